@@ -15,6 +15,22 @@ class Config:
     
     # Almacenamiento local (Obsidian-style markdown DB)
     DATOS_PATH = os.getenv('DATOS_PATH', 'datos')
+    DATOS_BACKEND = os.getenv('DATOS_BACKEND', 'markdown').lower()  # markdown | sqlite
+    DATOS_SQLITE = os.getenv('DATOS_SQLITE', '')  # Archivo SQLite (por defecto <DATOS_PATH>/pug.sqlite3)
+    DATOS_CACHE_MB = int(os.getenv('DATOS_CACHE_MB', '64'))  # Caché de documentos parseados
+    DATOS_FSYNC = os.getenv('DATOS_FSYNC', 'batch').lower()  # none | batch | always
+    DATOS_LECTORES = int(os.getenv('DATOS_LECTORES', '1'))  # Hilos de lectura (1 = secuencial)
+    DATOS_LOTE_LECTURA = int(os.getenv('DATOS_LOTE_LECTURA', '64'))
+    DATOS_YAML_PROCESOS = os.getenv('DATOS_YAML_PROCESOS', 'False').lower() == 'true'
+    DATOS_INSTANTANEAS = os.getenv('DATOS_INSTANTANEAS', 'True').lower() == 'true'  # _instantanea.pickle
+    DATOS_VERIFICAR_ESTADISTICAS = int(os.getenv('DATOS_VERIFICAR_ESTADISTICAS', '600'))  # Segundos (0 = nunca)
+    DATOS_DIARIO = os.getenv('DATOS_DIARIO', 'False').lower() == 'true'  # _diario.jsonl por colección
+    DATOS_DIARIO_MAX_KB = int(os.getenv('DATOS_DIARIO_MAX_KB', '1024'))  # Compactar al superar este tamaño
+    DATOS_DIARIO_INACTIVIDAD = float(os.getenv('DATOS_DIARIO_INACTIVIDAD', '5'))  # Segundos sin escrituras
+    
+    # Matchmaking
+    EMPAREJAMIENTO_TOLERANCIA_MIN = int(os.getenv('EMPAREJAMIENTO_TOLERANCIA_MIN', '0'))  # 0 = coincidencia exacta
+    ASIGNACION_MOTOR = os.getenv('ASIGNACION_MOTOR', 'flujo').lower()  # flujo | voraz
     
     # Portal Universitario
     PORTAL_URL = os.getenv('PORTAL_URL', 'https://segreteria.unigre.it')
@@ -0,0 +1,171 @@
+"""
+AsignacionFlujo - Asignación de conductores, carros y pasajeros por flujo de coste mínimo
+Modela la asignación diaria como una red: fuente → conductores → carros →
+sumidero. Cada unidad de flujo es un carro que sale con un conductor que
+tiene licencia para él (MATRIZ_LICENCIA_CARRO) y su coste es menos sus
+plazas (capacidad_pasajeros, conductor incluido).
+
+Los caminos más cortos sucesivos dan, tras k aumentos, la combinación de k
+carros con más plazas posibles; basta con parar en el primer k que sienta a
+todos (o cuando ningún carro más añade plazas) para maximizar los sentados
+con el mínimo de carros. Los pasajeros son intercambiables y se reparten
+después por las plazas libres.
+
+Los conductores con las mismas licencias y los carros del mismo tipo y
+capacidad son equivalentes, así que la red agrupa cada clase en un nodo con
+capacidad igual a su tamaño: unas pocas decenas de nodos aunque haya miles
+de estudiantes.
+"""
+
+import logging
+from typing import Dict, FrozenSet, List, Tuple
+
+from .models import MATRIZ_LICENCIA_CARRO, TipoLicencia
+
+logger = logging.getLogger(__name__)
+
+_INFINITO = float("inf")
+
+
+def tipos_carro_compatibles(tipos_licencia: List[str]) -> FrozenSet[str]:
+    """Tipos de carro ('mini', 'furgoneta', ...) que permiten conducir las licencias dadas."""
+    tipos = set()
+    for licencia in tipos_licencia or []:
+        try:
+            tipos.update(t.value for t in MATRIZ_LICENCIA_CARRO.get(TipoLicencia(licencia), []))
+        except ValueError:
+            logger.warning(f"Tipo de licencia desconocido: {licencia}")
+    return frozenset(tipos)
+
+
+class RedFlujo:
+    """Red de flujo de coste mínimo con aumentos de una unidad (caminos más cortos sucesivos)."""
+
+    def __init__(self, nodos: int):
+        self.nodos = nodos
+        # Aristas residuales: destino, capacidad, coste; la inversa de la arista i es i ^ 1
+        self.destino: List[int] = []
+        self.capacidad: List[int] = []
+        self.coste: List[int] = []
+        self.salientes: List[List[int]] = [[] for _ in range(nodos)]
+
+    def agregar_arista(self, origen: int, destino: int, capacidad: int, coste: int = 0) -> int:
+        """Agregar una arista y retornar su índice (para leer luego su flujo)."""
+        indice = len(self.destino)
+        for a, b, c, k in ((origen, destino, capacidad, coste), (destino, origen, 0, -coste)):
+            self.destino.append(b)
+            self.capacidad.append(c)
+            self.coste.append(k)
+            self.salientes[a].append(len(self.destino) - 1)
+        return indice
+
+    def flujo(self, arista: int) -> int:
+        """Unidades que pasan por la arista (capacidad de su inversa)."""
+        return self.capacidad[arista ^ 1]
+
+    def aumentar(self, fuente: int, sumidero: int) -> float:
+        """
+        Enviar una unidad por el camino de menor coste (Bellman-Ford: hay
+        costes negativos). Retorna su coste, o infinito si no queda camino.
+        """
+        distancia = [_INFINITO] * self.nodos
+        previa = [-1] * self.nodos
+        distancia[fuente] = 0
+        for _ in range(self.nodos - 1):
+            cambio = False
+            for nodo in range(self.nodos):
+                if distancia[nodo] == _INFINITO:
+                    continue
+                for arista in self.salientes[nodo]:
+                    siguiente = self.destino[arista]
+                    if self.capacidad[arista] > 0 and distancia[nodo] + self.coste[arista] < distancia[siguiente]:
+                        distancia[siguiente] = distancia[nodo] + self.coste[arista]
+                        previa[siguiente] = arista
+                        cambio = True
+            if not cambio:
+                break
+        if distancia[sumidero] == _INFINITO:
+            return _INFINITO
+        nodo = sumidero
+        while nodo != fuente:
+            arista = previa[nodo]
+            self.capacidad[arista] -= 1
+            self.capacidad[arista ^ 1] += 1
+            nodo = self.destino[arista ^ 1]
+        return distancia[sumidero]
+
+
+def asignar_por_flujo(conductores: List[Dict], estudiantes: List[Dict],
+                      carros: List[Dict]) -> Tuple[List[Tuple[Dict, Dict, List[str]]], List[str]]:
+    """
+    Elegir conductores y carros que sienten al máximo de estudiantes con el
+    mínimo de carros, y repartir a los demás como pasajeros.
+
+    Args:
+        conductores: Estudiantes con licencia ('matricola', 'tipos_licencia')
+        estudiantes: Todos los estudiantes que viajan (conductores incluidos)
+        carros: Carros disponibles ('id_carro', 'tipo_carro', 'capacidad_pasajeros')
+
+    Returns:
+        tuple: ([(conductor, carro, matrículas de pasajeros)], matrículas sin plaza)
+    """
+    # Clases de conductores (mismos tipos de carro) y de carros (tipo y capacidad)
+    clases_conductor: Dict[FrozenSet[str], List[Dict]] = {}
+    for conductor in conductores:
+        tipos = tipos_carro_compatibles(conductor.get('tipos_licencia', []))
+        if tipos:
+            clases_conductor.setdefault(tipos, []).append(conductor)
+    clases_carro: Dict[Tuple[str, int], List[Dict]] = {}
+    for carro in carros:
+        if carro.get('capacidad_pasajeros', 0) > 0:
+            clases_carro.setdefault((carro.get('tipo_carro'), carro['capacidad_pasajeros']), []).append(carro)
+
+    claves_conductor = list(clases_conductor)
+    claves_carro = list(clases_carro)
+    fuente, sumidero = 0, 1
+    red = RedFlujo(2 + len(claves_conductor) + len(claves_carro))
+    nodo_conductor = {clave: 2 + i for i, clave in enumerate(claves_conductor)}
+    nodo_carro = {clave: 2 + len(claves_conductor) + i for i, clave in enumerate(claves_carro)}
+
+    for clave, grupo in clases_conductor.items():
+        red.agregar_arista(fuente, nodo_conductor[clave], len(grupo))
+    for clave, grupo in clases_carro.items():
+        red.agregar_arista(nodo_carro[clave], sumidero, len(grupo), -clave[1])
+    aristas = {}
+    for tipos in claves_conductor:
+        for clave in claves_carro:
+            if clave[0] in tipos:
+                aristas[tipos, clave] = red.agregar_arista(nodo_conductor[tipos], nodo_carro[clave], len(clases_carro[clave]))
+
+    # Un carro más por aumento, mientras añada plazas y quede alguien sin sentar
+    plazas = 0
+    while plazas < len(estudiantes):
+        coste = red.aumentar(fuente, sumidero)
+        if coste >= 0:
+            break
+        plazas -= coste
+
+    # Conductores y carros concretos de cada clase
+    elegidos = []
+    pendientes_conductor = {clave: iter(grupo) for clave, grupo in clases_conductor.items()}
+    pendientes_carro = {clave: iter(grupo) for clave, grupo in clases_carro.items()}
+    for (tipos, clave), arista in aristas.items():
+        for _ in range(red.flujo(arista)):
+            elegidos.append((next(pendientes_conductor[tipos]), next(pendientes_carro[clave])))
+
+    # Pasajeros: primero quienes no tienen licencia, como en la asignación voraz
+    conductores_elegidos = {conductor['matricola'] for conductor, _ in elegidos}
+    pasajeros = [e['matricola'] for e in estudiantes
+                 if e['matricola'] not in conductores_elegidos and not e.get('tiene_licencia', False)]
+    pasajeros += [e['matricola'] for e in estudiantes
+                  if e['matricola'] not in conductores_elegidos and e.get('tiene_licencia', False)]
+
+    plan = []
+    siguiente = 0
+    for conductor, carro in sorted(elegidos, key=lambda par: -par[1]['capacidad_pasajeros']):
+        libres = carro['capacidad_pasajeros'] - 1  # -1 por el conductor
+        plan.append((conductor, carro, pasajeros[siguiente:siguiente + libres]))
+        siguiente += libres
+
+    logger.info(f"Asignación por flujo: {len(plan)} carro(s), {min(plazas, len(estudiantes))} plaza(s) ocupadas")
+    return plan, pasajeros[siguiente:]
@@ -107,15 +107,17 @@ class CarManager:
             logger.error(f"Error obteniendo carro {id_carro}: {e}")
             return None
     
-    def obtener_todos_carros(self, filtros: Dict[str, Any] = None) -> List[Carro]:
+    def obtener_todos_carros(self, filtros: Dict[str, Any] = None,
+                             campos: Optional[List[str]] = None) -> List[Any]:
         """
         Obtener todos los carros con filtros opcionales
         
         Args:
             filtros: Filtros opcionales (estado, tipo_carro, etc.)
+            campos: Si se indican, se devuelven diccionarios con solo esos campos
             
         Returns:
-            List[Carro]: Lista de carros
+            List[Carro]: Lista de carros (List[dict] si se indican campos)
         """
         try:
             query = self.db.collection(self.collection_name)
@@ -130,6 +132,9 @@ class CarManager:
                     # Este filtro se aplicará después de obtener los datos
                     pass
             
+            if campos is not None:
+                return [doc.to_dict() for doc in query.select(campos).stream()]
+            
             docs = query.stream()
             carros = []
             
@@ -319,38 +324,38 @@ class CarManager:
             dict: Estadísticas del sistema de carros
         """
         try:
-            carros = self.obtener_todos_carros()
+            carros = self.db.collection(self.collection_name)
+            total_carros = carros.count()
             
-            # Contar por estado
-            estados = {}
-            for estado in EstadoCarro:
-                estados[estado.value] = 0
+            # Contar por estado (sin el campo cuenta como disponible, como en Carro.from_dict)
+            estados = {estado.value: 0 for estado in EstadoCarro}
+            por_estado = carros.group_count('estado')
+            for valor, n in por_estado.items():
+                if valor in estados:
+                    estados[valor] += n
+            estados[EstadoCarro.DISPONIBLE.value] += total_carros - sum(por_estado.values())
             
             # Contar por tipo
-            tipos = {}
-            for tipo in TipoCarro:
-                tipos[tipo.value] = 0
+            tipos = {tipo.value: 0 for tipo in TipoCarro}
+            for valor, n in carros.group_count('tipo_carro').items():
+                if valor in tipos:
+                    tipos[valor] += n
             
             # Contar por combustible
-            combustibles = {}
-            for combustible in TipoCombustible:
-                combustibles[combustible.value] = 0
-            
-            total_capacidad = 0
+            combustibles = {combustible.value: 0 for combustible in TipoCombustible}
+            for valor, n in carros.group_count('tipo_combustible').items():
+                if valor in combustibles:
+                    combustibles[valor] += n
             
-            for carro in carros:
-                estados[carro.estado.value] += 1
-                tipos[carro.tipo_carro.value] += 1
-                combustibles[carro.tipo_combustible.value] += 1
-                total_capacidad += carro.capacidad_pasajeros
+            total_capacidad = carros.sum('capacidad_pasajeros')
             
             return {
-                'total_carros': len(carros),
+                'total_carros': total_carros,
                 'por_estado': estados,
                 'por_tipo': tipos,
                 'por_combustible': combustibles,
                 'capacidad_total': total_capacidad,
-                'capacidad_promedio': round(total_capacidad / len(carros), 1) if carros else 0
+                'capacidad_promedio': round(total_capacidad / total_carros, 1) if total_carros else 0
             }
             
         except Exception as e:
@@ -59,7 +59,8 @@ class DataProcessor:
                 }
             
             # Ejecutar matchmaking para encontrar grupos compatibles
-            grupos_compatibles = self.scheduler.obtener_grupos_compatibles(matricola)
+            emparejamiento = self.scheduler.obtener_emparejamiento()
+            grupos_compatibles = self.scheduler.formatear_informe(emparejamiento, matricola)
             
             self.logger.info(f"Datos procesados exitosamente para {matricola}")
             
@@ -69,6 +70,7 @@ class DataProcessor:
                 'data': {
                     'estudiante': datos_procesados,
                     'grupos_compatibles': grupos_compatibles,
+                    'grupos_estudiante': [g.to_dict() for g in emparejamiento.grupos_de(matricola)],
                     'timestamp': datetime.now().isoformat()
                 }
             }
@@ -241,7 +243,8 @@ class DataProcessor:
             num_calificaciones = len(datos_estudiante.get('calificaciones', []))
             
             # Obtener grupos compatibles
-            grupos_compatibles = self.scheduler.obtener_grupos_compatibles(matricola)
+            emparejamiento = self.scheduler.obtener_emparejamiento()
+            grupos_compatibles = self.scheduler.formatear_informe(emparejamiento, matricola)
             
             resumen = {
                 'perfil': {
@@ -257,6 +260,7 @@ class DataProcessor:
                     'total_calificaciones': num_calificaciones
                 },
                 'grupos_compatibles': grupos_compatibles,
+                'grupos_estudiante': [g.to_dict() for g in emparejamiento.grupos_de(matricola)],
                 'datos_completos': datos_estudiante
             }
             
@@ -286,17 +290,16 @@ class DataProcessor:
                 estado = datos.get('estado_horarios', 'no_disponible')
                 estados_horarios[estado] = estados_horarios.get(estado, 0) + 1
             
-            # Generar estadísticas de grupos
-            grupos_compatibles = self.scheduler.obtener_grupos_compatibles()
-            num_grupos_ida = grupos_compatibles.count('Para llegar el')
-            num_grupos_vuelta = grupos_compatibles.count('Para salir el')
+            # Estadísticas de grupos (emparejamiento en caché si no hubo cambios)
+            emparejamiento = self.scheduler.obtener_emparejamiento()
             
             estadisticas = {
                 'estudiantes': stats_firebase,
                 'horarios': {
                     'por_estado': estados_horarios,
-                    'grupos_ida_encontrados': num_grupos_ida,
-                    'grupos_vuelta_encontrados': num_grupos_vuelta
+                    'grupos_ida_encontrados': len(emparejamiento.grupos_ida),
+                    'grupos_vuelta_encontrados': len(emparejamiento.grupos_vuelta),
+                    'estudiantes_emparejados': emparejamiento.estudiantes_emparejados
                 },
                 'sistema': {
                     'version': '2.0',
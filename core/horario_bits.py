@@ -0,0 +1,216 @@
+"""
+HorarioBits - Horarios semanales codificados como máscaras de bits
+La semana de un estudiante cabe en un entero de 60 bits: 6 días × 10 bloques
+(DIAS_SEMANA × ORDEN_BLOQUES), con el bit dia * 10 + bloque a 1 si tiene
+clase. La entrada y la salida de cada día son el bit más bajo y el más alto
+de su tramo de 10 bits, así que no hace falta ordenar listas de bloques.
+
+Con tolerancia, los grupos son ventanas de bloques consecutivos cuya hora
+real (BLOQUES_A_HORAS) no se separa más de la tolerancia: un barrido por
+los bloques ocupados de cada día, ya ordenados, da las ventanas maximales.
+
+Para toda la cohorte, CohorteHorarios guarda las máscaras y los ordinales de
+entrada/salida por día en arrays compactos y, por cada (día, bloque), un
+entero con un bit por estudiante. La compatibilidad de ida o vuelta de un
+estudiante con todos los demás es entonces una consulta a ese bitset, y los
+grupos salen de recorrer 60 bitsets en lugar de comparar pares. El índice
+de emparejamiento (ver indice_emparejamiento) mantiene esas mismas casillas
+de forma incremental para la cohorte guardada; CohorteHorarios sirve para
+cohortes en memoria y para comprobar el índice.
+
+    bit  0..9   Lunedì    I..X
+    bit 10..19  Martedì   I..X
+    ...
+    bit 50..59  Sabato    I..X
+"""
+
+import logging
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from utils.constants import BLOQUES_A_HORAS, DIAS_SEMANA, ORDEN_BLOQUES
+
+logger = logging.getLogger(__name__)
+
+BLOQUES_POR_DIA = len(ORDEN_BLOQUES)
+DIAS = len(DIAS_SEMANA)
+
+# Ordinal de cada día y bloque (búsqueda en dict en lugar de list.index)
+ORDINAL_DIA = {dia: i for i, dia in enumerate(DIAS_SEMANA)}
+ORDINAL_BLOQUE = {bloque: i for i, bloque in enumerate(ORDEN_BLOQUES)}
+
+_TRAMO_DIA = (1 << BLOQUES_POR_DIA) - 1
+
+# Sin clase ese día en los arrays de entrada/salida
+SIN_CLASE = -1
+
+# Primer y último bloque de cada tramo diario posible (1024 valores)
+_PRIMERO = array('b', [SIN_CLASE] + [(t & -t).bit_length() - 1 for t in range(1, _TRAMO_DIA + 1)])
+_ULTIMO = array('b', [SIN_CLASE] + [t.bit_length() - 1 for t in range(1, _TRAMO_DIA + 1)])
+
+SENTIDOS = ("ida", "vuelta")
+
+
+def _minuto(hora: str) -> int:
+    horas, minutos = hora.strip().split(":")
+    return int(horas) * 60 + int(minutos)
+
+
+# Minuto del día en que empieza y termina cada bloque
+MINUTO_INICIO = [_minuto(BLOQUES_A_HORAS[b].split("-")[0]) for b in ORDEN_BLOQUES]
+MINUTO_FIN = [_minuto(BLOQUES_A_HORAS[b].split("-")[1]) for b in ORDEN_BLOQUES]
+
+
+def codificar_horario(clases: Iterable[dict], etiqueta: str = "") -> int:
+    """
+    Máscara de 60 bits de las clases (dicts con 'dia' y 'bloque' u 'hora').
+    Las clases sin día o bloque se ignoran; las de un día o bloque
+    desconocido, con un aviso que cita `etiqueta`.
+    """
+    mascara = 0
+    for clase in clases:
+        dia = clase.get('dia')
+        bloque = clase.get('bloque', clase.get('hora', ''))
+        if not dia or not bloque:
+            continue
+        b = ORDINAL_BLOQUE.get(bloque)
+        if b is None:
+            logger.warning(f"Bloque '{bloque}' desconocido para {etiqueta}")
+            continue
+        d = ORDINAL_DIA.get(dia)
+        if d is None:
+            logger.warning(f"Día '{dia}' desconocido para {etiqueta}")
+            continue
+        mascara |= 1 << (d * BLOQUES_POR_DIA + b)
+    return mascara
+
+
+def entrada_salida(mascara: int, dia: int) -> Optional[Tuple[int, int]]:
+    """Ordinales del primer y último bloque del día, o None si no tiene clase."""
+    tramo = (mascara >> (dia * BLOQUES_POR_DIA)) & _TRAMO_DIA
+    if not tramo:
+        return None
+    return _PRIMERO[tramo], _ULTIMO[tramo]
+
+
+def horario_diario(mascara: int) -> Dict[str, Dict[str, str]]:
+    """{dia: {"entrada": bloque, "salida": bloque}} en el orden de DIAS_SEMANA."""
+    resultado = {}
+    for d in range(DIAS):
+        extremos = entrada_salida(mascara, d)
+        if extremos is not None:
+            resultado[DIAS_SEMANA[d]] = {
+                "entrada": ORDEN_BLOQUES[extremos[0]],
+                "salida": ORDEN_BLOQUES[extremos[1]],
+            }
+    return resultado
+
+
+def ventanas(bloques: Sequence[int], sentido: str, tolerancia: int,
+             en_bloques: bool = False) -> Iterator[Tuple[int, int]]:
+    """
+    (primer, último) bloque de cada ventana maximal de `bloques` (ordinales
+    ocupados de un día, en orden) cuyos extremos no se separan más de
+    `tolerancia`: minutos entre las horas de llegada (ida, inicio del
+    bloque) o de salida (vuelta, fin del bloque), o bloques si `en_bloques`.
+    Barrido con dos punteros: lineal en los bloques.
+    """
+    if en_bloques:
+        posicion = list(bloques)
+    else:
+        minutos = MINUTO_INICIO if sentido == "ida" else MINUTO_FIN
+        posicion = [minutos[b] for b in bloques]
+    fin = anterior = -1
+    for inicio in range(len(bloques)):
+        fin = max(fin, inicio)
+        while fin + 1 < len(bloques) and posicion[fin + 1] - posicion[inicio] <= tolerancia:
+            fin += 1
+        # Si no llega más lejos que la anterior, la ventana está contenida en ella
+        if fin > anterior:
+            yield bloques[inicio], bloques[fin]
+            anterior = fin
+
+
+# Posiciones de los bits a 1 de cada byte
+_BITS_BYTE = [tuple(b for b in range(8) if v >> b & 1) for v in range(256)]
+
+
+def miembros(bitset: int) -> Iterator[int]:
+    """Posiciones de los bits a 1, de menor a mayor (por bytes: lineal en el tamaño)."""
+    for i, byte in enumerate(bitset.to_bytes((bitset.bit_length() + 7) // 8, "little")):
+        if byte:
+            base = i * 8
+            for bit in _BITS_BYTE[byte]:
+                yield base + bit
+
+
+class CohorteHorarios:
+    """
+    Máscaras de una cohorte (en el orden dado) con sus entradas/salidas por
+    día y, por sentido, un bitset de estudiantes por cada (día, bloque).
+    """
+
+    def __init__(self, mascaras: Sequence[int]):
+        n = len(mascaras)
+        self.mascaras = array('Q', mascaras)
+        # entradas[i * DIAS + d]: ordinal del primer bloque del estudiante i el día d
+        self.entradas = array('b', [SIN_CLASE]) * (n * DIAS)
+        self.salidas = array('b', [SIN_CLASE]) * (n * DIAS)
+        casillas = DIAS * BLOQUES_POR_DIA
+        bits = {sentido: [bytearray((n + 7) // 8) for _ in range(casillas)] for sentido in SENTIDOS}
+        ida, vuelta = bits["ida"], bits["vuelta"]
+        for i, mascara in enumerate(self.mascaras):
+            byte, bit = i >> 3, 1 << (i & 7)
+            d = 0
+            while mascara:
+                tramo = mascara & _TRAMO_DIA
+                if tramo:
+                    entrada, salida = _PRIMERO[tramo], _ULTIMO[tramo]
+                    self.entradas[i * DIAS + d] = entrada
+                    self.salidas[i * DIAS + d] = salida
+                    ida[d * BLOQUES_POR_DIA + entrada][byte] |= bit
+                    vuelta[d * BLOQUES_POR_DIA + salida][byte] |= bit
+                mascara >>= BLOQUES_POR_DIA
+                d += 1
+        self._bitsets: Dict[str, List[int]] = {
+            sentido: [int.from_bytes(b, "little") for b in por_casilla]
+            for sentido, por_casilla in bits.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.mascaras)
+
+    def bitset(self, sentido: str, dia: int, bloque: int) -> int:
+        """Estudiantes que entran (ida) o salen (vuelta) ese día en ese bloque."""
+        return self._bitsets[sentido][dia * BLOQUES_POR_DIA + bloque]
+
+    def compatibles(self, i: int, sentido: str, dia: int) -> int:
+        """Bitset de los demás estudiantes que comparten viaje con `i` ese día (0 si no va)."""
+        extremos = self.entradas if sentido == "ida" else self.salidas
+        bloque = extremos[i * DIAS + dia]
+        if bloque == SIN_CLASE:
+            return 0
+        return self.bitset(sentido, dia, bloque) & ~(1 << i)
+
+    def grupos(self, sentido: str, minimo: int = 2) -> Iterator[Tuple[int, int, int]]:
+        """(día, bloque, bitset) de las casillas con al menos `minimo` estudiantes."""
+        for casilla, bitset in enumerate(self._bitsets[sentido]):
+            if bitset.bit_count() >= minimo:
+                yield casilla // BLOQUES_POR_DIA, casilla % BLOQUES_POR_DIA, bitset
+
+    def grupos_ventana(self, sentido: str, tolerancia: int, en_bloques: bool = False,
+                       minimo: int = 2) -> Iterator[Tuple[int, int, int, int]]:
+        """
+        (día, primer bloque, último bloque, bitset) de las ventanas maximales
+        (ver ventanas) con al menos `minimo` estudiantes.
+        """
+        por_casilla = self._bitsets[sentido]
+        for dia in range(DIAS):
+            base = dia * BLOQUES_POR_DIA
+            ocupados = [b for b in range(BLOQUES_POR_DIA) if por_casilla[base + b]]
+            for desde, hasta in ventanas(ocupados, sentido, tolerancia, en_bloques):
+                bitset = 0
+                for b in range(desde, hasta + 1):
+                    bitset |= por_casilla[base + b]
+                if bitset.bit_count() >= minimo:
+                    yield dia, desde, hasta, bitset
@@ -0,0 +1,216 @@
+"""
+IndiceEmparejamiento - Índice persistente de horarios para el matchmaking
+Asocia cada casilla (día, bloque) con las matrículas que entran (ida) o
+salen (vuelta) en ella. ObsidianManager lo actualiza al guardar o eliminar
+un estudiante con solo su cambio, así que registrar un estudiante cuesta lo
+que sus clases y no lo que la cohorte, y los grupos compatibles se leen del
+índice sin cargar a los demás estudiantes.
+
+Como _indices.jsonl, es un registro de solo-anexado (ver registro_jsonl)
+con una línea por cambio (nombre, máscara semanal, ver horario_bits, y
+versión del documento). Las escrituras de la base en la colección de
+estudiantes lo actualizan (ver obsidian_manager y sqlite_db). Se compacta
+cuando acumula demasiadas líneas, con un bloqueo entre procesos
+(.emparejamiento.lock), y se reconstruye leyendo los estudiantes si falta,
+es inválido o, al cargarlo, sus versiones no son las de la colección (una
+edición a mano, un corte entre la nota y el índice).
+
+Estructura en disco:
+    datos/
+        _emparejamiento.jsonl   {"version": 2}
+                                {"id": "172934", "e": ["Ana Rossi", 1048577, "[[5417, 1760772000, 2048], null]"]}
+                                {"id": "100201", "e": [null, 0, "[[5420, 1760772001, 310], null]"]}  (sin nombre)
+                                {"id": "100200", "e": null}      (eliminado)
+"""
+
+import logging
+from pathlib import Path
+from typing import Callable, ContextManager, Dict, Iterable, List, Optional, Set, Tuple
+
+from .horario_bits import BLOQUES_POR_DIA, DIAS, SENTIDOS, codificar_horario, entrada_salida
+from .registro_jsonl import RegistroJsonl
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_EMPAREJAMIENTO = "_emparejamiento.jsonl"
+COLECCION_EMPAREJAMIENTO = "estudiantes"
+ARCHIVO_BLOQUEO_EMPAREJAMIENTO = ".emparejamiento.lock"
+
+# Campos del estudiante de los que depende el índice
+CAMPOS_EMPAREJAMIENTO = ("nome", "cognome", "horario")
+
+_VERSION = 2
+
+
+# (nombre completo o None sin datos básicos, máscara semanal, versión del documento)
+Entrada = Tuple[Optional[str], int, Optional[str]]
+
+
+def entrada_emparejamiento(matricola: str, data: Optional[dict],
+                           version: Optional[str] = None) -> Optional[Entrada]:
+    """
+    Entrada del estudiante; None si el documento no existe. Sin datos
+    básicos queda con nombre None y sin casillas: no entra en ningún grupo,
+    pero su versión cuenta al comprobar el índice.
+    """
+    if data is None:
+        return None
+    if 'nome' not in data:
+        return None, 0, version
+    nombre = f"{data.get('nome', '')} {data.get('cognome', '')}".strip()
+    return nombre, codificar_horario(data.get('horario', []), matricola), version
+
+
+class IndiceEmparejamiento(RegistroJsonl):
+    """
+    Casilla (día * 10 + bloque) → matrículas, para ida y para vuelta.
+    `cargar()` entrega pares (matrícula, datos) de todos los estudiantes
+    para reconstruirlo; `bloquear()` excluye a otros procesos mientras se
+    anexa o se compacta. `versiones()` entrega {matrícula: versión} de la
+    colección sin leer los documentos; sin ella el índice no se comprueba.
+    """
+
+    def __init__(self, archivo: Path, cargar: Callable[[], Iterable[Tuple[str, dict]]],
+                 bloquear: Callable[[], ContextManager],
+                 versiones: Optional[Callable[[], Dict[str, str]]] = None):
+        super().__init__(archivo, bloquear)
+        self.archivo = archivo
+        self._fuente = cargar
+        self._versiones = versiones
+        self._casillas: Dict[str, Dict[int, Set[str]]] = {sentido: {} for sentido in SENTIDOS}
+        # Cabecera del registro cuyas versiones ya se compararon con la colección
+        self._comprobada: Optional[bytes] = None
+
+    # ── Consultas ───────────────────────────────
+
+    def grupos(self, sentido: str, minimo: int = 2) -> Dict[Tuple[int, int], List[str]]:
+        """{(día, bloque): matrículas ordenadas} de las casillas con al menos `minimo` estudiantes."""
+        with self._lock:
+            self._refresh()
+            return {
+                divmod(casilla, BLOQUES_POR_DIA): sorted(matriculas)
+                for casilla, matriculas in sorted(self._casillas[sentido].items())
+                if len(matriculas) >= minimo
+            }
+
+    def nombre(self, matricola: str) -> Optional[str]:
+        return self.nombres([matricola])[0]
+
+    def nombres(self, matriculas: Iterable[str]) -> List[Optional[str]]:
+        """Nombre completo de cada matrícula (None si no está indexada)."""
+        with self._lock:
+            self._refresh()
+            return [entrada[0] if entrada is not None else None
+                    for entrada in map(self._docs.get, matriculas)]
+
+    def __len__(self) -> int:
+        """Estudiantes con datos básicos."""
+        with self._lock:
+            self._refresh()
+            return sum(entrada[0] is not None for entrada in self._docs.values())
+
+    @property
+    def version(self) -> Tuple[Optional[bytes], int]:
+        """
+        Versión de los datos indexados: (cabecera, bytes leídos) del registro.
+        Cambia con cada cambio de cualquier proceso y con cada compactación.
+        """
+        with self._lock:
+            self._refresh()
+            return self._marca, self._offset
+
+    # ── Mantenimiento ───────────────────────────
+
+    def actualizar(self, matricola: str, data: Optional[dict], version: Optional[str] = None):
+        """Registrar el estado del estudiante tras escribirlo (None si ya no existe) y su versión."""
+        self._registrar(matricola, entrada_emparejamiento(matricola, data, version))
+
+    def eliminar(self, matricola: str):
+        self._registrar(matricola, None)
+
+    def reconstruir(self) -> int:
+        """Releer todos los estudiantes. Retorna estudiantes indexados."""
+        return self._reconstruir()
+
+    def comprobar(self) -> bool:
+        """
+        Reconstruir si las versiones indexadas no son las de la colección.
+        Se hace al cargar el registro; retorna True si se reconstruyó.
+        """
+        if self._versiones is None:
+            return False
+        with self._lock:
+            super()._refresh()
+            self._comprobada = self._marca
+            indexadas = {matricola: entrada[2] for matricola, entrada in self._docs.items()}
+            if indexadas == self._versiones():
+                return False
+            logger.warning("Índice de emparejamiento desactualizado respecto a los estudiantes — reconstruyendo")
+            self._reconstruir()
+            return True
+
+    def _reconstruir(self) -> int:
+        total = super()._reconstruir()
+        self._comprobada = self._marca
+        logger.info(f"Índice de emparejamiento reconstruido ({total} estudiantes)")
+        return total
+
+    def _refresh(self):
+        super()._refresh()
+        if self._marca != self._comprobada:
+            self.comprobar()
+
+    def _volcar(self):
+        # Compactar no cambia el estado: si ya estaba comprobado, lo sigue estando
+        comprobada = self._comprobada == self._marca
+        super()._volcar()
+        if comprobada:
+            self._comprobada = self._marca
+
+    # ── Estado en memoria ───────────────────────
+
+    def _aplicar(self, matricola: str, entrada: Optional[Entrada]):
+        anterior = self._docs.pop(matricola, None)
+        if anterior is not None:
+            for sentido, casilla in _casillas_de(anterior[1]):
+                matriculas = self._casillas[sentido].get(casilla)
+                if matriculas is not None:
+                    matriculas.discard(matricola)
+                    if not matriculas:
+                        del self._casillas[sentido][casilla]
+        if entrada is not None:
+            self._docs[matricola] = entrada
+            for sentido, casilla in _casillas_de(entrada[1]):
+                self._casillas[sentido].setdefault(casilla, set()).add(matricola)
+
+    def _vaciar(self):
+        super()._vaciar()
+        self._casillas = {sentido: {} for sentido in SENTIDOS}
+
+    # ── Registro ────────────────────────────────
+
+    def _cabecera(self) -> dict:
+        return {"version": _VERSION}
+
+    def _comprobar_cabecera(self, registro: dict):
+        if registro["version"] != _VERSION:
+            raise ValueError(f"versión {registro['version']}")
+
+    def _decodificar(self, entrada) -> Optional[Entrada]:
+        return (entrada[0], entrada[1], entrada[2]) if entrada is not None else None
+
+    def _cargar(self):
+        # Las versiones se toman antes de leer: un cambio entre medias se
+        # detecta en la próxima comprobación en lugar de perderse
+        versiones = self._versiones() if self._versiones is not None else {}
+        for matricola, data in self._fuente():
+            self._aplicar(matricola, entrada_emparejamiento(matricola, data, versiones.get(matricola)))
+
+
+def _casillas_de(mascara: int) -> Iterable[Tuple[str, int]]:
+    """(sentido, casilla) de la entrada y la salida de cada día con clase."""
+    for dia in range(DIAS):
+        extremos = entrada_salida(mascara, dia)
+        if extremos is not None:
+            yield "ida", dia * BLOQUES_POR_DIA + extremos[0]
+            yield "vuelta", dia * BLOQUES_POR_DIA + extremos[1]
@@ -0,0 +1,249 @@
+"""
+MarkdownDiario - Diario de escrituras por colección (opcional, DATOS_DIARIO)
+Con el diario activo, las escrituras de una colección no reescriben la nota:
+se agregan como una línea JSON a _diario.jsonl y las lecturas ven el estado
+del diario por encima de las notas. Un compactador vuelca después las
+entradas a las notas en lote —tras unos segundos sin escrituras o cuando el
+diario supera un tamaño— y vacía el diario.
+
+Cada línea guarda el estado completo del documento tras la escritura, así
+que volver a aplicar el diario es idempotente: tras un corte se relee
+entero (incluso si la compactación ya había escrito algunas notas) y la
+última línea de cada id manda. Una línea a medio escribir se descarta.
+
+Varios procesos pueden compartir el diario: las escrituras se agregan con
+un bloqueo entre procesos y cada lector incorpora las líneas nuevas cuando
+cambia el tamaño del archivo; la compactación lo sustituye por uno vacío
+(otro inodo), y los demás procesos lo detectan y vuelven a las notas.
+
+Estructura en disco:
+    datos/
+        viajes/
+            _diario.jsonl   {"id": "ida_2026-03-10_...", "datos": {...}}
+                            {"id": "viaje_viejo", "datos": null}
+                            {"id": "lista_...", "datos": {...}, "cuerpo": "# Lista..."}
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_DIARIO = "_diario.jsonl"
+ARCHIVO_BLOQUEO_DIARIO = ".diario.lock"
+
+# Las fechas del frontmatter se conservan con su tipo: {"$fecha": "2026-03-10"}
+_TIPOS_FECHA = {"$fecha": date.fromisoformat, "$fechahora": datetime.fromisoformat}
+
+
+def _a_json(valor: Any) -> Dict[str, str]:
+    if isinstance(valor, datetime):
+        return {"$fechahora": valor.isoformat()}
+    if isinstance(valor, date):
+        return {"$fecha": valor.isoformat()}
+    raise TypeError(f"Tipo no serializable en el diario: {type(valor).__name__}")
+
+
+def _de_json(obj: dict) -> Any:
+    if len(obj) == 1:
+        clave, valor = next(iter(obj.items()))
+        convertir = _TIPOS_FECHA.get(clave)
+        if convertir is not None and isinstance(valor, str):
+            try:
+                return convertir(valor)
+            except ValueError:
+                pass
+    return obj
+
+
+class Entrada:
+    """Estado de un documento según el diario: datos None si se eliminó."""
+
+    __slots__ = ("datos", "cuerpo", "version")
+
+    def __init__(self, datos: Optional[dict], cuerpo: Optional[str], version: int):
+        self.datos = datos
+        # None: el cuerpo de la nota en disco no cambia
+        self.cuerpo = cuerpo
+        self.version = version
+
+
+class CollectionJournal:
+    """
+    Diario de una colección. `bloquear()` excluye a otros procesos mientras
+    se agrega o se compacta y `volcar(entradas)` escribe en las notas el
+    estado de cada id (o las elimina).
+    """
+
+    def __init__(self, path: Path, bloquear: Callable[[], ContextManager],
+                 volcar: Callable[[Dict[str, Entrada]], None]):
+        self.path = path
+        self._file = path / ARCHIVO_DIARIO
+        self._bloquear = bloquear
+        self._volcar = volcar
+        self._entradas: Dict[str, Entrada] = {}
+        # Archivo cargado (inodo) y bytes ya incorporados
+        self._ino: Optional[int] = None
+        self._leido = 0
+        self._versiones = 0
+        self._lock = threading.RLock()
+        self.ultima_escritura = 0.0
+
+    # ── Lectura ─────────────────────────────────
+
+    def entrada(self, doc_id: str) -> Optional[Entrada]:
+        """Estado del documento en el diario, o None si el diario no lo tiene."""
+        self.refrescar()
+        return self._entradas.get(doc_id)
+
+    def entradas(self) -> Dict[str, Entrada]:
+        """Copia de todas las entradas pendientes de compactar."""
+        self.refrescar()
+        with self._lock:
+            return dict(self._entradas)
+
+    @property
+    def tamano(self) -> int:
+        return self._leido
+
+    def refrescar(self):
+        """Incorporar las líneas que otros procesos agregaron (o recargar si se compactó)."""
+        try:
+            st = os.stat(self._file)
+        except FileNotFoundError:
+            st = None
+        ino = st.st_ino if st is not None else None
+        if ino == self._ino and (st is None or st.st_size == self._leido):
+            return
+        with self._lock:
+            if ino != self._ino:
+                self._entradas = {}
+                self._ino = ino
+                self._leido = 0
+            if st is not None and st.st_size > self._leido:
+                self._leer_desde(self._leido)
+
+    def _leer_desde(self, offset: int):
+        with open(self._file, "rb") as fh:
+            fh.seek(offset)
+            bloque = fh.read()
+        # Solo líneas completas: la última puede estar a medio escribir
+        fin = bloque.rfind(b"\n") + 1
+        for numero, linea in enumerate(bloque[:fin].splitlines()):
+            if not linea.strip():
+                continue
+            try:
+                registro = json.loads(linea, object_hook=_de_json)
+                self._aplicar(registro["id"], registro["datos"], registro.get("cuerpo"))
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error(f"Línea ilegible en {self._file} (byte {offset}, línea {numero + 1}): {e}")
+        self._leido = offset + fin
+
+    def _aplicar(self, doc_id: str, datos: Optional[dict], cuerpo: Optional[str]):
+        previa = self._entradas.get(doc_id)
+        if cuerpo is None and previa is not None:
+            # Sin cuerpo nuevo se conserva el de la entrada anterior ("" si se había eliminado)
+            cuerpo = previa.cuerpo if previa.datos is not None else ""
+        self._versiones += 1
+        self._entradas[doc_id] = Entrada(datos, cuerpo, self._versiones)
+
+    # ── Escritura ───────────────────────────────
+
+    def anotar(self, cambios: Iterable[Tuple[str, Optional[dict], Optional[str]]], fsync: bool = False):
+        """
+        Agregar al diario (id, datos o None si se elimina, cuerpo o None si
+        no cambia) en una sola escritura. Los dicts pasan a ser del diario.
+        """
+        cambios = list(cambios)
+        if not cambios:
+            return
+        lineas = []
+        for doc_id, datos, cuerpo in cambios:
+            registro: Dict[str, Any] = {"id": doc_id, "datos": datos}
+            if cuerpo is not None:
+                registro["cuerpo"] = cuerpo
+            lineas.append(json.dumps(registro, ensure_ascii=False, separators=(",", ":"), default=_a_json))
+        contenido = ("\n".join(lineas) + "\n").encode("utf-8")
+        with self._bloquear(), self._lock:
+            self.refrescar()
+            creado = self._ino is None
+            fd = os.open(self._file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size > self._leido:
+                    # Cola de una escritura interrumpida: se descarta
+                    os.ftruncate(fd, self._leido)
+                escrito = 0
+                while escrito < len(contenido):
+                    escrito += os.write(fd, contenido[escrito:])
+                if fsync:
+                    os.fsync(fd)
+                if creado:
+                    self._ino = os.fstat(fd).st_ino
+            finally:
+                os.close(fd)
+            self._leido += len(contenido)
+            for doc_id, datos, cuerpo in cambios:
+                self._aplicar(doc_id, datos, cuerpo)
+            self.ultima_escritura = time.monotonic()
+
+    def compactar(self) -> int:
+        """Volcar las entradas a las notas y vaciar el diario. Retorna cuántas se volcaron."""
+        with self._bloquear():
+            self.refrescar()
+            entradas = self.entradas()
+            if not entradas:
+                return 0
+            # Las lecturas siguen viendo el diario mientras se escriben las notas
+            self._volcar(entradas)
+            tmp = self._file.with_name(f".{ARCHIVO_DIARIO}.{os.getpid()}.tmp")
+            tmp.write_bytes(b"")
+            with self._lock:
+                os.replace(tmp, self._file)
+                self._ino = os.stat(self._file).st_ino
+                self._leido = 0
+                self._entradas = {}
+        logger.info(f"Diario de {self.path.name} compactado: {len(entradas)} nota(s)")
+        return len(entradas)
+
+
+class CompactadorDiarios(threading.Thread):
+    """
+    Hilo que compacta los diarios tras `inactividad` segundos sin escrituras
+    o en cuanto superan `limite_bytes` (avisar() lo despierta).
+    """
+
+    def __init__(self, diarios: Callable[[], List[CollectionJournal]], inactividad: float, limite_bytes: int):
+        super().__init__(name="compactador-diarios", daemon=True)
+        self._diarios = diarios
+        self.inactividad = inactividad
+        self.limite_bytes = limite_bytes
+        self._despertar = threading.Event()
+        self._detener = False
+
+    def run(self):
+        while not self._detener:
+            self._despertar.wait(max(self.inactividad / 2, 0.05))
+            self._despertar.clear()
+            ahora = time.monotonic()
+            for diario in self._diarios():
+                diario.refrescar()
+                if not diario.tamano:
+                    continue
+                if diario.tamano >= self.limite_bytes or ahora - diario.ultima_escritura >= self.inactividad:
+                    try:
+                        diario.compactar()
+                    except Exception as e:
+                        logger.error(f"Error compactando el diario de {diario.path.name}: {e}")
+
+    def avisar(self):
+        self._despertar.set()
+
+    def detener(self):
+        self._detener = True
+        self._despertar.set()
@@ -0,0 +1,163 @@
+"""
+MarkdownIndex - Índices secundarios persistentes para la base Markdown
+Cada colección indexada guarda junto a sus notas un archivo _indices.jsonl
+que asocia valores de campo con ids de documento.
+
+El archivo es un registro de solo-anexado (ver registro_jsonl): una línea
+de cabecera con los campos indexados y una línea por cambio, de modo que
+mantener el índice al escribir una nota cuesta O(1). Se compacta cuando
+acumula demasiadas líneas, con un bloqueo entre procesos (.indices.lock).
+
+Estructura en disco:
+    datos/
+        viajes/
+            _indices.jsonl     {"version": 1, "campos": ["fecha", "estado"]}
+                               {"id": "ida_...", "e": {"fecha": "\"2026-03-10\""}}
+                               {"id": "viaje_...", "e": null}      (borrado)
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Dict, Iterable, List, Optional, Set, Tuple
+
+from .registro_jsonl import RegistroJsonl
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_INDICES = "_indices.jsonl"
+ARCHIVO_BLOQUEO_INDICES = ".indices.lock"
+
+_ESCALARES = (str, int, float, bool)
+
+
+def _clave(valor: Any) -> Optional[str]:
+    """Clave JSON del valor (distingue True de 1 y '1'); None si no es indexable."""
+    if valor is None or isinstance(valor, _ESCALARES):
+        return json.dumps(valor, ensure_ascii=False)
+    return None
+
+
+class CollectionIndex(RegistroJsonl):
+    """
+    Índice campo → valor → ids de una colección.
+
+    Se mantiene al escribir o borrar notas con la API de MarkdownDB. Solo se
+    registran documentos con al menos un campo indexado. Si el archivo falta,
+    está corrupto o cambió la lista de campos, se reconstruye leyendo con
+    `leer` las notas que entrega `notas`. `bloquear()` excluye a otros
+    procesos mientras se anexa o se compacta.
+    """
+
+    def __init__(self, path: Path, campos: Tuple[str, ...],
+                 leer: Callable[[Path], Optional[dict]],
+                 notas: Optional[Callable[[], Iterable[Path]]],
+                 bloquear: Callable[[], ContextManager]):
+        super().__init__(path / ARCHIVO_INDICES, bloquear)
+        self.path = path
+        self.campos = tuple(campos)
+        self._leer = leer
+        # Notas de la colección (por defecto, los .md de la carpeta)
+        self._notas = notas or (lambda: sorted(self.path.glob("*.md")))
+        self._valores: Dict[str, Dict[str, Set[str]]] = {}
+
+    # ── Consultas ───────────────────────────────
+
+    def lookup(self, campo: str, op_string: str, valor: Any) -> Optional[Set[str]]:
+        """Ids que pueden cumplir el filtro, o None si el índice no lo cubre."""
+        if campo not in self.campos:
+            return None
+        if op_string == "==":
+            valores: Iterable[Any] = (valor,)
+        elif op_string == "in":
+            valores = valor
+        else:
+            return None
+        claves = [_clave(v) for v in valores]
+        if any(c is None for c in claves):
+            return None
+        with self._lock:
+            self._refresh()
+            por_valor = self._valores.get(campo, {})
+            ids: Set[str] = set()
+            for c in claves:
+                ids |= por_valor.get(c, set())
+            return ids
+
+    def grupos(self, campo: str) -> Optional[List[Tuple[Any, Set[str]]]]:
+        """Pares (valor, ids) de un campo indexado, o None si no está indexado."""
+        if campo not in self.campos:
+            return None
+        with self._lock:
+            self._refresh()
+            return [(json.loads(c), set(ids)) for c, ids in self._valores.get(campo, {}).items()]
+
+    def valores(self, campo: str) -> Dict[Any, int]:
+        """Conteo de documentos por valor de un campo indexado."""
+        with self._lock:
+            self._refresh()
+            return {json.loads(c): len(ids) for c, ids in self._valores.get(campo, {}).items()}
+
+    # ── Mantenimiento ───────────────────────────
+
+    def update(self, doc_id: str, data: dict):
+        self._registrar(doc_id, self._entrada(data))
+
+    def remove(self, doc_id: str):
+        self._registrar(doc_id, None)
+
+    def rebuild(self) -> int:
+        """Releer todas las notas de la colección. Retorna documentos indexados."""
+        return self._reconstruir()
+
+    def _reconstruir(self) -> int:
+        if not self.path.exists():
+            # Colección sin notas: no se crea la carpeta solo para el índice
+            with self._lock:
+                self._vaciar()
+                return 0
+        total = super()._reconstruir()
+        logger.info(f"Índice reconstruido: {self.path.name} ({total} documentos)")
+        return total
+
+    # ── Estado en memoria ───────────────────────
+
+    def _entrada(self, data: dict) -> Optional[Dict[str, str]]:
+        entrada = {}
+        for campo in self.campos:
+            if campo in data:
+                clave = _clave(data[campo])
+                if clave is not None:
+                    entrada[campo] = clave
+        return entrada or None
+
+    def _aplicar(self, doc_id: str, entrada: Optional[Dict[str, str]]):
+        for campo, clave in self._docs.pop(doc_id, {}).items():
+            ids = self._valores.get(campo, {}).get(clave)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self._valores[campo][clave]
+        if entrada:
+            self._docs[doc_id] = entrada
+            for campo, clave in entrada.items():
+                self._valores.setdefault(campo, {}).setdefault(clave, set()).add(doc_id)
+
+    def _vaciar(self):
+        super()._vaciar()
+        self._valores = {}
+
+    # ── Registro ────────────────────────────────
+
+    def _cabecera(self) -> dict:
+        return {"version": 1, "campos": list(self.campos)}
+
+    def _comprobar_cabecera(self, registro: dict):
+        if tuple(registro.get("campos", ())) != self.campos:
+            raise ValueError("campos distintos")
+
+    def _cargar(self):
+        for f in self._notas():
+            data = self._leer(f)
+            if data is not None:
+                self._aplicar(f.stem, self._entrada(data))
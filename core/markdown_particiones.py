@@ -0,0 +1,225 @@
+"""
+MarkdownParticiones - Colecciones repartidas en subcarpetas
+Una colección con muchas notas (viajes gana cientos al día) puede guardarse
+en subcarpetas en lugar de una carpeta plana. La subcarpeta de cada nota se
+deduce de su id, así que localizar un documento no requiere buscarlo:
+
+    fecha   viajes/2026/03/ida_2026-03-10_....md   (la fecha del id; sin_fecha/ si no tiene)
+    hash    estudiantes/3f/172934.md               (crc32 del id, 256 carpetas)
+
+Con el esquema por fecha, las consultas que filtran por el campo de fecha
+solo recorren las carpetas de los meses que pueden cumplir el filtro. Esa
+poda es válida mientras el campo de cada nota caiga en el mes de su id (así
+los crean los gestores); si una escritura lo rompe, la poda se desactiva en
+el archivo de la colección hasta la próxima migración.
+
+El particionado es opcional y se activa por colección con
+scripts/particionar.py, que mueve las notas y escribe _particiones.json.
+
+Estructura en disco:
+    datos/
+        viajes/
+            _particiones.json     {"esquema": "fecha", "campo": "fecha", "poda": true}
+            2026/03/ida_2026-03-10_100000_car0.md
+            sin_fecha/viaje_especial.md
+"""
+
+import json
+import logging
+import os
+import re
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_PARTICIONES = "_particiones.json"
+
+ESQUEMAS = ("plano", "fecha", "hash")
+
+CARPETA_SIN_FECHA = "sin_fecha"
+
+# Primera fecha del id: 2026-03-10 o 20260310
+_FECHA_EN_ID = re.compile(r"(?<!\d)(\d{4})-?(0[1-9]|1[0-2])-?(?:0[1-9]|[12]\d|3[01])(?!\d)")
+_ANIO = re.compile(r"\d{4}")
+_MES = re.compile(r"0[1-9]|1[0-2]")
+_HASH = re.compile(r"[0-9a-f]{2}")
+
+_RANGOS = ("<", "<=", ">", ">=")
+
+
+class Particionado:
+    """Esquema de carpetas de una colección, tal como lo describe _particiones.json."""
+
+    def __init__(self, esquema: str = "plano", campo: Optional[str] = None, poda: bool = True):
+        if esquema not in ESQUEMAS:
+            raise ValueError(f"Esquema de particionado no soportado: {esquema}")
+        if esquema == "fecha" and not campo:
+            raise ValueError("El esquema por fecha necesita el campo de fecha")
+        self.esquema = esquema
+        self.campo = campo if esquema == "fecha" else None
+        self.poda = poda
+
+    @property
+    def particionado(self) -> bool:
+        return self.esquema != "plano"
+
+    # ── Ubicación de las notas ──────────────────
+
+    def carpeta(self, doc_id: str) -> str:
+        """Subcarpeta relativa de la nota `doc_id` ('' en una colección plana)."""
+        if self.esquema == "fecha":
+            m = _FECHA_EN_ID.search(doc_id)
+            return f"{m.group(1)}/{m.group(2)}" if m else CARPETA_SIN_FECHA
+        if self.esquema == "hash":
+            return f"{zlib.crc32(doc_id.encode('utf-8')) & 0xFF:02x}"
+        return ""
+
+    def es_carpeta(self, relativa: Tuple[str, ...]) -> bool:
+        """Si la ruta relativa (por partes) es una subcarpeta de este esquema."""
+        if self.esquema == "fecha":
+            return relativa == (CARPETA_SIN_FECHA,) or (
+                len(relativa) == 2 and bool(_ANIO.fullmatch(relativa[0])) and bool(_MES.fullmatch(relativa[1]))
+            )
+        if self.esquema == "hash":
+            return len(relativa) == 1 and bool(_HASH.fullmatch(relativa[0]))
+        return relativa == ()
+
+    def carpetas(self, raiz: Path) -> List[Path]:
+        """Subcarpetas existentes, en orden (la raíz en una colección plana)."""
+        if self.esquema == "fecha":
+            carpetas = [raiz / f"{anio}/{mes}" for anio, mes in self._meses(raiz)]
+            sin_fecha = raiz / CARPETA_SIN_FECHA
+            return carpetas + ([sin_fecha] if sin_fecha.is_dir() else [])
+        if self.esquema == "hash":
+            return [raiz / nombre for nombre in _subcarpetas(raiz) if _HASH.fullmatch(nombre)]
+        return [raiz]
+
+    # ── Poda por el campo de fecha ──────────────
+
+    def podar(self, raiz: Path, filtros: Iterable[Tuple[str, str, Any]]) -> Optional[List[Path]]:
+        """
+        Carpetas que pueden contener notas que cumplan los filtros (campo,
+        operador, valor), o None si ningún filtro sobre el campo las acota.
+        """
+        if self.esquema != "fecha" or not self.poda:
+            return None
+        condiciones: List[Callable[[str], bool]] = []
+        for campo, op, valor in filtros:
+            if campo != self.campo:
+                continue
+            if op in ("==", "in"):
+                valores = [valor] if op == "==" else list(valor)
+                if not all(isinstance(v, str) for v in valores):
+                    return None
+                meses = {v[:7] for v in valores}
+                condiciones.append(meses.__contains__)
+            elif op in _RANGOS and isinstance(valor, str):
+                # Una fecha del mes m es mayor/menor que valor si m lo es a su prefijo
+                limite = valor[:7]
+                if op in (">", ">="):
+                    condiciones.append(lambda mes, limite=limite: mes >= limite)
+                else:
+                    condiciones.append(lambda mes, limite=limite: mes <= limite)
+        if not condiciones:
+            return None
+        carpetas = [
+            raiz / f"{anio}/{mes}" for anio, mes in self._meses(raiz)
+            if all(cumple(f"{anio}-{mes}") for cumple in condiciones)
+        ]
+        sin_fecha = raiz / CARPETA_SIN_FECHA
+        return carpetas + ([sin_fecha] if sin_fecha.is_dir() else [])
+
+    def coherente(self, doc_id: str, data: Optional[dict]) -> bool:
+        """Si la nota respeta la condición de la poda: su fecha de texto cae en el mes de su id."""
+        if self.esquema != "fecha" or not data:
+            return True
+        carpeta = self.carpeta(doc_id)
+        valor = data.get(self.campo)
+        if carpeta == CARPETA_SIN_FECHA or not isinstance(valor, str):
+            return True
+        return valor[:7] == carpeta.replace("/", "-")
+
+    # ── Persistencia ────────────────────────────
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"esquema": self.esquema}
+        if self.esquema == "fecha":
+            data.update(campo=self.campo, poda=self.poda)
+        return data
+
+    @classmethod
+    def leer(cls, raiz: Path) -> "Particionado":
+        """Esquema de la colección en `raiz` (plano si no hay _particiones.json)."""
+        try:
+            data = json.loads((raiz / ARCHIVO_PARTICIONES).read_text(encoding="utf-8"))
+            return cls(data["esquema"], data.get("campo"), data.get("poda", True))
+        except FileNotFoundError:
+            return PLANO
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"{raiz / ARCHIVO_PARTICIONES} inválido ({e}) — se trata como plana")
+            return PLANO
+
+    def guardar(self, raiz: Path):
+        """Escribir _particiones.json de forma atómica (o borrarlo si es plana)."""
+        archivo = raiz / ARCHIVO_PARTICIONES
+        if not self.particionado:
+            archivo.unlink(missing_ok=True)
+            return
+        tmp = archivo.with_name(f"{ARCHIVO_PARTICIONES}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self.to_dict(), ensure_ascii=False) + "\n", encoding="utf-8")
+        os.replace(tmp, archivo)
+
+    def _meses(self, raiz: Path) -> List[Tuple[str, str]]:
+        return [
+            (anio, mes)
+            for anio in _subcarpetas(raiz) if _ANIO.fullmatch(anio)
+            for mes in _subcarpetas(raiz / anio) if _MES.fullmatch(mes)
+        ]
+
+
+PLANO = Particionado()
+
+
+def _subcarpetas(carpeta: Path) -> List[str]:
+    try:
+        return sorted(e.name for e in os.scandir(carpeta) if e.is_dir())
+    except FileNotFoundError:
+        return []
+
+
+def reorganizar(raiz: Path, nuevo: Particionado) -> Dict[str, Any]:
+    """
+    Mover las notas de la colección en `raiz` (y la carpeta _<id> de sus
+    subcolecciones) a las subcarpetas de `nuevo` y escribir _particiones.json.
+    Es idempotente: si se interrumpe, volver a ejecutarla completa el trabajo.
+    """
+    anterior = Particionado.leer(raiz)
+    origenes = {raiz}
+    for esquema in (anterior, nuevo):
+        origenes.update(esquema.carpetas(raiz))
+    movidas = total = 0
+    for carpeta in sorted(origenes):
+        for nombre in sorted(os.listdir(carpeta)):
+            if not nombre.endswith(".md") or nombre.startswith(("_", ".")):
+                continue
+            doc_id = nombre[:-3]
+            destino = raiz / nuevo.carpeta(doc_id)
+            total += 1
+            if destino == carpeta:
+                continue
+            destino.mkdir(parents=True, exist_ok=True)
+            os.replace(carpeta / nombre, destino / nombre)
+            subcolecciones = carpeta / f"_{doc_id}"
+            if subcolecciones.is_dir():
+                os.replace(subcolecciones, destino / subcolecciones.name)
+            movidas += 1
+    # Las subcarpetas del esquema anterior que quedaron vacías se eliminan
+    for carpeta in sorted(origenes - {raiz}, reverse=True):
+        for vacia in (carpeta, carpeta.parent):
+            if vacia != raiz and vacia.is_dir() and not any(vacia.iterdir()):
+                vacia.rmdir()
+    nuevo.guardar(raiz)
+    logger.info(f"Colección {raiz.name} particionada ({nuevo.esquema}): {movidas} de {total} notas movidas")
+    return {"notas": total, "movidas": movidas, "esquema": nuevo.esquema}
@@ -0,0 +1,150 @@
+"""
+MarkdownSnapshot - Instantánea binaria del frontmatter parseado de una colección
+Cada colección guarda en _instantanea.pickle el frontmatter ya parseado de sus
+notas junto con la versión (inodo, mtime, tamaño) del archivo del que salió.
+
+Al arrancar, la primera lectura de una nota cuya versión coincide se resuelve
+deserializando su entrada (decenas de µs) en lugar de volver a parsear el YAML
+(más de un ms en un estudiante con horario); solo las notas editadas desde la
+última instantánea se parsean de nuevo. La instantánea se actualiza en memoria
+con cada lectura y escritura y se vuelve a guardar, si cambió, al salir.
+
+Las lecturas con select() guardan solo las claves parseadas; esa entrada sirve
+a lecturas posteriores que pidan un subconjunto de ellas.
+
+Estructura en disco:
+    datos/
+        estudiantes/
+            _instantanea.pickle    {"version": 2, "docs": {id: (versión, claves, pickle del dict)}}
+"""
+
+import io
+import logging
+import os
+import pickle
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_INSTANTANEA = "_instantanea.pickle"
+
+_VERSION = 2
+
+# El frontmatter YAML solo produce tipos básicos y fechas
+_CLASES_PERMITIDAS = {("datetime", "datetime"), ("datetime", "date"), ("datetime", "timezone"),
+                      ("datetime", "timedelta")}
+
+
+class _Deserializador(pickle.Unpickler):
+    """Unpickler que rechaza cualquier clase fuera de _CLASES_PERMITIDAS."""
+
+    def find_class(self, module, name):
+        if (module, name) in _CLASES_PERMITIDAS:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"Clase no permitida en la instantánea: {module}.{name}")
+
+
+def _cargar(blob: bytes):
+    return _Deserializador(io.BytesIO(blob)).load()
+
+
+def _cubre(guardados: Optional[frozenset], pedidos: Optional[frozenset]) -> bool:
+    """Si una entrada con las claves `guardados` sirve para leer `pedidos`."""
+    return guardados is None or (pedidos is not None and pedidos <= guardados)
+
+
+class CollectionSnapshot:
+    """
+    Frontmatter serializado de una colección, por id de documento.
+
+    Cada entrada solo se entrega si la versión del archivo coincide con la
+    que tenía al guardarse y contiene las claves pedidas (None = todas); si
+    no, el archivo debe parsearse de nuevo.
+    """
+
+    def __init__(self, path: Path, ids: Optional[Callable[[], Iterable[str]]] = None):
+        self.path = path
+        # Ids de las notas vivas (por defecto, los .md de la carpeta)
+        self._ids = ids or (lambda: (e.name[:-3] for e in os.scandir(self.path) if e.name.endswith(".md")))
+        self._file = path / ARCHIVO_INSTANTANEA
+        self._docs: Dict[str, Tuple[Tuple[int, int, int], Optional[frozenset], bytes]] = {}
+        self._cargada = False
+        self._cambios = 0
+        self._lock = threading.Lock()
+
+    def get(self, doc_id: str, stamp: Tuple[int, int, int],
+            campos: Optional[frozenset] = None) -> Optional[Tuple[dict, bool]]:
+        """(frontmatter, si está completo) o None si no hay entrada válida."""
+        with self._lock:
+            self._cargar()
+            entry = self._docs.get(doc_id)
+        if entry is None or entry[0] != stamp or not _cubre(entry[1], campos):
+            return None
+        try:
+            return _cargar(entry[2]), entry[1] is None
+        except Exception as e:
+            logger.warning(f"Entrada {doc_id} de la instantánea de {self.path.name} ilegible: {e}")
+            self.discard(doc_id)
+            return None
+
+    def put(self, doc_id: str, stamp: Tuple[int, int, int], data: dict,
+            campos: Optional[frozenset] = None):
+        with self._lock:
+            self._cargar()
+            previo = self._docs.get(doc_id)
+        if previo is not None and previo[0] == stamp:
+            if _cubre(previo[1], campos):
+                return
+            if campos is not None:
+                # Dos lecturas parciales de la misma versión se acumulan
+                data = {**_cargar(previo[2]), **data}
+                campos = previo[1] | campos
+        blob = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._docs[doc_id] = (stamp, campos, blob)
+            self._cambios += 1
+
+    def discard(self, doc_id: str):
+        with self._lock:
+            if self._docs.pop(doc_id, None) is not None:
+                self._cambios += 1
+
+    def guardar(self) -> bool:
+        """Escribir la instantánea si cambió desde que se cargó. Retorna True si se escribió."""
+        with self._lock:
+            if not self._cambios or not self.path.exists():
+                return False
+            # Las notas borradas fuera de la API no se arrastran a la próxima sesión
+            vivos = set(self._ids())
+            self._docs = {doc_id: e for doc_id, e in self._docs.items() if doc_id in vivos}
+            contenido = pickle.dumps({"version": _VERSION, "docs": self._docs},
+                                     protocol=pickle.HIGHEST_PROTOCOL)
+            tmp = self._file.with_name(f"{ARCHIVO_INSTANTANEA}.{os.getpid()}.tmp")
+            tmp.write_bytes(contenido)
+            os.replace(tmp, self._file)
+            self._cambios = 0
+            logger.info(f"Instantánea guardada: {self.path.name} ({len(self._docs)} documentos)")
+            return True
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._cargar()
+            return len(self._docs)
+
+    def _cargar(self):
+        """Leer el archivo la primera vez que se usa (con el lock tomado)."""
+        if self._cargada:
+            return
+        self._cargada = True
+        try:
+            contenido = _cargar(self._file.read_bytes())
+            if contenido.get("version") != _VERSION:
+                raise ValueError(f"versión {contenido.get('version')}")
+            # Lo escrito en esta sesión antes de cargar tiene prioridad
+            self._docs = {**contenido["docs"], **self._docs}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Instantánea {self._file} inválida ({e}) — se regenerará")
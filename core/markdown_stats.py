@@ -0,0 +1,213 @@
+"""
+MarkdownStats - Estadísticas materializadas para la base Markdown
+Cada colección configurada guarda junto a sus notas un documento _stats.md
+con el total de documentos y los desgloses más consultados, de modo que
+leerlas cuesta abrir un solo archivo.
+
+Las escrituras aplican solo la diferencia entre la nota anterior y la nueva.
+Un verificador en segundo plano recalcula periódicamente el documento desde
+las notas y corrige cualquier desviación (ediciones a mano en Obsidian,
+escrituras concurrentes sobre la misma nota...).
+
+Estructura en disco:
+    datos/
+        carros/
+            _stats.md      total: 42
+                           por_valor: {estado: {disponible: 30, en_uso: 12}}
+                           no_vacios: {}
+"""
+
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, ContextManager, Dict, Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DOC_ESTADISTICAS = "_stats"
+
+_ESCALARES = (str, int, float, bool)
+
+# Intentos de reconciliar cuando otras escrituras cambian el documento a la vez
+_INTENTOS_RECONCILIACION = 3
+
+
+def _vacio() -> dict:
+    return {"total": 0, "por_valor": {}, "no_vacios": {}}
+
+
+class CollectionStats:
+    """
+    Contadores de una colección: total, documentos por valor de los campos
+    `por_valor` y documentos con los campos `no_vacios` no vacíos.
+
+    `leer(path, campos)` carga el frontmatter (solo esas claves si puede),
+    `escribir(path, data)` guarda una nota de forma atómica, `bloquear()`
+    excluye a otros procesos mientras se modifica el documento y `notas()`
+    entrega las notas de la colección.
+    """
+
+    def __init__(self, path: Path, por_valor: Tuple[str, ...], no_vacios: Tuple[str, ...],
+                 leer: Callable[[Path, Optional[frozenset]], Optional[dict]],
+                 escribir: Callable[[Path, dict], None],
+                 bloquear: Callable[[], ContextManager],
+                 notas: Optional[Callable[[], Iterable[Path]]] = None):
+        self.path = path
+        self.por_valor = tuple(por_valor)
+        self.no_vacios = tuple(no_vacios)
+        self.campos = frozenset(self.por_valor + self.no_vacios)
+        self._leer = leer
+        self._escribir = escribir
+        self._bloquear = bloquear
+        self._notas = notas or (
+            lambda: (f for f in sorted(self.path.glob("*.md")) if not f.name.startswith(("_", ".")))
+        )
+        self._file = path / f"{DOC_ESTADISTICAS}.md"
+        self._lock = threading.Lock()
+
+    # ── Consultas ───────────────────────────────
+
+    def leer(self) -> dict:
+        """Contadores actuales; si el documento no existe se calcula."""
+        data = self._leer(self._file, None)
+        if data is None:
+            self.reconciliar()
+            data = self._leer(self._file, None) or _vacio()
+        return data
+
+    # ── Mantenimiento ───────────────────────────
+
+    def aporte(self, data: Optional[dict]) -> Iterator[tuple]:
+        """Contadores que incrementa un documento (nada si no existe)."""
+        if data is None:
+            return
+        yield ("total",)
+        for campo in self.por_valor:
+            valor = data.get(campo)
+            if campo in data and (valor is None or isinstance(valor, _ESCALARES)):
+                yield ("por_valor", campo, valor)
+        for campo in self.no_vacios:
+            if data.get(campo):
+                yield ("no_vacios", campo)
+
+    def registrar(self, cambios: Iterable[Tuple[Optional[dict], Optional[dict]]]):
+        """Aplicar pares (antes, después) de notas escritas o borradas."""
+        delta: Dict[tuple, int] = {}
+        for antes, despues in cambios:
+            for clave in self.aporte(antes):
+                delta[clave] = delta.get(clave, 0) - 1
+            for clave in self.aporte(despues):
+                delta[clave] = delta.get(clave, 0) + 1
+        delta = {clave: n for clave, n in delta.items() if n}
+        if not delta:
+            return
+        with self._lock, self._bloquear():
+            actual = self._leer(self._file, None)
+            if actual is None:
+                # Sin documento previo se calcula entero (ya incluye este cambio)
+                self._escribir(self._file, self._documento(self.calcular()))
+                return
+            contadores = _copiar(actual)
+            for clave, n in delta.items():
+                _sumar(contadores, clave, n)
+            contadores["actualizado"] = datetime.now().isoformat()
+            self._escribir(self._file, contadores)
+
+    def calcular(self) -> dict:
+        """Recorrer todas las notas de la colección y contar desde cero."""
+        contadores = _vacio()
+        if self.path.exists():
+            for f in self._notas():
+                for clave in self.aporte(self._leer(f, self.campos)):
+                    _sumar(contadores, clave, 1)
+        return contadores
+
+    def reconciliar(self) -> bool:
+        """
+        Recalcular desde las notas y corregir el documento. Si otra escritura
+        lo modifica mientras se cuenta, se vuelve a intentar. Retorna True si
+        había diferencias.
+        """
+        for _ in range(_INTENTOS_RECONCILIACION):
+            previo = self._firma()
+            contadores = self.calcular()
+            with self._lock, self._bloquear():
+                if self._firma() != previo:
+                    continue
+                actual = self._leer(self._file, None)
+                if actual is not None and _contadores(actual) == contadores:
+                    return False
+                if actual is not None:
+                    logger.warning(f"Estadísticas de {self.path.name} desviadas — corregidas")
+                self._escribir(self._file, self._documento(contadores))
+                return True
+        logger.warning(f"Estadísticas de {self.path.name}: demasiadas escrituras concurrentes, "
+                       f"se reconciliarán en la próxima pasada")
+        return False
+
+    # ── Internos ────────────────────────────────
+
+    def _documento(self, contadores: dict) -> dict:
+        ahora = datetime.now().isoformat()
+        return {**contadores, "actualizado": ahora, "reconciliado": ahora}
+
+    def _firma(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = self._file.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+
+def _contadores(data: dict) -> dict:
+    return {clave: data.get(clave, {} if clave != "total" else 0) for clave in _vacio()}
+
+
+def _copiar(data: dict) -> dict:
+    copia = dict(data)
+    for clave in ("por_valor", "no_vacios"):
+        copia[clave] = {
+            campo: dict(valor) if isinstance(valor, dict) else valor
+            for campo, valor in (data.get(clave) or {}).items()
+        }
+    copia.setdefault("total", 0)
+    return copia
+
+
+def _sumar(contadores: dict, clave: tuple, n: int):
+    """Sumar `n` al contador `clave`; los que quedan en cero se eliminan."""
+    if clave[0] == "total":
+        contadores["total"] = contadores.get("total", 0) + n
+        return
+    if clave[0] == "no_vacios":
+        grupo, sub = contadores.setdefault("no_vacios", {}), clave[1]
+    else:
+        grupo, sub = contadores.setdefault("por_valor", {}).setdefault(clave[1], {}), clave[2]
+    grupo[sub] = grupo.get(sub, 0) + n
+    if not grupo[sub]:
+        del grupo[sub]
+    if clave[0] == "por_valor" and not grupo:
+        del contadores["por_valor"][clave[1]]
+
+
+class VerificadorEstadisticas(threading.Thread):
+    """Hilo que reconcilia periódicamente las estadísticas con las notas."""
+
+    def __init__(self, colecciones: Callable[[], Iterable[CollectionStats]], intervalo: float):
+        super().__init__(name="verificador-estadisticas", daemon=True)
+        self._colecciones = colecciones
+        self.intervalo = intervalo
+        self._detener = threading.Event()
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            for stats in self._colecciones():
+                try:
+                    stats.reconciliar()
+                except Exception as e:
+                    logger.error(f"Error reconciliando estadísticas de {stats.path.name}: {e}")
+
+    def detener(self):
+        self._detener.set()
+
@@ -8,6 +8,8 @@ from typing import Dict, List, Optional, Any
 from enum import Enum
 import logging
 
+from utils.constants import BLOQUES_A_HORAS
+
 logger = logging.getLogger(__name__)
 
 class EstadoCarro(Enum):
@@ -361,6 +363,129 @@ class ListaViajes:
             }
         }
 
+class GrupoCompatible:
+    """
+    Estudiantes que entran (ida) o salen (vuelta) el mismo día en el mismo
+    bloque o, con tolerancia, entre `bloque` y `bloque_hasta`
+    """
+    
+    def __init__(self,
+                 sentido: str,
+                 dia: str,
+                 bloque: str,
+                 matriculas: List[str],
+                 nombres: List[str],
+                 bloque_hasta: Optional[str] = None):
+        
+        self.sentido = sentido
+        self.dia = dia
+        self.bloque = bloque
+        self.bloque_hasta = bloque_hasta if bloque_hasta != bloque else None
+        self.matriculas = matriculas
+        self.nombres = nombres
+    
+    @property
+    def clave(self) -> str:
+        """Clave 'dia_bloque' (o 'dia_bloque-bloque') de los informes"""
+        if self.bloque_hasta:
+            return f"{self.dia}_{self.bloque}-{self.bloque_hasta}"
+        return f"{self.dia}_{self.bloque}"
+    
+    @property
+    def hora(self) -> str:
+        """Horario del bloque, o desde el inicio del primero hasta el fin del último"""
+        if self.bloque_hasta:
+            inicio = BLOQUES_A_HORAS.get(self.bloque, self.bloque).split(' - ')[0]
+            fin = BLOQUES_A_HORAS.get(self.bloque_hasta, self.bloque_hasta).split(' - ')[-1]
+            return f"{inicio} - {fin}"
+        return BLOQUES_A_HORAS.get(self.bloque, self.bloque)
+    
+    @property
+    def tamano(self) -> int:
+        return len(self.matriculas)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'sentido': self.sentido,
+            'dia': self.dia,
+            'bloque': self.bloque,
+            'bloque_hasta': self.bloque_hasta,
+            'hora': self.hora,
+            'tamano': self.tamano,
+            'matriculas': list(self.matriculas),
+            'nombres': list(self.nombres)
+        }
+
+class MatchmakingResult:
+    """
+    Grupos compatibles de ida y vuelta de todos los estudiantes, calculados
+    sobre una versión concreta de los datos (ver StudentScheduler.obtener_emparejamiento).
+    Con tolerancia, `extra_emparejados` cuenta los estudiantes con grupo que
+    no lo tendrían con coincidencia exacta.
+    """
+    
+    def __init__(self,
+                 version: Any,
+                 total_estudiantes: int,
+                 grupos_ida: List[GrupoCompatible] = None,
+                 grupos_vuelta: List[GrupoCompatible] = None,
+                 tolerancia_minutos: int = 0,
+                 tolerancia_bloques: int = 0,
+                 extra_emparejados: int = 0):
+        
+        self.version = version
+        self.total_estudiantes = total_estudiantes
+        self.grupos_ida = grupos_ida or []
+        self.grupos_vuelta = grupos_vuelta or []
+        self.tolerancia_minutos = tolerancia_minutos
+        self.tolerancia_bloques = tolerancia_bloques
+        self.extra_emparejados = extra_emparejados
+        self.fecha_calculo = datetime.now()
+    
+    @property
+    def con_tolerancia(self) -> bool:
+        return bool(self.tolerancia_minutos or self.tolerancia_bloques)
+    
+    def grupos(self, sentido: str) -> List[GrupoCompatible]:
+        """Grupos de 'ida' o de 'vuelta', ordenados por día y bloque"""
+        return self.grupos_ida if sentido == "ida" else self.grupos_vuelta
+    
+    def grupos_de(self, matricola: str) -> List[GrupoCompatible]:
+        """Grupos (de ida y de vuelta) en los que está el estudiante"""
+        return [g for g in self.grupos_ida + self.grupos_vuelta if matricola in g.matriculas]
+    
+    def matriculas_emparejadas(self) -> set:
+        """Matrículas con al menos un grupo compatible"""
+        return {m for g in self.grupos_ida + self.grupos_vuelta for m in g.matriculas}
+    
+    @property
+    def estudiantes_emparejados(self) -> int:
+        """Estudiantes con al menos un grupo compatible"""
+        return len(self.matriculas_emparejadas())
+    
+    def como_claves(self) -> Dict[str, Dict[str, List[str]]]:
+        """{sentido: {'dia_bloque': nombres}}, por la clave de texto de cada grupo"""
+        return {
+            'ida': {g.clave: g.nombres for g in self.grupos_ida},
+            'vuelta': {g.clave: g.nombres for g in self.grupos_vuelta}
+        }
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'total_estudiantes': self.total_estudiantes,
+            'estudiantes_emparejados': self.estudiantes_emparejados,
+            'tolerancia_minutos': self.tolerancia_minutos,
+            'tolerancia_bloques': self.tolerancia_bloques,
+            'extra_emparejados': self.extra_emparejados,
+            'grupos_ida': [g.to_dict() for g in self.grupos_ida],
+            'grupos_vuelta': [g.to_dict() for g in self.grupos_vuelta],
+            'fecha_calculo': self.fecha_calculo.isoformat(),
+            'estadisticas': {
+                'total_grupos_ida': len(self.grupos_ida),
+                'total_grupos_vuelta': len(self.grupos_vuelta)
+            }
+        }
+
 def validar_compatibilidad_licencia_carro(licencias: List[TipoLicencia], tipo_carro: TipoCarro) -> bool:
     """Función utilitaria para validar compatibilidad licencia-carro"""
     for licencia in licencias:
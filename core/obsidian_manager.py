@@ -14,37 +14,273 @@ Estructura en disco:
             2026-03-10.md
 """
 
+import atexit
+import functools
+import hashlib
+import heapq
+import itertools
+import json
 import logging
 import os
+import random
+import re
 import shutil
-from datetime import datetime
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime
 from pathlib import Path
-from typing import Any, Dict, Iterator, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import yaml
 
+# libyaml (extensión C) cuando PyYAML se compiló con ella; misma salida
+try:
+    from yaml import CSafeDumper as _YamlDumper, CSafeLoader as _YamlLoader
+    YAML_BACKEND = "libyaml"
+except ImportError:
+    from yaml import SafeDumper as _YamlDumper, SafeLoader as _YamlLoader
+    YAML_BACKEND = "python"
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+from config import get_config
+from utils.constants import DATOS_CAMPOS_MARCA, DATOS_ESTADISTICAS, DATOS_INDICES
+from .markdown_diario import ARCHIVO_BLOQUEO_DIARIO, ARCHIVO_DIARIO, CollectionJournal, CompactadorDiarios, Entrada
+from .indice_emparejamiento import (
+    ARCHIVO_BLOQUEO_EMPAREJAMIENTO, ARCHIVO_EMPAREJAMIENTO, CAMPOS_EMPAREJAMIENTO, COLECCION_EMPAREJAMIENTO,
+    IndiceEmparejamiento,
+)
+from .markdown_index import ARCHIVO_BLOQUEO_INDICES, CollectionIndex
+from .markdown_particiones import ARCHIVO_PARTICIONES, PLANO, Particionado, reorganizar
+from .markdown_snapshot import CollectionSnapshot
+from .markdown_stats import CollectionStats, VerificadorEstadisticas
+
 logger = logging.getLogger(__name__)
 
 # Sentinel que se resuelve a datetime.now() al escribir
 SERVER_TIMESTAMP = "__SERVER_TIMESTAMP__"
 
 
+# ──────────────────────────────────────────────
+#  Caché de documentos parseados
+# ──────────────────────────────────────────────
+
+# Un dict parseado ocupa en memoria varias veces lo que su YAML en disco;
+# el presupuesto se contabiliza con esta estimación.
+_FACTOR_MEMORIA = 6
+
+
+def _clonar(valor: Any) -> Any:
+    """Copia profunda de dicts/listas; los escalares YAML son inmutables."""
+    if isinstance(valor, dict):
+        return {k: _clonar(v) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_clonar(v) for v in valor]
+    return valor
+
+
+class DocumentCache:
+    """
+    Caché LRU de frontmatter parseado, compartida por todo el proceso.
+
+    Cada entrada se valida contra (st_ino, st_mtime_ns, st_size) del archivo,
+    de modo que una edición manual en Obsidian invalida la entrada.
+    Los datos guardados no deben mutarse: quien los entrega afuera los clona.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, int, int], dict, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str, stamp: Tuple[int, int, int]) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, stamp: Tuple[int, int, int], data: dict):
+        cost = stamp[2] * _FACTOR_MEMORIA
+        with self._lock:
+            self._discard(key)
+            if cost > self.max_bytes:
+                return
+            self._entries[key] = (stamp, data, cost)
+            self._bytes += cost
+            while self._bytes > self.max_bytes:
+                _, (_, _, old_cost) = self._entries.popitem(last=False)
+                self._bytes -= old_cost
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._entries),
+                "bytes_estimados": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+
+_document_cache = DocumentCache(get_config().DATOS_CACHE_MB * 1024 * 1024)
+
+
+# ──────────────────────────────────────────────
+#  Instantáneas binarias (datos/<coleccion>/_instantanea.pickle)
+# ──────────────────────────────────────────────
+
+# Sobreviven entre ejecuciones: al arrancar, las notas sin cambios se
+# deserializan de la instantánea en lugar de parsear su YAML.
+_instantaneas_activas = get_config().DATOS_INSTANTANEAS
+_instantaneas: Dict[str, CollectionSnapshot] = {}
+_instantaneas_lock = threading.Lock()
+
+
+def _instantanea_de(path: Path) -> Optional[CollectionSnapshot]:
+    """Instantánea de la colección de la nota `path` (None si están desactivadas)."""
+    if not _instantaneas_activas or path.stem.startswith("_"):
+        return None
+    coleccion = _coleccion_de(path)
+    key = str(coleccion)
+    with _instantaneas_lock:
+        instantanea = _instantaneas.get(key)
+        if instantanea is None:
+            instantanea = _instantaneas[key] = CollectionSnapshot(
+                coleccion, lambda: MarkdownCollection(coleccion)._ids()
+            )
+        return instantanea
+
+
+def _recordar(path: Path, stamp: Tuple[int, int, int], data: dict,
+              campos: Optional[frozenset] = None):
+    """
+    Guardar un frontmatter en la instantánea y, si es completo, en la caché.
+    Con `campos` es el resultado parcial de _parse_parcial.
+    """
+    if campos is None:
+        _document_cache.put(str(path), stamp, data)
+    instantanea = _instantanea_de(path)
+    if instantanea is not None:
+        instantanea.put(path.stem, stamp, data, campos)
+
+
+def guardar_instantaneas() -> int:
+    """Escribir las instantáneas que cambiaron. Retorna cuántas se escribieron."""
+    with _instantaneas_lock:
+        pendientes = list(_instantaneas.values())
+    escritas = 0
+    for instantanea in pendientes:
+        try:
+            escritas += instantanea.guardar()
+        except OSError as e:
+            logger.warning(f"No se pudo guardar la instantánea de {instantanea.path.name}: {e}")
+    return escritas
+
+
+atexit.register(guardar_instantaneas)
+
+
+# ──────────────────────────────────────────────
+#  Particionado (datos/<coleccion>/_particiones.json)
+# ──────────────────────────────────────────────
+
+_particionados: Dict[str, Tuple[Tuple[int, int], Particionado]] = {}
+_colecciones_de: Dict[Path, Path] = {}
+
+
+def _particionado_de(col_path: Path) -> Particionado:
+    """Esquema de carpetas de la colección; se relee cuando cambia _particiones.json."""
+    try:
+        st = os.stat(col_path / ARCHIVO_PARTICIONES)
+    except (FileNotFoundError, NotADirectoryError):
+        return PLANO
+    firma = (st.st_ino, st.st_mtime_ns)
+    previo = _particionados.get(str(col_path))
+    if previo is not None and previo[0] == firma:
+        return previo[1]
+    particionado = Particionado.leer(col_path)
+    _particionados[str(col_path)] = (firma, particionado)
+    return particionado
+
+
+def _coleccion_de(path: Path) -> Path:
+    """Carpeta de la colección de la nota `path` (la raíz si está en una subcarpeta de partición)."""
+    carpeta = path.parent
+    coleccion = _colecciones_de.get(carpeta)
+    if coleccion is None:
+        coleccion = carpeta
+        for raiz in (carpeta.parent, carpeta.parent.parent):
+            if _particionado_de(raiz).es_carpeta(carpeta.relative_to(raiz).parts):
+                coleccion = raiz
+                break
+        _colecciones_de[carpeta] = coleccion
+    return coleccion
+
+
+def _notas_de(col_path: Path) -> Iterator[Path]:
+    """Notas de documentos de la colección (sin las internas), en todas sus subcarpetas."""
+    coleccion = MarkdownCollection(col_path)
+    for doc_id in sorted(coleccion._ids()):
+        yield coleccion._ruta(doc_id)
+
+
+def _comprobar_poda(col_path: Path, doc_id: str, data: dict):
+    """Desactivar la poda por fecha si la nota escrita no cae en el mes de su id."""
+    particionado = _particionado_de(col_path)
+    if particionado.poda and not particionado.coherente(doc_id, data):
+        logger.warning(f"{col_path.name}/{doc_id}: '{particionado.campo}' fuera del mes de su id "
+                       f"— poda por fecha desactivada hasta volver a particionar")
+        Particionado(particionado.esquema, particionado.campo, poda=False).guardar(col_path)
+
+
 # ──────────────────────────────────────────────
 #  Utilidades de lectura / escritura Markdown
 # ──────────────────────────────────────────────
 
-def _resolve_timestamps(data: dict) -> dict:
-    """Reemplazar SERVER_TIMESTAMP con la fecha/hora actual."""
-    now = datetime.now().isoformat()
+def _resolve_timestamps(data: dict, now: Optional[str] = None) -> dict:
+    """Reemplazar SERVER_TIMESTAMP con la fecha/hora actual (o `now`)."""
+    if now is None:
+        now = datetime.now().isoformat()
     resolved = {}
     for k, v in data.items():
         if v is SERVER_TIMESTAMP or v == SERVER_TIMESTAMP:
             resolved[k] = now
         elif isinstance(v, dict):
-            resolved[k] = _resolve_timestamps(v)
+            resolved[k] = _resolve_timestamps(v, now)
         elif isinstance(v, list):
             resolved[k] = [
-                _resolve_timestamps(item) if isinstance(item, dict) else item
+                _resolve_timestamps(item, now) if isinstance(item, dict) else item
                 for item in v
             ]
         else:
@@ -52,36 +288,824 @@ def _resolve_timestamps(data: dict) -> dict:
     return resolved
 
 
-def _read_frontmatter(path: Path) -> Optional[dict]:
-    """Leer frontmatter YAML de un archivo .md. Retorna None si no existe."""
-    if not path.exists():
+def _stamp(st: os.stat_result) -> Tuple[int, int, int]:
+    """Versión de una nota: cada escritura la reemplaza por un inodo nuevo."""
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _version_de(path: Path) -> Optional[Tuple[int, int, int]]:
+    try:
+        return _stamp(path.stat())
+    except FileNotFoundError:
         return None
+
+
+def _version_nota(path: Path) -> Tuple[Optional[Tuple[int, int, int]], Optional[int]]:
+    """Versión para las transacciones: la del archivo y la de su entrada en el diario."""
+    diario = _diario_de(path)
+    entrada = diario.entrada(path.stem) if diario is not None else None
+    return _version_de(path), entrada.version if entrada is not None else None
+
+
+# Las notas llevan el frontmatter al inicio; se lee en bloques hasta el
+# delimitador de cierre y el cuerpo Markdown nunca se carga en un escaneo.
+_BLOQUE_LECTURA = 512
+
+
+def _read_header(path: Path) -> Tuple[str, int]:
+    """
+    Texto YAML entre los delimitadores '---' y bytes leídos del archivo.
+    Retorna texto vacío si la nota no tiene frontmatter cerrado.
+    """
+    with open(path, "rb", buffering=0) as fh:
+        buf = bytearray(fh.read(_BLOQUE_LECTURA))
+        if not buf.startswith(b"---"):
+            return "", len(buf)
+        desde = 3
+        while True:
+            end = buf.find(b"\n---", desde)
+            if end != -1:
+                return buf[3:end].decode("utf-8"), len(buf)
+            chunk = fh.read(_BLOQUE_LECTURA)
+            if not chunk:
+                return "", len(buf)
+            # El delimitador puede quedar partido entre dos bloques
+            desde = max(3, len(buf) - 3)
+            buf += chunk
+
+
+def _read_body(path: Path) -> str:
+    """Cuerpo Markdown que sigue al frontmatter (el del diario si lo tiene)."""
+    diario = _diario_de(path)
+    entrada = diario.entrada(path.stem) if diario is not None else None
+    if entrada is not None:
+        if entrada.datos is None:
+            return ""
+        if entrada.cuerpo is not None:
+            return entrada.cuerpo
+    return _cuerpo_en_disco(path)
+
+
+def _cuerpo_en_disco(path: Path) -> str:
+    """Cuerpo Markdown de la nota en disco (lectura completa del archivo)."""
+    if not path.exists():
+        return ""
     text = path.read_text(encoding="utf-8")
-    if not text.startswith("---"):
-        return {}
-    end = text.find("---", 3)
-    if end == -1:
-        return {}
-    yaml_text = text[3:end].strip()
-    if not yaml_text:
+    if text.startswith("---"):
+        end = text.find("\n---", 3)
+        if end == -1:
+            return ""
+        text = text[end + 4:]
+    return text.strip("\n")
+
+
+def _parse_frontmatter(yaml_text: str) -> dict:
+    if not yaml_text.strip():
         return {}
-    return yaml.safe_load(yaml_text) or {}
+    # El texto acaba donde empieza "\n---": se le devuelve el salto de línea
+    # para que un escalar de bloque al final conserve el suyo
+    return yaml.load(yaml_text + "\n", Loader=_YamlLoader) or {}
 
 
-def _write_md(path: Path, data: dict, body: str = ""):
-    """Escribir archivo .md con frontmatter YAML y cuerpo opcional."""
-    path.parent.mkdir(parents=True, exist_ok=True)
-    resolved = _resolve_timestamps(data)
-    frontmatter = yaml.dump(
-        resolved,
+# Clave de primer nivel tal como la escribe _dump_yaml: sin comillas, en la columna 0
+_LINEA_CLAVE = re.compile(r"([A-Za-z_][\w.\- ]*?)[ \t]*:(?:[ \t]|\r?$)")
+
+
+def _parse_parcial(yaml_text: str, campos: frozenset) -> Optional[dict]:
+    """
+    Parsear solo las claves de primer nivel en `campos`; los subárboles
+    restantes (horario, materias...) ni se construyen. Retorna None si el
+    texto tiene una forma que no se puede recortar por líneas, y entonces
+    hay que parsear el documento completo.
+    """
+    seleccion = []
+    incluir = False
+    for linea in yaml_text.splitlines(keepends=True):
+        if not linea.strip() or linea[0] in " \t#" or linea.startswith("- ") or linea.rstrip() == "-":
+            # Continuación del valor de la clave anterior
+            if incluir:
+                seleccion.append(linea)
+            continue
+        m = _LINEA_CLAVE.match(linea)
+        if m is None:
+            return None
+        incluir = m.group(1) in campos
+        if incluir:
+            seleccion.append(linea)
+    try:
+        return _parse_frontmatter("".join(seleccion))
+    except yaml.YAMLError:
+        # p. ej. un alias cuyo ancla quedó en una clave descartada
+        return None
+
+
+def _preleer(path: Path, literales: Tuple[str, ...] = (), campos: Optional[frozenset] = None):
+    """
+    Primera mitad de _load_frontmatter: (dict, None, None) si está en caché
+    o en la instantánea (con al menos `campos`), (None, yaml, versión) si hay
+    que parsearlo y (None, None, None) si no existe o no contiene alguno de
+    `literales`.
+    """
+    diario = _diario_de(path)
+    entrada = diario.entrada(path.stem) if diario is not None else None
+    if entrada is not None:
+        return entrada.datos, None, None
+    key = str(path)
+    try:
+        stamp = _stamp(path.stat())
+    except FileNotFoundError:
+        _document_cache.invalidate(key)
+        return None, None, None
+    data = _document_cache.get(key, stamp)
+    if data is not None:
+        return data, None, None
+    instantanea = _instantanea_de(path)
+    encontrado = instantanea.get(path.stem, stamp, campos) if instantanea is not None else None
+    if encontrado is not None:
+        data, completo = encontrado
+        # La caché solo guarda notas completas
+        if completo:
+            _document_cache.put(key, stamp, data)
+        return data, None, None
+    text, _ = _read_header(path)
+    if any(lit not in text for lit in literales):
+        return None, None, None
+    return None, text, stamp
+
+
+def _load_frontmatter(path: Path, literales: Tuple[str, ...] = (),
+                      campos: Optional[frozenset] = None) -> Optional[dict]:
+    """
+    Frontmatter parseado pasando por la caché. Retorna None si no existe,
+    o si el texto no contiene alguno de `literales` (se omite el YAML).
+    El dict devuelto es compartido: no mutarlo.
+
+    Con `campos` (claves de primer nivel) y sin entrada en caché se parsean
+    solo esas claves; ese resultado parcial no se guarda en la caché, solo
+    en la instantánea.
+    """
+    data, text, stamp = _preleer(path, literales, campos)
+    if text is None:
+        return data
+    if campos is not None:
+        parcial = _parse_parcial(text, campos)
+        if parcial is not None:
+            _recordar(path, stamp, parcial, campos)
+            return parcial
+    data = _parse_frontmatter(text)
+    _recordar(path, stamp, data)
+    return data
+
+
+def _read_frontmatter(path: Path) -> Optional[dict]:
+    """Leer frontmatter YAML de un archivo .md. Retorna None si no existe."""
+    data = _load_frontmatter(path)
+    return _clonar(data) if data is not None else None
+
+
+def _remove_md(path: Path, apartado: Optional[Path] = None, antes: Optional[dict] = None) -> bool:
+    """
+    Eliminar un archivo .md, su entrada en caché, en los índices y en las
+    estadísticas. Si ya se apartó (WriteBatch), se elimina `apartado`, y
+    `antes` es el frontmatter que tenía.
+    """
+    diario = _diario_de(path)
+    if diario is not None:
+        if _load_frontmatter(path) is None:
+            return False
+        _anotar(diario, [(path, None, None)], _fsync_policy == "always")
+        return True
+    estadisticas = _estadisticas_de(path)
+    if apartado is None:
+        antes = _load_frontmatter(path, campos=estadisticas.campos) if estadisticas is not None else None
+    _document_cache.invalidate(str(path))
+    _huellas.pop(str(path), None)
+    instantanea = _instantanea_de(path)
+    if instantanea is not None:
+        instantanea.discard(path.stem)
+    indice = _indice_de(_coleccion_de(path))
+    if indice is not None and not _es_interno(path):
+        indice.remove(path.stem)
+    archivo = apartado or path
+    if archivo.exists():
+        archivo.unlink()
+        if antes is not None:
+            estadisticas.registrar([(antes, None)])
+        emparejamiento = _emparejamiento_de(_coleccion_de(path)) if not _es_interno(path) else None
+        if emparejamiento is not None:
+            emparejamiento.eliminar(path.stem)
+        return True
+    return False
+
+
+# ──────────────────────────────────────────────
+#  Lectura paralela (opcional, DATOS_LECTORES > 1)
+# ──────────────────────────────────────────────
+
+# En discos lentos o de red la latencia de cada archivo domina el escaneo;
+# con varios lectores se solapan las lecturas. El YAML puede además parsearse
+# en procesos para no competir por el GIL.
+_lectura = {"hilos": 1, "lote": 64, "procesos": False}
+_pools: Dict[str, Any] = {}
+_pools_lock = threading.Lock()
+
+
+def configurar_lectura(hilos: Optional[int] = None, lote: Optional[int] = None,
+                       procesos: Optional[bool] = None):
+    """Cambiar hilos de lectura, tamaño de lote y uso de procesos para el YAML."""
+    with _pools_lock:
+        if hilos is not None:
+            _lectura["hilos"] = max(1, hilos)
+        if lote is not None:
+            _lectura["lote"] = max(1, lote)
+        if procesos is not None:
+            _lectura["procesos"] = procesos
+        for pool in _pools.values():
+            pool.shutdown(wait=False)
+        _pools.clear()
+
+
+configurar_lectura(get_config().DATOS_LECTORES, get_config().DATOS_LOTE_LECTURA,
+                   get_config().DATOS_YAML_PROCESOS)
+
+
+def _pool(tipo: str):
+    with _pools_lock:
+        pool = _pools.get(tipo)
+        if pool is None:
+            if tipo == "hilos":
+                pool = ThreadPoolExecutor(_lectura["hilos"], thread_name_prefix="pug-lectura")
+            else:
+                pool = ProcessPoolExecutor(_lectura["hilos"])
+            _pools[tipo] = pool
+        return pool
+
+
+def _parsear_en_procesos(lote: List[Path], previos: list) -> List[Optional[dict]]:
+    """Completar las lecturas de _preleer parseando el YAML en el pool de procesos."""
+    resultado = [data for data, _, _ in previos]
+    pendientes = [i for i, (_, text, _) in enumerate(previos) if text is not None]
+    if pendientes:
+        chunksize = max(1, len(pendientes) // (_lectura["hilos"] * 4))
+        parseados = _pool("procesos").map(
+            _parse_frontmatter, [previos[i][1] for i in pendientes], chunksize=chunksize
+        )
+        for i, data in zip(pendientes, parseados):
+            _recordar(lote[i], previos[i][2], data)
+            resultado[i] = data
+    return resultado
+
+
+def _cargar_frontmatters(paths: Iterable[Path], literales: Tuple[str, ...] = (),
+                         campos: Optional[frozenset] = None) -> Iterator[Tuple[Path, Optional[dict]]]:
+    """
+    Pares (ruta, frontmatter compartido) en el orden de `paths`. Con más de un
+    lector se leen lotes en paralelo, con el siguiente lote ya en curso
+    mientras se entrega el actual. `campos` como en _load_frontmatter (el
+    parseo en procesos siempre es completo).
+    """
+    if _lectura["hilos"] <= 1:
+        for path in paths:
+            yield path, _load_frontmatter(path, literales, campos)
+        return
+    paths = iter(paths)
+    procesos = _lectura["procesos"]
+    anterior = None
+    while True:
+        lote = list(itertools.islice(paths, _lectura["lote"]))
+        if not lote:
+            pendiente = None
+        elif procesos:
+            pendiente = (lote, [_pool("hilos").submit(_preleer, p, literales) for p in lote])
+        else:
+            pendiente = (lote, [_pool("hilos").submit(_load_frontmatter, p, literales, campos) for p in lote])
+        if anterior is not None:
+            lote_prev, futuros = anterior
+            resultados = [f.result() for f in futuros]
+            if procesos:
+                resultados = _parsear_en_procesos(lote_prev, resultados)
+            yield from zip(lote_prev, resultados)
+        if pendiente is None:
+            return
+        anterior = pendiente
+
+
+# ──────────────────────────────────────────────
+#  Índices secundarios (datos/<coleccion>/_indices.jsonl)
+# ──────────────────────────────────────────────
+
+_indices: Dict[str, CollectionIndex] = {}
+_indices_lock = threading.Lock()
+
+
+def _indice_de(col_path: Path) -> Optional[CollectionIndex]:
+    """Índice de la colección en `col_path`, si tiene campos indexados."""
+    campos = DATOS_INDICES.get(col_path.name)
+    if not campos:
+        return None
+    key = str(col_path)
+    with _indices_lock:
+        indice = _indices.get(key)
+        if indice is None:
+            indice = _indices[key] = CollectionIndex(
+                col_path, campos, _load_frontmatter,
+                lambda: _notas_de(col_path),
+                lambda: _bloquear_carpetas([col_path], ARCHIVO_BLOQUEO_INDICES),
+            )
+        return indice
+
+
+# ── Índice de emparejamiento (datos/_emparejamiento.jsonl) ──
+
+# Uno por archivo: lo comparten todas las bases y gestores del proceso
+_emparejamientos: Dict[str, IndiceEmparejamiento] = {}
+_emparejamientos_lock = threading.Lock()
+
+
+def _emparejamiento(archivo: Path, estudiantes: "MarkdownCollection") -> IndiceEmparejamiento:
+    """Índice de emparejamiento en `archivo` de la colección `estudiantes` (Markdown o SQLite)."""
+    key = str(archivo)
+    with _emparejamientos_lock:
+        indice = _emparejamientos.get(key)
+        if indice is None:
+            indice = _emparejamientos[key] = IndiceEmparejamiento(
+                archivo,
+                lambda: ((s.id, s.to_dict()) for s in estudiantes.select(list(CAMPOS_EMPAREJAMIENTO)).stream()),
+                lambda: _bloquear_carpetas([archivo.parent], ARCHIVO_BLOQUEO_EMPAREJAMIENTO),
+                estudiantes._versiones,
+            )
+        return indice
+
+
+def _emparejamiento_de(col_path: Path) -> Optional[IndiceEmparejamiento]:
+    """Índice de emparejamiento de la colección en `col_path`, si es la de estudiantes."""
+    if col_path.name != COLECCION_EMPAREJAMIENTO or col_path.parent.name.startswith("_"):
+        return None
+    return _emparejamiento(col_path.parent / ARCHIVO_EMPAREJAMIENTO, MarkdownCollection(col_path))
+
+
+def _texto_stamp(stamp: Tuple[int, int, int]) -> str:
+    return "{}:{}:{}".format(*stamp)
+
+
+def _version_documento(path: Path) -> Optional[str]:
+    """
+    Versión de la nota para el índice de emparejamiento, la misma en todos
+    los procesos: la del archivo o, si está en el diario, una huella de su
+    entrada (las versiones de las entradas son de cada proceso).
+    """
+    diario = _diario_de(path)
+    entrada = diario.entrada(path.stem) if diario is not None else None
+    if entrada is not None:
+        huella = _huella(entrada.datos) if entrada.datos is not None else None
+        return f"diario:{huella.hex()}" if huella is not None else None
+    stamp = _version_de(path)
+    return _texto_stamp(stamp) if stamp is not None else None
+
+
+# ── Estadísticas materializadas (_stats.md) ──
+
+ARCHIVO_BLOQUEO_ESTADISTICAS = ".estadisticas.lock"
+
+_estadisticas: Dict[str, CollectionStats] = {}
+_verificadores: Dict[str, VerificadorEstadisticas] = {}
+
+
+def _es_interno(path: Path) -> bool:
+    """Notas propias de la base (_stats.md): no se indexan ni se cuentan."""
+    return path.stem.startswith("_")
+
+
+def _estadisticas_de(path: Path) -> Optional[CollectionStats]:
+    """
+    Estadísticas de la colección en `path` (o de la colección de la nota
+    `path`), si tiene contadores configurados.
+    """
+    if path.suffix == ".md":
+        if _es_interno(path):
+            return None
+        path = _coleccion_de(path)
+    config = DATOS_ESTADISTICAS.get(path.name)
+    if not config:
+        return None
+    key = str(path)
+    with _indices_lock:
+        stats = _estadisticas.get(key)
+        if stats is None:
+            stats = _estadisticas[key] = CollectionStats(
+                path, config.get("por_valor", ()), config.get("no_vacios", ()),
+                lambda f, campos: _load_frontmatter(f, campos=campos),
+                lambda f, data: _write_md(f, data),
+                lambda: _bloquear_carpetas([path], ARCHIVO_BLOQUEO_ESTADISTICAS),
+                lambda: _notas_de(path),
+            )
+        return stats
+
+
+def iniciar_verificador(base_path: Path, intervalo: float) -> Optional[VerificadorEstadisticas]:
+    """Arrancar (una vez por carpeta de datos) el hilo que reconcilia las estadísticas."""
+    if intervalo <= 0:
+        return None
+    key = str(base_path)
+    with _indices_lock:
+        verificador = _verificadores.get(key)
+        if verificador is None:
+            verificador = _verificadores[key] = VerificadorEstadisticas(
+                lambda: [_estadisticas_de(base_path / nombre) for nombre in DATOS_ESTADISTICAS],
+                intervalo,
+            )
+            verificador.start()
+        return verificador
+
+
+def _dump_yaml(data: dict) -> str:
+    return yaml.dump(
+        data,
+        Dumper=_YamlDumper,
         default_flow_style=False,
         allow_unicode=True,
         sort_keys=False,
     )
-    content = f"---\n{frontmatter}---\n"
+
+
+def _render_md(data: dict, body: str = "") -> str:
+    """Contenido de la nota: frontmatter YAML y cuerpo opcional."""
+    content = f"---\n{_dump_yaml(data)}---\n"
     if body:
         content += f"\n{body}\n"
-    path.write_text(content, encoding="utf-8")
+    return content
+
+
+# ──────────────────────────────────────────────
+#  Escrituras sin cambios
+# ──────────────────────────────────────────────
+
+# Una escritura que deja la nota igual que en disco no se hace: no cambia el
+# mtime (Obsidian y las cachés no la invalidan) ni se regenera el archivo.
+# Se compara una huella del frontmatter canónico (JSON con claves ordenadas)
+# y del cuerpo. Los campos de DATOS_CAMPOS_MARCA cuentan como cualquier otro:
+# decidir que una escritura que solo los cambia sobra es cosa de quien escribe
+# (ver solo_cambian_marcas).
+_CAMPOS_MARCA = frozenset(DATOS_CAMPOS_MARCA)
+
+# Huella de cada nota por ruta, válida mientras no cambie su versión
+_huellas: Dict[str, Tuple[Tuple[int, int, int], bytes]] = {}
+
+
+def _canonico(valor: Any) -> str:
+    # El tipo distingue date("2026-03-10") del texto "2026-03-10" (el YAML también)
+    if isinstance(valor, (date, datetime)):
+        return f"{type(valor).__name__}:{valor.isoformat()}"
+    raise TypeError(f"Tipo sin forma canónica: {type(valor).__name__}")
+
+
+def _huella(data: dict, body: str = "", ignorar: frozenset = frozenset()) -> Optional[bytes]:
+    """Huella del frontmatter (sin los campos de `ignorar`) y el cuerpo; None si no es serializable."""
+    try:
+        texto = json.dumps({k: v for k, v in data.items() if k not in ignorar},
+                           sort_keys=True, ensure_ascii=False, default=_canonico)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.blake2b(f"{texto}\0{body}".encode("utf-8"), digest_size=16).digest()
+
+
+def solo_cambian_marcas(actual: Optional[dict], nuevo: dict) -> bool:
+    """
+    Si escribir `nuevo` sobre `actual` solo cambiaría campos de
+    DATOS_CAMPOS_MARCA (p. ej. una reextracción con los mismos datos).
+    """
+    if actual is None:
+        return False
+    huella = _huella(nuevo, ignorar=_CAMPOS_MARCA)
+    return huella is not None and huella == _huella(actual, ignorar=_CAMPOS_MARCA)
+
+
+def _huella_en_disco(path: Path) -> Optional[bytes]:
+    """Huella de la nota tal como está en disco; se recalcula solo si cambió el archivo."""
+    diario = _diario_de(path)
+    entrada = diario.entrada(path.stem) if diario is not None else None
+    if entrada is not None:
+        return _huella(entrada.datos, _read_body(path)) if entrada.datos is not None else None
+    version = _version_de(path)
+    if version is None:
+        return None
+    previa = _huellas.get(str(path))
+    if previa is not None and previa[0] == version:
+        return previa[1]
+    data = _load_frontmatter(path)
+    if data is None:
+        return None
+    huella = _huella(data, _read_body(path))
+    if huella is not None:
+        _huellas[str(path)] = (version, huella)
+    return huella
+
+
+def _sin_cambios(path: Path, huella: Optional[bytes]) -> bool:
+    """Si escribir la nota con esta huella la dejaría como ya está."""
+    return huella is not None and huella == _huella_en_disco(path)
+
+
+def _registrar_escritura(path: Path, resolved: dict, huella: Optional[bytes] = None):
+    """Actualizar caché, índices y poda por fecha tras dejar `resolved` en `path`."""
+    stamp = _stamp(path.stat())
+    _recordar(path, stamp, _clonar(resolved))
+    if huella is not None:
+        _huellas[str(path)] = (stamp, huella)
+    if _es_interno(path):
+        return
+    coleccion = _coleccion_de(path)
+    indice = _indice_de(coleccion)
+    if indice is not None:
+        indice.update(path.stem, resolved)
+    emparejamiento = _emparejamiento_de(coleccion)
+    if emparejamiento is not None:
+        emparejamiento.actualizar(path.stem, resolved, _version_documento(path))
+    if coleccion != path.parent:
+        _comprobar_poda(coleccion, path.stem, resolved)
+
+
+# Política de fsync (DATOS_FSYNC): "none" nunca sincroniza, "batch" sincroniza
+# los commits de WriteBatch (archivos y una vez cada carpeta) y "always"
+# además cada escritura individual.
+POLITICAS_FSYNC = ("none", "batch", "always")
+_fsync_policy = "batch"
+
+
+def configurar_fsync(politica: str):
+    """Cambiar la política de fsync del proceso."""
+    global _fsync_policy
+    if politica not in POLITICAS_FSYNC:
+        raise ValueError(f"Política de fsync inválida: {politica!r} (use {', '.join(POLITICAS_FSYNC)})")
+    _fsync_policy = politica
+
+
+try:
+    configurar_fsync(get_config().DATOS_FSYNC)
+except ValueError as e:
+    logger.warning(f"{e} — se usa 'batch'")
+
+
+def _temporal_de(path: Path) -> Path:
+    """Archivo temporal junto a `path`; no coincide con el glob *.md."""
+    return path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def _apartado_de(path: Path) -> Path:
+    """Nombre con el que WriteBatch aparta una nota o carpeta a eliminar (fuera de los globs)."""
+    return path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.borrado")
+
+
+def _escribir_temporal(path: Path, content: str, fsync: bool) -> Path:
+    tmp = _temporal_de(path)
+    try:
+        with open(tmp, "w", encoding="utf-8", newline="") as fh:
+            fh.write(content)
+            if fsync:
+                fh.flush()
+                os.fsync(fh.fileno())
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return tmp
+
+
+def _fsync_dir(directorio: Path):
+    """Persistir los renombrados de un directorio (no disponible en Windows)."""
+    try:
+        fd = os.open(directorio, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_md(path: Path, data: dict, body: Optional[str] = "") -> bool:
+    """
+    Escribir archivo .md con frontmatter YAML y cuerpo opcional (None
+    conserva el actual). Se escribe en un temporal y se renombra con
+    os.replace: un corte a mitad de escritura deja la nota anterior intacta,
+    nunca una truncada. Con el diario activo la escritura va al diario.
+    Retorna False si la nota ya tenía ese contenido y no se escribió.
+    """
+    resolved = _resolve_timestamps(data)
+    diario = _diario_de(path)
+    if diario is not None:
+        return _anotar(diario, [(path, resolved, body)], _fsync_policy == "always")[0] > 0
+    if body is None:
+        body = _read_body(path)
+    huella = _huella(resolved, body)
+    if _sin_cambios(path, huella):
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    estadisticas = _estadisticas_de(path)
+    antes = _load_frontmatter(path, campos=estadisticas.campos) if estadisticas is not None else None
+    fsync = _fsync_policy == "always"
+    tmp = _escribir_temporal(path, _render_md(resolved, body), fsync)
+    try:
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    if fsync:
+        _fsync_dir(path.parent)
+    _registrar_escritura(path, resolved, huella)
+    if estadisticas is not None:
+        estadisticas.registrar([(antes, resolved)])
+    return True
+
+
+# ──────────────────────────────────────────────
+#  Diario de escrituras (datos/<coleccion>/_diario.jsonl)
+# ──────────────────────────────────────────────
+
+# Con DATOS_DIARIO las escrituras de las colecciones de primer nivel se
+# agregan al diario y un hilo las compacta en las notas; las lecturas ven el
+# diario por encima de las notas. Las notas internas y las subcolecciones se
+# escriben siempre directamente.
+_diarios_activos = get_config().DATOS_DIARIO
+_diarios: Dict[str, CollectionJournal] = {}
+_diarios_lock = threading.Lock()
+_compactador: Optional[CompactadorDiarios] = None
+
+
+def configurar_diario(activo: bool):
+    """Activar o desactivar el diario del proceso (al desactivarlo se compacta)."""
+    global _diarios_activos
+    if not activo:
+        compactar_diarios()
+    _diarios_activos = activo
+
+
+def _diario_coleccion(col_path: Path) -> Optional[CollectionJournal]:
+    """Diario de la colección en `col_path` (None si está desactivado o es una subcolección)."""
+    if not _diarios_activos or col_path.parent.name.startswith("_"):
+        return None
+    key = str(col_path)
+    diario = _diarios.get(key)
+    if diario is None:
+        with _diarios_lock:
+            diario = _diarios.get(key)
+            if diario is None:
+                diario = _diarios[key] = _nuevo_diario(col_path)
+                _iniciar_compactador()
+    return diario
+
+
+def _diario_de(path: Path) -> Optional[CollectionJournal]:
+    """Diario de la colección de la nota `path` (None para notas internas)."""
+    if not _diarios_activos or _es_interno(path):
+        return None
+    return _diario_coleccion(_coleccion_de(path))
+
+
+def _nuevo_diario(col_path: Path) -> CollectionJournal:
+    return CollectionJournal(
+        col_path,
+        lambda: _bloquear_carpetas([col_path], ARCHIVO_BLOQUEO_DIARIO),
+        lambda entradas: _volcar_diario(col_path, entradas),
+    )
+
+
+def _iniciar_compactador():
+    global _compactador
+    if _compactador is None:
+        config = get_config()
+        _compactador = CompactadorDiarios(
+            lambda: list(_diarios.values()), config.DATOS_DIARIO_INACTIVIDAD, config.DATOS_DIARIO_MAX_KB * 1024
+        )
+        _compactador.start()
+
+
+def _anotar(diario: CollectionJournal, cambios: List[Tuple[Path, Optional[dict], Optional[str]]],
+            fsync: bool) -> Tuple[int, int]:
+    """
+    Agregar al diario (ruta, frontmatter o None si se elimina, cuerpo o None
+    si no cambia) y actualizar índices y estadísticas como una escritura.
+    Retorna (escritas, omitidas por no cambiar nada).
+    """
+    estadisticas = _estadisticas_de(diario.path)
+    indice = _indice_de(diario.path)
+    emparejamiento = _emparejamiento_de(diario.path)
+    rutas: List[Path] = []
+    lineas: List[Tuple[str, Optional[dict], Optional[str]]] = []
+    pares: List[Tuple[Optional[dict], Optional[dict]]] = []
+    omitidas = 0
+    for path, data, body in cambios:
+        antes = _load_frontmatter(path)
+        if data is not None and antes is not None:
+            if body is None:
+                huella = _huella(data)
+                sin_cambios = huella is not None and huella == _huella(antes)
+            else:
+                sin_cambios = _sin_cambios(path, _huella(data, body))
+            if sin_cambios:
+                omitidas += 1
+                continue
+        rutas.append(path)
+        lineas.append((path.stem, _clonar(data) if data is not None else None, body))
+        pares.append((antes, data))
+    diario.anotar(lineas, fsync)
+    if _compactador is not None and diario.tamano >= _compactador.limite_bytes:
+        _compactador.avisar()
+
+    for (doc_id, data, _), (antes, _) in zip(lineas, pares):
+        if indice is not None:
+            if data is None:
+                indice.remove(doc_id)
+            else:
+                indice.update(doc_id, data)
+    if emparejamiento is not None:
+        for path, (doc_id, data, _) in zip(rutas, lineas):
+            if data is None:
+                emparejamiento.eliminar(doc_id)
+            else:
+                emparejamiento.actualizar(doc_id, data, _version_documento(path))
+    if estadisticas is not None:
+        estadisticas.registrar(pares)
+    particionado = _particionado_de(diario.path)
+    if particionado.particionado:
+        for doc_id, data, _ in lineas:
+            if data is not None:
+                _comprobar_poda(diario.path, doc_id, data)
+    return sum(data is not None for _, data, _ in lineas), omitidas
+
+
+def _volcar_diario(col_path: Path, entradas: Dict[str, Entrada]):
+    """Compactación: escribir en las notas el estado que tiene el diario."""
+    coleccion = MarkdownCollection(col_path)
+    particionado = _particionado_de(col_path)
+    emparejamiento = _emparejamiento_de(col_path)
+    fsync = _fsync_policy != "none"
+    carpetas = set()
+    for doc_id, entrada in entradas.items():
+        path = coleccion._ruta(doc_id, particionado)
+        _huellas.pop(str(path), None)
+        if entrada.datos is None:
+            _document_cache.invalidate(str(path))
+            instantanea = _instantanea_de(path)
+            if instantanea is not None:
+                instantanea.discard(doc_id)
+            path.unlink(missing_ok=True)
+            if emparejamiento is not None:
+                emparejamiento.eliminar(doc_id)
+            continue
+        body = entrada.cuerpo if entrada.cuerpo is not None else _cuerpo_en_disco(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = _escribir_temporal(path, _render_md(entrada.datos, body), fsync)
+        try:
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        carpetas.add(path.parent)
+        stamp = _stamp(path.stat())
+        _recordar(path, stamp, _clonar(entrada.datos))
+        _huellas[str(path)] = (stamp, _huella(entrada.datos, body))
+        if emparejamiento is not None:
+            # La entrada sigue en el diario hasta vaciarlo: la versión es ya la de la nota
+            emparejamiento.actualizar(doc_id, entrada.datos, _texto_stamp(stamp))
+    if fsync:
+        for carpeta in carpetas:
+            _fsync_dir(carpeta)
+
+
+def compactar_diarios(base_path: Optional[Path] = None) -> Dict[str, int]:
+    """
+    Compactar ya los diarios (también se hace al salir). Con `base_path`,
+    los de sus colecciones aunque el diario esté desactivado: así se
+    recuperan las escrituras que quedaron en un diario tras un corte.
+    """
+    if base_path is None:
+        diarios = list(_diarios.values())
+    else:
+        diarios = [
+            _diario_coleccion(p) or _nuevo_diario(p)
+            for p in sorted(base_path.iterdir())
+            if p.is_dir() and _tiene_diario(p)
+        ]
+    resultado = {}
+    for diario in diarios:
+        try:
+            resultado[diario.path.name] = diario.compactar()
+        except OSError as e:
+            logger.error(f"No se pudo compactar el diario de {diario.path.name}: {e}")
+    return resultado
+
+
+def _tiene_diario(col_path: Path) -> bool:
+    try:
+        return (col_path / ARCHIVO_DIARIO).stat().st_size > 0
+    except FileNotFoundError:
+        return False
+
+
+# Se registra después de guardar_instantaneas: atexit lo ejecuta antes
+atexit.register(compactar_diarios)
 
 
 # ──────────────────────────────────────────────
@@ -98,7 +1122,15 @@ class MarkdownSnapshot:
         self.exists = data is not None
 
     def to_dict(self) -> dict:
-        return dict(self._data) if self._data else {}
+        return _clonar(self._data) if self._data else {}
+
+    def get(self, field: str) -> Any:
+        """Valor de un campo sin copiar el documento completo."""
+        return self._data.get(field) if self._data else None
+
+    def body(self) -> str:
+        """Cuerpo Markdown de la nota; se lee del disco solo cuando se pide."""
+        return self.reference._body() if self.exists else ""
 
 
 class MarkdownDocument:
@@ -107,27 +1139,35 @@ class MarkdownDocument:
     def __init__(self, path: Path, doc_id: str):
         self.path = path
         self.id = doc_id
-        self.reference = self
+
+    @property
+    def reference(self) -> "MarkdownDocument":
+        # Propiedad y no atributo: evita un ciclo que retrasa la liberación
+        return self
 
     def get(self) -> MarkdownSnapshot:
-        data = _read_frontmatter(self.path)
+        data = _load_frontmatter(self.path)
         return MarkdownSnapshot(self.id, self, data)
 
     def set(self, data: dict, merge: bool = False):
-        if merge and self.path.exists():
-            existing = _read_frontmatter(self.path) or {}
+        body: Optional[str] = ""
+        existing = _read_frontmatter(self.path) if merge else None
+        if existing is not None:
             existing.update(_resolve_timestamps(data))
             data = existing
-        _write_md(self.path, data)
+            body = None
+        _write_md(self.path, data, body)
 
     def update(self, data: dict):
-        existing = _read_frontmatter(self.path) or {}
+        # Se conserva el cuerpo Markdown de la nota (p. ej. el resumen del estudiante)
+        existing = _read_frontmatter(self.path)
+        body = None if existing is not None else ""
+        existing = existing or {}
         existing.update(_resolve_timestamps(data))
-        _write_md(self.path, existing)
+        _write_md(self.path, existing, body)
 
     def delete(self):
-        if self.path.exists():
-            self.path.unlink()
+        _remove_md(self.path)
         # Limpiar carpeta de subcolecciones si existe
         sub_dir = self.path.parent / f"_{self.id}"
         if sub_dir.exists():
@@ -138,36 +1178,885 @@ class MarkdownDocument:
         sub_path = self.path.parent / f"_{self.id}" / name
         return MarkdownCollection(sub_path)
 
+    def collections(self) -> List["MarkdownCollection"]:
+        """Subcolecciones existentes del documento."""
+        sub_dir = self.path.parent / f"_{self.id}"
+        if not sub_dir.is_dir():
+            return []
+        return [MarkdownCollection(p) for p in sorted(sub_dir.iterdir()) if p.is_dir()]
+
+    def _body(self) -> str:
+        return _read_body(self.path)
+
+
+def _get_all(references: Iterable[MarkdownDocument],
+             field_paths: Optional[Iterable[str]] = None) -> List[MarkdownSnapshot]:
+    """
+    Snapshots de `references` en el mismo orden. Cada nota se lee una sola
+    vez aunque se repita, y con DATOS_LECTORES > 1 se leen en paralelo.
+    """
+    references = list(references)
+    unicas: Dict[Path, MarkdownDocument] = {}
+    for ref in references:
+        unicas.setdefault(ref.path, ref)
+    datos = dict(_cargar_frontmatters(unicas))
+    campos = tuple(field_paths) if field_paths is not None else None
+    snapshots = {}
+    for path, ref in unicas.items():
+        data = datos[path]
+        if campos is not None and data is not None:
+            data = _proyectar(data, campos)
+        snapshots[path] = MarkdownSnapshot(ref.id, ref, data)
+    return [snapshots[ref.path] for ref in references]
+
+
+class WriteBatch:
+    """
+    Equivalente a firestore.WriteBatch — escrituras agrupadas en un commit.
+
+    Las operaciones se acumulan en memoria. commit() resuelve SERVER_TIMESTAMP
+    una sola vez, escribe todas las notas en archivos temporales agrupados por
+    carpeta y aparta (renombra) las notas a eliminar y sus subcolecciones;
+    solo entonces aplica los renombrados y borra lo apartado. Si falla una
+    escritura o no se puede apartar algo, se deshace lo apartado y no se toca
+    ninguna nota. Las eliminaciones en colecciones con diario se anotan en él
+    tras los renombrados, como las escrituras. Con fsync=True se sincronizan los temporales y cada
+    carpeta una sola vez al final; por defecto lo decide DATOS_FSYNC. Las
+    notas que quedarían igual no se reescriben y se cuentan como omitidas.
+    """
+
+    def __init__(self, fsync: Optional[bool] = None):
+        self.fsync = _fsync_policy != "none" if fsync is None else fsync
+        self._ops: List[Tuple[str, MarkdownDocument, Optional[dict], bool]] = []
+        # Cuerpo Markdown de las notas escritas con _set_nota
+        self._cuerpos: Dict[Path, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._ops)
+
+    def set(self, reference: MarkdownDocument, document_data: dict, merge: bool = False):
+        self._ops.append(("set", reference, document_data, merge))
+
+    def update(self, reference: MarkdownDocument, field_updates: dict):
+        self._ops.append(("update", reference, field_updates, True))
+
+    def delete(self, reference: MarkdownDocument):
+        self._ops.append(("delete", reference, None, False))
+
+    def _set_nota(self, reference: MarkdownDocument, document_data: dict, body: str):
+        """set() que además escribe el cuerpo Markdown de la nota."""
+        self._cuerpos[reference.path] = body
+        self._ops.append(("set", reference, document_data, False))
+
+    def commit(self) -> Dict[str, int]:
+        """Aplicar las operaciones. Retorna el resumen de escritos/omitidos/eliminados."""
+        now = datetime.now().isoformat()
+        # Estado final de cada nota: (dict, cuerpo o None si no cambia) o None si se elimina
+        finales: Dict[Path, Tuple[MarkdownDocument, Optional[Tuple[dict, Optional[str]]]]] = {}
+        for op, ref, data, merge in self._ops:
+            if op == "delete":
+                finales[ref.path] = (ref, None)
+                continue
+            resolved = _resolve_timestamps(data, now)
+            body = self._cuerpos.get(ref.path, "")
+            if merge:
+                if ref.path in finales:
+                    actual, body = finales[ref.path][1] or ({}, "")
+                else:
+                    actual = _read_frontmatter(ref.path)
+                    if actual is not None:
+                        body = None
+                base = dict(actual) if actual else {}
+                base.update(resolved)
+                resolved = base
+            finales[ref.path] = (ref, (resolved, body))
+
+        por_carpeta: Dict[Path, List[Tuple[Path, dict, str]]] = {}
+        borrados: List[MarkdownDocument] = []
+        huellas: Dict[Path, Optional[bytes]] = {}
+        diarios: Dict[CollectionJournal, List[Tuple[Path, dict, Optional[str]]]] = {}
+        omitidos = 0
+        for path, (ref, nota) in finales.items():
+            if nota is None:
+                borrados.append(ref)
+                continue
+            resolved, body = nota
+            diario = _diario_de(path)
+            if diario is not None:
+                diarios.setdefault(diario, []).append((path, resolved, body))
+                continue
+            if body is None:
+                body = _read_body(path)
+            huellas[path] = _huella(resolved, body)
+            if _sin_cambios(path, huellas[path]):
+                omitidos += 1
+            else:
+                por_carpeta.setdefault(path.parent, []).append((path, resolved, body))
+
+        # Valores anteriores de las notas con estadísticas, antes de sustituirlas
+        cambios: Dict[CollectionStats, List[Tuple[Optional[dict], dict]]] = {}
+        anteriores: Dict[Path, Optional[dict]] = {}
+        for notas in por_carpeta.values():
+            for path, _, _ in notas:
+                estadisticas = _estadisticas_de(path)
+                if estadisticas is not None:
+                    anteriores[path] = _load_frontmatter(path, campos=estadisticas.campos)
+
+        temporales: List[Tuple[Path, Path, dict]] = []
+        # (original, apartado) de las notas y subcolecciones a eliminar
+        apartados: List[Tuple[Path, Path]] = []
+        try:
+            for carpeta, notas in por_carpeta.items():
+                carpeta.mkdir(parents=True, exist_ok=True)
+                for path, data, body in notas:
+                    tmp = _escribir_temporal(path, _render_md(data, body), self.fsync)
+                    temporales.append((tmp, path, data))
+            for ref in borrados:
+                estadisticas = _estadisticas_de(ref.path)
+                if _diario_de(ref.path) is None and estadisticas is not None:
+                    anteriores[ref.path] = _load_frontmatter(ref.path, campos=estadisticas.campos)
+                originales = [ref.path] if _diario_de(ref.path) is None else []
+                for original in originales + [ref.path.parent / f"_{ref.id}"]:
+                    if original.exists():
+                        apartado = _apartado_de(original)
+                        os.replace(original, apartado)
+                        apartados.append((original, apartado))
+        except BaseException:
+            for original, apartado in reversed(apartados):
+                os.replace(apartado, original)
+            for tmp, _, _ in temporales:
+                tmp.unlink(missing_ok=True)
+            raise
+
+        for tmp, path, data in temporales:
+            os.replace(tmp, path)
+            _registrar_escritura(path, data, huellas[path])
+            if path in anteriores:
+                cambios.setdefault(_estadisticas_de(path), []).append((anteriores[path], data))
+        for estadisticas, pares in cambios.items():
+            estadisticas.registrar(pares)
+        anotados = con_diario = 0
+        for diario, notas in diarios.items():
+            escritas, sin_cambios = _anotar(diario, notas, self.fsync)
+            anotados += escritas
+            omitidos += sin_cambios
+            con_diario += escritas > 0
+        apartado_de = dict(apartados)
+        for ref in borrados:
+            _remove_md(ref.path, apartado_de.get(ref.path), anteriores.get(ref.path))
+            subcolecciones = apartado_de.get(ref.path.parent / f"_{ref.id}")
+            if subcolecciones is not None:
+                shutil.rmtree(subcolecciones)
+        if self.fsync:
+            for carpeta in set(por_carpeta) | {ref.path.parent for ref in borrados}:
+                _fsync_dir(carpeta)
+
+        self._ops = []
+        self._cuerpos = {}
+        return {
+            "escritos": len(temporales) + anotados,
+            "omitidos": omitidos,
+            "eliminados": len(borrados),
+            # Carpetas con notas escritas más colecciones con escrituras en el diario
+            "carpetas": len(por_carpeta) + con_diario,
+        }
+
+
+# ──────────────────────────────────────────────
+#  Transacciones optimistas
+# ──────────────────────────────────────────────
+
+ARCHIVO_BLOQUEO = ".transacciones.lock"
+
+
+class ConflictoTransaccion(Exception):
+    """Un documento leído en la transacción cambió antes del commit."""
+    pass
+
+
+@contextmanager
+def _bloquear_carpetas(carpetas, archivo: str = ARCHIVO_BLOQUEO):
+    """Bloqueo exclusivo entre procesos de varias carpetas (en orden fijo)."""
+    abiertos = []
+    try:
+        for carpeta in sorted(set(carpetas)):
+            carpeta.mkdir(parents=True, exist_ok=True)
+            fh = open(carpeta / archivo, "a+b")
+            abiertos.append(fh)
+            if os.name == "nt":
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+            else:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        yield
+    finally:
+        for fh in reversed(abiertos):
+            if os.name == "nt":
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            fh.close()
+
+
+class Transaction(WriteBatch):
+    """
+    Equivalente a firestore.Transaction — lecturas versionadas y commit CAS.
+
+    get() registra la versión (inodo, mtime, tamaño y entrada del diario) de
+    cada nota leída.
+    commit() bloquea las carpetas implicadas, comprueba que ninguna nota
+    leída cambió y solo entonces aplica las escrituras; si cambió, lanza
+    ConflictoTransaccion. Usar con @transactional para reintentar.
+    """
+
+    def __init__(self, max_attempts: int = 5, fsync: Optional[bool] = None):
+        super().__init__(fsync)
+        self.max_attempts = max_attempts
+        self._versiones: Dict[Path, Tuple[Optional[Tuple[int, int, int]], Optional[int]]] = {}
+
+    def get(self, reference: MarkdownDocument) -> MarkdownSnapshot:
+        self._registrar_lecturas([reference])
+        return reference.get()
+
+    def get_all(self, references: Iterable[MarkdownDocument]) -> List[MarkdownSnapshot]:
+        """Varias lecturas versionadas en una llamada, como MarkdownDB.get_all."""
+        references = list(references)
+        self._registrar_lecturas(references)
+        return _get_all(references)
+
+    def _registrar_lecturas(self, references: List[MarkdownDocument]):
+        if self._ops:
+            raise ValueError("Las lecturas deben hacerse antes de las escrituras en una transacción")
+        # La versión se toma antes de leer: si la nota cambia entre medias,
+        # el commit detecta el conflicto en lugar de perder la escritura.
+        for reference in references:
+            self._versiones.setdefault(reference.path, _version_nota(reference.path))
+
+    def commit(self) -> Dict[str, int]:
+        carpetas = {_coleccion_de(p) for p in self._versiones}
+        carpetas |= {_coleccion_de(ref.path) for _, ref, _, _ in self._ops}
+        with _bloquear_carpetas(carpetas):
+            for path, version in self._versiones.items():
+                if _version_nota(path) != version:
+                    raise ConflictoTransaccion(f"{_coleccion_de(path).name}/{path.stem} cambió durante la transacción")
+            return super().commit()
+
+    def _reiniciar(self):
+        self._ops = []
+        self._versiones = {}
+
+
+def transactional(func):
+    """
+    Equivalente a firestore.transactional: ejecuta func(transaction, ...) y
+    hace commit, repitiendo todo el cuerpo si hay conflicto.
+    """
+    @functools.wraps(func)
+    def wrapper(transaction: Transaction, *args, **kwargs):
+        for intento in range(transaction.max_attempts):
+            transaction._reiniciar()
+            resultado = func(transaction, *args, **kwargs)
+            try:
+                transaction.commit()
+                return resultado
+            except ConflictoTransaccion as e:
+                logger.debug(f"Reintentando transacción ({intento + 1}): {e}")
+                time.sleep(random.uniform(0, 0.005 * 2 ** intento))
+        raise ConflictoTransaccion(f"Transacción abortada tras {transaction.max_attempts} intentos")
+    return wrapper
+
 
 class MarkdownCollection:
     """Equivalente a firestore.CollectionReference"""
 
     def __init__(self, path: Path):
         self.path = path
-        self._order_field: Optional[str] = None
+
+    @property
+    def id(self) -> str:
+        return self.path.name
 
     def document(self, doc_id: str) -> MarkdownDocument:
-        return MarkdownDocument(self.path / f"{doc_id}.md", doc_id)
+        return MarkdownDocument(self._ruta(doc_id), doc_id)
 
-    def order_by(self, field: str) -> "MarkdownCollection":
-        clone = MarkdownCollection(self.path)
-        clone._order_field = field
-        return clone
+    # ── Consultas (delegan en MarkdownQuery) ────
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None,
+              value: Any = None, *, filter: Optional["FieldFilter"] = None) -> "MarkdownQuery":
+        return MarkdownQuery(self).where(field_path, op_string, value, filter=filter)
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "MarkdownQuery":
+        return MarkdownQuery(self).order_by(field_path, direction)
+
+    def limit(self, count: int) -> "MarkdownQuery":
+        return MarkdownQuery(self).limit(count)
+
+    def offset(self, num_to_skip: int) -> "MarkdownQuery":
+        return MarkdownQuery(self).offset(num_to_skip)
+
+    def start_after(self, document_fields_or_snapshot: Any) -> "MarkdownQuery":
+        return MarkdownQuery(self).start_after(document_fields_or_snapshot)
+
+    def select(self, field_paths: List[str]) -> "MarkdownQuery":
+        return MarkdownQuery(self).select(field_paths)
 
     def stream(self) -> Iterator[MarkdownSnapshot]:
         """Iterar todos los documentos .md de la colección."""
-        if not self.path.exists():
+        return MarkdownQuery(self).stream()
+
+    def count(self) -> int:
+        return MarkdownQuery(self).count()
+
+    def estadisticas(self) -> Optional[dict]:
+        """
+        Documento _stats de la colección (total, por_valor, no_vacios), o
+        None si no tiene contadores configurados en DATOS_ESTADISTICAS.
+        """
+        stats = _estadisticas_de(self.path)
+        return _clonar(stats.leer()) if stats is not None else None
+
+    def sum(self, field_path: str) -> Any:
+        return MarkdownQuery(self).sum(field_path)
+
+    def avg(self, field_path: str) -> Optional[float]:
+        return MarkdownQuery(self).avg(field_path)
+
+    def group_count(self, field_path: str) -> Dict[Any, int]:
+        return MarkdownQuery(self).group_count(field_path)
+
+    # ── Acceso a archivos ───────────────────────
+    #
+    # MarkdownQuery solo accede al almacenamiento a través de estos métodos
+    # (_indice, _ids, _candidatos, _iter_ids, _cargar y document).
+
+    def _indice(self) -> Optional[CollectionIndex]:
+        return _indice_de(self.path)
+
+    def _ruta(self, doc_id: str, particionado: Optional[Particionado] = None) -> Path:
+        """Ruta de la nota: en la subcarpeta que le toca si la colección está particionada."""
+        particionado = particionado or _particionado_de(self.path)
+        return self.path / particionado.carpeta(doc_id) / f"{doc_id}.md"
+
+    def _lookup(self, flt: "FieldFilter") -> Optional[set]:
+        """
+        Ids candidatos para un filtro sin leer archivos, o None si ningún
+        índice lo cubre: el id del documento o un índice secundario.
+        """
+        if flt.field_path == DOCUMENT_ID:
+            if flt.op_string == "==":
+                return {flt.value}
+            if flt.op_string == "in":
+                return set(flt.value)
+            return None
+        indice = self._indice()
+        if indice is None:
+            return None
+        return indice.lookup(flt.field_path, flt.op_string, flt.value)
+
+    def _candidatos(self, filters: Tuple["FieldFilter", ...]) -> Optional[set]:
+        """Intersección de los ids que acotan los índices, o None si ninguno aplica."""
+        ids: Optional[set] = None
+        for flt in filters:
+            found = self._lookup(flt)
+            if found is not None:
+                ids = found if ids is None else ids & found
+        return ids
+
+    def _ids(self, filters: Tuple["FieldFilter", ...] = ()) -> Iterator[str]:
+        """
+        Ids de las notas en el orden del directorio. En una colección
+        particionada por fecha solo se recorren las subcarpetas de los meses
+        que pueden cumplir `filters`.
+        """
+        particionado = _particionado_de(self.path)
+        carpetas = particionado.podar(self.path, [(f.field_path, f.op_string, f.value) for f in filters])
+        diario = _diario_coleccion(self.path)
+        pendientes = diario.entradas() if diario is not None else None
+        vistos = set()
+        for carpeta in carpetas if carpetas is not None else particionado.carpetas(self.path):
+            try:
+                entradas = os.scandir(carpeta)
+            except FileNotFoundError:
+                continue
+            # Solo nombres: no se crea un Path por archivo hasta entregarlo
+            with entradas:
+                for e in entradas:
+                    if e.name.endswith(".md") and not e.name.startswith((".", "_")):
+                        doc_id = e.name[:-3]
+                        if pendientes:
+                            vistos.add(doc_id)
+                            if doc_id in pendientes and pendientes[doc_id].datos is None:
+                                continue
+                        yield doc_id
+        # Documentos creados en el diario que aún no tienen nota
+        if pendientes:
+            for doc_id, entrada in pendientes.items():
+                if entrada.datos is not None and doc_id not in vistos:
+                    yield doc_id
+
+    def _versiones(self) -> Dict[str, Optional[str]]:
+        """Versión de cada documento (ver _version_documento) sin leer las notas."""
+        particionado = _particionado_de(self.path)
+        return {doc_id: _version_documento(self._ruta(doc_id, particionado)) for doc_id in self._ids()}
+
+    def _iter_ids(self, filters: Tuple["FieldFilter", ...] = (), desde_id: Optional[str] = None,
+                  limite: Optional[int] = None, ordenado: bool = True) -> Iterable[str]:
+        """
+        Ids con id > desde_id, acotados por índices si es posible.
+        Con `ordenado` salen en orden de id (con `limite`, solo los primeros
+        mediante un heap); sin él, en el orden del directorio.
+        """
+        ids: Optional[Iterable[str]] = self._candidatos(filters)
+        if ids is None:
+            ids = self._ids(filters)
+        if desde_id is not None:
+            ids = (doc_id for doc_id in ids if doc_id > desde_id)
+        if ordenado:
+            ids = heapq.nsmallest(limite, ids) if limite is not None else sorted(ids)
+        return ids
+
+    def _cargar(self, ids: Iterable[str], literales: Tuple[str, ...] = (),
+                campos: Optional[frozenset] = None) -> Iterator[Tuple[str, Optional[dict]]]:
+        """Pares (id, frontmatter) en el orden de `ids`; None si falta o no contiene los literales."""
+        particionado = _particionado_de(self.path)
+        paths = (self._ruta(doc_id, particionado) for doc_id in ids)
+        for path, data in _cargar_frontmatters(paths, literales, campos):
+            yield path.stem, data
+
+
+# ──────────────────────────────────────────────
+#  Motor de consultas (where / order_by / limit / cursores)
+# ──────────────────────────────────────────────
+
+# Equivalente a firestore.FieldPath.document_id()
+DOCUMENT_ID = "__name__"
+
+_MISSING = object()
+
+
+def _comparar(op):
+    def _cmp(valor, esperado):
+        try:
+            return op(valor, esperado)
+        except TypeError:
+            # Firestore no compara valores de tipos distintos
+            return False
+    return _cmp
+
+
+_OPERADORES = {
+    "==": lambda v, x: v == x,
+    "!=": lambda v, x: v != x,
+    "<": _comparar(lambda v, x: v < x),
+    "<=": _comparar(lambda v, x: v <= x),
+    ">": _comparar(lambda v, x: v > x),
+    ">=": _comparar(lambda v, x: v >= x),
+    "in": lambda v, x: v in x,
+    "array_contains": lambda v, x: isinstance(v, list) and x in v,
+    "array_contains_any": lambda v, x: isinstance(v, list) and any(i in v for i in x),
+}
+
+# Literales que yaml.dump escribe tal cual (con o sin comillas) y que por
+# tanto se pueden buscar en el texto crudo antes de parsear el YAML.
+_LITERAL_BUSCABLE = re.compile(r"[\w.@:+/-]{1,64}")
+
+
+def _get_field(data: dict, field_path: str) -> Any:
+    """Valor de un campo, admite rutas anidadas 'a.b.c'."""
+    valor: Any = data
+    for parte in field_path.split("."):
+        if not isinstance(valor, dict) or parte not in valor:
+            return _MISSING
+        valor = valor[parte]
+    return valor
+
+
+class FieldFilter:
+    """Equivalente a firestore.FieldFilter — condición campo / operador / valor."""
+
+    def __init__(self, field_path: str, op_string: str, value: Any):
+        if op_string not in _OPERADORES:
+            raise ValueError(f"Operador no soportado: {op_string}")
+        if op_string in ("in", "array_contains_any") and not isinstance(value, (list, tuple, set)):
+            raise ValueError(f"El operador '{op_string}' requiere una lista de valores")
+        self.field_path = field_path
+        self.op_string = op_string
+        self.value = value
+        self._test = _OPERADORES[op_string]
+
+    def matches(self, doc_id: str, data: dict) -> bool:
+        valor = doc_id if self.field_path == DOCUMENT_ID else _get_field(data, self.field_path)
+        # Como en Firestore, un campo ausente nunca satisface un filtro
+        if valor is _MISSING:
+            return False
+        return self._test(valor, self.value)
+
+    def literal(self) -> Optional[str]:
+        """Texto que debe aparecer en el archivo para que el filtro pueda cumplirse."""
+        if (self.op_string == "==" and self.field_path != DOCUMENT_ID
+                and isinstance(self.value, str) and _LITERAL_BUSCABLE.fullmatch(self.value)):
+            return self.value
+        return None
+
+
+def _es_numero(valor: Any) -> bool:
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+
+
+def _claves_grupo(valor: Any) -> Iterator[Any]:
+    """Claves de group_count para un valor: sus elementos si es una lista."""
+    elementos = valor if isinstance(valor, list) else (valor,)
+    vistos = set()
+    for elemento in elementos:
+        try:
+            if elemento in vistos:
+                continue
+            vistos.add(elemento)
+        except TypeError:
+            continue  # mapas y listas anidadas no agrupan
+        yield elemento
+
+
+def _proyectar(data: dict, campos: Tuple[str, ...]) -> dict:
+    """Dict con solo `campos` (rutas 'a.b' conservan su anidamiento)."""
+    resultado: dict = {}
+    for campo in campos:
+        valor = _get_field(data, campo)
+        if valor is _MISSING:
+            continue
+        destino = resultado
+        *padres, hoja = campo.split(".")
+        for parte in padres:
+            destino = destino.setdefault(parte, {})
+        destino[hoja] = valor
+    return resultado
+
+
+# Equivalentes a firestore.Query.ASCENDING / DESCENDING
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+
+# Entre valores de tipos distintos se ordena por tipo, como en Firestore
+_RANGO_TIPO = ((bool, 1), (int, 2), (float, 2), (datetime, 3), (str, 4), (bytes, 5), (list, 6))
+
+
+def _orden_valor(valor: Any) -> tuple:
+    # Los documentos sin el campo van primero, como null en Firestore
+    if valor is _MISSING or valor is None:
+        return (0,)
+    if isinstance(valor, date) and not isinstance(valor, datetime):
+        # Las fechas YAML sin hora se comparan como medianoche de ese día
+        valor = datetime(valor.year, valor.month, valor.day)
+    for tipo, rango in _RANGO_TIPO:
+        if isinstance(valor, tipo):
+            return (rango, valor)
+    return (7, str(valor))
+
+
+class _Descendente:
+    """Valor de orden con la comparación invertida (campos DESCENDING)."""
+
+    __slots__ = ("valor",)
+
+    def __init__(self, valor: tuple):
+        self.valor = valor
+
+    def __eq__(self, other):
+        return self.valor == other.valor
+
+    def __lt__(self, other):
+        return other.valor < self.valor
+
+    def __gt__(self, other):
+        return other.valor > self.valor
+
+    def __le__(self, other):
+        return other.valor <= self.valor
+
+    def __ge__(self, other):
+        return other.valor >= self.valor
+
+    __hash__ = None
+
+
+def _sentido(valor: tuple, direction: str) -> Any:
+    return _Descendente(valor) if direction == DESCENDING else valor
+
+
+class MarkdownQuery:
+    """
+    Equivalente a firestore.Query — consulta inmutable sobre una colección.
+
+    Los filtros se evalúan mientras se recorren los archivos; los que caen
+    sobre un campo indexado acotan los archivos a leer, y las igualdades
+    de texto descartan archivos por su contenido crudo antes del YAML.
+
+    order_by se puede encadenar, cada campo con su dirección. Los valores
+    ausentes o null van primero en ASCENDING y últimos en DESCENDING; el id
+    del documento desempata en la dirección del último campo.
+    """
+
+    ASCENDING = ASCENDING
+    DESCENDING = DESCENDING
+
+    def __init__(self, collection: MarkdownCollection):
+        self._collection = collection
+        self._filters: Tuple[FieldFilter, ...] = ()
+        self._orders: Tuple[Tuple[str, str], ...] = ()
+        self._limit: Optional[int] = None
+        self._offset = 0
+        self._cursor: Optional[Any] = None
+        self._fields: Optional[Tuple[str, ...]] = None
+
+    def _copy(self, **cambios) -> "MarkdownQuery":
+        clone = type(self)(self._collection)
+        clone.__dict__.update(self.__dict__)
+        clone.__dict__.update(cambios)
+        return clone
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None,
+              value: Any = None, *, filter: Optional[FieldFilter] = None) -> "MarkdownQuery":
+        flt = filter or FieldFilter(field_path, op_string, value)
+        return self._copy(_filters=self._filters + (flt,))
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> "MarkdownQuery":
+        if direction not in (ASCENDING, DESCENDING):
+            raise ValueError(f"Dirección no soportada: {direction}")
+        return self._copy(_orders=self._orders + ((field_path, direction),))
+
+    def select(self, field_paths: List[str]) -> "MarkdownQuery":
+        """Proyección: los snapshots solo llevan estos campos."""
+        return self._copy(_fields=tuple(field_paths))
+
+    def limit(self, count: int) -> "MarkdownQuery":
+        return self._copy(_limit=count)
+
+    def offset(self, num_to_skip: int) -> "MarkdownQuery":
+        return self._copy(_offset=num_to_skip)
+
+    def start_after(self, document_fields_or_snapshot: Any) -> "MarkdownQuery":
+        """Cursor: snapshot, dict de campos o lista de valores de order_by."""
+        return self._copy(_cursor=document_fields_or_snapshot)
+
+    def get(self) -> List[MarkdownSnapshot]:
+        return list(self.stream())
+
+    def stream(self) -> Iterator[MarkdownSnapshot]:
+        fin = self._offset + self._limit if self._limit is not None else None
+        if self._orders:
+            docs = self._ordenados()
+        else:
+            # Sin filtros cada id es un resultado: basta con los `fin` primeros
+            docs = self._scan(self._cursor_id(), fin if not self._filters else None)
+        docs = itertools.islice(docs, self._offset, fin)
+        if self._fields is None:
+            yield from docs
             return
-        docs = []
-        for f in sorted(self.path.glob("*.md")):
-            doc_id = f.stem
-            data = _read_frontmatter(f)
-            if data is not None:
-                ref = MarkdownDocument(f, doc_id)
-                docs.append(MarkdownSnapshot(doc_id, ref, data))
-        if self._order_field and docs:
-            docs.sort(key=lambda s: s.to_dict().get(self._order_field, 0))
-        yield from docs
+        for snap in docs:
+            yield MarkdownSnapshot(snap.id, snap.reference, _proyectar(snap._data, self._fields))
+
+    # ── Agregaciones ────────────────────────────
+    #
+    # A diferencia de Firestore (AggregationQuery) devuelven el valor directamente.
+    # Sin limit/offset/cursor y con filtros cubiertos por índices se responden
+    # desde el índice; si no, con una pasada que solo parsea los campos usados.
+
+    def count(self) -> int:
+        """Número de documentos que cumplen la consulta."""
+        ids = self._ids_exactos()
+        if ids is not None:
+            return len(ids)
+        return sum(1 for _ in self.select([])._agregables())
+
+    def sum(self, field_path: str) -> Any:
+        """Suma de los valores numéricos del campo (los demás se ignoran)."""
+        return sum(
+            (valor * n for valor, n in self._valores(field_path) if _es_numero(valor)), 0
+        )
+
+    def avg(self, field_path: str) -> Optional[float]:
+        """Media de los valores numéricos del campo, o None si no hay ninguno."""
+        total = cuenta = 0
+        for valor, n in self._valores(field_path):
+            if _es_numero(valor):
+                total += valor * n
+                cuenta += n
+        return total / cuenta if cuenta else None
+
+    def group_count(self, field_path: str) -> Dict[Any, int]:
+        """
+        Documentos por valor del campo. En campos lista cada elemento distinto
+        cuenta una vez por documento; los documentos sin el campo no cuentan.
+        """
+        conteo: Dict[Any, int] = {}
+        for valor, n in self._valores(field_path):
+            for clave in _claves_grupo(valor):
+                conteo[clave] = conteo.get(clave, 0) + n
+        return conteo
+
+    def _ids_exactos(self) -> Optional[set]:
+        """Ids del resultado si se conocen sin leer notas, o None."""
+        if self._limit is not None or self._offset or self._cursor is not None:
+            return None
+        if not self._filters:
+            return set(self._collection._ids())
+        indice = self._collection._indice()
+        if indice is None:
+            return None
+        ids: Optional[set] = None
+        for flt in self._filters:
+            if flt.field_path == DOCUMENT_ID:
+                return None
+            found = indice.lookup(flt.field_path, flt.op_string, flt.value)
+            if found is None:
+                return None
+            ids = found if ids is None else ids & found
+        return ids
+
+    def _agregables(self, requeridos: Tuple[str, ...] = ()) -> Iterator[MarkdownSnapshot]:
+        """Documentos a agregar; sin limit, offset ni cursor el orden no importa."""
+        if self._limit is None and not self._offset and self._cursor is None:
+            return self._leer(self._collection._iter_ids(self._filters, ordenado=False), requeridos)
+        return self.stream()
+
+    def _valores(self, field_path: str) -> Iterator[Tuple[Any, int]]:
+        """Pares (valor, documentos) del campo en el resultado de la consulta."""
+        ids = self._ids_exactos()
+        indice = self._collection._indice() if ids is not None else None
+        grupos = indice.grupos(field_path) if indice is not None else None
+        consulta = self.select([field_path])
+        # Una nota sin la clave en el texto no aporta valores: se omite sin YAML
+        raiz = field_path.split(".")[0]
+        requeridos = (f"{raiz}:",) if _LITERAL_BUSCABLE.fullmatch(raiz) else ()
+        if grupos is None:
+            for snap in consulta._agregables(requeridos):
+                valor = _get_field(snap._data, field_path)
+                if valor is not _MISSING:
+                    yield valor, 1
+            return
+        for valor, del_grupo in grupos:
+            comunes = del_grupo & ids
+            if comunes:
+                ids -= comunes
+                yield valor, len(comunes)
+        # Quedan las notas sin valor escalar indexado: listas, mapas o sin el campo
+        for snap in consulta._leer(sorted(ids), requeridos):
+            valor = _get_field(snap._data, field_path)
+            if valor is not _MISSING:
+                yield valor, 1
+
+    # ── Ejecución ───────────────────────────────
+
+    def _scan(self, desde_id: Optional[str] = None, limite: Optional[int] = None,
+              ordenado: bool = True) -> Iterator[MarkdownSnapshot]:
+        """Documentos que cumplen los filtros (en orden de id si `ordenado`)."""
+        return self._leer(self._collection._iter_ids(self._filters, desde_id, limite, ordenado))
+
+    def _leer(self, ids: Iterable[str], requeridos: Tuple[str, ...] = ()) -> Iterator[MarkdownSnapshot]:
+        """
+        Snapshots de los ids que cumplen los filtros, en el mismo orden.
+        Las notas cuyo texto no contiene algún literal de `requeridos` se omiten.
+        """
+        literales = requeridos + tuple(lit for lit in (f.literal() for f in self._filters) if lit)
+        coleccion = self._collection
+        for doc_id, data in coleccion._cargar(ids, literales, self._campos_necesarios()):
+            if data is None:
+                continue
+            if all(f.matches(doc_id, data) for f in self._filters):
+                yield MarkdownSnapshot(doc_id, coleccion.document(doc_id), data)
+
+    def _campos_necesarios(self) -> Optional[frozenset]:
+        """Claves de primer nivel que hay que parsear (None = todas)."""
+        if self._fields is None:
+            return None
+        rutas = self._fields + tuple(f for f, _ in self._orders) + tuple(
+            f.field_path for f in self._filters if f.field_path != DOCUMENT_ID
+        )
+        return frozenset(ruta.split(".")[0] for ruta in rutas)
+
+    def _clave(self, doc_id: str, data: dict) -> tuple:
+        """Clave de orden completa; se calcula una vez por documento."""
+        clave = tuple(_sentido(_orden_valor(_get_field(data, f)), d) for f, d in self._orders)
+        return clave + (_sentido((1, doc_id), self._orders[-1][1]),)
+
+    def _ordenados(self) -> Iterator[MarkdownSnapshot]:
+        """
+        Documentos en el orden pedido. El cursor se aplica durante el escaneo;
+        con limit solo se conservan los offset+limit primeros en un heap, así
+        la memoria no crece con la colección.
+        """
+        if self._limit is not None:
+            indice = self._collection._indice()
+            grupos = indice.grupos(self._orders[0][0]) if indice is not None else None
+            if grupos is not None:
+                yield from self._ordenados_por_indice(grupos)
+                return
+        cursor = self._cursor_clave()
+        # El orden final lo da la clave: el directorio se recorre tal cual
+        candidatos = ((self._clave(s.id, s._data), s) for s in self._scan(ordenado=False))
+        if cursor is not None:
+            candidatos = (par for par in candidatos if par[0][:len(cursor)] > cursor)
+        if self._limit is not None:
+            docs = heapq.nsmallest(self._offset + self._limit, candidatos, key=lambda par: par[0])
+        else:
+            docs = sorted(candidatos, key=lambda par: par[0])
+        for _, snap in docs:
+            yield snap
+
+    def _ordenados_por_indice(self, grupos: List[Tuple[Any, set]]) -> Iterator[MarkdownSnapshot]:
+        """
+        Orden servido por el índice del primer campo: se recorren sus valores
+        en orden y solo se leen las notas de cada grupo hasta completar el
+        limit. Las notas sin ese campo en el índice se leen todas al inicio.
+        """
+        campo, direccion = self._orders[0]
+        permitidos = self._collection._candidatos(self._filters)
+        todos = permitidos if permitidos is not None else set(self._collection._ids(self._filters))
+        cursor = self._cursor_clave()
+        pendientes: list = []
+
+        def cargar(ids):
+            for snap in self._leer(sorted(ids)):
+                clave = self._clave(snap.id, snap._data)
+                if cursor is None or clave[:len(cursor)] > cursor:
+                    heapq.heappush(pendientes, (clave, snap))
+
+        cargar(todos - set().union(*(ids for _, ids in grupos)))
+        orden = sorted(
+            ((_sentido(_orden_valor(valor), direccion), ids) for valor, ids in grupos),
+            key=lambda grupo: grupo[0],
+        )
+        for primera, ids in orden:
+            # Todo lo pendiente por delante de este grupo ya está en su sitio
+            while pendientes and pendientes[0][0][0] < primera:
+                yield heapq.heappop(pendientes)[1]
+            if cursor is not None and primera < cursor[0]:
+                continue
+            cargar(ids & todos)
+        while pendientes:
+            yield heapq.heappop(pendientes)[1]
+
+    def _cursor_id(self) -> Optional[str]:
+        """Sin order_by el cursor solo puede referirse al id del documento."""
+        cursor = self._cursor
+        if cursor is None:
+            return None
+        if isinstance(cursor, MarkdownSnapshot):
+            return cursor.id
+        if isinstance(cursor, dict):
+            return cursor.get(DOCUMENT_ID)
+        return cursor[0] if cursor else None
+
+    def _cursor_clave(self) -> Optional[tuple]:
+        cursor = self._cursor
+        if cursor is None:
+            return None
+        if isinstance(cursor, MarkdownSnapshot):
+            return self._clave(cursor.id, cursor._data or {})
+        if isinstance(cursor, dict):
+            return tuple(_sentido(_orden_valor(_get_field(cursor, f)), d) for f, d in self._orders)
+        return tuple(_sentido(_orden_valor(v), d) for v, (_, d) in zip(cursor, self._orders))
 
 
 class MarkdownDB:
@@ -176,24 +2065,116 @@ class MarkdownDB:
     def __init__(self, base_path: Path):
         self.base_path = base_path
         self.base_path.mkdir(parents=True, exist_ok=True)
+        self.cache = _document_cache
+        if not _diarios_activos:
+            # Escrituras que quedaron en un diario (corte, o el diario se desactivó)
+            compactar_diarios(self.base_path)
 
     def collection(self, name: str) -> MarkdownCollection:
         return MarkdownCollection(self.base_path / name)
 
+    def batch(self, fsync: Optional[bool] = None) -> WriteBatch:
+        return WriteBatch(fsync)
+
+    def transaction(self, max_attempts: int = 5) -> Transaction:
+        return Transaction(max_attempts)
+
+    def get_all(self, references: Iterable[MarkdownDocument], field_paths: Optional[Iterable[str]] = None,
+                transaction: Optional[Transaction] = None) -> List[MarkdownSnapshot]:
+        """
+        Equivalente a firestore.Client.get_all: snapshots de varios documentos
+        (de cualquier colección) en el orden pedido, leyendo una sola vez los
+        repetidos. Con `transaction` las lecturas quedan versionadas en ella.
+        """
+        references = list(references)
+        if transaction is not None:
+            transaction._registrar_lecturas(references)
+        return _get_all(references, field_paths)
+
+    def reconstruir_indices(self) -> Dict[str, int]:
+        """Reconstruir los índices secundarios tras ediciones manuales en Obsidian."""
+        return {
+            nombre: _indice_de(self.base_path / nombre).rebuild()
+            for nombre in DATOS_INDICES
+        }
+
+    def emparejamiento(self) -> IndiceEmparejamiento:
+        """Índice de horarios de la colección de estudiantes (datos/_emparejamiento.jsonl)."""
+        return _emparejamiento_de(self.base_path / COLECCION_EMPAREJAMIENTO)
+
+    def guardar_instantaneas(self) -> int:
+        """Escribir ya las instantáneas pendientes (también se hace al salir)."""
+        return guardar_instantaneas()
+
+    def reconciliar_estadisticas(self) -> Dict[str, bool]:
+        """Recalcular las estadísticas desde las notas. True donde había desviación."""
+        return {
+            nombre: _estadisticas_de(self.base_path / nombre).reconciliar()
+            for nombre in DATOS_ESTADISTICAS
+        }
+
+    def compactar_diarios(self) -> Dict[str, int]:
+        """Volcar a las notas los diarios de escrituras pendientes (también se hace al salir)."""
+        return compactar_diarios(self.base_path)
+
+    def particionar(self, nombre: str, esquema: str, campo: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Reorganizar las notas de una colección en subcarpetas ('fecha' o
+        'hash') o volver a la carpeta plana ('plano'). Ejecutar sin otros
+        procesos escribiendo en la colección.
+        """
+        col_path = self.base_path / nombre
+        compactar_diarios(self.base_path)
+        with _bloquear_carpetas([col_path]), \
+                _bloquear_carpetas([col_path], ARCHIVO_BLOQUEO_ESTADISTICAS):
+            resultado = reorganizar(col_path, Particionado(esquema, campo))
+            # Las rutas cambiaron: la caché se indexa por ruta
+            _document_cache.clear()
+            _colecciones_de.clear()
+            particionado = _particionado_de(col_path)
+            if particionado.esquema == "fecha":
+                campos = frozenset({particionado.campo})
+                particionado.poda = all(
+                    particionado.coherente(path.stem, _load_frontmatter(path, campos=campos))
+                    for path in _notas_de(col_path)
+                )
+                particionado.guardar(col_path)
+                resultado["poda"] = particionado.poda
+        return resultado
+
     def collections(self) -> List[MarkdownCollection]:
         if not self.base_path.exists():
             return []
         return [
             MarkdownCollection(p)
             for p in sorted(self.base_path.iterdir())
-            if p.is_dir() and not p.name.startswith("_")
+            if p.is_dir() and not p.name.startswith(("_", "."))
         ]
 
 
+BACKENDS = ("markdown", "sqlite")
+
+
+def abrir_base(datos_path: Path):
+    """MarkdownDB sobre `datos_path` o SqliteDB, según DATOS_BACKEND."""
+    config = get_config()
+    if config.DATOS_BACKEND not in BACKENDS:
+        raise ValueError(f"DATOS_BACKEND no soportado: {config.DATOS_BACKEND} (usar {', '.join(BACKENDS)})")
+    if config.DATOS_BACKEND == "sqlite":
+        # Importación diferida: sqlite_db importa este módulo
+        from .sqlite_db import ARCHIVO_SQLITE, SqliteDB
+        return SqliteDB(Path(config.DATOS_SQLITE) if config.DATOS_SQLITE else datos_path / ARCHIVO_SQLITE)
+    return MarkdownDB(datos_path)
+
+
 # ──────────────────────────────────────────────
 #  ObsidianManager — reemplazo directo de FirebaseManager
 # ──────────────────────────────────────────────
 
+# Campos que entrega obtener_todos_estudiantes (materias y calificaciones no se parsean)
+CAMPOS_RESUMEN_ESTUDIANTE = ["nome", "cognome", "email", "ultima_actualizacion",
+                             "estado_horarios", "horario"]
+
 class ObsidianManager:
     """
     Gestor de datos usando archivos Markdown estilo Obsidian.
@@ -202,14 +2183,23 @@ class ObsidianManager:
 
     def __init__(self, datos_path: Optional[str] = None):
         self.datos_path = Path(datos_path or os.getenv("DATOS_PATH", "datos"))
-        self.db = MarkdownDB(self.datos_path)
+        self.db = abrir_base(self.datos_path)
+        # Con SQLite las notas .md no existen: todo pasa por la API de colecciones
+        self._markdown = isinstance(self.db, MarkdownDB)
+        if self._markdown:
+            iniciar_verificador(self.datos_path, get_config().DATOS_VERIFICAR_ESTADISTICAS)
         self.logger = logging.getLogger("obsidian_manager")
-        self.logger.info(f"ObsidianManager inicializado: {self.datos_path}")
+        self.logger.info(f"ObsidianManager inicializado: {self.datos_path} "
+                         f"(backend: {get_config().DATOS_BACKEND}, YAML: {YAML_BACKEND})")
 
     def get_client(self) -> MarkdownDB:
-        """Retorna el cliente MarkdownDB (equivalente a Firestore client)."""
+        """Retorna el cliente MarkdownDB o SqliteDB (equivalente a Firestore client)."""
         return self.db
 
+    def emparejamiento(self) -> IndiceEmparejamiento:
+        """Índice de horarios (casilla → matrículas) que mantienen las escrituras en estudiantes."""
+        return self.db.emparejamiento()
+
     def test_connection(self) -> bool:
         """Verificar que la carpeta de datos es accesible."""
         try:
@@ -251,9 +2241,23 @@ class ObsidianManager:
                 "calificaciones": calificaciones,
             }
 
-            body = self._generar_cuerpo_estudiante(doc_data)
-            path = self.datos_path / "estudiantes" / f"{matricola}.md"
-            _write_md(path, doc_data, body)
+            # Una reextracción con los mismos datos no reescribe la nota ni su cuerpo
+            ref = self.db.collection("estudiantes").document(matricola)
+            actual = ref.get()
+            if actual.exists and solo_cambian_marcas(actual.to_dict(), doc_data):
+                self.logger.info(f"Estudiante {matricola} sin cambios")
+                return {
+                    "success": True,
+                    "message": f"Sin cambios para {matricola}",
+                    "sin_cambios": True,
+                    "timestamp": datetime.now().isoformat(),
+                }
+
+            if self._markdown:
+                body = self._generar_cuerpo_estudiante(doc_data)
+                _write_md(ref.path, doc_data, body)
+            else:
+                ref.set(doc_data)
 
             self.logger.info(f"Estudiante {matricola} guardado exitosamente")
             return {
@@ -272,7 +2276,10 @@ class ObsidianManager:
     def obtener_estudiante(self, matricola: str) -> Optional[dict]:
         """Leer datos de un estudiante desde su archivo .md"""
         try:
-            path = self.datos_path / "estudiantes" / f"{matricola}.md"
+            if not self._markdown:
+                snap = self.db.collection("estudiantes").document(matricola).get()
+                return snap.to_dict() if snap.exists else None
+            path = self.db.collection("estudiantes").document(matricola).path
             return _read_frontmatter(path)
         except Exception as e:
             self.logger.error(f"Error obteniendo estudiante {matricola}: {e}")
@@ -283,25 +2290,21 @@ class ObsidianManager:
         try:
             self.logger.info("Obteniendo datos de todos los estudiantes")
             estudiantes: Dict[str, dict] = {}
-            est_dir = self.datos_path / "estudiantes"
-            if not est_dir.exists():
-                return {}
-
-            for f in sorted(est_dir.glob("*.md")):
-                matricola = f.stem
-                data = _read_frontmatter(f)
-                if not data or "nome" not in data:
-                    self.logger.warning(f"Estudiante {matricola} sin datos básicos — omitido")
+            consulta = self.db.collection("estudiantes").select(CAMPOS_RESUMEN_ESTUDIANTE)
+
+            for snap in consulta.stream():
+                data = snap.to_dict()
+                if "nome" not in data:
+                    self.logger.warning(f"Estudiante {snap.id} sin datos básicos — omitido")
                     continue
 
-                estudiantes[matricola] = {
-                    "nome": data.get("nome", ""),
-                    "cognome": data.get("cognome", ""),
-                    "email": data.get("email", ""),
-                    "ultima_actualizacion": data.get("ultima_actualizacion"),
-                    "estado_horarios": data.get("estado_horarios", "no_disponible"),
-                    "horario": data.get("horario", []),
-                }
+                data.setdefault("nome", "")
+                data.setdefault("cognome", "")
+                data.setdefault("email", "")
+                data.setdefault("ultima_actualizacion", None)
+                data.setdefault("estado_horarios", "no_disponible")
+                data.setdefault("horario", [])
+                estudiantes[snap.id] = data
 
             self.logger.info(f"Obtenidos datos de {len(estudiantes)} estudiantes")
             return estudiantes
@@ -312,9 +2315,15 @@ class ObsidianManager:
     def eliminar_estudiante(self, matricola: str) -> bool:
         """Eliminar el archivo .md de un estudiante."""
         try:
-            path = self.datos_path / "estudiantes" / f"{matricola}.md"
-            if path.exists():
-                path.unlink()
+            if not self._markdown:
+                ref = self.db.collection("estudiantes").document(matricola)
+                if not ref.get().exists:
+                    return False
+                ref.delete()
+                self.logger.info(f"Estudiante {matricola} eliminado")
+                return True
+            path = self.db.collection("estudiantes").document(matricola).path
+            if _remove_md(path):
                 self.logger.info(f"Estudiante {matricola} eliminado")
                 return True
             return False
@@ -327,20 +2336,15 @@ class ObsidianManager:
         try:
             total_docs = 0
             colecciones = 0
-            for d in self.datos_path.iterdir():
-                if d.is_dir() and not d.name.startswith('.'):
-                    colecciones += 1
-                    total_docs += sum(1 for _ in d.glob("*.md"))
-
-            est_dir = self.datos_path / "estudiantes"
-            total_est = 0
-            con_horarios = 0
-            if est_dir.exists():
-                for f in est_dir.glob("*.md"):
-                    total_est += 1
-                    data = _read_frontmatter(f)
-                    if data and data.get("horario"):
-                        con_horarios += 1
+            for col in self.db.collections():
+                colecciones += 1
+                # Las colecciones con _stats no se recorren
+                stats = col.estadisticas()
+                total_docs += stats["total"] if stats is not None else col.count()
+
+            estudiantes = self.db.collection("estudiantes").estadisticas()
+            total_est = estudiantes["total"]
+            con_horarios = estudiantes["no_vacios"].get("horario", 0)
 
             return {
                 "total_colecciones": colecciones,
@@ -397,8 +2401,34 @@ class ObsidianManager:
         return "\n".join(lines)
 
 
+# ── Diagnóstico ─────────────────────────────
+
+def capacidades_almacenamiento() -> Dict[str, Any]:
+    """Motores activos de la capa de almacenamiento (para el informe de arranque)."""
+    config = get_config()
+    return {
+        "backend": (
+            f"SQLite (WAL) — {config.DATOS_SQLITE or Path(config.DATOS_PATH) / 'pug.sqlite3'}"
+            if config.DATOS_BACKEND == "sqlite" else f"Markdown — {config.DATOS_PATH}"
+        ),
+        "yaml": "libyaml (C)" if YAML_BACKEND == "libyaml" else "PyYAML puro (sin libyaml)",
+        "cache_mb": _document_cache.max_bytes // (1024 * 1024),
+        "fsync": _fsync_policy,
+        "arranque": "instantánea binaria" if _instantaneas_activas else "sin instantánea",
+        "contadores": (
+            f"reconciliación cada {config.DATOS_VERIFICAR_ESTADISTICAS} s"
+            if config.DATOS_VERIFICAR_ESTADISTICAS > 0 else "sin reconciliación periódica"
+        ),
+        "lectura": (
+            f"{_lectura['hilos']} hilos, lotes de {_lectura['lote']}"
+            + (", YAML en procesos" if _lectura["procesos"] else "")
+            if _lectura["hilos"] > 1 else "secuencial"
+        ),
+    }
+
+
 # ── Funciones de compatibilidad ─────────────
 
 def inicializar_datos():
-    """Inicializar el almacenamiento local. Retorna MarkdownDB."""
+    """Inicializar el almacenamiento local. Retorna MarkdownDB o SqliteDB."""
     return ObsidianManager().get_client()
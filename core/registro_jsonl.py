@@ -0,0 +1,187 @@
+"""
+RegistroJsonl - Base de los índices persistidos como registro JSON de solo-anexado
+Un registro es una línea de cabecera ({"version": ...}) y una línea
+{"id": ..., "e": ...} por cambio; la última línea de cada id manda y
+"e": null lo elimina. Lo usan _indices.jsonl (markdown_index) y
+_emparejamiento.jsonl (indice_emparejamiento).
+
+Varios procesos comparten el archivo: anexar y compactar se hacen con un
+bloqueo entre procesos (`bloquear`) y después de incorporar lo que otros
+anexaron, así que la compactación nunca pierde líneas ajenas. Las lecturas
+no bloquean: incorporan las líneas completas nuevas y, si la cabecera
+cambió (otro proceso compactó; lleva una marca propia de cada escritura
+porque el inodo puede reutilizarse), releen el archivo entero.
+"""
+
+import json
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Compactar cuando el registro supera este múltiplo de los documentos vivos
+_FACTOR_COMPACTACION = 2
+_MIN_LINEAS_COMPACTACION = 1000
+
+
+class RegistroJsonl:
+    """
+    Estado id → entrada reconstruido desde un registro JSONL. Las subclases
+    definen la cabecera, cómo se aplica cada entrada a sus estructuras y de
+    dónde se reconstruye el estado (`_cargar`).
+    """
+
+    def __init__(self, archivo: Path, bloquear: Callable[[], ContextManager]):
+        self._file = archivo
+        self._bloquear = bloquear
+        self._docs: Dict[str, Any] = {}
+        # Posición leída del registro y cabecera del archivo al que corresponde
+        self._offset = 0
+        self._marca: Optional[bytes] = None
+        self._lineas = 0
+        self._lock = threading.RLock()
+        # Este hilo ya tiene el bloqueo entre procesos (flock no es reentrante)
+        self._bloqueado = False
+
+    # ── A definir por cada registro ─────────────
+
+    def _cabecera(self) -> dict:
+        raise NotImplementedError
+
+    def _comprobar_cabecera(self, registro: dict):
+        """Lanzar ValueError si la cabecera no corresponde a este registro."""
+        raise NotImplementedError
+
+    def _cargar(self):
+        """Aplicar (con _aplicar) el estado actual leído de la fuente de datos."""
+        raise NotImplementedError
+
+    def _decodificar(self, entrada: Any) -> Any:
+        """Entrada tal como se usa en memoria a partir de su JSON."""
+        return entrada
+
+    def _vaciar(self):
+        self._docs = {}
+
+    def _aplicar(self, doc_id: str, entrada: Any):
+        if entrada is None:
+            self._docs.pop(doc_id, None)
+        else:
+            self._docs[doc_id] = entrada
+
+    # ── Operaciones ─────────────────────────────
+
+    def _reconstruir(self) -> int:
+        """Rehacer el estado desde la fuente y reescribir el registro. Retorna documentos."""
+        with self._exclusivo():
+            self._vaciar()
+            self._cargar()
+            self._volcar()
+            return len(self._docs)
+
+    def _registrar(self, doc_id: str, entrada: Any):
+        """Aplicar y anexar el nuevo estado de un documento (nada si no cambia)."""
+        with self._exclusivo():
+            self._refresh()
+            if self._docs.get(doc_id) == entrada:
+                return
+            self._aplicar(doc_id, entrada)
+            self._anexar(json.dumps({"id": doc_id, "e": entrada}, ensure_ascii=False) + "\n")
+            if self._lineas > max(_MIN_LINEAS_COMPACTACION, _FACTOR_COMPACTACION * len(self._docs)):
+                self._volcar()
+
+    def _compactar(self):
+        """Reescribir el registro con una línea por documento vivo."""
+        with self._exclusivo():
+            self._refresh()
+            self._volcar()
+
+    def _refresh(self):
+        """Leer lo que otros procesos anexaron; reconstruir si falta o es inválido."""
+        try:
+            fh = open(self._file, "rb")
+        except FileNotFoundError:
+            self._reconstruir()
+            return
+        with fh:
+            # Cabecera y tamaño del archivo abierto (no del nombre, que otro proceso puede reemplazar)
+            cabecera = fh.readline()
+            tamano = os.fstat(fh.fileno()).st_size
+            if cabecera != self._marca or tamano < self._offset:
+                # Archivo nuevo o compactado por otro proceso: lectura completa
+                self._vaciar()
+                self._offset = 0
+                self._lineas = 0
+                self._marca = cabecera
+            if tamano == self._offset:
+                return
+            try:
+                fh.seek(self._offset)
+                nuevo = fh.read()
+                # Una línea a medio escribir por otro proceso se lee la próxima vez
+                completo = nuevo[:nuevo.rfind(b"\n") + 1]
+                for raw in completo.splitlines():
+                    registro = json.loads(raw)
+                    if "version" in registro:
+                        self._comprobar_cabecera(registro)
+                        continue
+                    self._aplicar(registro["id"], self._decodificar(registro["e"]))
+                    self._lineas += 1
+                self._offset += len(completo)
+                return
+            except (ValueError, KeyError, TypeError, IndexError, OSError) as e:
+                logger.warning(f"Registro {self._file} inválido ({e}) — reconstruyendo")
+        self._reconstruir()
+
+    # ── Con el bloqueo tomado ───────────────────
+
+    @contextmanager
+    def _exclusivo(self):
+        """Bloqueo del hilo y, si este hilo aún no lo tiene, el bloqueo entre procesos."""
+        with self._lock:
+            if self._bloqueado:
+                yield
+                return
+            with self._bloquear():
+                self._bloqueado = True
+                try:
+                    yield
+                finally:
+                    self._bloqueado = False
+
+    def _anexar(self, linea: str):
+        contenido = linea.encode("utf-8")
+        fd = os.open(self._file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size > self._offset:
+                # Cola de una escritura interrumpida: se descarta
+                os.ftruncate(fd, self._offset)
+            escrito = 0
+            while escrito < len(contenido):
+                escrito += os.write(fd, contenido[escrito:])
+        finally:
+            os.close(fd)
+        # Nadie más escribe mientras se tiene el bloqueo: la línea propia ya está aplicada
+        self._offset += len(contenido)
+        self._lineas += 1
+
+    def _volcar(self):
+        """Escribir el estado en memoria como registro nuevo (tras _refresh o _cargar)."""
+        self._file.parent.mkdir(parents=True, exist_ok=True)
+        lineas = [json.dumps(dict(self._cabecera(), marca=uuid.uuid4().hex))]
+        lineas += [
+            json.dumps({"id": doc_id, "e": entrada}, ensure_ascii=False)
+            for doc_id, entrada in self._docs.items()
+        ]
+        contenido = ("\n".join(lineas) + "\n").encode("utf-8")
+        tmp = self._file.with_name(f"{self._file.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(contenido)
+        os.replace(tmp, self._file)
+        self._marca = lineas[0].encode("utf-8") + b"\n"
+        self._offset = len(contenido)
+        self._lineas = len(self._docs)
@@ -0,0 +1,763 @@
+"""
+SqliteDB - Backend SQLite con la misma API que MarkdownDB
+Cada colección es una tabla con el documento serializado en JSON; los campos
+de DATOS_INDICES se exponen como columnas generadas con índice, de modo que
+las igualdades y las ordenaciones sobre ellos no recorren la tabla.
+Los filtros sobre esas columnas y sobre el id se traducen a WHERE, y el
+orden por id y el límite a ORDER BY / LIMIT; los demás se evalúan en Python.
+
+La base usa WAL: los lectores no bloquean al escritor ni entre sí, y varios
+procesos pueden compartir el archivo. Las consultas reutilizan MarkdownQuery,
+así que filtros, orden, cursores, select y agregaciones se comportan igual
+que sobre la bóveda Markdown.
+
+Se elige con DATOS_BACKEND=sqlite. scripts/migrar_backend.py copia los datos
+entre la bóveda Markdown y la base SQLite en ambos sentidos.
+
+Los commits que escriben en la tabla de estudiantes actualizan el índice de
+emparejamiento de la base (ver indice_emparejamiento), guardado junto al
+archivo con las versiones de las filas.
+
+Estructura en disco:
+    datos/
+        pug.sqlite3            tabla "carros"          (id, data, version, f_placa, f_estado)
+                               tabla "estudiantes/172934/horarios"   (subcolección)
+        pug_emparejamiento.jsonl
+"""
+
+import json
+import logging
+import random
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from utils.constants import DATOS_ESTADISTICAS, DATOS_INDICES
+from . import obsidian_manager as _markdown
+from .indice_emparejamiento import ARCHIVO_EMPAREJAMIENTO, COLECCION_EMPAREJAMIENTO, IndiceEmparejamiento
+from .markdown_index import _clave
+from .obsidian_manager import (
+    DOCUMENT_ID, ConflictoTransaccion, FieldFilter, MarkdownCollection, MarkdownDB, MarkdownSnapshot,
+    ObsidianManager, _es_numero, _huella, _proyectar, _resolve_timestamps,
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_SQLITE = "pug.sqlite3"
+
+# Ids por consulta al cargar documentos (muy por debajo del límite de parámetros)
+_LOTE_IDS = 500
+
+# synchronous de SQLite para cada política de DATOS_FSYNC (en WAL, NORMAL no
+# sincroniza en cada commit y FULL sí)
+_SINCRONIZACION = {"none": "OFF", "batch": "NORMAL", "always": "FULL"}
+
+
+def _json_default(valor: Any) -> Any:
+    """Tipos que YAML admite y JSON no: fechas como ISO 8601, conjuntos como listas."""
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, (set, frozenset, tuple)):
+        return list(valor)
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def _a_json(data: dict) -> str:
+    return json.dumps(data, ensure_ascii=False, default=_json_default)
+
+
+def _q(nombre: str) -> str:
+    """Identificador SQL entre comillas."""
+    return '"' + nombre.replace('"', '""') + '"'
+
+
+def _ruta_json(campo: str) -> str:
+    return '$."' + campo.replace('"', '\\"') + '"'
+
+
+def _columna(campo: str) -> str:
+    return f"f_{campo}"
+
+
+def _columna_no_vacio(campo: str) -> str:
+    return f"v_{campo}"
+
+
+def _campos_con_columna(tabla: str) -> Tuple[str, ...]:
+    """Campos con columna f_<campo>: los indexados y los desgloses por valor."""
+    nombre = tabla.rsplit("/", 1)[-1]
+    por_valor = DATOS_ESTADISTICAS.get(nombre, {}).get("por_valor", ())
+    return tuple(dict.fromkeys(DATOS_INDICES.get(nombre, ()) + tuple(por_valor)))
+
+
+def _columnas(tabla: str) -> Dict[str, str]:
+    """
+    Columnas generadas (con índice) de una tabla: f_<campo> con la clave JSON
+    de los valores escalares de los campos indexados y de los desgloses de
+    DATOS_ESTADISTICAS (NULL si falta o es lista/mapa), y v_<campo> = 1 si
+    el campo no está vacío según Python. Así ni las consultas ni las
+    estadísticas parsean el JSON de cada fila.
+    """
+    estadisticas = DATOS_ESTADISTICAS.get(tabla.rsplit("/", 1)[-1], {})
+    columnas = {}
+    for campo in _campos_con_columna(tabla):
+        ruta = _ruta_json(campo).replace("'", "''")
+        columnas[_columna(campo)] = (
+            f"CASE WHEN json_type(data, '{ruta}') IN ('array', 'object') THEN NULL "
+            f"ELSE data -> '{ruta}' END"
+        )
+    for campo in estadisticas.get("no_vacios", ()):
+        ruta = _ruta_json(campo).replace("'", "''")
+        columnas[_columna_no_vacio(campo)] = (
+            f"CASE json_type(data, '{ruta}') "
+            f"WHEN 'true' THEN 1 "
+            f"WHEN 'integer' THEN json_extract(data, '{ruta}') != 0 "
+            f"WHEN 'real' THEN json_extract(data, '{ruta}') != 0 "
+            f"WHEN 'text' THEN json_extract(data, '{ruta}') != '' "
+            f"WHEN 'array' THEN json_array_length(data, '{ruta}') > 0 "
+            f"WHEN 'object' THEN data -> '{ruta}' != '{{}}' "
+            f"ELSE 0 END"
+        )
+    return columnas
+
+
+# Comparaciones que se traducen a SQL: en Python un tipo distinto no cumple
+# el filtro, así que se exige el mismo tipo JSON
+_COMPARACIONES = {"<": "<", "<=": "<=", ">": ">", ">=": ">="}
+_TIPOS_TEXTO = "('text')"
+_TIPOS_NUMERO = "('integer', 'real', 'true', 'false')"
+# Enteros que SQLite compara sin perder precisión
+_MAX_ENTERO_EXACTO = 2 ** 53
+
+
+def _condicion(flt: FieldFilter, campos: Tuple[str, ...]) -> Optional[Tuple[str, List[Any]]]:
+    """
+    (SQL, parámetros) que preselecciona las filas que pueden cumplir el
+    filtro, o None si no se traduce. Las igualdades comparan la clave JSON,
+    como _IndiceSqlite.lookup; el filtro se vuelve a evaluar sobre cada
+    documento, así que la condición puede admitir de más pero no de menos.
+    """
+    op, valor = flt.op_string, flt.value
+    if flt.field_path == DOCUMENT_ID:
+        if op == "==":
+            return ("id = ?", [valor]) if isinstance(valor, str) else None
+        if op == "in":
+            return "id IN (SELECT value FROM json_each(?))", [json.dumps([v for v in valor if isinstance(v, str)])]
+        if op in _COMPARACIONES and isinstance(valor, str):
+            return f"id {_COMPARACIONES[op]} ?", [valor]
+        return None
+    if flt.field_path not in campos:
+        return None
+    columna = _q(_columna(flt.field_path))
+    if op in ("==", "!="):
+        clave = _clave(valor)
+        if clave is None:
+            return None
+        if op == "==":
+            return f"{columna} = ?", [clave]
+        # Las listas y mapas tienen la columna a NULL: se comprueban en Python
+        return f"({columna} IS NULL OR {columna} != ?)", [clave]
+    if op == "in":
+        claves = [_clave(v) for v in valor]
+        if any(c is None for c in claves):
+            return None
+        return f"{columna} IN (SELECT value FROM json_each(?))", [json.dumps(claves)]
+    if op in _COMPARACIONES:
+        if isinstance(valor, str):
+            tipos = _TIPOS_TEXTO
+        elif _es_numero(valor) and (isinstance(valor, float) or abs(valor) < _MAX_ENTERO_EXACTO):
+            tipos = _TIPOS_NUMERO
+        else:
+            return None
+        return (f"(json_type({columna}) IN {tipos} AND {columna} ->> '$' {_COMPARACIONES[op]} ?)",
+                [valor])
+    return None
+
+
+def _nueva_version() -> int:
+    # Como el inodo nuevo de cada nota: borrar y recrear un documento no
+    # devuelve una versión ya vista por una transacción
+    return random.getrandbits(62)
+
+
+class _IndiceSqlite:
+    """
+    Adaptador con la interfaz de CollectionIndex (lookup / grupos) sobre las
+    columnas generadas de la tabla. Las claves son el JSON del valor, como en
+    _indices.jsonl; listas y mapas no se indexan.
+    """
+
+    def __init__(self, coleccion: "SqliteCollection", campos: Tuple[str, ...]):
+        self._coleccion = coleccion
+        self.campos = tuple(campos)
+
+    def lookup(self, campo: str, op_string: str, valor: Any) -> Optional[Set[str]]:
+        if campo not in self.campos:
+            return None
+        if op_string == "==":
+            valores: Iterable[Any] = (valor,)
+        elif op_string == "in":
+            valores = valor
+        else:
+            return None
+        claves = [_clave(v) for v in valores]
+        if any(c is None for c in claves):
+            return None
+        if not claves:
+            return set()
+        marcas = ",".join("?" * len(claves))
+        filas = self._coleccion._consultar(
+            f"SELECT id FROM {{t}} WHERE {_q(_columna(campo))} IN ({marcas})", claves)
+        return {doc_id for doc_id, in filas}
+
+    def grupos(self, campo: str) -> Optional[List[Tuple[Any, Set[str]]]]:
+        if campo not in self.campos:
+            return None
+        por_clave: Dict[str, Set[str]] = {}
+        columna = _q(_columna(campo))
+        filas = self._coleccion._consultar(f"SELECT {columna}, id FROM {{t}} WHERE {columna} IS NOT NULL")
+        for clave, doc_id in filas:
+            por_clave.setdefault(clave, set()).add(doc_id)
+        return [(json.loads(clave), ids) for clave, ids in por_clave.items()]
+
+
+class SqliteDocument:
+    """Equivalente a firestore.DocumentReference sobre una fila de la tabla."""
+
+    def __init__(self, collection: "SqliteCollection", doc_id: str):
+        self._collection = collection
+        self.id = doc_id
+
+    @property
+    def reference(self) -> "SqliteDocument":
+        return self
+
+    @property
+    def _clave(self) -> Tuple[str, str]:
+        return self._collection.nombre, self.id
+
+    def get(self) -> MarkdownSnapshot:
+        data, _ = self._collection._db._leer_fila(self._clave)
+        return MarkdownSnapshot(self.id, self, data)
+
+    def set(self, data: dict, merge: bool = False):
+        batch = self._collection._db._batch_individual()
+        batch.set(self, data, merge)
+        batch.commit()
+
+    def update(self, data: dict):
+        batch = self._collection._db._batch_individual()
+        batch.update(self, data)
+        batch.commit()
+
+    def delete(self):
+        batch = self._collection._db._batch_individual()
+        batch.delete(self)
+        batch.commit()
+
+    def collection(self, name: str) -> "SqliteCollection":
+        """Subcolección: tabla "<colección>/<doc_id>/<name>"."""
+        return SqliteCollection(self._collection._db, f"{self._collection.nombre}/{self.id}/{name}")
+
+    def collections(self) -> List["SqliteCollection"]:
+        """Subcolecciones existentes del documento."""
+        prefijo = f"{self._collection.nombre}/{self.id}/"
+        return [
+            SqliteCollection(self._collection._db, tabla)
+            for tabla in self._collection._db._tablas_existentes()
+            if tabla.startswith(prefijo) and "/" not in tabla[len(prefijo):]
+        ]
+
+    def _body(self) -> str:
+        # Sin cuerpo Markdown: el exportador lo regenera para los estudiantes
+        return ""
+
+
+class SqliteCollection(MarkdownCollection):
+    """
+    Equivalente a firestore.CollectionReference sobre una tabla. Hereda las
+    consultas de MarkdownCollection y solo cambia el acceso al almacenamiento.
+    """
+
+    def __init__(self, db: "SqliteDB", nombre: str):
+        self._db = db
+        self.nombre = nombre
+        campos = DATOS_INDICES.get(self.id)
+        self._indice_sql = _IndiceSqlite(self, campos) if campos else None
+        self._campos_sql = _campos_con_columna(nombre)
+
+    @property
+    def id(self) -> str:
+        return self.nombre.rsplit("/", 1)[-1]
+
+    def document(self, doc_id: str) -> SqliteDocument:
+        return SqliteDocument(self, doc_id)
+
+    def estadisticas(self) -> Optional[dict]:
+        """
+        Mismo formato que el documento _stats de la bóveda (total, por_valor,
+        no_vacios), calculado sobre los índices de las columnas generadas.
+        """
+        config = DATOS_ESTADISTICAS.get(self.id)
+        if not config:
+            return None
+        contadores: Dict[str, Any] = {"total": 0, "por_valor": {}, "no_vacios": {}}
+        if not self._db._existe(self.nombre):
+            return contadores
+        contadores["total"] = self._consultar("SELECT count(*) FROM {t}")[0][0]
+        for campo in config.get("por_valor", ()):
+            columna = _q(_columna(campo))
+            filas = self._consultar(
+                f"SELECT {columna}, count(*) FROM {{t}} WHERE {columna} IS NOT NULL GROUP BY 1")
+            if filas:
+                contadores["por_valor"][campo] = {json.loads(clave): n for clave, n in filas}
+        for campo in config.get("no_vacios", ()):
+            n = self._consultar(f"SELECT count(*) FROM {{t}} WHERE {_q(_columna_no_vacio(campo))} = 1")[0][0]
+            if n:
+                contadores["no_vacios"][campo] = n
+        return contadores
+
+    # ── Acceso a la tabla ───────────────────────
+
+    def _indice(self) -> Optional[_IndiceSqlite]:
+        return self._indice_sql
+
+    def _ids(self, filters: Tuple[FieldFilter, ...] = ()) -> Iterator[str]:
+        return iter(self._iter_ids(filters, ordenado=False))
+
+    def _iter_ids(self, filters: Tuple[FieldFilter, ...] = (), desde_id: Optional[str] = None,
+                  limite: Optional[int] = None, ordenado: bool = True) -> List[str]:
+        """
+        Como MarkdownCollection._iter_ids, en una sola consulta: los filtros
+        que se traducen (ver _condicion) van al WHERE, el cursor por id y el
+        orden y límite a ORDER BY / LIMIT.
+        """
+        condiciones, parametros = [], []
+        for flt in filters:
+            traducida = _condicion(flt, self._campos_sql)
+            if traducida is not None:
+                condiciones.append(traducida[0])
+                parametros += traducida[1]
+        if desde_id is not None:
+            condiciones.append("id > ?")
+            parametros.append(desde_id)
+        sql = "SELECT id FROM {t}"
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        if ordenado:
+            sql += " ORDER BY id"
+            if limite is not None:
+                sql += " LIMIT ?"
+                parametros.append(limite)
+        return [doc_id for doc_id, in self._consultar(sql, parametros)]
+
+    def _cargar(self, ids: Iterable[str], literales: Tuple[str, ...] = (),
+                campos: Optional[frozenset] = None) -> Iterator[Tuple[str, Optional[dict]]]:
+        """
+        Pares (id, documento) en el orden de `ids`, por lotes de consultas.
+        Los literales y campos solo acotan el parseo en Markdown: aquí se
+        ignoran (los filtros se evalúan igualmente sobre el documento).
+        """
+        ids = iter(ids)
+        while True:
+            lote = [doc_id for _, doc_id in zip(range(_LOTE_IDS), ids)]
+            if not lote:
+                return
+            marcas = ",".join("?" * len(lote))
+            filas = dict(self._consultar(f"SELECT id, data FROM {{t}} WHERE id IN ({marcas})", lote))
+            for doc_id in lote:
+                data = filas.get(doc_id)
+                yield doc_id, json.loads(data) if data is not None else None
+
+    def _versiones(self) -> Dict[str, str]:
+        """Versión de cada fila, como la guarda el índice de emparejamiento."""
+        return {doc_id: str(version) for doc_id, version in self._consultar("SELECT id, version FROM {t}")}
+
+    def _consultar(self, sql: str, parametros: Iterable[Any] = ()) -> list:
+        """Ejecutar `sql` con {t} como nombre de la tabla; sin tabla no hay filas."""
+        if not self._db._existe(self.nombre):
+            return []
+        return self._db._conexion().execute(sql.format(t=_q(self.nombre)), tuple(parametros)).fetchall()
+
+
+class SqliteWriteBatch:
+    """
+    Equivalente a firestore.WriteBatch: todas las operaciones se aplican en
+    una sola transacción SQLite (BEGIN IMMEDIATE ... COMMIT); si una falla
+    no se aplica ninguna. Con fsync=True el commit se sincroniza a disco.
+    Los documentos que quedarían igual no se reescriben (conservan su versión).
+    """
+
+    def __init__(self, db: "SqliteDB", fsync: Optional[bool] = None):
+        self._db = db
+        self.fsync = _markdown._fsync_policy != "none" if fsync is None else fsync
+        self._ops: List[Tuple[str, SqliteDocument, Optional[dict], bool]] = []
+
+    def __len__(self) -> int:
+        return len(self._ops)
+
+    def set(self, reference: SqliteDocument, document_data: dict, merge: bool = False):
+        self._ops.append(("set", reference, document_data, merge))
+
+    def update(self, reference: SqliteDocument, field_updates: dict):
+        self._ops.append(("update", reference, field_updates, True))
+
+    def delete(self, reference: SqliteDocument):
+        self._ops.append(("delete", reference, None, False))
+
+    def commit(self) -> Dict[str, int]:
+        """Aplicar las operaciones. Retorna el resumen de escritos/omitidos/eliminados."""
+        now = datetime.now().isoformat()
+        for tabla in {ref._collection.nombre for op, ref, _, _ in self._ops if op != "delete"}:
+            self._db._crear_tabla(tabla)
+        with self._db._transaccion(self.fsync) as con:
+            self._verificar(con)
+            finales: Dict[Tuple[str, str], Optional[dict]] = {}
+            for op, ref, data, merge in self._ops:
+                if op == "delete":
+                    finales[ref._clave] = None
+                    continue
+                resolved = _resolve_timestamps(data, now)
+                if merge:
+                    if ref._clave in finales:
+                        actual = finales[ref._clave]
+                    else:
+                        actual = self._db._leer_fila(ref._clave, con)[0]
+                    base = dict(actual) if actual else {}
+                    base.update(resolved)
+                    resolved = base
+                finales[ref._clave] = resolved
+
+            borradas: List[str] = []
+            omitidos: Set[Tuple[str, str]] = set()
+            versiones: Dict[Tuple[str, str], int] = {}
+            for (tabla, doc_id), data in finales.items():
+                if data is None:
+                    if self._db._existe(tabla):
+                        con.execute(f"DELETE FROM {_q(tabla)} WHERE id = ?", (doc_id,))
+                    borradas += self._db._borrar_subcolecciones(con, tabla, doc_id)
+                    continue
+                huella = _huella(data)
+                actual = self._db._leer_fila((tabla, doc_id), con)[0] if huella is not None else None
+                if actual is not None and _huella(actual) == huella:
+                    omitidos.add((tabla, doc_id))
+                else:
+                    versiones[(tabla, doc_id)] = _nueva_version()
+                    con.execute(
+                        f"INSERT INTO {_q(tabla)} (id, data, version) VALUES (?, ?, ?) "
+                        f"ON CONFLICT(id) DO UPDATE SET data = excluded.data, version = excluded.version",
+                        (doc_id, _a_json(data), versiones[(tabla, doc_id)]),
+                    )
+        self._db._olvidar_tablas(borradas)
+        estudiantes = [(doc_id, data) for (tabla, doc_id), data in finales.items()
+                       if tabla == COLECCION_EMPAREJAMIENTO and (tabla, doc_id) not in omitidos]
+        if estudiantes:
+            emparejamiento = self._db.emparejamiento()
+            for doc_id, data in estudiantes:
+                if data is None:
+                    emparejamiento.eliminar(doc_id)
+                else:
+                    emparejamiento.actualizar(doc_id, data, str(versiones[(COLECCION_EMPAREJAMIENTO, doc_id)]))
+
+        self._ops = []
+        escritos = [clave for clave, data in finales.items() if data is not None and clave not in omitidos]
+        return {
+            "escritos": len(escritos),
+            "omitidos": len(omitidos),
+            "eliminados": sum(data is None for data in finales.values()),
+            "carpetas": len({tabla for tabla, _ in escritos}),
+        }
+
+    def _verificar(self, con: sqlite3.Connection):
+        """Comprobaciones previas dentro de la transacción (ver SqliteTransaction)."""
+        pass
+
+
+class SqliteTransaction(SqliteWriteBatch):
+    """
+    Equivalente a firestore.Transaction. get() registra la versión de cada
+    fila leída; commit() la comprueba con la base bloqueada para escritura
+    y lanza ConflictoTransaccion si cambió. Compatible con @transactional.
+    """
+
+    def __init__(self, db: "SqliteDB", max_attempts: int = 5, fsync: Optional[bool] = None):
+        super().__init__(db, fsync)
+        self.max_attempts = max_attempts
+        self._versiones: Dict[Tuple[str, str], Optional[int]] = {}
+
+    def get(self, reference: SqliteDocument) -> MarkdownSnapshot:
+        if self._ops:
+            raise ValueError("Las lecturas deben hacerse antes de las escrituras en una transacción")
+        data, version = self._db._leer_fila(reference._clave)
+        self._versiones.setdefault(reference._clave, version)
+        return MarkdownSnapshot(reference.id, reference, data)
+
+    def get_all(self, references: Iterable[SqliteDocument]) -> List[MarkdownSnapshot]:
+        """Varias lecturas versionadas en una llamada, como SqliteDB.get_all."""
+        return self._db.get_all(references, transaction=self)
+
+    def _verificar(self, con: sqlite3.Connection):
+        for clave, version in self._versiones.items():
+            if self._db._leer_fila(clave, con)[1] != version:
+                raise ConflictoTransaccion(f"{clave[0]}/{clave[1]} cambió durante la transacción")
+
+    def _reiniciar(self):
+        self._ops = []
+        self._versiones = {}
+
+
+class SqliteDB:
+    """Equivalente a firestore.Client sobre un archivo SQLite en modo WAL."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._tablas: Set[str] = set()
+        self._tablas_lock = threading.Lock()
+        self._conexion().execute("PRAGMA journal_mode=WAL")
+
+    def collection(self, name: str) -> SqliteCollection:
+        return SqliteCollection(self, name)
+
+    def batch(self, fsync: Optional[bool] = None) -> SqliteWriteBatch:
+        return SqliteWriteBatch(self, fsync)
+
+    def transaction(self, max_attempts: int = 5) -> SqliteTransaction:
+        return SqliteTransaction(self, max_attempts)
+
+    def get_all(self, references: Iterable[SqliteDocument], field_paths: Optional[Iterable[str]] = None,
+                transaction: Optional[SqliteTransaction] = None) -> List[MarkdownSnapshot]:
+        """
+        Equivalente a firestore.Client.get_all: snapshots en el orden pedido,
+        con una consulta por tabla y los ids repetidos leídos una vez.
+        """
+        references = list(references)
+        if transaction is not None and transaction._ops:
+            raise ValueError("Las lecturas deben hacerse antes de las escrituras en una transacción")
+        filas = self._leer_filas(ref._clave for ref in references)
+        if transaction is not None:
+            for clave, (_, version) in filas.items():
+                transaction._versiones.setdefault(clave, version)
+        campos = tuple(field_paths) if field_paths is not None else None
+        snapshots = {}
+        for ref in references:
+            if ref._clave not in snapshots:
+                data = filas[ref._clave][0]
+                if campos is not None and data is not None:
+                    data = _proyectar(data, campos)
+                snapshots[ref._clave] = MarkdownSnapshot(ref.id, ref, data)
+        return [snapshots[ref._clave] for ref in references]
+
+    def collections(self) -> List[SqliteCollection]:
+        return [
+            SqliteCollection(self, tabla)
+            for tabla in self._tablas_existentes()
+            if "/" not in tabla and not tabla.startswith(("_", "."))
+        ]
+
+    def reconstruir_indices(self) -> Dict[str, int]:
+        """
+        Añadir las columnas generadas que falten (si cambió DATOS_INDICES o
+        DATOS_ESTADISTICAS) y reconstruir sus índices. Retorna documentos
+        indexados por colección.
+        """
+        conteos = {}
+        for nombre, campos in DATOS_INDICES.items():
+            if not self._existe(nombre):
+                conteos[nombre] = 0
+                continue
+            self._crear_tabla(nombre, forzar=True)
+            con = self._conexion()
+            con.execute(f"REINDEX {_q(nombre)}")
+            con_valor = " OR ".join(f"{_q(_columna(c))} IS NOT NULL" for c in campos)
+            conteos[nombre] = con.execute(
+                f"SELECT count(*) FROM {_q(nombre)} WHERE {con_valor}").fetchone()[0]
+        return conteos
+
+    def emparejamiento(self) -> IndiceEmparejamiento:
+        """Índice de horarios de la tabla de estudiantes (pug_emparejamiento.jsonl junto a la base)."""
+        archivo = self.path.with_name(f"{self.path.stem}{ARCHIVO_EMPAREJAMIENTO}")
+        return _markdown._emparejamiento(archivo, self.collection(COLECCION_EMPAREJAMIENTO))
+
+    def reconciliar_estadisticas(self) -> Dict[str, bool]:
+        """Las estadísticas se calculan al consultarlas: nunca hay desviación."""
+        return {nombre: False for nombre in DATOS_ESTADISTICAS}
+
+    def guardar_instantaneas(self) -> int:
+        """Sin instantáneas: los documentos ya se guardan serializados."""
+        return 0
+
+    # ── Conexiones y transacciones ──────────────
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Una conexión por hilo (sqlite3 no comparte conexiones entre hilos)."""
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            con.execute(f"PRAGMA synchronous={_SINCRONIZACION.get(_markdown._fsync_policy, 'NORMAL')}")
+            self._local.con = con
+        return con
+
+    @contextmanager
+    def _transaccion(self, fsync: bool = False):
+        """BEGIN IMMEDIATE: toma el bloqueo de escritura antes de leer las versiones."""
+        con = self._conexion()
+        if fsync:
+            con.execute("PRAGMA synchronous=FULL")
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            yield con
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        else:
+            con.execute("COMMIT")
+        finally:
+            if fsync:
+                con.execute(f"PRAGMA synchronous={_SINCRONIZACION.get(_markdown._fsync_policy, 'NORMAL')}")
+
+    def _batch_individual(self) -> SqliteWriteBatch:
+        """Batch de una escritura suelta: solo se sincroniza con DATOS_FSYNC=always."""
+        return SqliteWriteBatch(self, _markdown._fsync_policy == "always")
+
+    def _leer_fila(self, clave: Tuple[str, str],
+                   con: Optional[sqlite3.Connection] = None) -> Tuple[Optional[dict], Optional[int]]:
+        """(documento, versión) de una fila, o (None, None) si no existe."""
+        tabla, doc_id = clave
+        if not self._existe(tabla):
+            return None, None
+        fila = (con or self._conexion()).execute(
+            f"SELECT data, version FROM {_q(tabla)} WHERE id = ?", (doc_id,)).fetchone()
+        if fila is None:
+            return None, None
+        return json.loads(fila[0]), fila[1]
+
+    def _leer_filas(self, claves: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Tuple[Optional[dict], Optional[int]]]:
+        """(documento, versión) de cada clave, con una consulta por tabla y lote de ids."""
+        por_tabla: Dict[str, List[str]] = {}
+        for tabla, doc_id in dict.fromkeys(claves):
+            por_tabla.setdefault(tabla, []).append(doc_id)
+        filas: Dict[Tuple[str, str], Tuple[Optional[dict], Optional[int]]] = {}
+        for tabla, ids in por_tabla.items():
+            encontradas = {}
+            if self._existe(tabla):
+                for inicio in range(0, len(ids), _LOTE_IDS):
+                    lote = ids[inicio:inicio + _LOTE_IDS]
+                    encontradas.update(
+                        (doc_id, (data, version)) for doc_id, data, version in self._conexion().execute(
+                            f"SELECT id, data, version FROM {_q(tabla)} WHERE id IN ({','.join('?' * len(lote))})",
+                            lote))
+            for doc_id in ids:
+                data, version = encontradas.get(doc_id, (None, None))
+                filas[(tabla, doc_id)] = (json.loads(data) if data is not None else None, version)
+        return filas
+
+    # ── Tablas ──────────────────────────────────
+
+    def _tablas_existentes(self) -> List[str]:
+        filas = self._conexion().execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+            "ORDER BY name").fetchall()
+        return [nombre for nombre, in filas]
+
+    def _existe(self, tabla: str) -> bool:
+        with self._tablas_lock:
+            if tabla in self._tablas:
+                return True
+        # Otro proceso pudo crearla: solo se recuerdan las que existen
+        existe = self._conexion().execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabla,)).fetchone()
+        if existe:
+            with self._tablas_lock:
+                self._tablas.add(tabla)
+        return bool(existe)
+
+    def _crear_tabla(self, tabla: str, forzar: bool = False):
+        """Crear la tabla con sus columnas generadas (ver _columnas) y los índices."""
+        if not forzar and self._existe(tabla):
+            return
+        con = self._conexion()
+        con.execute(
+            f"CREATE TABLE IF NOT EXISTS {_q(tabla)} ("
+            f"id TEXT PRIMARY KEY, data TEXT NOT NULL, version INTEGER NOT NULL)"
+        )
+        existentes = {fila[1] for fila in con.execute(f"PRAGMA table_xinfo({_q(tabla)})")}
+        for columna, expresion in _columnas(tabla).items():
+            if columna not in existentes:
+                con.execute(f"ALTER TABLE {_q(tabla)} ADD COLUMN {_q(columna)} "
+                            f"GENERATED ALWAYS AS ({expresion}) VIRTUAL")
+            con.execute(f"CREATE INDEX IF NOT EXISTS {_q(f'{tabla}#{columna}')} ON {_q(tabla)} ({_q(columna)})")
+        with self._tablas_lock:
+            self._tablas.add(tabla)
+
+    def _borrar_subcolecciones(self, con: sqlite3.Connection, tabla: str, doc_id: str) -> List[str]:
+        """Eliminar las tablas de las subcolecciones (a cualquier profundidad) del documento."""
+        prefijo = f"{tabla}/{doc_id}/"
+        borradas = [t for t in self._tablas_existentes() if t.startswith(prefijo)]
+        for t in borradas:
+            con.execute(f"DROP TABLE {_q(t)}")
+        return borradas
+
+    def _olvidar_tablas(self, tablas: Iterable[str]):
+        with self._tablas_lock:
+            self._tablas.difference_update(tablas)
+
+
+# ──────────────────────────────────────────────
+#  Migración entre backends
+# ──────────────────────────────────────────────
+
+def _copiar_coleccion(origen: MarkdownCollection, destino: MarkdownCollection, db_destino,
+                      lote: int, conteos: Dict[str, int], nombre: str):
+    """Copiar los documentos de `origen` a `destino` y, recursivamente, sus subcolecciones."""
+    # Las notas de estudiantes llevan su resumen legible, como en guardar_estudiante
+    con_cuerpo = isinstance(db_destino, MarkdownDB) and nombre == "estudiantes"
+    batch = db_destino.batch(fsync=False)
+    subcolecciones = []
+    for snap in origen.stream():
+        data = snap.to_dict()
+        ref = destino.document(snap.id)
+        if con_cuerpo and "matricola" in data:
+            batch._set_nota(ref, data, ObsidianManager._generar_cuerpo_estudiante(data))
+        else:
+            batch.set(ref, data)
+        conteos[nombre] = conteos.get(nombre, 0) + 1
+        subcolecciones += [(sub, ref.collection(sub.id)) for sub in snap.reference.collections()]
+        if len(batch) >= lote:
+            batch.commit()
+    if len(batch):
+        batch.commit()
+    for sub_origen, sub_destino in subcolecciones:
+        _copiar_coleccion(sub_origen, sub_destino, db_destino, lote, conteos,
+                          f"{nombre}/*/{sub_origen.id}")
+
+
+def _copiar_base(origen, destino, lote: int) -> Dict[str, int]:
+    conteos: Dict[str, int] = {}
+    for coleccion in origen.collections():
+        _copiar_coleccion(coleccion, destino.collection(coleccion.id), destino, lote, conteos, coleccion.id)
+    return conteos
+
+
+def importar_boveda(boveda: MarkdownDB, base: SqliteDB, lote: int = 500) -> Dict[str, int]:
+    """
+    Copiar la bóveda Markdown a la base SQLite (el frontmatter; el cuerpo de
+    las notas no se conserva). Retorna documentos copiados por colección.
+    """
+    conteos = _copiar_base(boveda, base, lote)
+    logger.info(f"Bóveda importada en {base.path}: {sum(conteos.values())} documentos")
+    return conteos
+
+
+def exportar_boveda(base: SqliteDB, boveda: MarkdownDB, lote: int = 500) -> Dict[str, int]:
+    """
+    Copiar la base SQLite a la bóveda Markdown, regenerando el cuerpo de las
+    notas de estudiantes. Retorna documentos copiados por colección.
+    """
+    conteos = _copiar_base(base, boveda, lote)
+    logger.info(f"Base {base.path} exportada a {boveda.base_path}: {sum(conteos.values())} documentos")
+    return conteos
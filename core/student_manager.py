@@ -7,7 +7,7 @@ import logging
 from typing import Dict, List, Optional, Any
 from datetime import datetime, date
 from .models import Estudiante, TipoLicencia
-from .obsidian_manager import ObsidianManager
+from .obsidian_manager import ObsidianManager, solo_cambian_marcas
 
 logger = logging.getLogger(__name__)
 
@@ -109,12 +109,14 @@ class StudentManager:
             logger.error(f"Error obteniendo estudiante {matricola}: {e}")
             return None
     
-    def listar_estudiantes(self, filtros: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    def listar_estudiantes(self, filtros: Optional[Dict[str, Any]] = None,
+                           campos: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
         Listar todos los estudiantes con filtros opcionales
         
         Args:
             filtros: Diccionario con filtros a aplicar
+            campos: Campos a devolver (por defecto, el documento completo)
             
         Returns:
             list: Lista de estudiantes
@@ -134,6 +136,10 @@ class StudentManager:
                     # Filtrar por al menos uno de los tipos de licencia
                     query = query.where('tipos_licencia', 'array_contains_any', filtros['tipos_licencia'])
             
+            # Proyección: no cargar horario/materias si no se piden
+            if campos is not None:
+                query = query.select(campos)
+            
             # Ejecutar consulta
             docs = query.stream()
             estudiantes = []
@@ -181,20 +187,7 @@ class StudentManager:
                 }
             
             # Preparar datos para actualización
-            datos_actualizados = datos_actualizacion.copy()
-            datos_actualizados['fecha_actualizacion'] = datetime.now().isoformat()
-            
-            # Procesar tipos de licencia si se proporcionan
-            if 'tipos_licencia' in datos_actualizados:
-                datos_actualizados['tipos_licencia'] = [
-                    t if isinstance(t, str) else t.value 
-                    for t in datos_actualizados['tipos_licencia']
-                ]
-            
-            # Procesar fecha de vencimiento
-            if 'fecha_vencimiento_licencia' in datos_actualizados:
-                fecha = self._parse_fecha(datos_actualizados['fecha_vencimiento_licencia'])
-                datos_actualizados['fecha_vencimiento_licencia'] = fecha.isoformat() if fecha else None
+            datos_actualizados = self._preparar_actualizacion(datos_actualizacion)
             
             # Actualizar en Firebase
             doc_ref = self.db.collection(self.collection_name).document(matricola)
@@ -216,6 +209,62 @@ class StudentManager:
                 'errors': [str(e)]
             }
     
+    def actualizar_estudiantes_lote(self, actualizaciones: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Actualizar varios estudiantes con un único commit por lotes
+        
+        Args:
+            actualizaciones: Datos a actualizar indexados por matrícula
+            
+        Returns:
+            dict: Resultado de la operación con el resumen del lote
+        """
+        try:
+            coleccion = self.db.collection(self.collection_name)
+            batch = self.db.batch()
+            errores = []
+            sin_cambios = 0
+            
+            for matricola, datos_actualizacion in actualizaciones.items():
+                doc_ref = coleccion.document(matricola)
+                actual = doc_ref.get()
+                if not actual.exists:
+                    errores.append(f'{matricola}: matrícula no existe')
+                    continue
+                
+                validacion = self._validar_datos_actualizacion(datos_actualizacion)
+                if not validacion['valid']:
+                    errores.extend(f'{matricola}: {e}' for e in validacion['errors'])
+                    continue
+                
+                # Si solo cambiaría fecha_actualizacion, el estudiante no se reescribe
+                datos = self._preparar_actualizacion(datos_actualizacion)
+                actual = actual.to_dict()
+                if solo_cambian_marcas(actual, {**actual, **datos}):
+                    sin_cambios += 1
+                    continue
+                batch.update(doc_ref, datos)
+            
+            resumen = batch.commit()
+            resumen['omitidos'] += sin_cambios
+            logger.info(f"Lote de estudiantes actualizado: {resumen['escritos']} escritos, "
+                        f"{resumen['omitidos']} sin cambios")
+            
+            return {
+                'success': not errores,
+                'message': f"{resumen['escritos']} estudiante(s) actualizados, {resumen['omitidos']} sin cambios",
+                'data': resumen,
+                'errors': errores
+            }
+            
+        except Exception as e:
+            logger.error(f"Error actualizando lote de estudiantes: {e}")
+            return {
+                'success': False,
+                'message': f'Error técnico: {str(e)}',
+                'errors': [str(e)]
+            }
+    
     def eliminar_estudiante(self, matricola: str) -> Dict[str, Any]:
         """
         Eliminar un estudiante del sistema
@@ -264,29 +313,29 @@ class StudentManager:
             dict: Estadísticas completas
         """
         try:
-            estudiantes = self.listar_estudiantes()
+            estudiantes = self.db.collection(self.collection_name)
             
-            # Estadísticas básicas
-            total_estudiantes = len(estudiantes)
-            con_licencia = len([e for e in estudiantes if e.get('tiene_licencia', False)])
-            viajan_hoy = len([e for e in estudiantes if e.get('viaja_hoy', True)])
+            # Estadísticas básicas (índices de tiene_licencia y viaja_hoy)
+            total_estudiantes = estudiantes.count()
+            con_licencia = estudiantes.where('tiene_licencia', '==', True).count()
+            # Sin el campo se considera que viaja, como en el modelo
+            no_viajan = sum(n for valor, n in estudiantes.group_count('viaja_hoy').items() if not valor)
+            viajan_hoy = total_estudiantes - no_viajan
             
             # Estadísticas por tipo de licencia
-            licencias_count = {}
-            for estudiante in estudiantes:
-                for licencia in estudiante.get('tipos_licencia', []):
-                    licencias_count[licencia] = licencias_count.get(licencia, 0) + 1
+            licencias_count = estudiantes.group_count('tipos_licencia')
             
-            # Licencias vigentes
+            # Licencias vigentes: solo se lee la fecha de quienes tienen licencia
             hoy = date.today()
             licencias_vigentes = 0
-            for estudiante in estudiantes:
-                if estudiante.get('tiene_licencia') and estudiante.get('fecha_vencimiento_licencia'):
+            conductores = estudiantes.where('tiene_licencia', '==', True).select(['fecha_vencimiento_licencia'])
+            for doc in conductores.stream():
+                vencimiento = doc.get('fecha_vencimiento_licencia')
+                if vencimiento:
                     try:
-                        vencimiento = datetime.fromisoformat(estudiante['fecha_vencimiento_licencia']).date()
-                        if vencimiento > hoy:
+                        if datetime.fromisoformat(str(vencimiento)).date() > hoy:
                             licencias_vigentes += 1
-                    except:
+                    except ValueError:
                         pass
             
             estadisticas = {
@@ -409,6 +458,25 @@ class StudentManager:
             'errors': errores
         }
     
+    def _preparar_actualizacion(self, datos_actualizacion: Dict[str, Any]) -> Dict[str, Any]:
+        """Normalizar los datos de actualización al formato almacenado"""
+        datos_actualizados = datos_actualizacion.copy()
+        datos_actualizados['fecha_actualizacion'] = datetime.now().isoformat()
+        
+        # Procesar tipos de licencia si se proporcionan
+        if 'tipos_licencia' in datos_actualizados:
+            datos_actualizados['tipos_licencia'] = [
+                t if isinstance(t, str) else t.value 
+                for t in datos_actualizados['tipos_licencia']
+            ]
+        
+        # Procesar fecha de vencimiento
+        if 'fecha_vencimiento_licencia' in datos_actualizados:
+            fecha = self._parse_fecha(datos_actualizados['fecha_vencimiento_licencia'])
+            datos_actualizados['fecha_vencimiento_licencia'] = fecha.isoformat() if fecha else None
+        
+        return datos_actualizados
+    
     def _existe_matricula(self, matricola: str) -> bool:
         """Verificar si existe una matrícula"""
         try:
@@ -5,16 +5,25 @@ para viajes compartidos a la universidad.
 """
 
 import logging
+import threading
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
-from utils.constants import ORDEN_BLOQUES, BLOQUES_A_HORAS
+from utils.constants import DIAS_SEMANA, ORDEN_BLOQUES
+from .horario_bits import DIAS, SENTIDOS, ventanas
+from .indice_emparejamiento import IndiceEmparejamiento
+from .models import GrupoCompatible, MatchmakingResult
 from .obsidian_manager import ObsidianManager
 from .portal_extractor import PortalExtractor
 from .demo_generator import DemoDataGenerator
 
 logger = logging.getLogger(__name__)
 
+# Último emparejamiento calculado por archivo de índice y tolerancia; se
+# reutiliza mientras la versión del índice (cabecera, bytes leídos) no cambie
+_resultados: Dict[Tuple[str, int, int], MatchmakingResult] = {}
+_resultados_lock = threading.Lock()
+
 class StudentScheduler:
     """
     Clase principal para gestionar la programación y agrupación de estudiantes
@@ -197,12 +206,15 @@ class StudentScheduler:
         
         return horario_convertido
     
-    def obtener_grupos_compatibles(self, matricola_especifica: Optional[str] = None) -> str:
+    def obtener_grupos_compatibles(self, matricola_especifica: Optional[str] = None,
+                                   tolerancia_minutos: int = 0, tolerancia_bloques: int = 0) -> str:
         """
         Buscar grupos de estudiantes con horarios compatibles
         
         Args:
             matricola_especifica: Matrícula específica para incluir info adicional
+            tolerancia_minutos: Agrupar llegadas (o salidas) separadas hasta estos minutos
+            tolerancia_bloques: Agrupar llegadas (o salidas) separadas hasta estos bloques
             
         Returns:
             str: Informe formateado de grupos compatibles
@@ -210,135 +222,120 @@ class StudentScheduler:
         logger.info("Iniciando búsqueda de grupos compatibles")
         
         try:
-            # Obtener datos de estudiantes
-            datos_estudiantes = self.firebase.obtener_todos_estudiantes()
-            
-            if not datos_estudiantes:
-                return "No se encontraron datos de estudiantes en la base de datos."
-            
-            # Procesar horarios
-            horarios_procesados = self._procesar_horarios_estudiantes(datos_estudiantes)
-            
-            # Encontrar coincidencias
-            grupos_compatibles = self._encontrar_coincidencias_horarios(horarios_procesados)
-            
-            # Formatear resultado
-            resultado = self._formatear_informe_grupos(grupos_compatibles)
-            
-            # Agregar información específica si se solicita
-            if matricola_especifica and matricola_especifica in datos_estudiantes:
-                resultado += self._agregar_info_estudiante_especifico(
-                    matricola_especifica, datos_estudiantes[matricola_especifica]
-                )
-            
-            return resultado
+            resultado = self.obtener_emparejamiento(tolerancia_minutos, tolerancia_bloques)
+            return self.formatear_informe(resultado, matricola_especifica)
             
         except Exception as e:
             logger.error(f"Error buscando grupos compatibles: {e}")
             return f"Error: No se pudieron procesar los datos de horarios. {str(e)}"
     
-    def _procesar_horarios_estudiantes(self, datos_estudiantes: dict) -> dict:
+    def obtener_emparejamiento(self, tolerancia_minutos: int = 0, tolerancia_bloques: int = 0) -> MatchmakingResult:
         """
-        Procesar horarios de estudiantes para obtener entrada/salida por día
+        Grupos compatibles de todos los estudiantes. El resultado se guarda
+        con la versión del índice de emparejamiento y se reutiliza (también
+        entre instancias) mientras no cambie: cualquier escritura en la
+        colección de estudiantes, de este u otro proceso, la cambia.
         
         Args:
-            datos_estudiantes: Diccionario con datos de todos los estudiantes
+            tolerancia_minutos: Agrupar llegadas (o salidas) separadas hasta estos minutos
+            tolerancia_bloques: Agrupar llegadas (o salidas) separadas hasta estos bloques
             
         Returns:
-            dict: Horarios procesados por estudiante
+            MatchmakingResult: Grupos de ida y vuelta con sus miembros
         """
-        logger.info("Procesando horarios de estudiantes...")
-        horarios_procesados = {}
+        indice = self.firebase.emparejamiento()
+        clave = (str(indice.archivo), tolerancia_minutos, tolerancia_bloques)
+        version = indice.version
         
-        for matricola, info in datos_estudiantes.items():
-            # Verificar datos básicos
-            if not info or 'nome' not in info:
-                logger.warning(f"Estudiante {matricola} sin datos básicos - omitido")
-                continue
-            
-            horario_diario = {}
-            
-            # Procesar clases del estudiante
-            for clase in info.get('horario', []):
-                dia = clase.get('dia')
-                bloque = clase.get('bloque', clase.get('hora', ''))
-                
-                if not dia or not bloque:
-                    continue
-                
-                # Verificar que el bloque sea válido
-                if bloque not in ORDEN_BLOQUES:
-                    logger.warning(f"Bloque '{bloque}' desconocido para {matricola}")
-                    continue
-                
-                if dia not in horario_diario:
-                    horario_diario[dia] = []
-                horario_diario[dia].append(bloque)
-            
-            # Calcular entrada y salida por día
-            horario_final = {}
-            for dia, bloques in horario_diario.items():
-                bloques_ordenados = sorted(bloques, key=lambda b: ORDEN_BLOQUES.index(b))
-                if bloques_ordenados:
-                    horario_final[dia] = {
-                        "entrada": bloques_ordenados[0],
-                        "salida": bloques_ordenados[-1]
-                    }
-            
-            horarios_procesados[matricola] = {
-                "nombre_completo": f"{info.get('nome', '')} {info.get('cognome', '')}".strip(),
-                "horario_diario": horario_final
-            }
+        with _resultados_lock:
+            resultado = _resultados.get(clave)
+        if resultado is not None and resultado.version == version:
+            logger.debug("Emparejamiento sin cambios - se reutiliza el resultado")
+            return resultado
         
-        logger.info(f"Procesados horarios de {len(horarios_procesados)} estudiantes")
-        return horarios_procesados
+        if tolerancia_minutos or tolerancia_bloques:
+            exacto = self.obtener_emparejamiento()
+            resultado = self._calcular_emparejamiento_ventanas(indice, version, tolerancia_minutos, tolerancia_bloques)
+            resultado.extra_emparejados = len(resultado.matriculas_emparejadas() - exacto.matriculas_emparejadas())
+        else:
+            resultado = self._calcular_emparejamiento(indice, version)
+        with _resultados_lock:
+            _resultados[clave] = resultado
+        return resultado
     
-    def _encontrar_coincidencias_horarios(self, horarios_procesados: dict) -> dict:
+    def formatear_informe(self, resultado: MatchmakingResult, matricola_especifica: Optional[str] = None) -> str:
         """
-        Encontrar coincidencias de horarios para viajes compartidos
+        Informe de texto de un emparejamiento ya calculado
         
         Args:
-            horarios_procesados: Horarios procesados de estudiantes
+            resultado: Resultado de obtener_emparejamiento
+            matricola_especifica: Matrícula específica para incluir info adicional
             
         Returns:
-            dict: Grupos compatibles para ida y vuelta
+            str: Informe formateado de grupos compatibles
         """
-        logger.info("Buscando coincidencias de horarios...")
-        
-        indice_ida = {}
-        indice_vuelta = {}
-        
-        # Construir índices de horarios
-        for matricola, data in horarios_procesados.items():
-            nombre = data['nombre_completo']
-            
-            for dia, horas in data['horario_diario'].items():
-                # Índice para viajes de ida (entrada a universidad)
-                clave_ida = f"{dia}_{horas['entrada']}"
-                if clave_ida not in indice_ida:
-                    indice_ida[clave_ida] = []
-                indice_ida[clave_ida].append(nombre)
-                
-                # Índice para viajes de vuelta (salida de universidad)
-                clave_vuelta = f"{dia}_{horas['salida']}"
-                if clave_vuelta not in indice_vuelta:
-                    indice_vuelta[clave_vuelta] = []
-                indice_vuelta[clave_vuelta].append(nombre)
+        if not resultado.total_estudiantes:
+            return "No se encontraron datos de estudiantes en la base de datos."
         
-        # Filtrar solo grupos con más de una persona
-        grupos_ida = {k: v for k, v in indice_ida.items() if len(v) > 1}
-        grupos_vuelta = {k: v for k, v in indice_vuelta.items() if len(v) > 1}
+        informe = self._formatear_informe_grupos(resultado)
         
-        logger.info(f"Encontrados {len(grupos_ida)} grupos de ida y {len(grupos_vuelta)} de vuelta")
+        # Agregar información específica si se solicita
+        if matricola_especifica:
+            datos_estudiante = self.firebase.obtener_estudiante(matricola_especifica)
+            if datos_estudiante and 'nome' in datos_estudiante:
+                informe += self._agregar_info_estudiante_especifico(matricola_especifica, datos_estudiante)
         
-        return {"ida": grupos_ida, "vuelta": grupos_vuelta}
+        return informe
     
-    def _formatear_informe_grupos(self, grupos_compatibles: dict) -> str:
+    def _calcular_emparejamiento(self, indice: IndiceEmparejamiento, version) -> MatchmakingResult:
+        """
+        Grupos compatibles para ida y vuelta leídos del índice de emparejamiento:
+        una casilla (día, bloque) con más de un estudiante es un grupo
+        """
+        grupos = {}
+        for sentido in SENTIDOS:
+            grupos[sentido] = [
+                GrupoCompatible(sentido, DIAS_SEMANA[dia], ORDEN_BLOQUES[bloque],
+                                matriculas, indice.nombres(matriculas))
+                for (dia, bloque), matriculas in indice.grupos(sentido).items()
+            ]
+        logger.info(f"Encontrados {len(grupos['ida'])} grupos de ida y {len(grupos['vuelta'])} de vuelta")
+        return MatchmakingResult(version, len(indice), grupos['ida'], grupos['vuelta'])
+    
+    def _calcular_emparejamiento_ventanas(self, indice: IndiceEmparejamiento, version,
+                                          tolerancia_minutos: int, tolerancia_bloques: int) -> MatchmakingResult:
+        """
+        Grupos por ventanas de tolerancia leídos del índice de emparejamiento:
+        por cada día, un barrido sobre sus bloques ocupados (ver horario_bits.ventanas)
+        """
+        en_bloques = not tolerancia_minutos
+        tolerancia = tolerancia_bloques if en_bloques else tolerancia_minutos
+        grupos = {}
+        for sentido in SENTIDOS:
+            por_casilla = indice.grupos(sentido, minimo=1)
+            grupos[sentido] = []
+            for dia in range(DIAS):
+                ocupados = [b for b in range(len(ORDEN_BLOQUES)) if (dia, b) in por_casilla]
+                for desde, hasta in ventanas(ocupados, sentido, tolerancia, en_bloques):
+                    matriculas = sorted(
+                        m for b in range(desde, hasta + 1) for m in por_casilla.get((dia, b), ())
+                    )
+                    if len(matriculas) >= 2:
+                        grupos[sentido].append(GrupoCompatible(
+                            sentido, DIAS_SEMANA[dia], ORDEN_BLOQUES[desde],
+                            matriculas, indice.nombres(matriculas), ORDEN_BLOQUES[hasta]
+                        ))
+        logger.info(f"Encontrados {len(grupos['ida'])} grupos de ida y {len(grupos['vuelta'])} de vuelta "
+                    f"con tolerancia de {tolerancia} {'bloque(s)' if en_bloques else 'minuto(s)'}")
+        return MatchmakingResult(version, len(indice), grupos['ida'], grupos['vuelta'],
+                                 tolerancia_minutos, tolerancia_bloques)
+    
+    def _formatear_informe_grupos(self, resultado: MatchmakingResult) -> str:
         """
         Formatear informe de grupos compatibles
         
         Args:
-            grupos_compatibles: Diccionario con grupos de ida y vuelta
+            resultado: Grupos de ida y vuelta
             
         Returns:
             str: Informe formateado
@@ -351,25 +348,28 @@ class StudentScheduler:
         
         # Viajes de ida
         output.append("\n🚌 VIAJES DE IDA (Llegar a la universidad)\n")
-        if not grupos_compatibles['ida']:
+        if not resultado.grupos_ida:
             output.append("❌ No se encontraron coincidencias para viajes de ida.")
         else:
-            for clave, personas in sorted(grupos_compatibles['ida'].items()):
-                dia, bloque = clave.split('_')
-                hora = BLOQUES_A_HORAS.get(bloque, bloque)
-                output.append(f"📅 {dia} a las {hora}:")
-                output.append(f"   👥 Grupo compatible: {', '.join(personas)}\n")
+            for grupo in sorted(resultado.grupos_ida, key=lambda g: g.clave):
+                output.append(f"📅 {grupo.dia} a las {grupo.hora}:")
+                output.append(f"   👥 Grupo compatible: {', '.join(grupo.nombres)}\n")
         
         # Viajes de vuelta
         output.append("\n🏠 VIAJES DE VUELTA (Salir de la universidad)\n")
-        if not grupos_compatibles['vuelta']:
+        if not resultado.grupos_vuelta:
             output.append("❌ No se encontraron coincidencias para viajes de vuelta.")
         else:
-            for clave, personas in sorted(grupos_compatibles['vuelta'].items()):
-                dia, bloque = clave.split('_')
-                hora = BLOQUES_A_HORAS.get(bloque, bloque)
-                output.append(f"📅 {dia} a las {hora}:")
-                output.append(f"   👥 Grupo compatible: {', '.join(personas)}\n")
+            for grupo in sorted(resultado.grupos_vuelta, key=lambda g: g.clave):
+                output.append(f"📅 {grupo.dia} a las {grupo.hora}:")
+                output.append(f"   👥 Grupo compatible: {', '.join(grupo.nombres)}\n")
+        
+        # Ganancia de la tolerancia frente a la coincidencia exacta
+        if resultado.con_tolerancia:
+            tolerancia = (f"{resultado.tolerancia_minutos} min" if resultado.tolerancia_minutos
+                          else f"{resultado.tolerancia_bloques} bloque(s)")
+            output.append(f"\n🔁 Con tolerancia de {tolerancia}: {resultado.extra_emparejados} "
+                          f"estudiante(s) más con grupo que con coincidencia exacta")
         
         return "\n".join(output)
     
@@ -6,13 +6,19 @@ CRUD completo para gestión de viajes y listas diarias
 import logging
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, date, timedelta
+from config import get_config
 from .models import Viaje, ListaViajes, Carro, Estudiante, EstadoViaje, EstadoLista, TipoLicencia
-from .obsidian_manager import ObsidianManager
+from .obsidian_manager import ObsidianManager, SERVER_TIMESTAMP, ConflictoTransaccion, transactional
+from .asignacion_flujo import asignar_por_flujo, tipos_carro_compatibles
 from .car_manager import CarManager
 from .student_manager import StudentManager
 
 logger = logging.getLogger(__name__)
 
+# Motores de asignación automática (ASIGNACION_MOTOR); 'voraz' es además el
+# respaldo si el de flujo falla
+MOTORES_ASIGNACION = ('flujo', 'voraz')
+
 class ViajeManager:
     """Gestor principal para operaciones de viajes y listas diarias"""
     
@@ -44,8 +50,14 @@ class ViajeManager:
                     'errors': validacion['errors']
                 }
             
+            # Leer el carro y el conductor en una sola llamada
+            carro_doc, conductor_doc = self.db.get_all([
+                self.db.collection(self.car_manager.collection_name).document(viaje_data['id_carro']),
+                self.db.collection(self.student_manager.collection_name).document(viaje_data['matricola_conductor']),
+            ])
+            
             # Verificar disponibilidad del carro
-            carro_data = self.car_manager.obtener_carro(viaje_data['id_carro'])
+            carro_data = carro_doc.to_dict()
             if not carro_data:
                 return {
                     'success': False,
@@ -61,7 +73,7 @@ class ViajeManager:
                 }
             
             # Verificar que el conductor existe y puede conducir el carro
-            conductor_data = self.student_manager.obtener_estudiante(viaje_data['matricola_conductor'])
+            conductor_data = conductor_doc.to_dict()
             if not conductor_data:
                 return {
                     'success': False,
@@ -130,72 +142,86 @@ class ViajeManager:
             dict: Resultado de la operación
         """
         try:
-            # Obtener viaje actual
-            viaje_data = self.obtener_viaje(id_viaje)
-            if not viaje_data:
-                return {
-                    'success': False,
-                    'message': 'Viaje no encontrado',
-                    'errors': ['ID de viaje inválido']
-                }
-            
-            # Verificar que el estudiante existe
-            estudiante_data = self.student_manager.obtener_estudiante(matricola_pasajero)
-            if not estudiante_data:
-                return {
-                    'success': False,
-                    'message': 'Estudiante no encontrado',
-                    'errors': ['Matrícula inválida']
-                }
-            
-            # Verificar que no sea el conductor
-            if matricola_pasajero == viaje_data['matricola_conductor']:
-                return {
-                    'success': False,
-                    'message': 'El conductor no puede ser pasajero',
-                    'errors': ['Conflicto conductor-pasajero']
-                }
-            
-            # Verificar que no esté ya en la lista
-            pasajeros_actuales = viaje_data.get('pasajeros', [])
-            if matricola_pasajero in pasajeros_actuales:
-                return {
-                    'success': False,
-                    'message': 'El estudiante ya está en este viaje',
-                    'errors': ['Pasajero duplicado']
+            doc_ref = self.db.collection(self.collection_viajes).document(id_viaje)
+            estudiante_ref = self.db.collection(self.student_manager.collection_name).document(matricola_pasajero)
+            
+            # Leer, comprobar plazas y escribir dentro de una transacción: si otra
+            # sesión modifica el viaje entre medias, se repite con los datos nuevos
+            @transactional
+            def reservar_plaza(transaction):
+                # Obtener viaje actual y el estudiante en una sola lectura
+                snapshot, estudiante = transaction.get_all([doc_ref, estudiante_ref])
+                if not snapshot.exists:
+                    return {
+                        'success': False,
+                        'message': 'Viaje no encontrado',
+                        'errors': ['ID de viaje inválido']
+                    }
+                viaje_data = snapshot.to_dict()
+                
+                # Verificar que el estudiante existe
+                if not estudiante.exists:
+                    return {
+                        'success': False,
+                        'message': 'Estudiante no encontrado',
+                        'errors': ['Matrícula inválida']
+                    }
+                
+                # Verificar que no sea el conductor
+                if matricola_pasajero == viaje_data['matricola_conductor']:
+                    return {
+                        'success': False,
+                        'message': 'El conductor no puede ser pasajero',
+                        'errors': ['Conflicto conductor-pasajero']
+                    }
+                
+                # Verificar que no esté ya en la lista
+                pasajeros_actuales = viaje_data.get('pasajeros', [])
+                if matricola_pasajero in pasajeros_actuales:
+                    return {
+                        'success': False,
+                        'message': 'El estudiante ya está en este viaje',
+                        'errors': ['Pasajero duplicado']
+                    }
+                
+                # Verificar capacidad
+                ocupacion_actual = viaje_data.get('ocupacion_actual', 1)
+                capacidad_maxima = viaje_data.get('capacidad_maxima', 5)
+                
+                if ocupacion_actual >= capacidad_maxima:
+                    return {
+                        'success': False,
+                        'message': 'Viaje lleno',
+                        'errors': ['No hay plazas disponibles']
+                    }
+                
+                # Agregar pasajero
+                pasajeros_actuales.append(matricola_pasajero)
+                datos_actualizacion = {
+                    'pasajeros': pasajeros_actuales,
+                    'ocupacion_actual': ocupacion_actual + 1,
+                    'fecha_actualizacion': datetime.now().isoformat()
                 }
-            
-            # Verificar capacidad
-            ocupacion_actual = viaje_data.get('ocupacion_actual', 1)
-            capacidad_maxima = viaje_data.get('capacidad_maxima', 5)
-            
-            if ocupacion_actual >= capacidad_maxima:
+                transaction.update(doc_ref, datos_actualizacion)
+                
                 return {
-                    'success': False,
-                    'message': 'Viaje lleno',
-                    'errors': ['No hay plazas disponibles']
+                    'success': True,
+                    'message': 'Pasajero agregado exitosamente',
+                    'data': datos_actualizacion
                 }
             
-            # Agregar pasajero
-            pasajeros_actuales.append(matricola_pasajero)
-            datos_actualizacion = {
-                'pasajeros': pasajeros_actuales,
-                'ocupacion_actual': ocupacion_actual + 1,
-                'fecha_actualizacion': datetime.now().isoformat()
-            }
-            
-            # Actualizar en Firebase
-            doc_ref = self.db.collection(self.collection_viajes).document(id_viaje)
-            doc_ref.update(datos_actualizacion)
-            
-            logger.info(f"Pasajero {matricola_pasajero} agregado al viaje {id_viaje}")
+            resultado = reservar_plaza(self.db.transaction())
+            if resultado['success']:
+                logger.info(f"Pasajero {matricola_pasajero} agregado al viaje {id_viaje}")
+            return resultado
             
+        except ConflictoTransaccion as e:
+            logger.warning(f"Conflicto agregando pasajero a {id_viaje}: {e}")
             return {
-                'success': True,
-                'message': 'Pasajero agregado exitosamente',
-                'data': datos_actualizacion
+                'success': False,
+                'message': 'El viaje se está modificando en otra sesión, intente de nuevo',
+                'errors': [str(e)]
             }
-            
         except Exception as e:
             logger.error(f"Error agregando pasajero: {e}")
             return {
@@ -270,6 +296,29 @@ class ViajeManager:
             logger.error(f"Error listando viajes: {e}")
             return []
     
+    def contar_viajes(self, fecha: Optional[str] = None, estado: Optional[str] = None) -> int:
+        """
+        Contar viajes con los mismos filtros que listar_viajes, sin cargarlos
+        
+        Args:
+            fecha: Fecha específica (YYYY-MM-DD)
+            estado: Estado del viaje
+            
+        Returns:
+            int: Número de viajes (0 si hay error)
+        """
+        try:
+            query = self.db.collection(self.collection_viajes)
+            if fecha:
+                query = query.where('fecha', '==', fecha)
+            if estado:
+                query = query.where('estado', '==', estado)
+            return query.count()
+            
+        except Exception as e:
+            logger.error(f"Error contando viajes: {e}")
+            return 0
+    
     def crear_lista_diaria(self, fecha: str, viajes_ida: List[str] = None, viajes_vuelta: List[str] = None) -> Dict[str, Any]:
         """
         Crear una lista diaria de viajes
@@ -285,57 +334,77 @@ class ViajeManager:
         try:
             # Generar ID para la lista
             id_lista = f"lista_{fecha.replace('-', '')}"
-            
-            # Verificar que no exista ya una lista para esa fecha
-            lista_existente = self.obtener_lista_diaria(fecha)
-            if lista_existente:
-                return {
-                    'success': False,
-                    'message': 'Ya existe una lista para esta fecha',
-                    'errors': ['Lista duplicada']
-                }
-            
-            # Validar que los viajes existen
             viajes_ida = viajes_ida or []
             viajes_vuelta = viajes_vuelta or []
             
-            for vid in viajes_ida + viajes_vuelta:
-                if not self.obtener_viaje(vid):
+            lista_ref = self.db.collection(self.collection_listas).document(id_lista)
+            viajes_col = self.db.collection(self.collection_viajes)
+            
+            # La comprobación de duplicados y de viajes se valida en el commit:
+            # dos sesiones no pueden crear la misma lista a la vez
+            @transactional
+            def crear_lista(transaction):
+                # Leer la lista y todos los viajes de una vez (los repetidos, una sola)
+                ids_viajes = viajes_ida + viajes_vuelta
+                lista, *snapshots = transaction.get_all(
+                    [lista_ref] + [viajes_col.document(vid) for vid in ids_viajes]
+                )
+                
+                # Verificar que no exista ya una lista para esa fecha
+                if lista.exists:
                     return {
                         'success': False,
-                        'message': f'Viaje {vid} no encontrado',
-                        'errors': ['Viaje inválido']
+                        'message': 'Ya existe una lista para esta fecha',
+                        'errors': ['Lista duplicada']
                     }
+                
+                # Validar que los viajes existen
+                viajes = {}
+                for vid, snapshot in zip(ids_viajes, snapshots):
+                    if not snapshot.exists:
+                        return {
+                            'success': False,
+                            'message': f'Viaje {vid} no encontrado',
+                            'errors': ['Viaje inválido']
+                        }
+                    viajes[vid] = snapshot
+                
+                # Crear objeto lista
+                lista_dict = {
+                    'id_lista': id_lista,
+                    'fecha': fecha,
+                    'viajes_ida': viajes_ida,
+                    'viajes_vuelta': viajes_vuelta,
+                    'estado': 'borrador',
+                    'creado_por': 'admin',  # TODO: obtener del contexto de sesión
+                    'observaciones': '',
+                    'fecha_creacion': datetime.now().isoformat(),
+                    'fecha_actualizacion': datetime.now().isoformat(),
+                    'total_estudiantes_ida': self._calcular_total_estudiantes(viajes, viajes_ida),
+                    'total_estudiantes_vuelta': self._calcular_total_estudiantes(viajes, viajes_vuelta),
+                    'total_carros_usados': len(set(viajes_ida + viajes_vuelta))
+                }
+                transaction.set(lista_ref, lista_dict)
+                
+                return {
+                    'success': True,
+                    'message': 'Lista diaria creada exitosamente',
+                    'data': lista_dict,
+                    'id': id_lista
+                }
             
-            # Crear objeto lista
-            lista_dict = {
-                'id_lista': id_lista,
-                'fecha': fecha,
-                'viajes_ida': viajes_ida,
-                'viajes_vuelta': viajes_vuelta,
-                'estado': 'borrador',
-                'creado_por': 'admin',  # TODO: obtener del contexto de sesión
-                'observaciones': '',
-                'fecha_creacion': datetime.now().isoformat(),
-                'fecha_actualizacion': datetime.now().isoformat(),
-                'total_estudiantes_ida': self._calcular_total_estudiantes(viajes_ida),
-                'total_estudiantes_vuelta': self._calcular_total_estudiantes(viajes_vuelta),
-                'total_carros_usados': len(set(viajes_ida + viajes_vuelta))
-            }
-            
-            # Guardar en Firebase
-            doc_ref = self.db.collection(self.collection_listas).document(id_lista)
-            doc_ref.set(lista_dict)
-            
-            logger.info(f"Lista diaria creada: {id_lista}")
+            resultado = crear_lista(self.db.transaction())
+            if resultado['success']:
+                logger.info(f"Lista diaria creada: {id_lista}")
+            return resultado
             
+        except ConflictoTransaccion as e:
+            logger.warning(f"Conflicto creando lista diaria {fecha}: {e}")
             return {
-                'success': True,
-                'message': 'Lista diaria creada exitosamente',
-                'data': lista_dict,
-                'id': id_lista
+                'success': False,
+                'message': 'La lista se está modificando en otra sesión, intente de nuevo',
+                'errors': [str(e)]
             }
-            
         except Exception as e:
             logger.error(f"Error creando lista diaria: {e}")
             return {
@@ -371,19 +440,39 @@ class ViajeManager:
             logger.error(f"Error obteniendo lista diaria {fecha}: {e}")
             return None
     
-    def generar_asignacion_automatica(self, fecha: str) -> Dict[str, Any]:
+    def generar_asignacion_automatica(self, fecha: str, motor: Optional[str] = None,
+                                      reemplazar: bool = False) -> Dict[str, Any]:
         """
         Generar asignación automática de estudiantes a carros para una fecha
         
+        Los viajes que generó una asignación anterior para la fecha se
+        sustituyen, salvo que se hayan cambiado sus pasajeros o estén en la
+        lista diaria: entonces no se hace nada y se indican en
+        'viajes_protegidos', a menos que se pida reemplazar.
+        
         Args:
             fecha: Fecha para la asignación (YYYY-MM-DD)
+            motor: 'flujo' o 'voraz' (por defecto ASIGNACION_MOTOR)
+            reemplazar: Sustituir también los viajes protegidos
             
         Returns:
             dict: Resultado con viajes generados
         """
         try:
-            # Obtener estudiantes que viajan hoy
-            estudiantes_viajan = self.student_manager.listar_estudiantes({'viaja_hoy': True})
+            ids_anteriores, protegidos = self._viajes_automaticos(fecha)
+            if protegidos and not reemplazar:
+                return {
+                    'success': False,
+                    'message': f'Hay {len(protegidos)} viaje(s) generados para {fecha} con pasajeros '
+                               f'cambiados o en la lista diaria',
+                    'errors': [f'{id_viaje}: protegido' for id_viaje in protegidos],
+                    'viajes_protegidos': protegidos
+                }
+            
+            # Obtener estudiantes que viajan hoy (solo los campos que usa la asignación)
+            estudiantes_viajan = self.student_manager.listar_estudiantes(
+                {'viaja_hoy': True}, campos=['matricola', 'tiene_licencia', 'tipos_licencia']
+            )
             
             if not estudiantes_viajan:
                 return {
@@ -393,7 +482,9 @@ class ViajeManager:
                 }
             
             # Obtener carros disponibles
-            carros_disponibles = self.car_manager.obtener_todos_carros({'estado': 'disponible'})
+            carros_disponibles = self.car_manager.obtener_todos_carros(
+                {'estado': 'disponible'}, campos=['id_carro', 'tipo_carro', 'capacidad_pasajeros']
+            )
             
             if not carros_disponibles:
                 return {
@@ -413,13 +504,33 @@ class ViajeManager:
                 }
             
             # Algoritmo de asignación
-            viajes_generados = self._algoritmo_asignacion(conductores, estudiantes_viajan, carros_disponibles, fecha)
-            
-            logger.info(f"Asignación automática completada: {len(viajes_generados)} viajes generados")
+            viajes_generados, sin_plaza = self._algoritmo_asignacion(
+                conductores, estudiantes_viajan, carros_disponibles, fecha, motor
+            )
+            
+            # Guardar todos los viajes en un único commit, sustituyendo los que
+            # generó una asignación automática anterior para la misma fecha
+            coleccion = self.db.collection(self.collection_viajes)
+            batch = self.db.batch()
+            for id_viaje in ids_anteriores:
+                batch.delete(coleccion.document(id_viaje))
+            for viaje in viajes_generados:
+                batch.set(coleccion.document(viaje['id_viaje']),
+                          {**viaje, 'fecha_creacion': SERVER_TIMESTAMP})
+            batch.commit()
+            ids_creados = [v['id_viaje'] for v in viajes_generados]
+            ids_eliminados = sorted(set(ids_anteriores) - set(ids_creados))
+            
+            logger.info(f"Asignación automática completada: {len(viajes_generados)} viajes generados, "
+                        f"{len(ids_eliminados)} anteriores eliminados")
             
             return {
                 'success': True,
                 'message': f'Asignación completada: {len(viajes_generados)} viajes generados',
+                'viajes_creados': viajes_generados,
+                'viajes_creados_ids': ids_creados,
+                'viajes_eliminados_ids': ids_eliminados,
+                'estudiantes_sin_asignar': sin_plaza,
                 'data': {
                     'viajes_generados': viajes_generados,
                     'total_viajes': len(viajes_generados),
@@ -436,7 +547,32 @@ class ViajeManager:
                 'errors': [str(e)]
             }
     
-    def _algoritmo_asignacion(self, conductores: List[Dict], estudiantes: List[Dict], carros: List[Dict], fecha: str) -> List[Dict]:
+    def _viajes_automaticos(self, fecha: str) -> Tuple[List[str], List[str]]:
+        """
+        IDs de los viajes planificados que generó la asignación automática
+        para una fecha y, de ellos, los protegidos: con pasajeros distintos
+        de los asignados (agregar_pasajero, edición a mano) o en la lista diaria
+        """
+        prefijos = tuple(f"{tipo_viaje}_{fecha}_" for tipo_viaje in ('ida', 'vuelta'))
+        query = (self.db.collection(self.collection_viajes)
+                 .where('fecha', '==', fecha)
+                 .where('estado', '==', 'planificado')
+                 .select(['pasajeros', 'pasajeros_asignados']))
+        lista = (self.db.collection(self.collection_listas)
+                 .document(f"lista_{fecha.replace('-', '')}").get().to_dict())
+        en_lista = set(lista.get('viajes_ida', [])) | set(lista.get('viajes_vuelta', []))
+        ids, protegidos = [], []
+        for doc in query.stream():
+            if not doc.id.startswith(prefijos):
+                continue
+            ids.append(doc.id)
+            viaje = doc.to_dict()
+            if doc.id in en_lista or viaje.get('pasajeros') != viaje.get('pasajeros_asignados'):
+                protegidos.append(doc.id)
+        return ids, protegidos
+    
+    def _algoritmo_asignacion(self, conductores: List[Dict], estudiantes: List[Dict], carros: List[Dict],
+                              fecha: str, motor: Optional[str] = None) -> Tuple[List[Dict], List[str]]:
         """
         Algoritmo para asignar estudiantes a carros con conductores
         
@@ -445,14 +581,48 @@ class ViajeManager:
             estudiantes: Lista de todos los estudiantes
             carros: Lista de carros disponibles
             fecha: Fecha del viaje
+            motor: 'flujo' (máximo de sentados con el mínimo de carros) o 'voraz'
             
         Returns:
-            list: Lista de viajes generados
+            tuple: Lista de viajes generados y matrículas que quedaron sin plaza
         """
+        motor = motor or get_config().ASIGNACION_MOTOR
+        if motor not in MOTORES_ASIGNACION:
+            logger.warning(f"Motor de asignación '{motor}' desconocido - se usa 'voraz'")
+            motor = 'voraz'
+        
+        plan, sin_plaza = None, []
+        if motor == 'flujo':
+            try:
+                plan, sin_plaza = asignar_por_flujo(conductores, estudiantes, carros)
+            except Exception as e:
+                logger.error(f"Error en la asignación por flujo, se usa la voraz: {e}")
+        if plan is None:
+            plan, sin_plaza = self._asignacion_voraz(conductores, estudiantes, carros)
+        
         viajes_generados = []
+        for conductor, carro, pasajeros in plan:
+            viajes_generados.extend(self._viajes_ida_vuelta(conductor, carro, pasajeros, fecha))
+        return viajes_generados, sin_plaza
+    
+    def _asignacion_voraz(self, conductores: List[Dict], estudiantes: List[Dict],
+                          carros: List[Dict]) -> Tuple[List[Tuple[Dict, Dict, List[str]]], List[str]]:
+        """
+        Cada conductor (los más versátiles primero) toma el primer carro
+        compatible libre y lo llena en el orden de la lista de estudiantes
+        
+        Returns:
+            tuple: ([(conductor, carro, pasajeros)], matrículas sin plaza)
+        """
+        plan = []
         estudiantes_asignados = set()
         carros_usados = set()
         
+        # Colas de pasajeros (sin licencia primero) que se recorren una sola vez
+        sin_licencia = [e['matricola'] for e in estudiantes if not e.get('tiene_licencia', False)]
+        con_licencia = [e['matricola'] for e in estudiantes if e.get('tiene_licencia', False)]
+        siguiente_sin, siguiente_con = 0, 0
+        
         # Ordenar conductores por cantidad de licencias (más versátiles primero)
         conductores_ordenados = sorted(conductores, key=lambda c: len(c.get('tipos_licencia', [])), reverse=True)
         
@@ -473,96 +643,65 @@ class ViajeManager:
             if not carro_asignado:
                 continue
             
-            # Crear viaje de ida y vuelta
-            pasajeros_ida = []
-            pasajeros_vuelta = []
+            estudiantes_asignados.add(conductor['matricola'])
+            carros_usados.add(carro_asignado['id_carro'])
+            pasajeros = []
             capacidad_disponible = carro_asignado['capacidad_pasajeros'] - 1  # -1 por el conductor
             
-            # Asignar pasajeros (estudiantes sin licencia primero)
-            estudiantes_sin_conductor = [e for e in estudiantes if e['matricola'] not in estudiantes_asignados and e['matricola'] != conductor['matricola']]
-            estudiantes_sin_licencia = [e for e in estudiantes_sin_conductor if not e.get('tiene_licencia', False)]
-            otros_estudiantes = [e for e in estudiantes_sin_conductor if e.get('tiene_licencia', False)]
-            
             # Priorizar estudiantes sin licencia
-            for estudiante in estudiantes_sin_licencia[:capacidad_disponible]:
-                pasajeros_ida.append(estudiante['matricola'])
-                pasajeros_vuelta.append(estudiante['matricola'])
-                estudiantes_asignados.add(estudiante['matricola'])
+            while capacidad_disponible > 0 and siguiente_sin < len(sin_licencia):
+                pasajeros.append(sin_licencia[siguiente_sin])
+                siguiente_sin += 1
                 capacidad_disponible -= 1
             
             # Llenar con otros estudiantes si hay espacio
-            for estudiante in otros_estudiantes[:capacidad_disponible]:
-                pasajeros_ida.append(estudiante['matricola'])
-                pasajeros_vuelta.append(estudiante['matricola'])
-                estudiantes_asignados.add(estudiante['matricola'])
-                capacidad_disponible -= 1
-            
-            # Crear viaje de ida
-            viaje_ida = {
-                'id_viaje': f"ida_{fecha}_{conductor['matricola']}_{carro_asignado['id_carro']}",
-                'fecha': fecha,
-                'hora_salida': '07:30',  # Hora estándar de ida
-                'origen': 'Seminario',
-                'destino': 'Universidad Gregoriana',
-                'id_carro': carro_asignado['id_carro'],
-                'matricola_conductor': conductor['matricola'],
-                'pasajeros': pasajeros_ida,
-                'estado': 'planificado',
-                'ocupacion_actual': 1 + len(pasajeros_ida),
-                'capacidad_maxima': carro_asignado['capacidad_pasajeros'],
-                'tipo_viaje': 'ida'
-            }
-            
-            # Crear viaje de vuelta
-            viaje_vuelta = {
-                'id_viaje': f"vuelta_{fecha}_{conductor['matricola']}_{carro_asignado['id_carro']}",
+            while capacidad_disponible > 0 and siguiente_con < len(con_licencia):
+                matricola = con_licencia[siguiente_con]
+                siguiente_con += 1
+                if matricola not in estudiantes_asignados:
+                    pasajeros.append(matricola)
+                    capacidad_disponible -= 1
+            
+            estudiantes_asignados.update(pasajeros)
+            plan.append((conductor, carro_asignado, pasajeros))
+        
+        sin_plaza = [e['matricola'] for e in estudiantes if e['matricola'] not in estudiantes_asignados]
+        return plan, sin_plaza
+    
+    def _viajes_ida_vuelta(self, conductor: Dict, carro: Dict, pasajeros: List[str], fecha: str) -> List[Dict]:
+        """Viajes de ida y de vuelta de un conductor con su carro y pasajeros"""
+        viajes = []
+        for tipo_viaje, hora_salida, origen, destino in (
+            ('ida', '07:30', 'Seminario', 'Universidad Gregoriana'),       # Hora estándar de ida
+            ('vuelta', '18:00', 'Universidad Gregoriana', 'Seminario'),    # Hora estándar de vuelta
+        ):
+            viajes.append({
+                'id_viaje': f"{tipo_viaje}_{fecha}_{conductor['matricola']}_{carro['id_carro']}",
                 'fecha': fecha,
-                'hora_salida': '18:00',  # Hora estándar de vuelta
-                'origen': 'Universidad Gregoriana',
-                'destino': 'Seminario',
-                'id_carro': carro_asignado['id_carro'],
+                'hora_salida': hora_salida,
+                'origen': origen,
+                'destino': destino,
+                'id_carro': carro['id_carro'],
                 'matricola_conductor': conductor['matricola'],
-                'pasajeros': pasajeros_vuelta,
+                'pasajeros': list(pasajeros),
+                'pasajeros_asignados': list(pasajeros),  # Para detectar cambios antes de sustituirlo
                 'estado': 'planificado',
-                'ocupacion_actual': 1 + len(pasajeros_vuelta),
-                'capacidad_maxima': carro_asignado['capacidad_pasajeros'],
-                'tipo_viaje': 'vuelta'
-            }
-            
-            viajes_generados.extend([viaje_ida, viaje_vuelta])
-            estudiantes_asignados.add(conductor['matricola'])
-            carros_usados.add(carro_asignado['id_carro'])
-        
-        return viajes_generados
+                'ocupacion_actual': 1 + len(pasajeros),
+                'capacidad_maxima': carro['capacidad_pasajeros'],
+                'tipo_viaje': tipo_viaje
+            })
+        return viajes
     
     def _puede_conducir_carro(self, conductor_data: Dict, carro_data: Dict) -> bool:
-        """Verificar si un conductor puede manejar un carro específico"""
+        """Verificar si un conductor puede manejar un carro específico (MATRIZ_LICENCIA_CARRO)"""
         if not conductor_data.get('tiene_licencia', False):
             return False
         
-        tipos_licencia_conductor = conductor_data.get('tipos_licencia', [])
-        tipo_carro = carro_data.get('tipo_carro')
-        
-        # Mapeo simplificado de compatibilidad
-        compatibilidad = {
-            'mini': ['B', 'C', 'D'],
-            'compacto': ['B', 'C', 'D'],
-            'familiar': ['B', 'C', 'D'],
-            'furgoneta': ['C', 'D'],
-            'microbus': ['D']
-        }
-        
-        licencias_requeridas = compatibilidad.get(tipo_carro, [])
-        return any(licencia in tipos_licencia_conductor for licencia in licencias_requeridas)
+        return carro_data.get('tipo_carro') in tipos_carro_compatibles(conductor_data.get('tipos_licencia', []))
     
-    def _calcular_total_estudiantes(self, ids_viajes: List[str]) -> int:
-        """Calcular total de estudiantes en una lista de viajes"""
-        total = 0
-        for id_viaje in ids_viajes:
-            viaje = self.obtener_viaje(id_viaje)
-            if viaje:
-                total += viaje.get('ocupacion_actual', 0)
-        return total
+    def _calcular_total_estudiantes(self, viajes: Dict[str, Any], ids_viajes: List[str]) -> int:
+        """Calcular total de estudiantes en una lista de viajes ya leídos"""
+        return sum(viajes[id_viaje].get('ocupacion_actual') or 0 for id_viaje in ids_viajes)
     
     def _generar_id_viaje(self, fecha: str, hora: str) -> str:
         """Generar ID único para viaje"""
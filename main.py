@@ -123,6 +123,13 @@ def get_student_manager():
     return _managers["student"]
 
 
+def get_scheduler():
+    if "scheduler" not in _managers:
+        from core.student_scheduler import StudentScheduler
+        _managers["scheduler"] = StudentScheduler()
+    return _managers["scheduler"]
+
+
 def get_viaje_manager():
     if "viaje" not in _managers:
         from core.viaje_manager import ViajeManager
@@ -130,14 +137,20 @@ def get_viaje_manager():
     return _managers["viaje"]
 
 
+def _imprimir_capacidades(capacidades):
+    for nombre, valor in capacidades.items():
+        print(f"  {C.DIM}  {nombre:<10} {valor}{C.RESET}")
+
+
 def verificar_conexion():
     """Verificar acceso al almacenamiento local. Devuelve bool."""
     print(f"  {C.DIM}Verificando almacenamiento local...{C.RESET}", end="", flush=True)
     try:
-        from core.obsidian_manager import ObsidianManager
+        from core.obsidian_manager import ObsidianManager, capacidades_almacenamiento
         storage = ObsidianManager()
         if storage.test_connection():
             print(f"\r  {C.GREEN}Almacenamiento local OK.{C.RESET}                          ")
+            _imprimir_capacidades(capacidades_almacenamiento())
             return True
         else:
             print(f"\r  {C.RED}No se pudo acceder al almacenamiento.{C.RESET}               ")
@@ -174,6 +187,11 @@ def menu_carros():
         else: err("Opcion invalida.")
 
 
+# Campos que muestran las tablas: las consultas no cargan el resto del documento
+CAMPOS_TABLA_CARROS = ["id_carro", "marca", "modelo", "placa", "tipo_carro",
+                       "capacidad_pasajeros", "estado"]
+
+
 def _tabla_carros(carros):
     if not carros:
         warn("No se encontraron carros.")
@@ -207,7 +225,7 @@ def listar_carros():
             requerido=False, valor_defecto=""
         )
         filtros = {"estado": estado} if estado else {}
-        carros = cm.obtener_todos_carros(filtros)
+        carros = cm.obtener_todos_carros(filtros, campos=CAMPOS_TABLA_CARROS)
         _tabla_carros(carros)
         stats = cm.obtener_estadisticas()
         por_estado = stats.get('por_estado', {})
@@ -363,6 +381,7 @@ def menu_estudiantes():
         menu_opcion(5, "Editar estudiante")
         menu_opcion(6, "Marcar disponibilidad de hoy")
         menu_opcion(7, "Eliminar estudiante")
+        menu_opcion(8, "Grupos compatibles", "por horario de entrada y salida")
         menu_opcion(0, "Volver")
         print()
         op = pedir("Opcion", requerido=False, valor_defecto="0")
@@ -374,9 +393,14 @@ def menu_estudiantes():
         elif op == "5": editar_estudiante()
         elif op == "6": marcar_disponibilidad()
         elif op == "7": eliminar_estudiante()
+        elif op == "8": ver_grupos_compatibles()
         else: err("Opcion invalida.")
 
 
+CAMPOS_TABLA_ESTUDIANTES = ["matricola", "nombre", "nome", "apellido", "cognome",
+                            "email", "tiene_licencia", "viaja_hoy"]
+
+
 def _tabla_estudiantes(estudiantes):
     if not estudiantes:
         warn("No se encontraron estudiantes.")
@@ -414,7 +438,8 @@ def listar_estudiantes():
         elif filtro == "viajan_hoy":
             filtros["viaja_hoy"] = True
 
-        estudiantes = sm.listar_estudiantes(filtros if filtros else None)
+        estudiantes = sm.listar_estudiantes(filtros if filtros else None,
+                                            campos=CAMPOS_TABLA_ESTUDIANTES)
         _tabla_estudiantes(estudiantes)
         stats = sm.obtener_estadisticas()
         resumen = stats.get('resumen', {})
@@ -966,7 +991,9 @@ def marcar_disponibilidad():
     print()
     try:
         sm = get_student_manager()
-        estudiantes = sm.listar_estudiantes()
+        estudiantes = sm.listar_estudiantes(campos=[
+            "matricola", "nombre", "nome", "apellido", "cognome", "horario", "clases"
+        ])
         if not estudiantes:
             warn("No hay estudiantes registrados.")
             pausar()
@@ -986,7 +1013,7 @@ def marcar_disponibilidad():
         print(f"{C.BOLD}{header}{C.RESET}")
         print(f"  {'─' * (col_n + col_d * 5)}")
 
-        actualizados = 0
+        actualizaciones = {}
         for e in estudiantes:
             d = e if isinstance(e, dict) else e.to_dict()
             mat = d.get("matricola", "")
@@ -996,11 +1023,10 @@ def marcar_disponibilidad():
 
             # Actualizar viaja_hoy basado en el dia actual
             viaja_hoy = disp.get(dia_hoy_it, 0) > 0 if dia_hoy_it else False
-            sm.actualizar_estudiante(mat, {
+            actualizaciones[mat] = {
                 "viaja_hoy": viaja_hoy,
                 "disponibilidad_semanal": {DIAS_CORTO[d_]: disp[d_] > 0 for d_ in DIAS_SEMANA_IT}
-            })
-            actualizados += 1
+            }
 
             # Fila
             linea = f"  {nombre[:col_n-1]:<{col_n}}"
@@ -1017,7 +1043,11 @@ def marcar_disponibilidad():
             info(f"* = hoy ({dia_hoy_it})")
         else:
             info("Hoy es fin de semana — no hay clases.")
-        ok(f"{actualizados} estudiante(s) actualizados.")
+        # Un solo commit para toda la semana en lugar de una escritura por estudiante
+        res = sm.actualizar_estudiantes_lote(actualizaciones)
+        ok(res["message"] + ".")
+        for error in res.get("errors", []):
+            warn(error)
     except Exception as e:
         err(f"Error: {e}")
     pausar()
@@ -1045,6 +1075,24 @@ def eliminar_estudiante():
     pausar()
 
 
+def ver_grupos_compatibles():
+    subtitulo("GRUPOS COMPATIBLES")
+    matricola = pedir("Matricola para ver su detalle (Enter = ninguna)", requerido=False)
+    from config import get_config
+    tolerancia = pedir("Tolerancia en minutos entre llegadas/salidas (0 = exacta)", requerido=False,
+                       valor_defecto=str(get_config().EMPAREJAMIENTO_TOLERANCIA_MIN))
+    try:
+        scheduler = get_scheduler()
+        resultado = scheduler.obtener_emparejamiento(tolerancia_minutos=max(int(tolerancia), 0))
+        print(scheduler.formatear_informe(resultado, matricola or None))
+        print()
+        info(f"{len(resultado.grupos_ida)} grupo(s) de ida, {len(resultado.grupos_vuelta)} de vuelta; "
+             f"{resultado.estudiantes_emparejados} de {resultado.total_estudiantes} estudiante(s) con grupo")
+    except Exception as e:
+        err(f"Error: {e}")
+    pausar()
+
+
 # =============================================================================
 #  MODULO: VIAJES
 # =============================================================================
@@ -1141,7 +1189,7 @@ def crear_viaje():
 
         # Carros disponibles
         cm = get_car_manager()
-        carros_disp = cm.obtener_todos_carros({"estado": "disponible"})
+        carros_disp = cm.obtener_todos_carros({"estado": "disponible"}, campos=CAMPOS_TABLA_CARROS)
         if not carros_disp:
             warn("No hay carros disponibles.")
             pausar()
@@ -1227,6 +1275,19 @@ def agregar_pasajero():
     pausar()
 
 
+def _generar_asignacion(vm, fecha):
+    """Asignacion automatica; si hay viajes protegidos, pregunta antes de reemplazarlos."""
+    res = vm.generar_asignacion_automatica(fecha)
+    protegidos = res.get("viajes_protegidos", [])
+    if protegidos:
+        warn(res["message"] + ":")
+        for id_viaje in protegidos:
+            print(f"  {C.DIM}    - {id_viaje}{C.RESET}")
+        if pedir_confirmacion("Reemplazarlos de todos modos?"):
+            res = vm.generar_asignacion_automatica(fecha, reemplazar=True)
+    return res
+
+
 def asignacion_automatica():
     subtitulo("ASIGNACION AUTOMATICA")
     info("Asigna conductores, carros y pasajeros segun disponibilidad del dia.")
@@ -1235,7 +1296,7 @@ def asignacion_automatica():
         return
     try:
         info("Calculando... (puede tardar unos segundos)")
-        res = get_viaje_manager().generar_asignacion_automatica(fecha)
+        res = _generar_asignacion(get_viaje_manager(), fecha)
         if res["success"]:
             ok(res.get("message", "Asignacion completada"))
             viajes_c = res.get("viajes_creados", [])
@@ -1333,7 +1394,7 @@ def generar_lista_diaria():
     try:
         vm = get_viaje_manager()
         info("Paso 1/2: Ejecutando asignacion automatica...")
-        res_asig = vm.generar_asignacion_automatica(fecha)
+        res_asig = _generar_asignacion(vm, fecha)
         if not res_asig["success"]:
             err(f"Error en asignacion: {res_asig.get('message','')}")
             pausar()
@@ -1364,6 +1425,7 @@ def menu_sistema():
         menu_opcion(2, "Verificar almacenamiento local")
         menu_opcion(3, "Verificar Chrome / Selenium")
         menu_opcion(4, "Gestionar contrasena de administrador")
+        menu_opcion(5, "Reconstruir indices", "tras editar notas a mano en Obsidian")
         menu_opcion(0, "Volver")
         print()
         op = pedir("Opcion", requerido=False, valor_defecto="0")
@@ -1372,6 +1434,7 @@ def menu_sistema():
         elif op == "2": probar_almacenamiento()
         elif op == "3": probar_chrome()
         elif op == "4": gestionar_admin()
+        elif op == "5": reconstruir_indices()
         else: err("Opcion invalida.")
 
 
@@ -1380,7 +1443,7 @@ def estadisticas_generales():
     try:
         stats_c = get_car_manager().obtener_estadisticas()
         stats_e = get_student_manager().obtener_estadisticas()
-        viajes_hoy = get_viaje_manager().listar_viajes(fecha=date.today().isoformat())
+        viajes_hoy = get_viaje_manager().contar_viajes(fecha=date.today().isoformat())
 
         print(f"\n  {C.BOLD}CARROS{C.RESET}")
         por_estado = stats_c.get('por_estado', {})
@@ -1397,7 +1460,13 @@ def estadisticas_generales():
         print(f"  Viajan hoy        {resumen_e.get('viajan_hoy',0)}")
 
         print(f"\n  {C.BOLD}VIAJES HOY  ({date.today().isoformat()}){C.RESET}")
-        print(f"  Total             {len(viajes_hoy)}")
+        print(f"  Total             {viajes_hoy}")
+
+        emparejamiento = get_scheduler().obtener_emparejamiento()
+        print(f"\n  {C.BOLD}GRUPOS COMPATIBLES{C.RESET}")
+        print(f"  De ida            {len(emparejamiento.grupos_ida)}")
+        print(f"  De vuelta         {len(emparejamiento.grupos_vuelta)}")
+        print(f"  Con grupo         {emparejamiento.estudiantes_emparejados}")
     except Exception as e:
         err(f"Error: {e}")
     pausar()
@@ -1406,7 +1475,7 @@ def estadisticas_generales():
 def probar_almacenamiento():
     subtitulo("VERIFICAR ALMACENAMIENTO LOCAL")
     try:
-        from core.obsidian_manager import ObsidianManager
+        from core.obsidian_manager import ObsidianManager, capacidades_almacenamiento
         storage = ObsidianManager()
         if storage.test_connection():
             ok("Almacenamiento local accesible.")
@@ -1414,6 +1483,7 @@ def probar_almacenamiento():
             info(f"Directorio: {storage.datos_path}")
             info(f"Colecciones: {stats.get('total_colecciones', 0)}")
             info(f"Documentos: {stats.get('total_documentos', 0)}")
+            _imprimir_capacidades(capacidades_almacenamiento())
         else:
             err("No se pudo acceder al almacenamiento.")
     except Exception as e:
@@ -1421,6 +1491,24 @@ def probar_almacenamiento():
     pausar()
 
 
+def reconstruir_indices():
+    subtitulo("RECONSTRUIR INDICES")
+    try:
+        from core.obsidian_manager import ObsidianManager
+        db = ObsidianManager().get_client()
+        conteos = db.reconstruir_indices()
+        for coleccion, total in conteos.items():
+            info(f"{coleccion:<14} {total} documento(s) indexados")
+        for coleccion, corregidas in db.reconciliar_estadisticas().items():
+            info(f"{coleccion:<14} estadisticas {'corregidas' if corregidas else 'al dia'}")
+        total = ObsidianManager().emparejamiento().reconstruir()
+        info(f"{'emparejamiento':<14} {total} estudiante(s) indexados")
+        ok("Indices y estadisticas reconstruidos.")
+    except Exception as e:
+        err(f"Error: {e}")
+    pausar()
+
+
 def probar_chrome():
     subtitulo("VERIFICAR CHROME / SELENIUM")
     info("Intentando iniciar Chrome en modo headless...")
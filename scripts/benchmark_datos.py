@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de la capa de almacenamiento Markdown de PUG
+Genera una bóveda de prueba con estudiantes demo y mide las rutas de lectura/escritura.
+
+Uso:
+    python scripts/benchmark_datos.py lectura --estudiantes 5000
+    python scripts/benchmark_datos.py lectura --datos ruta/a/boveda
+    python scripts/benchmark_datos.py yaml --iteraciones 2000
+    python scripts/benchmark_datos.py fsync --documentos 10000
+    python scripts/benchmark_datos.py paralelo --estudiantes 5000 --latencia-ms 2
+    python scripts/benchmark_datos.py memoria --tamanos 1000,4000,16000
+    python scripts/benchmark_datos.py orden --viajes 8000
+    python scripts/benchmark_datos.py arranque --estudiantes 10000
+    python scripts/benchmark_datos.py diario --actualizaciones 2000
+"""
+
+import argparse
+import gc
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.demo_generator import obtener_datos_demo_rapido
+import yaml
+
+from core import obsidian_manager
+from core.markdown_snapshot import ARCHIVO_INSTANTANEA
+from core.obsidian_manager import (
+    MarkdownDB, ObsidianManager, _parse_frontmatter, _read_header, transactional,
+)
+
+
+def generar_boveda(destino: Path, total: int) -> Path:
+    """Crear `total` notas de estudiantes demo (se reutilizan si ya existen)."""
+    est_dir = destino / "estudiantes"
+    existentes = len(list(est_dir.glob("*.md"))) if est_dir.exists() else 0
+    if existentes >= total:
+        return est_dir
+    print(f"📝 Generando {total - existentes} estudiantes demo en {destino}...")
+    manager = ObsidianManager(str(destino))
+    for i in range(existentes, total):
+        matricola = f"{100000 + i}"
+        manager.guardar_estudiante(matricola, obtener_datos_demo_rapido(matricola))
+    return est_dir
+
+
+def _medir(nombre: str, archivos: list, leer) -> float:
+    bytes_leidos = 0
+    inicio = time.perf_counter()
+    for f in archivos:
+        _, leidos = leer(f)
+        bytes_leidos += leidos
+    segundos = time.perf_counter() - inicio
+    print(f"  {nombre:<24} {bytes_leidos / 1024 / 1024:>9.2f} MB  {segundos:>8.3f} s  "
+          f"({len(archivos) / segundos:,.0f} docs/s)")
+    return segundos
+
+
+def _leer_completo(path: Path):
+    """Lector anterior: archivo completo con read_text y búsqueda de '---'."""
+    text = path.read_text(encoding="utf-8")
+    end = text.find("---", 3)
+    return text[3:end], len(text.encode("utf-8"))
+
+
+def bench_lectura(datos: Path, total: int):
+    archivos = sorted(generar_boveda(datos, total).glob("*.md"))[:total]
+    print(f"\n📊 Lectura de frontmatter — {len(archivos)} estudiantes (sin caché, sin YAML)")
+    antes = _medir("antes (read_text)", archivos, _leer_completo)
+    despues = _medir("después (solo cabecera)", archivos, _read_header)
+    print(f"  Mejora: {antes / despues:.2f}x")
+    # Comprobar que ambos lectores entregan el mismo YAML
+    muestra = archivos[:200]
+    iguales = all(
+        _parse_frontmatter(_leer_completo(f)[0]) == _parse_frontmatter(_read_header(f)[0])
+        for f in muestra
+    )
+    print(f"  Frontmatter idéntico en muestra de {len(muestra)}: {'sí' if iguales else 'NO'}")
+
+
+def bench_yaml(datos: Path, iteraciones: int):
+    nota = sorted(generar_boveda(datos, 1).glob("*.md"))[0]
+    yaml_text, _ = _read_header(nota)
+    doc = yaml.safe_load(yaml_text)
+    backends = [("python", yaml.SafeLoader, yaml.SafeDumper)]
+    if yaml.__with_libyaml__:
+        backends.append(("libyaml", yaml.CSafeLoader, yaml.CSafeDumper))
+    print(f"\n📊 YAML de un estudiante típico ({len(yaml_text)} bytes) — {iteraciones} iteraciones")
+    resultados = {}
+    for nombre, loader, dumper in backends:
+        inicio = time.perf_counter()
+        for _ in range(iteraciones):
+            yaml.load(yaml_text, Loader=loader)
+        carga = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        for _ in range(iteraciones):
+            yaml.dump(doc, Dumper=dumper, default_flow_style=False,
+                      allow_unicode=True, sort_keys=False)
+        volcado = time.perf_counter() - inicio
+        resultados[nombre] = (carga, volcado)
+        print(f"  {nombre:<8} load {carga * 1e6 / iteraciones:>8.1f} µs/doc   "
+              f"dump {volcado * 1e6 / iteraciones:>8.1f} µs/doc")
+    if "libyaml" in resultados:
+        (cp, dp), (cc, dc) = resultados["python"], resultados["libyaml"]
+        print(f"  Mejora libyaml: load {cp / cc:.1f}x, dump {dp / dc:.1f}x")
+    else:
+        print("  libyaml no disponible en esta instalación de PyYAML")
+
+
+def bench_fsync(datos: Path, documentos: int):
+    db = MarkdownDB(datos)
+    politica_original = obsidian_manager._fsync_policy
+    print(f"\n📊 Escritura de {documentos} actualizaciones por política de fsync")
+    print(f"  {'política':<8} {'individual':>16} {'WriteBatch':>16}")
+    try:
+        for politica in obsidian_manager.POLITICAS_FSYNC:
+            obsidian_manager.configurar_fsync(politica)
+            col = db.collection(f"bench_fsync_{politica}")
+            refs = [col.document(f"doc_{i:06d}") for i in range(documentos)]
+            preparacion = db.batch(fsync=False)
+            for i, ref in enumerate(refs):
+                preparacion.set(ref, {"n": i, "estado": "inicial"})
+            preparacion.commit()
+
+            inicio = time.perf_counter()
+            for ref in refs:
+                ref.update({"estado": "individual"})
+            individual = time.perf_counter() - inicio
+
+            lote = db.batch()
+            for ref in refs:
+                lote.update(ref, {"estado": "lote"})
+            inicio = time.perf_counter()
+            lote.commit()
+            en_lote = time.perf_counter() - inicio
+
+            print(f"  {politica:<8} {documentos / individual:>11,.0f} docs/s "
+                  f"{documentos / en_lote:>11,.0f} docs/s")
+            shutil.rmtree(col.path, ignore_errors=True)
+    finally:
+        obsidian_manager.configurar_fsync(politica_original)
+
+
+def bench_paralelo(datos: Path, total: int, latencia_ms: float, lote: int):
+    generar_boveda(datos, total)
+    db = MarkdownDB(datos)
+    leer_original = obsidian_manager._read_header
+    if latencia_ms:
+        # Simula un disco de red: cada apertura paga la latencia indicada
+        def leer_lento(path):
+            time.sleep(latencia_ms / 1000)
+            return leer_original(path)
+        obsidian_manager._read_header = leer_lento
+    print(f"\n📊 Escaneo de estudiantes (sin caché, latencia simulada {latencia_ms} ms, lotes de {lote})")
+    referencia = None
+    try:
+        for procesos in (False, True):
+            for hilos in (1, 4, 8):
+                if procesos and hilos == 1:
+                    continue
+                obsidian_manager.configurar_lectura(hilos=hilos, lote=lote, procesos=procesos)
+                obsidian_manager._document_cache.clear()
+                inicio = time.perf_counter()
+                ids = [s.id for s in db.collection("estudiantes").stream()]
+                segundos = time.perf_counter() - inicio
+                if referencia is None:
+                    referencia = ids
+                modo = "hilos + YAML en procesos" if procesos else "hilos"
+                orden = "ok" if ids == referencia else "DISTINTO"
+                print(f"  {hilos} {modo:<26} {len(ids) / segundos:>10,.0f} docs/s   orden {orden}")
+    finally:
+        obsidian_manager._read_header = leer_original
+        obsidian_manager.configurar_lectura(hilos=1)
+
+
+def _pico_memoria(consulta) -> float:
+    """Pico de memoria (KB) al consumir la consulta, con la caché desactivada."""
+    gc.collect()
+    tracemalloc.start()
+    for _ in consulta.stream():
+        pass
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return pico / 1024
+
+
+def bench_memoria(datos: Path, tamanos: list):
+    db = MarkdownDB(datos)
+    cache = obsidian_manager._document_cache
+    max_bytes = cache.max_bytes
+    print("\n📊 Pico de memoria de order_by('hora_salida') sobre viajes sintéticos (sin caché)")
+    print(f"  {'documentos':>10} {'limit(20)':>12} {'limit(20)+cursor':>18} {'sin limit':>12}")
+    try:
+        cache.max_bytes = 0
+        for total in tamanos:
+            col = db.collection(f"bench_memoria_{total}")
+            lote = db.batch(fsync=False)
+            for i in range(total):
+                lote.set(col.document(f"viaje_{i:07d}"), {
+                    "fecha": "2026-03-10",
+                    "hora_salida": f"{(i * 7919) % 24:02d}:{(i * 104729) % 60:02d}",
+                    "pasajeros": [f"{100000 + (i + k) % 5000}" for k in range(4)],
+                })
+            lote.commit()
+            cache.clear()
+            consulta = col.order_by("hora_salida").limit(20)
+            primera = consulta.get()
+            top = _pico_memoria(consulta)
+            cursor = _pico_memoria(consulta.start_after(primera[-1]))
+            completo = _pico_memoria(col.order_by("hora_salida"))
+            print(f"  {total:>10,} {top:>9,.0f} KB {cursor:>15,.0f} KB {completo:>9,.0f} KB")
+            shutil.rmtree(col.path, ignore_errors=True)
+    finally:
+        cache.max_bytes = max_bytes
+
+
+def bench_orden(datos: Path, total: int):
+    db = MarkdownDB(datos)
+    col = db.collection("viajes")
+    lote = db.batch(fsync=False)
+    for i in range(total):
+        lote.set(col.document(f"bench_{i:07d}"), {
+            "fecha": f"2026-{1 + i % 12:02d}-{1 + i % 28:02d}",
+            "hora_salida": f"{(i * 7919) % 24:02d}:{(i * 104729) % 60:02d}",
+            "estado": "planificado",
+        })
+    lote.commit()
+    leer_original = obsidian_manager._read_header
+    leidos = [0]
+
+    def leer_contando(path):
+        leidos[0] += 1
+        return leer_original(path)
+
+    consultas = [
+        ("fecha ↑ (índice)", col.order_by("fecha").limit(20)),
+        ("fecha ↓, hora ↑ (índice)",
+         col.order_by("fecha", "DESCENDING").order_by("hora_salida").limit(20)),
+        ("hora ↑ (sin índice)", col.order_by("hora_salida").limit(20)),
+    ]
+    print(f"\n📊 order_by(...).limit(20) sobre {total} viajes (sin caché)")
+    obsidian_manager._read_header = leer_contando
+    try:
+        for nombre, consulta in consultas:
+            obsidian_manager._document_cache.clear()
+            leidos[0] = 0
+            inicio = time.perf_counter()
+            consulta.get()
+            segundos = time.perf_counter() - inicio
+            print(f"  {nombre:<26} {leidos[0]:>8,} notas leídas  {segundos * 1000:>8.1f} ms")
+    finally:
+        obsidian_manager._read_header = leer_original
+
+
+# Proceso nuevo: importa PUG y mide la primera lectura de la colección
+_PRIMERA_LECTURA = """
+import sys, time
+sys.path.insert(0, sys.argv[1])
+from core.obsidian_manager import ObsidianManager
+inicio = time.perf_counter()
+manager = ObsidianManager(sys.argv[2])
+if sys.argv[3] == "resumen":
+    n = len(manager.obtener_todos_estudiantes())
+else:
+    n = sum(1 for _ in manager.get_client().collection("estudiantes").stream())
+print(n, time.perf_counter() - inicio)
+"""
+
+
+def _primera_lectura(datos: Path, modo: str, instantaneas: bool) -> Tuple[int, float]:
+    entorno = dict(os.environ, DATOS_INSTANTANEAS=str(instantaneas), LOG_LEVEL="WARNING")
+    salida = subprocess.run(
+        [sys.executable, "-c", _PRIMERA_LECTURA, str(Path(__file__).resolve().parent.parent),
+         str(datos), modo],
+        env=entorno, capture_output=True, text=True, check=True,
+    ).stdout.split()
+    return int(salida[-2]), float(salida[-1])
+
+
+def bench_arranque(datos: Path, total: int):
+    est_dir = generar_boveda(datos, total)
+    instantanea = est_dir / ARCHIVO_INSTANTANEA
+    notas = sorted(est_dir.glob("*.md"))
+    print(f"\n📊 Primera lectura de {len(notas)} estudiantes en un proceso nuevo")
+    print(f"  {'':<34} {'resumen (select)':>18} {'completo':>12}")
+    instantanea.unlink(missing_ok=True)
+    for modo in ("resumen", "completo"):
+        _primera_lectura(datos, modo, True)  # construye la instantánea
+    filas = [("sin instantánea (antes)", False, None),
+             ("con instantánea", True, None),
+             ("con instantánea, 1% editadas", True, max(1, len(notas) // 100))]
+    for nombre, activas, editar in filas:
+        tiempos = []
+        for modo in ("resumen", "completo"):
+            if editar:
+                # Simula ediciones en Obsidian: cambia mtime y tamaño
+                for nota in notas[::len(notas) // editar][:editar]:
+                    with open(nota, "a", encoding="utf-8") as fh:
+                        fh.write("\n")
+            n, segundos = _primera_lectura(datos, modo, activas)
+            tiempos.append(segundos)
+        print(f"  {nombre:<34} {tiempos[0] * 1000:>15,.0f} ms {tiempos[1] * 1000:>9,.0f} ms")
+    tamano = instantanea.stat().st_size if instantanea.exists() else 0
+    print(f"  Instantánea: {tamano / 1024 / 1024:.1f} MB")
+
+
+def _actualizaciones_pequenas(db: MarkdownDB, nombre: str, viajes: int, actualizaciones: int) -> Tuple[float, float]:
+    """Reservas de una plaza (transacción) y cambios de un campo (update), en actualizaciones/s."""
+    col = db.collection(nombre)
+    refs = [col.document(f"ida_2026-03-10_{i:04d}") for i in range(viajes)]
+    preparacion = db.batch(fsync=False)
+    for ref in refs:
+        preparacion.set(ref, {"fecha": "2026-03-10", "hora_salida": "07:30", "estado": "planificado",
+                              "capacidad": 10 ** 6, "pasajeros": [], "plazas_libres": 0})
+    preparacion.commit()
+
+    @transactional
+    def reservar(transaction, ref, matricola):
+        snap = transaction.get(ref)
+        transaction.update(ref, {"pasajeros": snap.get("pasajeros") + [matricola]})
+
+    inicio = time.perf_counter()
+    for i in range(actualizaciones):
+        reservar(db.transaction(), refs[i % viajes], f"{i:06d}")
+    transacciones = actualizaciones / (time.perf_counter() - inicio)
+    inicio = time.perf_counter()
+    for i in range(actualizaciones):
+        refs[i % viajes].update({"plazas_libres": i})
+    updates = actualizaciones / (time.perf_counter() - inicio)
+    return transacciones, updates
+
+
+def bench_diario(datos: Path, viajes: int, actualizaciones: int):
+    db = MarkdownDB(datos)
+    print(f"\n📊 {actualizaciones} actualizaciones pequeñas sobre {viajes} viajes (DATOS_FSYNC={obsidian_manager._fsync_policy})")
+    print(f"  {'':<24} {'reservas (transacción)':>24} {'update de un campo':>20}")
+    for nombre, activo in (("notas (sin diario)", False), ("diario", True)):
+        obsidian_manager.configurar_diario(activo)
+        try:
+            transacciones, updates = _actualizaciones_pequenas(db, f"bench_diario_{activo}", viajes, actualizaciones)
+            inicio = time.perf_counter()
+            compactadas = sum(db.compactar_diarios().values())
+            compactacion = time.perf_counter() - inicio
+        finally:
+            obsidian_manager.configurar_diario(False)
+        print(f"  {nombre:<24} {transacciones:>17,.0f} act/s {updates:>13,.0f} act/s")
+        if activo:
+            print(f"  Compactación: {compactadas} notas en {compactacion * 1000:,.0f} ms")
+    ref = db.collection("bench_diario_True").document("ida_2026-03-10_0000").get()
+    esperado = db.collection("bench_diario_False").document("ida_2026-03-10_0000").get()
+    print(f"  Mismo resultado en las notas: {'sí' if ref.to_dict() == esperado.to_dict() else 'NO'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de almacenamiento PUG")
+    parser.add_argument("--datos", help="Carpeta de la bóveda (por defecto, temporal)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_lectura = sub.add_parser("lectura", help="Lector de cabecera vs lectura completa")
+    p_lectura.add_argument("--estudiantes", type=int, default=5000)
+
+    p_yaml = sub.add_parser("yaml", help="Carga/volcado YAML: libyaml vs Python puro")
+    p_yaml.add_argument("--iteraciones", type=int, default=2000)
+
+    p_fsync = sub.add_parser("fsync", help="Escrituras atómicas bajo cada política de fsync")
+    p_fsync.add_argument("--documentos", type=int, default=10000)
+
+    p_par = sub.add_parser("paralelo", help="Escaneo con 1, 4 y 8 lectores")
+    p_par.add_argument("--estudiantes", type=int, default=5000)
+    p_par.add_argument("--latencia-ms", type=float, default=0.0)
+    p_par.add_argument("--lote", type=int, default=64)
+
+    p_mem = sub.add_parser("memoria", help="Memoria de consultas ordenadas con limit")
+    p_mem.add_argument("--tamanos", default="1000,4000,16000",
+                       help="Tamaños de colección separados por coma")
+
+    p_orden = sub.add_parser("orden", help="Ordenación servida por índice vs escaneo")
+    p_orden.add_argument("--viajes", type=int, default=8000)
+
+    p_arr = sub.add_parser("arranque", help="Primera lectura con y sin instantánea binaria")
+    p_arr.add_argument("--estudiantes", type=int, default=10000)
+
+    p_diario = sub.add_parser("diario", help="Actualizaciones pequeñas con y sin diario de escrituras")
+    p_diario.add_argument("--viajes", type=int, default=200)
+    p_diario.add_argument("--actualizaciones", type=int, default=2000)
+
+    args = parser.parse_args()
+    temporal = args.datos is None
+    datos = Path(args.datos) if args.datos else Path(tempfile.mkdtemp(prefix="pug_bench_"))
+    try:
+        if args.comando == "lectura":
+            bench_lectura(datos, args.estudiantes)
+        elif args.comando == "yaml":
+            bench_yaml(datos, args.iteraciones)
+        elif args.comando == "fsync":
+            bench_fsync(datos, args.documentos)
+        elif args.comando == "paralelo":
+            bench_paralelo(datos, args.estudiantes, args.latencia_ms, args.lote)
+        elif args.comando == "memoria":
+            bench_memoria(datos, [int(t) for t in args.tamanos.split(",")])
+        elif args.comando == "orden":
+            bench_orden(datos, args.viajes)
+        elif args.comando == "arranque":
+            bench_arranque(datos, args.estudiantes)
+        elif args.comando == "diario":
+            bench_diario(datos, args.viajes, args.actualizaciones)
+    finally:
+        if temporal:
+            shutil.rmtree(datos, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Benchmarks del matchmaking de PUG
+Genera cohortes demo en memoria (sin tocar datos/) y mide la agrupación por
+horarios (exacta y con tolerancia), el coste de registrar un estudiante en
+el índice de emparejamiento y los motores de asignación de carros.
+
+Uso:
+    python scripts/benchmark_matchmaking.py horarios --estudiantes 10000
+    python scripts/benchmark_matchmaking.py registro --estudiantes 1000 10000
+    python scripts/benchmark_matchmaking.py tolerancia --estudiantes 50 1000 10000 --minutos 60
+    python scripts/benchmark_matchmaking.py asignacion --estudiantes 2000 500 --carros 150
+"""
+
+import argparse
+import logging
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.asignacion_flujo import asignar_por_flujo, tipos_carro_compatibles
+from core.demo_generator import DemoDataGenerator
+from core.horario_bits import (DIAS, MINUTO_FIN, MINUTO_INICIO, SENTIDOS, CohorteHorarios,
+                               codificar_horario, entrada_salida, miembros)
+from core.indice_emparejamiento import ARCHIVO_BLOQUEO_EMPAREJAMIENTO, IndiceEmparejamiento
+from core.models import CAPACIDADES_CARRO, TipoCarro
+from core.obsidian_manager import _bloquear_carpetas
+from core.student_scheduler import StudentScheduler
+from core.viaje_manager import ViajeManager
+from utils.constants import DEMO_NAMES, DIAS_SEMANA, ORDEN_BLOQUES
+
+
+def generar_cohorte(total: int, semilla: int = 1) -> dict:
+    """`total` estudiantes demo con el formato de obtener_todos_estudiantes."""
+    random.seed(semilla)
+    generador = DemoDataGenerator()
+    nombres = DEMO_NAMES['nombres']
+    return {
+        f"{100000 + i}": {
+            'nome': f"{random.choice(nombres)}{i}",
+            'cognome': 'Demo',
+            'horario': generador.generar_horario_demo(random.randint(2, 6)),
+        }
+        for i in range(total)
+    }
+
+
+def _agrupar_con_listas(datos_estudiantes: dict) -> dict:
+    """Agrupación anterior: listas de bloques ordenadas con ORDEN_BLOQUES.index y claves de texto."""
+    indice = {"ida": {}, "vuelta": {}}
+    for info in datos_estudiantes.values():
+        if not info or 'nome' not in info:
+            continue
+        nombre = f"{info.get('nome', '')} {info.get('cognome', '')}".strip()
+        horario_diario = {}
+        for clase in info.get('horario', []):
+            dia, bloque = clase.get('dia'), clase.get('bloque', clase.get('hora', ''))
+            if dia and bloque in ORDEN_BLOQUES:
+                horario_diario.setdefault(dia, []).append(bloque)
+        for dia, bloques in horario_diario.items():
+            ordenados = sorted(bloques, key=lambda b: ORDEN_BLOQUES.index(b))
+            indice["ida"].setdefault(f"{dia}_{ordenados[0]}", []).append(nombre)
+            indice["vuelta"].setdefault(f"{dia}_{ordenados[-1]}", []).append(nombre)
+    return {sentido: {k: v for k, v in grupos.items() if len(v) > 1} for sentido, grupos in indice.items()}
+
+
+def _indice(carpeta: str, cohorte: dict) -> IndiceEmparejamiento:
+    """Índice de emparejamiento de la cohorte en una carpeta temporal."""
+    return IndiceEmparejamiento(Path(carpeta) / "_emparejamiento.jsonl", lambda: cohorte.items(),
+                                lambda: _bloquear_carpetas([Path(carpeta)], ARCHIVO_BLOQUEO_EMPAREJAMIENTO))
+
+
+def bench_horarios(total: int):
+    cohorte = generar_cohorte(total)
+    scheduler = StudentScheduler.__new__(StudentScheduler)
+    print(f"\n📊 Agrupación por horarios — {total} estudiantes")
+
+    inicio = time.perf_counter()
+    anterior = _agrupar_con_listas(cohorte)
+    t_anterior = time.perf_counter() - inicio
+
+    with tempfile.TemporaryDirectory() as tmp:
+        indice = _indice(tmp, cohorte)
+        inicio = time.perf_counter()
+        indice.reconstruir()
+        t_indice = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        grupos = scheduler._calcular_emparejamiento(indice, indice.version).como_claves()
+        t_grupos = time.perf_counter() - inicio
+
+    # Cohorte en memoria: máscaras y un bitset por casilla
+    nombres = [f"{info['nome']} {info['cognome']}" for info in cohorte.values()]
+    inicio = time.perf_counter()
+    bits = CohorteHorarios([codificar_horario(info['horario']) for info in cohorte.values()])
+    t_cohorte = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    grupos_bits = {
+        sentido: {f"{DIAS_SEMANA[dia]}_{ORDEN_BLOQUES[bloque]}": [nombres[i] for i in miembros(bitset)]
+                  for dia, bloque, bitset in bits.grupos(sentido)}
+        for sentido in SENTIDOS
+    }
+    t_grupos_bits = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    for i in range(len(bits)):
+        bits.compatibles(i, "ida", 0)
+    t_compatibles = time.perf_counter() - inicio
+
+    print(f"  {'antes (listas)':<28} {t_anterior * 1000:9.1f} ms")
+    print(f"  {'reconstruir el índice':<28} {t_indice * 1000:9.1f} ms")
+    print(f"  {'grupos desde el índice':<28} {t_grupos * 1000:9.1f} ms")
+    print(f"  {'CohorteHorarios (bitsets)':<28} {t_cohorte * 1000:9.1f} ms")
+    print(f"  {'grupos desde los bitsets':<28} {t_grupos_bits * 1000:9.1f} ms")
+    print(f"  {'compatibles de cada uno':<28} {t_compatibles * 1000:9.1f} ms")
+    print(f"  Grupos: {len(grupos['ida'])} de ida, {len(grupos['vuelta'])} de vuelta — "
+          f"mismo resultado: {'sí' if grupos == anterior == grupos_bits else 'NO'}")
+
+
+def bench_registro(totales: list, repeticiones: int = 200):
+    print(f"\n📊 Registrar un estudiante y consultar grupos (media de {repeticiones})")
+    print(f"  {'estudiantes':>11} {'recalcular todo':>16} {'índice (delta)':>15} {'consulta':>10}")
+    for total in totales:
+        cohorte = generar_cohorte(total)
+        nuevos = generar_cohorte(repeticiones, semilla=2)
+        with tempfile.TemporaryDirectory() as tmp:
+            indice = _indice(tmp, cohorte)
+            indice.reconstruir()
+
+            # Sin índice: cada registro recalculaba los grupos de toda la cohorte
+            inicio = time.perf_counter()
+            for _ in range(max(1, repeticiones // 20)):
+                _agrupar_con_listas(cohorte)
+            t_todo = (time.perf_counter() - inicio) / max(1, repeticiones // 20)
+
+            inicio = time.perf_counter()
+            for i, datos in enumerate(nuevos.values()):
+                indice.actualizar(f"9{i:05d}", datos)
+            t_delta = (time.perf_counter() - inicio) / repeticiones
+
+            inicio = time.perf_counter()
+            for _ in range(20):
+                indice.grupos("ida")
+                indice.grupos("vuelta")
+            t_consulta = (time.perf_counter() - inicio) / 20
+
+        print(f"  {total:>11} {t_todo * 1000:>13.2f} ms {t_delta * 1000:>12.3f} ms {t_consulta * 1000:>7.2f} ms")
+
+
+def _ventanas_por_pares(cohorte: dict, sentido: str, minutos: int) -> set:
+    """Referencia O(n²): para cada estudiante, los que llegan (o salen) hasta `minutos` después."""
+    mascaras = {matricola: codificar_horario(info['horario']) for matricola, info in cohorte.items()}
+    hora = MINUTO_INICIO if sentido == "ida" else MINUTO_FIN
+    extremo = 0 if sentido == "ida" else 1
+    grupos = set()
+    for dia in range(DIAS):
+        tiempos = [(m, hora[extremos[extremo]]) for m, mascara in mascaras.items()
+                   if (extremos := entrada_salida(mascara, dia)) is not None]
+        ventanas = {frozenset(m for m, tm in tiempos if ti <= tm <= ti + minutos) for _, ti in tiempos}
+        grupos |= {(DIAS_SEMANA[dia], v) for v in ventanas if len(v) > 1 and not any(v < otra for otra in ventanas)}
+    return grupos
+
+
+def _viajes_con_grupo(resultado) -> int:
+    """Viajes (estudiante, día, sentido) con grupo, aunque estén en varias ventanas."""
+    por_dia = {}
+    for sentido in SENTIDOS:
+        for grupo in resultado.grupos(sentido):
+            por_dia.setdefault((sentido, grupo.dia), set()).update(grupo.matriculas)
+    return sum(len(matriculas) for matriculas in por_dia.values())
+
+
+def bench_tolerancia(totales: list, minutos: int):
+    print(f"\n📊 Agrupación con tolerancia de {minutos} min vs coincidencia exacta")
+    print(f"  {'estudiantes':>11} {'exacta':>9} {'ventanas':>9} {'por pares':>10} "
+          f"{'grupos':>7} {'con grupo':>10} {'extra':>6} {'viajes extra':>13}")
+    scheduler = StudentScheduler.__new__(StudentScheduler)
+    for total in totales:
+        cohorte = generar_cohorte(total)
+        with tempfile.TemporaryDirectory() as tmp:
+            indice = _indice(tmp, cohorte)
+            indice.reconstruir()
+            version = indice.version
+
+            inicio = time.perf_counter()
+            exacto = scheduler._calcular_emparejamiento(indice, version)
+            t_exacta = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            resultado = scheduler._calcular_emparejamiento_ventanas(indice, version, minutos, 0)
+            t_ventanas = time.perf_counter() - inicio
+
+        grupos = {sentido: {(g.dia, frozenset(g.matriculas)) for g in resultado.grupos(sentido)}
+                  for sentido in SENTIDOS}
+        con_grupo = resultado.matriculas_emparejadas()
+
+        # La referencia por pares solo en cohortes pequeñas
+        pares = "—"
+        if total <= 1000:
+            inicio = time.perf_counter()
+            iguales = all(_ventanas_por_pares(cohorte, sentido, minutos) == grupos[sentido] for sentido in SENTIDOS)
+            pares = f"{(time.perf_counter() - inicio) * 1000:.0f} ms" + ("" if iguales else " ≠")
+
+        total_grupos = sum(len(g) for g in grupos.values())
+        print(f"  {total:>11} {t_exacta * 1000:>6.1f} ms {t_ventanas * 1000:>6.1f} ms {pares:>10} "
+              f"{total_grupos:>7} {len(con_grupo):>10} {len(con_grupo - exacto.matriculas_emparejadas()):>6} "
+              f"{_viajes_con_grupo(resultado) - _viajes_con_grupo(exacto):>13}")
+
+
+def generar_flota(estudiantes: int, carros: int, con_licencia: float = 1 / 3, semilla: int = 1):
+    """Estudiantes que viajan (la fracción `con_licencia` con licencia) y carros de tipos y capacidades variados."""
+    random.seed(semilla)
+    licencias = [['B']] * 12 + [['B', 'C1']] * 2 + [['C']] * 2 + [['B', 'D1']] + [['D']]
+    lista_estudiantes = []
+    for i in range(estudiantes):
+        tiene_licencia = random.random() < con_licencia
+        lista_estudiantes.append({
+            'matricola': f"{100000 + i}",
+            'tiene_licencia': tiene_licencia,
+            'tipos_licencia': random.choice(licencias) if tiene_licencia else [],
+        })
+    tipos = [TipoCarro.MINI] * 3 + [TipoCarro.COMPACTO] * 4 + [TipoCarro.FAMILIAR] * 2 + \
+            [TipoCarro.FURGONETA] + [TipoCarro.MICROBUS]
+    lista_carros = []
+    for i in range(carros):
+        tipo = random.choice(tipos)
+        rango = CAPACIDADES_CARRO[tipo]
+        lista_carros.append({
+            'id_carro': f"CAR{i:04d}",
+            'tipo_carro': tipo.value,
+            'capacidad_pasajeros': random.randint(rango['min'], rango['max']),
+        })
+    return lista_estudiantes, lista_carros
+
+
+def _comprobar_plan(plan, sin_plaza, estudiantes) -> str:
+    """Cada estudiante una sola vez, licencias válidas y sin superar capacidades."""
+    vistos = list(sin_plaza)
+    for conductor, carro, pasajeros in plan:
+        if carro['tipo_carro'] not in tipos_carro_compatibles(conductor.get('tipos_licencia', [])):
+            return "licencia"
+        if 1 + len(pasajeros) > carro['capacidad_pasajeros']:
+            return "capacidad"
+        vistos += [conductor['matricola']] + pasajeros
+    if sorted(vistos) != sorted(e['matricola'] for e in estudiantes):
+        return "estudiantes"
+    return "ok"
+
+
+def bench_asignacion(totales: list, carros: int, con_licencia: float):
+    print(f"\n📊 Asignación de conductores, carros y pasajeros — {carros} carros, "
+          f"{con_licencia:.0%} de estudiantes con licencia")
+    print(f"  {'estudiantes':>11} {'motor':<7} {'tiempo':>9} {'carros':>7} {'sentados':>9} "
+          f"{'sin plaza':>10} {'plazas vacías':>14} {'válido':>7}")
+    viajes = ViajeManager.__new__(ViajeManager)
+    for total in totales:
+        estudiantes, flota = generar_flota(total, carros, con_licencia)
+        conductores = [e for e in estudiantes if e['tiene_licencia']]
+        for nombre, motor in (("voraz", viajes._asignacion_voraz), ("flujo", asignar_por_flujo)):
+            inicio = time.perf_counter()
+            plan, sin_plaza = motor(conductores, estudiantes, flota)
+            t_motor = time.perf_counter() - inicio
+            sentados = sum(1 + len(pasajeros) for _, _, pasajeros in plan)
+            vacias = sum(carro['capacidad_pasajeros'] for _, carro, _ in plan) - sentados
+            print(f"  {total:>11} {nombre:<7} {t_motor * 1000:>6.1f} ms {len(plan):>7} {sentados:>9} "
+                  f"{len(sin_plaza):>10} {vacias:>14} {_comprobar_plan(plan, sin_plaza, estudiantes):>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del matchmaking de PUG")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_horarios = sub.add_parser("horarios", help="Índice de emparejamiento y bitsets vs listas de bloques")
+    p_horarios.add_argument("--estudiantes", type=int, default=10000)
+
+    p_registro = sub.add_parser("registro", help="Índice incremental vs recalcular la cohorte")
+    p_registro.add_argument("--estudiantes", type=int, nargs="+", default=[1000, 10000])
+
+    p_tolerancia = sub.add_parser("tolerancia", help="Ventanas de tolerancia vs coincidencia exacta")
+    p_tolerancia.add_argument("--estudiantes", type=int, nargs="+", default=[50, 1000, 10000])
+    p_tolerancia.add_argument("--minutos", type=int, default=60)
+
+    p_asignacion = sub.add_parser("asignacion", help="Asignación por flujo de coste mínimo vs voraz")
+    p_asignacion.add_argument("--estudiantes", type=int, nargs="+", default=[2000, 500])
+    p_asignacion.add_argument("--carros", type=int, default=150)
+    p_asignacion.add_argument("--con-licencia", type=float, default=1 / 3)
+
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    if args.comando == "horarios":
+        bench_horarios(args.estudiantes)
+    elif args.comando == "registro":
+        bench_registro(args.estudiantes)
+    elif args.comando == "tolerancia":
+        bench_tolerancia(args.estudiantes, args.minutos)
+    elif args.comando == "asignacion":
+        bench_asignacion(args.estudiantes, args.carros, args.con_licencia)
+
+
+if __name__ == "__main__":
+    main()
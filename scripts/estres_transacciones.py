@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Prueba de estrés de las transacciones (backend de DATOS_BACKEND)
+Varios procesos reservan plazas a la vez en los mismos viajes y crean la misma
+lista diaria; al final se comprueba que ningún viaje quedó sobrevendido, que no
+se perdió ningún pasajero y que la lista se creó una sola vez.
+
+Uso:
+    python scripts/estres_transacciones.py --procesos 8 --intentos 40
+    python scripts/estres_transacciones.py --sin-transaccion   # lectura-escritura sin aislamiento
+    DATOS_BACKEND=sqlite python scripts/estres_transacciones.py
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+FECHA = "2026-03-10"
+CAPACIDAD = 5
+
+
+def _agregar_sin_aislamiento(vm, id_viaje: str, matricola: str) -> dict:
+    """Ruta anterior: leer, comprobar y escribir sin transacción."""
+    viaje = vm.obtener_viaje(id_viaje)
+    if matricola in viaje['pasajeros'] or viaje['ocupacion_actual'] >= viaje['capacidad_maxima']:
+        return {'success': False}
+    time.sleep(0.001)  # ventana típica entre la lectura y la escritura
+    vm.db.collection('viajes').document(id_viaje).update({
+        'pasajeros': viaje['pasajeros'] + [matricola],
+        'ocupacion_actual': viaje['ocupacion_actual'] + 1,
+    })
+    return {'success': True}
+
+
+def trabajador(n: int, viajes: list, intentos: int, sin_transaccion: bool, barrera, salida):
+    from core.viaje_manager import ViajeManager
+    vm = ViajeManager()
+    rng = random.Random(n)
+    reservas, conflictos = [], 0
+    barrera.wait()
+    for i in range(intentos):
+        matricola = f"{200000 + n * 1000 + i}"
+        id_viaje = rng.choice(viajes)
+        if sin_transaccion:
+            res = _agregar_sin_aislamiento(vm, id_viaje, matricola)
+        else:
+            res = vm.agregar_pasajero(id_viaje, matricola)
+            if 'otra sesión' in res.get('message', ''):
+                conflictos += 1
+        if res['success']:
+            reservas.append((id_viaje, matricola))
+    lista = vm.crear_lista_diaria(FECHA, viajes_ida=viajes)
+    salida.put((reservas, conflictos, lista['success']))
+
+
+def preparar(procesos: int, intentos: int, num_viajes: int) -> list:
+    from core.obsidian_manager import abrir_base
+    db = abrir_base(Path(os.environ["DATOS_PATH"]))
+    batch = db.batch(fsync=False)
+    estudiantes = db.collection('estudiantes')
+    for n in range(procesos):
+        for i in range(intentos):
+            matricola = f"{200000 + n * 1000 + i}"
+            batch.set(estudiantes.document(matricola), {'matricola': matricola, 'nombre': 'Estres'})
+    viajes = []
+    for v in range(num_viajes):
+        id_viaje = f"ida_{FECHA}_estres_{v:02d}"
+        batch.set(db.collection('viajes').document(id_viaje), {
+            'id_viaje': id_viaje, 'fecha': FECHA, 'matricola_conductor': f"conductor_{v}",
+            'pasajeros': [], 'ocupacion_actual': 1, 'capacidad_maxima': CAPACIDAD,
+            'estado': 'planificado',
+        })
+        viajes.append(id_viaje)
+    batch.commit()
+    return viajes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estrés de transacciones (reserva de plazas)")
+    parser.add_argument("--procesos", type=int, default=8)
+    parser.add_argument("--intentos", type=int, default=40, help="Reservas por proceso")
+    parser.add_argument("--viajes", type=int, default=6)
+    parser.add_argument("--sin-transaccion", action="store_true")
+    args = parser.parse_args()
+
+    datos = Path(tempfile.mkdtemp(prefix="pug_estres_"))
+    os.environ["DATOS_PATH"] = str(datos)
+    try:
+        viajes = preparar(args.procesos, args.intentos, args.viajes)
+        ctx = multiprocessing.get_context("spawn")
+        barrera = ctx.Barrier(args.procesos)
+        salida = ctx.Queue()
+        modo = "sin transacción" if args.sin_transaccion else "transaccional"
+        print(f"🔥 {args.procesos} procesos × {args.intentos} reservas sobre {len(viajes)} viajes "
+              f"de {CAPACIDAD} plazas ({modo})")
+        inicio = time.perf_counter()
+        hijos = [
+            ctx.Process(target=trabajador,
+                        args=(n, viajes, args.intentos, args.sin_transaccion, barrera, salida))
+            for n in range(args.procesos)
+        ]
+        for h in hijos:
+            h.start()
+        resultados = [salida.get() for _ in hijos]
+        for h in hijos:
+            h.join()
+        segundos = time.perf_counter() - inicio
+
+        from core.obsidian_manager import abrir_base
+        db = abrir_base(datos)
+        confirmadas = {}
+        for reservas, _, _ in resultados:
+            for id_viaje, matricola in reservas:
+                confirmadas.setdefault(id_viaje, set()).add(matricola)
+        sobreventa = perdidos = incoherentes = 0
+        for id_viaje in viajes:
+            viaje = db.collection('viajes').document(id_viaje).get().to_dict()
+            pasajeros = viaje['pasajeros']
+            sobreventa += max(0, viaje['ocupacion_actual'] - CAPACIDAD)
+            perdidos += len(confirmadas.get(id_viaje, set()) - set(pasajeros))
+            incoherentes += viaje['ocupacion_actual'] != 1 + len(pasajeros)
+        listas = sum(1 for _, _, creada in resultados if creada)
+        conflictos = sum(c for _, c, _ in resultados)
+
+        print(f"  Reservas confirmadas:      {sum(len(r) for r, _, _ in resultados)}"
+              f" (plazas totales {len(viajes) * (CAPACIDAD - 1)})")
+        print(f"  Plazas sobrevendidas:      {sobreventa}")
+        print(f"  Pasajeros perdidos:        {perdidos}")
+        print(f"  Ocupación incoherente:     {incoherentes}")
+        print(f"  Listas diarias creadas:    {listas}")
+        print(f"  Conflictos sin resolver:   {conflictos}")
+        print(f"  Tiempo:                    {segundos:.2f} s")
+        correcto = sobreventa == perdidos == incoherentes == 0 and listas == 1
+        print("✅ Sin sobreventa" if correcto else "❌ Inconsistencias detectadas")
+        sys.exit(0 if correcto else 1)
+    finally:
+        shutil.rmtree(datos, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
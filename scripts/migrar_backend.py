@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Migración entre la bóveda Markdown y la base SQLite
+importar copia las notas de datos/ a la base SQLite (DATOS_BACKEND=sqlite);
+exportar regenera la bóveda desde la base para consultarla en Obsidian.
+Las colecciones, subcolecciones e ids se conservan; el cuerpo de las notas
+de estudiantes se vuelve a generar al exportar.
+
+Uso:
+    python scripts/migrar_backend.py importar
+    python scripts/migrar_backend.py exportar --datos boveda_obsidian
+    python scripts/migrar_backend.py importar --datos datos --sqlite /srv/pug.sqlite3
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from config import get_config  # noqa: E402
+from core.obsidian_manager import MarkdownDB  # noqa: E402
+from core.sqlite_db import ARCHIVO_SQLITE, SqliteDB, exportar_boveda, importar_boveda  # noqa: E402
+
+
+def main():
+    config = get_config()
+    parser = argparse.ArgumentParser(description="Copiar datos entre la bóveda Markdown y SQLite")
+    parser.add_argument("sentido", choices=("importar", "exportar"),
+                        help="importar: Markdown → SQLite; exportar: SQLite → Markdown")
+    parser.add_argument("--datos", default=config.DATOS_PATH, help="Carpeta de la bóveda Markdown")
+    parser.add_argument("--sqlite", default=config.DATOS_SQLITE, help="Archivo SQLite")
+    parser.add_argument("--lote", type=int, default=500, help="Documentos por commit")
+    args = parser.parse_args()
+
+    datos = Path(args.datos)
+    base = SqliteDB(Path(args.sqlite) if args.sqlite else datos / ARCHIVO_SQLITE)
+    boveda = MarkdownDB(datos)
+
+    t0 = time.perf_counter()
+    if args.sentido == "importar":
+        conteos = importar_boveda(boveda, base, args.lote)
+        destino = base.path
+    else:
+        conteos = exportar_boveda(base, boveda, args.lote)
+        boveda.guardar_instantaneas()
+        destino = datos
+    for coleccion, total in sorted(conteos.items()):
+        print(f"  {coleccion:<32} {total:>7} documento(s)")
+    print(f"{sum(conteos.values())} documentos copiados a {destino} en {time.perf_counter() - t0:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Particionado de colecciones de la bóveda Markdown
+Mueve las notas de una colección a subcarpetas por fecha (viajes/2026/03/)
+o por hash del id (estudiantes/3f/), o las devuelve a la carpeta plana, y
+escribe _particiones.json. Las lecturas localizan cada nota por su id, así
+que los gestores no cambian. Ejecutar con la aplicación detenida.
+
+Uso:
+    python scripts/particionar.py viajes                   # esquema de DATOS_PARTICIONES (fecha)
+    python scripts/particionar.py estudiantes              # hash por defecto
+    python scripts/particionar.py viajes --esquema plano   # deshacer
+    python scripts/particionar.py viajes --medir           # tiempos de consulta antes y después
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from config import get_config  # noqa: E402
+from core.markdown_particiones import ESQUEMAS  # noqa: E402
+from core import obsidian_manager  # noqa: E402
+from core.obsidian_manager import MarkdownDB  # noqa: E402
+from utils.constants import DATOS_PARTICIONES  # noqa: E402
+
+
+def _en_frio():
+    """Olvidar los documentos ya parseados (caché e instantáneas en memoria)."""
+    obsidian_manager._document_cache.clear()
+    with obsidian_manager._instantaneas_lock:
+        obsidian_manager._instantaneas.clear()
+
+
+def _medir(db: MarkdownDB, nombre: str, campo: str) -> dict:
+    """Tiempo en frío de recorrer la colección y de una consulta por el campo de fecha."""
+    col = db.collection(nombre)
+    tiempos = {}
+    _en_frio()
+    t0 = time.perf_counter()
+    ids = [s.id for s in col.stream()]
+    tiempos["stream"] = time.perf_counter() - t0
+    valor = max((s.get(campo) for s in col.select([campo]).stream()
+                 if isinstance(s.get(campo), str)), default=None)
+    if valor is not None:
+        _en_frio()
+        t0 = time.perf_counter()
+        n = len(col.where(campo, "==", valor).get())
+        tiempos[f"{campo} == {valor} ({n})"] = time.perf_counter() - t0
+    tiempos["documentos"] = len(ids)
+    return tiempos
+
+
+def main():
+    config = get_config()
+    parser = argparse.ArgumentParser(description="Repartir una colección Markdown en subcarpetas")
+    parser.add_argument("coleccion", help="Colección de datos/ (viajes, estudiantes, ...)")
+    parser.add_argument("--esquema", choices=ESQUEMAS, help="fecha, hash o plano (por defecto DATOS_PARTICIONES)")
+    parser.add_argument("--campo", help="Campo de fecha para el esquema por fecha")
+    parser.add_argument("--datos", default=config.DATOS_PATH, help="Carpeta de la bóveda Markdown")
+    parser.add_argument("--medir", action="store_true", help="Medir consultas antes y después")
+    args = parser.parse_args()
+
+    defecto = DATOS_PARTICIONES.get(args.coleccion, {"esquema": "hash"})
+    esquema = args.esquema or defecto["esquema"]
+    campo = args.campo or defecto.get("campo") or "fecha"
+
+    db = MarkdownDB(Path(args.datos))
+    if not (db.base_path / args.coleccion).is_dir():
+        parser.error(f"No existe la colección {db.base_path / args.coleccion}")
+
+    antes = _medir(db, args.coleccion, campo) if args.medir else None
+    t0 = time.perf_counter()
+    resultado = db.particionar(args.coleccion, esquema, campo if esquema == "fecha" else None)
+    print(f"{args.coleccion}: esquema {resultado['esquema']}, {resultado['movidas']} de "
+          f"{resultado['notas']} notas movidas en {time.perf_counter() - t0:.1f} s")
+    if resultado.get("poda") is False:
+        print(f"  Aviso: hay notas cuyo '{campo}' no cae en el mes de su id; "
+              f"las consultas por {campo} recorrerán todas las carpetas")
+
+    if antes is not None:
+        despues = _medir(db, args.coleccion, campo)
+        for clave in antes:
+            if clave != "documentos":
+                print(f"  {clave:<40} {antes[clave] * 1000:9.1f} ms -> {despues.get(clave, 0) * 1000:9.1f} ms")
+    db.guardar_instantaneas()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Asignación automática de viajes: motor de flujo, respaldo voraz y sustitución de los viajes generados."""
+
+import pytest
+
+FECHA = "2026-03-10"
+
+
+@pytest.fixture
+def vm(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATOS_PATH", str(tmp_path / "datos"))
+    from core.viaje_manager import ViajeManager
+    vm = ViajeManager()
+    batch = vm.db.batch()
+    for matricola, licencia in [("100000", ["B"]), ("100001", []), ("100002", [])]:
+        batch.set(vm.db.collection("estudiantes").document(matricola), {
+            "matricola": matricola, "nome": f"N{matricola}", "viaja_hoy": True,
+            "tiene_licencia": bool(licencia), "tipos_licencia": licencia,
+        })
+    for id_carro, estado in [("C1", "disponible"), ("C2", "mantenimiento")]:
+        batch.set(vm.db.collection("carros").document(id_carro), {
+            "id_carro": id_carro, "tipo_carro": "compacto", "capacidad_pasajeros": 5, "estado": estado,
+        })
+    # Viajes que la nueva asignación no debe tocar
+    viajes = vm.db.collection("viajes")
+    batch.set(viajes.document("V20260310_0800"), {"fecha": FECHA, "estado": "planificado"})
+    batch.set(viajes.document("ida_2026-03-10_100009_C9"), {"fecha": FECHA, "estado": "completado"})
+    batch.set(viajes.document("ida_2026-03-11_100000_C1"), {"fecha": "2026-03-11", "estado": "planificado"})
+    batch.commit()
+    return vm
+
+
+def _ids_viajes(vm) -> list:
+    return sorted(doc.id for doc in vm.db.collection("viajes").stream())
+
+
+def test_repetir_asignacion_sustituye_los_viajes_generados(vm):
+    primera = vm.generar_asignacion_automatica(FECHA)
+    assert primera["success"]
+    assert primera["viajes_creados_ids"] == ["ida_2026-03-10_100000_C1", "vuelta_2026-03-10_100000_C1"]
+    assert primera["viajes_eliminados_ids"] == []
+
+    # El carro C1 pasa a mantenimiento: la nueva asignación usa C2
+    vm.db.collection("carros").document("C1").update({"estado": "mantenimiento"})
+    vm.db.collection("carros").document("C2").update({"estado": "disponible"})
+    segunda = vm.generar_asignacion_automatica(FECHA)
+    assert segunda["success"]
+    assert segunda["viajes_eliminados_ids"] == ["ida_2026-03-10_100000_C1", "vuelta_2026-03-10_100000_C1"]
+    assert _ids_viajes(vm) == [
+        "V20260310_0800", "ida_2026-03-10_100000_C2", "ida_2026-03-10_100009_C9",
+        "ida_2026-03-11_100000_C1", "vuelta_2026-03-10_100000_C2",
+    ]
+
+    # Sin cambios, los mismos viajes se vuelven a escribir y no se elimina ninguno
+    tercera = vm.generar_asignacion_automatica(FECHA)
+    assert tercera["viajes_eliminados_ids"] == []
+    assert _ids_viajes(vm) == [
+        "V20260310_0800", "ida_2026-03-10_100000_C2", "ida_2026-03-10_100009_C9",
+        "ida_2026-03-11_100000_C1", "vuelta_2026-03-10_100000_C2",
+    ]
+    ida = vm.db.collection("viajes").document("ida_2026-03-10_100000_C2").get().to_dict()
+    assert sorted(ida["pasajeros"]) == ["100001", "100002"]
+
+
+def test_viajes_con_pasajeros_cambiados_no_se_sustituyen(vm):
+    primera = vm.generar_asignacion_automatica(FECHA)
+    ida, vuelta = primera["viajes_creados_ids"]
+    vm.db.collection("estudiantes").document("100003").set({"matricola": "100003", "viaja_hoy": False})
+    assert vm.agregar_pasajero(ida, "100003")["success"]
+
+    segunda = vm.generar_asignacion_automatica(FECHA)
+    assert not segunda["success"]
+    assert segunda["viajes_protegidos"] == [ida]
+    assert "100003" in vm.db.collection("viajes").document(ida).get().get("pasajeros")
+
+    # Pidiéndolo, se sustituyen igualmente
+    tercera = vm.generar_asignacion_automatica(FECHA, reemplazar=True)
+    assert tercera["success"]
+    assert "100003" not in vm.db.collection("viajes").document(ida).get().get("pasajeros")
+
+
+def test_viajes_de_la_lista_diaria_no_se_sustituyen(vm):
+    ida, vuelta = vm.generar_asignacion_automatica(FECHA)["viajes_creados_ids"]
+    assert vm.crear_lista_diaria(FECHA, viajes_vuelta=[vuelta])["success"]
+
+    vm.db.collection("carros").document("C1").update({"estado": "mantenimiento"})
+    vm.db.collection("carros").document("C2").update({"estado": "disponible"})
+    segunda = vm.generar_asignacion_automatica(FECHA)
+    assert not segunda["success"] and segunda["viajes_protegidos"] == [vuelta]
+    assert ida in _ids_viajes(vm) and vuelta in _ids_viajes(vm)
+
+    tercera = vm.generar_asignacion_automatica(FECHA, reemplazar=True)
+    assert tercera["viajes_eliminados_ids"] == [ida, vuelta]
+
+
+def _estudiante(matricola: str, licencias=()) -> dict:
+    return {"matricola": matricola, "tiene_licencia": bool(licencias), "tipos_licencia": list(licencias)}
+
+
+def _carro(id_carro: str, tipo: str, capacidad: int) -> dict:
+    return {"id_carro": id_carro, "tipo_carro": tipo, "capacidad_pasajeros": capacidad}
+
+
+def _resumen(plan) -> list:
+    return [(conductor["matricola"], carro["id_carro"], pasajeros) for conductor, carro, pasajeros in plan]
+
+
+def test_flujo_usa_el_minimo_de_carros():
+    from core.asignacion_flujo import asignar_por_flujo
+    estudiantes = [_estudiante("1", ["B"]), _estudiante("2", ["B"])] + [_estudiante(str(i)) for i in range(3, 7)]
+    carros = [_carro("M1", "mini", 4), _carro("M2", "mini", 4), _carro("F1", "familiar", 7)]
+    plan, sin_plaza = asignar_por_flujo(estudiantes[:2], estudiantes, carros)
+    # Un familiar de 7 sienta a los 6; dos minis también, pero son dos carros
+    assert _resumen(plan) == [("1", "F1", ["3", "4", "5", "6", "2"])]
+    assert sin_plaza == []
+
+
+def test_flujo_respeta_la_matriz_de_licencias():
+    from core.asignacion_flujo import asignar_por_flujo, tipos_carro_compatibles
+    assert tipos_carro_compatibles(["B"]) == {"mini", "compacto", "familiar"}
+    assert "furgoneta" in tipos_carro_compatibles(["C1"])
+    assert tipos_carro_compatibles(["X", "A"]) == frozenset()
+
+    estudiantes = [_estudiante("1", ["B"])] + [_estudiante(str(i)) for i in range(2, 9)]
+    carros = [_carro("V1", "furgoneta", 9), _carro("C1", "compacto", 5)]
+    # Con B la furgoneta no se puede conducir: solo el compacto
+    plan, sin_plaza = asignar_por_flujo(estudiantes[:1], estudiantes, carros)
+    assert _resumen(plan) == [("1", "C1", ["2", "3", "4", "5"])]
+    assert sin_plaza == ["6", "7", "8"]
+    # Con C1, la furgoneta sienta a los 8
+    estudiantes[0] = _estudiante("1", ["C1"])
+    plan, sin_plaza = asignar_por_flujo(estudiantes[:1], estudiantes, carros)
+    assert [carro["id_carro"] for _, carro, _ in plan] == ["V1"] and sin_plaza == []
+
+
+def test_flujo_para_cuando_otro_carro_no_anade_plazas():
+    from core.asignacion_flujo import RedFlujo, asignar_por_flujo
+    # Dos conductores para cinco carros: no hay un tercer carro que añada plazas
+    conductores = [_estudiante("1", ["B"]), _estudiante("2", ["B"])]
+    estudiantes = conductores + [_estudiante(str(i)) for i in range(3, 21)]
+    carros = [_carro(f"C{i}", "compacto", 5) for i in range(5)]
+    plan, sin_plaza = asignar_por_flujo(conductores, estudiantes, carros)
+    assert len(plan) == 2 and len(sin_plaza) == 20 - 10
+    # Todos sentados con el primer carro: los otros conductores viajan de pasajeros
+    plan, sin_plaza = asignar_por_flujo(conductores, estudiantes[:4], carros)
+    assert _resumen(plan) == [("1", "C0", ["3", "4", "2"])] and sin_plaza == []
+
+    red = RedFlujo(3)
+    arista = red.agregar_arista(0, 1, 1, -4)
+    red.agregar_arista(1, 2, 1)
+    assert red.aumentar(0, 2) == -4 and red.flujo(arista) == 1
+    assert red.aumentar(0, 2) == float("inf")
+
+
+def test_si_el_flujo_falla_se_usa_la_asignacion_voraz(vm, monkeypatch):
+    import core.viaje_manager as viaje_manager
+
+    def fallar(*args):
+        raise RuntimeError("red inválida")
+
+    conductores = [_estudiante("1", ["B"])]
+    estudiantes = conductores + [_estudiante("2"), _estudiante("3")]
+    carros = [_carro("C1", "compacto", 2)]
+    monkeypatch.setattr(viaje_manager, "asignar_por_flujo", fallar)
+    viajes, sin_plaza = vm._algoritmo_asignacion(conductores, estudiantes, carros, FECHA, "flujo")
+    assert [v["id_viaje"] for v in viajes] == ["ida_2026-03-10_1_C1", "vuelta_2026-03-10_1_C1"]
+    assert viajes[0]["pasajeros"] == ["2"] and sin_plaza == ["3"]
+    assert (viajes, sin_plaza) == vm._algoritmo_asignacion(conductores, estudiantes, carros, FECHA, "voraz")
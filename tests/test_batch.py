@@ -0,0 +1,200 @@
+"""WriteBatch de la base Markdown: commit atómico y resumen de escrituras."""
+
+import pytest
+
+import core.obsidian_manager as om
+from core.obsidian_manager import MarkdownDB
+
+
+@pytest.fixture
+def db(tmp_path):
+    return MarkdownDB(tmp_path / "datos")
+
+
+def _contenido(carpeta):
+    """Nombre → bytes de cada archivo de la carpeta (sin los de bloqueo)."""
+    return {p.name: p.read_bytes() for p in carpeta.iterdir() if p.is_file() and not p.name.endswith(".lock")}
+
+
+def test_commit_resume_escrituras(db):
+    viajes = db.collection("viajes")
+    batch = db.batch()
+    for i in range(3):
+        batch.set(viajes.document(f"v{i}"), {"estado": "planificado", "n": i})
+    batch.set(db.collection("carros").document("c1"), {"placa": "AB123CD"})
+    assert len(batch) == 4
+    assert batch.commit() == {"escritos": 4, "omitidos": 0, "eliminados": 0, "carpetas": 2}
+    assert len(batch) == 0
+
+    batch = db.batch()
+    batch.update(viajes.document("v0"), {"estado": "completado"})
+    batch.delete(viajes.document("v1"))
+    assert batch.commit() == {"escritos": 1, "omitidos": 0, "eliminados": 1, "carpetas": 1}
+    assert viajes.document("v0").get().to_dict() == {"estado": "completado", "n": 0}
+    assert not viajes.document("v1").get().exists
+    assert [s.id for s in viajes.where("estado", "==", "planificado").stream()] == ["v2"]
+
+
+def test_commit_fallido_no_toca_ninguna_nota(db, monkeypatch):
+    viajes = db.collection("viajes")
+    batch = db.batch()
+    for i in range(3):
+        batch.set(viajes.document(f"v{i}"), {"estado": "planificado", "n": i})
+    batch.commit()
+    antes = _contenido(viajes.path)
+
+    # La tercera nota temporal falla: las dos primeras ya están escritas
+    escribir = om._escribir_temporal
+    llamadas = []
+
+    def escribir_o_fallar(path, content, fsync):
+        llamadas.append(path)
+        if len(llamadas) == 3:
+            raise OSError("disco lleno")
+        return escribir(path, content, fsync)
+
+    monkeypatch.setattr(om, "_escribir_temporal", escribir_o_fallar)
+    batch = db.batch()
+    for i in range(3):
+        batch.update(viajes.document(f"v{i}"), {"estado": "completado"})
+    batch.set(viajes.document("v9"), {"estado": "completado"})
+    with pytest.raises(OSError):
+        batch.commit()
+
+    assert len(llamadas) == 3
+    # Ni notas cambiadas ni temporales sueltos
+    assert _contenido(viajes.path) == antes
+    assert [s.id for s in viajes.where("estado", "==", "completado").stream()] == []
+    assert viajes.document("v0").get().to_dict() == {"estado": "planificado", "n": 0}
+
+    monkeypatch.setattr(om, "_escribir_temporal", escribir)
+    assert batch.commit()["escritos"] == 4
+    assert [s.id for s in viajes.where("estado", "==", "completado").stream()] == ["v0", "v1", "v2", "v9"]
+
+
+def test_eliminacion_que_no_se_puede_preparar_no_toca_ninguna_nota(db, monkeypatch):
+    viajes = db.collection("viajes")
+    for i in range(3):
+        viajes.document(f"v{i}").set({"estado": "planificado", "n": i})
+    viajes.document("v0").collection("paradas").document("p1").set({"orden": 1})
+    antes = _contenido(viajes.path)
+
+    # La segunda nota a eliminar no se puede apartar: la primera ya lo está
+    apartar = om._apartado_de
+    llamadas = []
+
+    def apartar_o_fallar(path):
+        llamadas.append(path)
+        if len(llamadas) == 3:
+            return path.parent / "no_existe" / path.name
+        return apartar(path)
+
+    monkeypatch.setattr(om, "_apartado_de", apartar_o_fallar)
+    batch = db.batch()
+    batch.update(viajes.document("v2"), {"estado": "completado"})
+    batch.delete(viajes.document("v0"))
+    batch.delete(viajes.document("v1"))
+    with pytest.raises(OSError):
+        batch.commit()
+
+    # v0 y su subcolección vuelven a su sitio; v2 sigue igual
+    assert [p.name for p in llamadas] == ["v0.md", "_v0", "v1.md"]
+    assert _contenido(viajes.path) == antes
+    assert viajes.document("v0").collection("paradas").document("p1").get().exists
+    assert sorted(s.id for s in viajes.stream()) == ["v0", "v1", "v2"]
+
+    monkeypatch.setattr(om, "_apartado_de", apartar)
+    assert batch.commit() == {"escritos": 1, "omitidos": 0, "eliminados": 2, "carpetas": 1}
+    assert [s.id for s in viajes.stream()] == ["v2"]
+    # Ni apartados sueltos ni la carpeta de la subcolección
+    assert not [p.name for p in viajes.path.iterdir() if p.name.endswith(".borrado") or p.name == "_v0"]
+
+
+def test_operaciones_sobre_el_mismo_documento(db):
+    ref = db.collection("viajes").document("v1")
+    ref.set({"estado": "planificado", "n": 1})
+    batch = db.batch()
+    batch.delete(ref)
+    batch.set(ref, {"estado": "recreado"}, merge=True)
+    batch.update(ref, {"n": 2})
+    # La última operación sobre cada nota decide: una sola escritura
+    assert batch.commit() == {"escritos": 1, "omitidos": 0, "eliminados": 0, "carpetas": 1}
+    assert ref.get().to_dict() == {"estado": "recreado", "n": 2}
+
+
+# ── Escrituras sin cambios ──────────────────
+
+def _versiones(carpeta):
+    return {p.name: p.stat().st_ino for p in carpeta.glob("*.md")}
+
+
+def test_notas_iguales_se_omiten(db):
+    viajes = db.collection("viajes")
+    docs = {f"v{i}": {"estado": "planificado", "pasajeros": [f"m{i}"], "n": i} for i in range(3)}
+    batch = db.batch()
+    for doc_id, data in docs.items():
+        batch.set(viajes.document(doc_id), data)
+    batch.commit()
+    antes = _versiones(viajes.path)
+
+    batch = db.batch()
+    for doc_id, data in docs.items():
+        batch.set(viajes.document(doc_id), dict(data))
+    batch.update(viajes.document("v2"), {"n": 2})
+    assert batch.commit() == {"escritos": 0, "omitidos": 3, "eliminados": 0, "carpetas": 0}
+    # Ninguna nota se reescribió (cada escritura deja un inodo nuevo)
+    assert _versiones(viajes.path) == antes
+    viajes.document("v0").set(dict(docs["v0"]))
+    assert _versiones(viajes.path) == antes
+
+    batch = db.batch()
+    batch.set(viajes.document("v0"), dict(docs["v0"]))
+    batch.update(viajes.document("v1"), {"n": 10})
+    assert batch.commit() == {"escritos": 1, "omitidos": 1, "eliminados": 0, "carpetas": 1}
+    assert viajes.document("v1").get().get("n") == 10
+    assert _versiones(viajes.path)["v0.md"] == antes["v0.md"]
+    assert _versiones(viajes.path)["v1.md"] != antes["v1.md"]
+
+
+def test_campos_de_marca_se_escriben(db):
+    # La base compara todos los campos: una actualización de solo la marca se guarda
+    ref = db.collection("carros").document("C1")
+    ref.set({"estado": "disponible", "fecha_actualizacion": "2026-03-01T10:00:00"})
+    batch = db.batch()
+    batch.update(ref, {"fecha_actualizacion": "2026-03-02T10:00:00"})
+    assert batch.commit()["escritos"] == 1
+    assert ref.get().get("fecha_actualizacion") == "2026-03-02T10:00:00"
+    ref.update({"fecha_actualizacion": "2026-03-03T10:00:00"})
+    assert ref.get().get("fecha_actualizacion") == "2026-03-03T10:00:00"
+
+
+def test_estudiantes_sin_cambios_salvo_la_marca_no_se_reescriben(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATOS_PATH", str(tmp_path / "datos"))
+    from core.student_manager import StudentManager
+    manager = StudentManager()
+    datos = {"perfil": {"nome": "Ana", "cognome": "Rossi"}, "horario": []}
+    assert manager.firebase.guardar_estudiante("172934", datos).get("sin_cambios") is None
+    nota = tmp_path / "datos" / "estudiantes" / "172934.md"
+    antes = nota.stat().st_mtime_ns, nota.read_text(encoding="utf-8")
+    # Reextracción igual: solo cambiarían ultima_actualizacion y fecha_extraccion
+    assert manager.firebase.guardar_estudiante("172934", datos)["sin_cambios"]
+    assert (nota.stat().st_mtime_ns, nota.read_text(encoding="utf-8")) == antes
+
+    # El lote añade fecha_actualizacion: sin otros cambios, se omite
+    resultado = manager.actualizar_estudiantes_lote({"172934": {"nome": "Ana"}})
+    assert resultado["data"]["omitidos"] == 1 and resultado["data"]["escritos"] == 0
+    assert nota.read_text(encoding="utf-8") == antes[1]
+    resultado = manager.actualizar_estudiantes_lote({"172934": {"nome": "Anna"}})
+    assert resultado["data"]["escritos"] == 1
+    guardado = manager.db.collection("estudiantes").document("172934").get().to_dict()
+    assert guardado["nome"] == "Anna" and "fecha_actualizacion" in guardado
+
+
+def test_nota_editada_a_mano_se_vuelve_a_escribir(db):
+    ref = db.collection("viajes").document("v1")
+    ref.set({"estado": "planificado"})
+    ref.path.write_text("---\nestado: cancelado\n---\n", encoding="utf-8")
+    batch = db.batch()
+    batch.set(ref, {"estado": "planificado"})
+    assert batch.commit()["escritos"] == 1
+    assert ref.get().to_dict() == {"estado": "planificado"}
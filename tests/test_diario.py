@@ -0,0 +1,86 @@
+"""Diario de escrituras (_diario.jsonl): cola cortada y recuperación tras un corte."""
+
+import json
+import multiprocessing
+import os
+from datetime import date
+from pathlib import Path
+
+from core.markdown_diario import ARCHIVO_BLOQUEO_DIARIO, ARCHIVO_DIARIO, CollectionJournal
+from core.obsidian_manager import MarkdownDB, _bloquear_carpetas, configurar_diario
+
+COLA_CORTADA = b'{"id":"v9","datos":{"estado":"plan'
+
+
+def _diario(carpeta: Path, volcados: list) -> CollectionJournal:
+    return CollectionJournal(carpeta, lambda: _bloquear_carpetas([carpeta], ARCHIVO_BLOQUEO_DIARIO),
+                             volcados.append)
+
+
+def test_cola_cortada_se_ignora_y_se_descarta(tmp_path):
+    diario = _diario(tmp_path, [])
+    diario.anotar([("v1", {"estado": "planificado"}, None), ("v2", {"estado": "completado"}, "# V2")])
+    with open(tmp_path / ARCHIVO_DIARIO, "ab") as fh:
+        fh.write(COLA_CORTADA)
+
+    # Otro proceso (o el mismo tras reiniciar) solo ve las líneas completas
+    releido = _diario(tmp_path, [])
+    entradas = releido.entradas()
+    assert sorted(entradas) == ["v1", "v2"]
+    assert entradas["v2"].datos == {"estado": "completado"} and entradas["v2"].cuerpo == "# V2"
+
+    # La siguiente escritura sustituye la cola cortada
+    releido.anotar([("v3", None, None)])
+    lineas = (tmp_path / ARCHIVO_DIARIO).read_bytes().splitlines()
+    assert [json.loads(linea)["id"] for linea in lineas] == ["v1", "v2", "v3"]
+    entradas = _diario(tmp_path, []).entradas()
+    assert sorted(entradas) == ["v1", "v2", "v3"] and entradas["v3"].datos is None
+
+
+def test_compactar_vuelca_el_ultimo_estado(tmp_path):
+    volcados = []
+    diario = _diario(tmp_path, volcados)
+    diario.anotar([("v1", {"n": 1}, None), ("v2", {"n": 1}, None)])
+    diario.anotar([("v1", {"n": 2}, None), ("v2", None, None)])
+    assert diario.compactar() == 2
+    assert {doc_id: e.datos for doc_id, e in volcados[0].items()} == {"v1": {"n": 2}, "v2": None}
+    assert (tmp_path / ARCHIVO_DIARIO).stat().st_size == 0
+    assert diario.entradas() == {}
+
+
+def _escribir_y_cortar(base: str):
+    """Escribir en el diario y terminar sin compactar, como un corte de luz."""
+    configurar_diario(True)
+    db = MarkdownDB(Path(base))
+    viajes = db.collection("viajes")
+    batch = db.batch()
+    batch.set(viajes.document("v1"), {"fecha": date(2026, 3, 10), "estado": "planificado"})
+    batch.set(viajes.document("v2"), {"fecha": date(2026, 3, 11), "estado": "completado"})
+    batch.update(viajes.document("viejo"), {"estado": "completado"})
+    batch.commit()
+    viajes.document("v2").delete()
+    viajes.document("v3").set({"estado": "planificado"})
+    os._exit(0)
+
+
+def test_recuperacion_tras_corte_con_cola_cortada(tmp_path):
+    base = tmp_path / "datos"
+    MarkdownDB(base).collection("viajes").document("viejo").set({"estado": "planificado", "n": 1})
+
+    hijo = multiprocessing.Process(target=_escribir_y_cortar, args=(str(base),))
+    hijo.start()
+    hijo.join(60)
+    assert hijo.exitcode == 0
+    viajes_path = base / "viajes"
+    assert not (viajes_path / "v1.md").exists()
+    with open(viajes_path / ARCHIVO_DIARIO, "ab") as fh:
+        fh.write(COLA_CORTADA)
+
+    # Al abrir la base sin diario activo se aplican las escrituras pendientes
+    viajes = MarkdownDB(base).collection("viajes")
+    assert (viajes_path / ARCHIVO_DIARIO).stat().st_size == 0
+    assert sorted(p.stem for p in viajes_path.glob("[!_]*.md")) == ["v1", "v3", "viejo"]
+    assert viajes.document("v1").get().to_dict() == {"fecha": date(2026, 3, 10), "estado": "planificado"}
+    assert viajes.document("viejo").get().to_dict() == {"estado": "completado", "n": 1}
+    assert not viajes.document("v9").get().exists
+    assert [s.id for s in viajes.where("estado", "==", "planificado").stream()] == ["v1", "v3"]
@@ -0,0 +1,273 @@
+"""Índice de emparejamiento (_emparejamiento.jsonl) compartido entre procesos."""
+
+import multiprocessing
+from pathlib import Path
+
+import pytest
+
+from core.indice_emparejamiento import ARCHIVO_BLOQUEO_EMPAREJAMIENTO, ARCHIVO_EMPAREJAMIENTO, IndiceEmparejamiento
+from core.obsidian_manager import MarkdownDB, _bloquear_carpetas, _emparejamientos, configurar_diario
+from core.sqlite_db import SqliteDB
+
+POR_PROCESO = 200
+BLOQUES = ["I", "II", "III"]
+
+
+def _indice(carpeta: Path) -> IndiceEmparejamiento:
+    # Sin estudiantes de origen: un registro perdido se reconstruiría vacío
+    return IndiceEmparejamiento(carpeta / ARCHIVO_EMPAREJAMIENTO, lambda: [],
+                                lambda: _bloquear_carpetas([carpeta], ARCHIVO_BLOQUEO_EMPAREJAMIENTO))
+
+
+def _estudiante(i: int) -> dict:
+    # Lunes: los pares de I a II, los impares de II a III
+    primero = i % 2
+    return {
+        "nome": f"Nombre{i}",
+        "cognome": "Apellido",
+        "horario": [{"dia": "Lunedì", "bloque": bloque} for bloque in BLOQUES[primero:primero + 2]],
+    }
+
+
+def _registrar(carpeta: str, inicio: int):
+    indice = _indice(Path(carpeta))
+    for i in range(inicio, inicio + POR_PROCESO):
+        indice.actualizar(str(i), _estudiante(i))
+        if i % 4 == 0:
+            indice.eliminar(str(i))
+
+
+def _compactar(carpeta: str, veces: int):
+    indice = _indice(Path(carpeta))
+    for _ in range(veces):
+        indice._compactar()
+
+
+def test_compactar_mientras_otros_procesos_registran(tmp_path):
+    procesos = [
+        multiprocessing.Process(target=_registrar, args=(str(tmp_path), 0)),
+        multiprocessing.Process(target=_registrar, args=(str(tmp_path), POR_PROCESO)),
+        multiprocessing.Process(target=_compactar, args=(str(tmp_path), 200)),
+    ]
+    for p in procesos:
+        p.start()
+    for p in procesos:
+        p.join(60)
+        assert p.exitcode == 0
+
+    vivos = [i for i in range(2 * POR_PROCESO) if i % 4 != 0]
+    indice = _indice(tmp_path)
+    assert len(indice) == len(vivos)
+    assert indice.nombres([str(i) for i in vivos]) == [f"Nombre{i} Apellido" for i in vivos]
+    assert indice.grupos("ida") == {
+        (0, 0): sorted(str(i) for i in vivos if i % 2 == 0),
+        (0, 1): sorted(str(i) for i in vivos if i % 2 == 1),
+    }
+    assert indice.grupos("vuelta") == {
+        (0, 1): sorted(str(i) for i in vivos if i % 2 == 0),
+        (0, 2): sorted(str(i) for i in vivos if i % 2 == 1),
+    }
+
+
+def test_version_cambia_con_cada_registro_y_compactacion(tmp_path):
+    indice = _indice(tmp_path)
+    indice.actualizar("1", _estudiante(1))
+    antes = indice.version
+    indice.actualizar("2", _estudiante(2))
+    tras_registro = indice.version
+    indice._compactar()
+    assert len({antes, tras_registro, indice.version}) == 3
+    # Otro proceso ve la misma versión que quien escribió
+    assert _indice(tmp_path).version == indice.version
+
+
+def test_grupos_exactos_y_por_ventanas(tmp_path):
+    from core.student_scheduler import StudentScheduler
+    indice = _indice(tmp_path)
+    # Lunes: 1 en I (08:30-09:15), 2 en II (09:30-10:15), 3 en IV (11:30-12:15); 4 solo el martes
+    for matricola, dia, bloque in [("1", "Lunedì", "I"), ("2", "Lunedì", "II"),
+                                   ("3", "Lunedì", "IV"), ("4", "Martedì", "I")]:
+        indice.actualizar(matricola, {"nome": f"N{matricola}", "horario": [{"dia": dia, "bloque": bloque}]})
+    scheduler = StudentScheduler.__new__(StudentScheduler)
+
+    def claves(resultado):
+        return {sentido: {g.clave: g.matriculas for g in resultado.grupos(sentido)} for sentido in ("ida", "vuelta")}
+
+    assert claves(scheduler._calcular_emparejamiento(indice, indice.version)) == {"ida": {}, "vuelta": {}}
+    # 60 minutos: I y II (llegadas 08:30 y 09:30, salidas 09:15 y 10:15); IV queda a 120
+    por_minutos = scheduler._calcular_emparejamiento_ventanas(indice, indice.version, 60, 0)
+    assert claves(por_minutos) == {"ida": {"Lunedì_I-II": ["1", "2"]}, "vuelta": {"Lunedì_I-II": ["1", "2"]}}
+    assert por_minutos.grupos_ida[0].nombres == ["N1", "N2"]
+    # 2 bloques: dos ventanas maximales que comparten a 2
+    por_bloques = scheduler._calcular_emparejamiento_ventanas(indice, indice.version, 0, 2)
+    assert claves(por_bloques)["ida"] == {"Lunedì_I-II": ["1", "2"], "Lunedì_II-IV": ["2", "3"]}
+
+
+@pytest.fixture(params=["markdown", "sqlite"])
+def db(request, tmp_path):
+    if request.param == "markdown":
+        return MarkdownDB(tmp_path / "datos")
+    return SqliteDB(tmp_path / "pug.sqlite3")
+
+
+def _horario(*bloques):
+    return [{"dia": "Lunedì", "bloque": bloque} for bloque in bloques]
+
+
+def _reiniciar(db):
+    """Otro proceso: sin los índices en memoria, solo con el archivo."""
+    _emparejamientos.clear()
+    return db.emparejamiento()
+
+
+def test_escrituras_de_la_base_actualizan_el_indice(db):
+    estudiantes = db.collection("estudiantes")
+    estudiantes.document("100001").set({"nome": "Ana", "horario": _horario("I")})
+    estudiantes.document("100002").set({"nome": "Luca", "horario": _horario("I")})
+    assert db.emparejamiento().grupos("ida") == {(0, 0): ["100001", "100002"]}
+
+    batch = db.batch()
+    batch.update(estudiantes.document("100002"), {"horario": _horario("III")})
+    batch.set(estudiantes.document("100003"), {"nome": "Sara", "horario": _horario("III")})
+    batch.commit()
+    assert db.emparejamiento().grupos("ida") == {(0, 2): ["100002", "100003"]}
+
+    estudiantes.document("100003").delete()
+    estudiantes.document("100001").update({"horario": _horario("III")})
+    assert db.emparejamiento().grupos("ida") == {(0, 2): ["100001", "100002"]}
+    assert db.emparejamiento().nombre("100003") is None
+    # Otras colecciones no entran en el índice
+    db.collection("carros").document("100004").set({"nome": "C", "horario": _horario("III")})
+    assert len(db.emparejamiento()) == 2
+    # Lo escrito sigue valiendo tras reiniciar, sin reconstruir
+    assert not _reiniciar(db).comprobar()
+    assert db.emparejamiento().grupos("ida") == {(0, 2): ["100001", "100002"]}
+
+
+def test_nota_editada_a_mano_reconstruye_al_cargar(tmp_path):
+    db = MarkdownDB(tmp_path / "datos")
+    estudiantes = db.collection("estudiantes")
+    estudiantes.document("100001").set({"nome": "Ana", "horario": _horario("I")})
+    estudiantes.document("100002").set({"nome": "Luca", "horario": _horario("I")})
+    assert db.emparejamiento().grupos("ida") == {(0, 0): ["100001", "100002"]}
+
+    # Edición en Obsidian con la aplicación cerrada
+    nota = tmp_path / "datos" / "estudiantes" / "100002.md"
+    nota.write_text(nota.read_text(encoding="utf-8").replace("bloque: I", "bloque: III"), encoding="utf-8")
+    (tmp_path / "datos" / "estudiantes" / "100001.md").unlink()
+    assert _reiniciar(db).grupos("ida", minimo=1) == {(0, 2): ["100002"]}
+    assert len(db.emparejamiento()) == 1
+
+
+def test_diario_y_compactacion_mantienen_el_indice(tmp_path):
+    configurar_diario(True)
+    db = MarkdownDB(tmp_path / "datos")
+    estudiantes = db.collection("estudiantes")
+    estudiantes.document("100001").set({"nome": "Ana", "horario": _horario("I")})
+    estudiantes.document("100002").set({"nome": "Luca", "horario": _horario("II")})
+    assert not _reiniciar(db).comprobar()
+    assert db.emparejamiento().grupos("ida", minimo=1) == {(0, 0): ["100001"], (0, 1): ["100002"]}
+
+    estudiantes.document("100002").update({"horario": _horario("I")})
+    configurar_diario(False)
+    assert not _reiniciar(db).comprobar()
+    assert db.emparejamiento().grupos("ida") == {(0, 0): ["100001", "100002"]}
+
+
+def test_migrar_backend_deja_el_indice_del_destino_al_dia(tmp_path):
+    from core.sqlite_db import importar_boveda
+    boveda = MarkdownDB(tmp_path / "datos")
+    boveda.collection("estudiantes").document("100001").set({"nome": "Ana", "horario": _horario("II")})
+    boveda.collection("estudiantes").document("100002").set({"nome": "Luca", "horario": _horario("II")})
+    base = SqliteDB(tmp_path / "pug.sqlite3")
+    importar_boveda(boveda, base)
+    assert base.emparejamiento().grupos("ida") == {(0, 1): ["100001", "100002"]}
+    assert base.emparejamiento().archivo != boveda.emparejamiento().archivo
+    assert not _reiniciar(base).comprobar()
+
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATOS_PATH", str(tmp_path / "datos"))
+    from core.student_scheduler import StudentScheduler
+    return StudentScheduler()
+
+
+def _guardar(scheduler, matricola: str, nombre: str, *bloques):
+    resultado = scheduler.firebase.guardar_estudiante(matricola, {
+        "perfil": {"nome": nombre, "cognome": "Rossi"}, "horario": _horario(*bloques),
+    })
+    assert resultado["success"]
+
+
+def test_emparejamiento_se_reutiliza_hasta_que_cambia_un_estudiante(scheduler, monkeypatch):
+    _guardar(scheduler, "100001", "Ana", "I")
+    _guardar(scheduler, "100002", "Luca", "I")
+    calculos = []
+    calcular = scheduler._calcular_emparejamiento
+    monkeypatch.setattr(scheduler, "_calcular_emparejamiento",
+                        lambda *args: calculos.append(args) or calcular(*args))
+
+    primero = scheduler.obtener_emparejamiento()
+    assert primero.como_claves()["ida"] == {"Lunedì_I": ["Ana Rossi", "Luca Rossi"]}
+    # Otra instancia con el mismo índice reutiliza el resultado
+    from core.student_scheduler import StudentScheduler
+    assert StudentScheduler().obtener_emparejamiento() is primero
+    assert len(calculos) == 1
+
+    _guardar(scheduler, "100002", "Luca", "III")
+    segundo = scheduler.obtener_emparejamiento()
+    assert segundo is not primero and len(calculos) == 2
+    assert segundo.como_claves() == {"ida": {}, "vuelta": {}}
+    # Escribir por otra vía (un lote) también invalida
+    batch = scheduler.firebase.db.batch()
+    batch.update(scheduler.firebase.db.collection("estudiantes").document("100001"),
+                 {"horario": _horario("III")})
+    batch.commit()
+    assert scheduler.obtener_emparejamiento().como_claves()["ida"] == {"Lunedì_III": ["Ana Rossi", "Luca Rossi"]}
+    assert len(calculos) == 3
+
+
+def test_informe_y_grupos_de_un_estudiante(scheduler):
+    assert scheduler.formatear_informe(scheduler.obtener_emparejamiento()) == (
+        "No se encontraron datos de estudiantes en la base de datos.")
+    _guardar(scheduler, "100001", "Ana", "I", "II")
+    _guardar(scheduler, "100002", "Luca", "I")
+    _guardar(scheduler, "100003", "Sara", "IV")
+    resultado = scheduler.obtener_emparejamiento()
+
+    assert [(g.sentido, g.clave) for g in resultado.grupos_de("100002")] == [("ida", "Lunedì_I")]
+    assert resultado.grupos_de("100003") == []
+    informe = scheduler.formatear_informe(resultado, "100002")
+    assert "👥 Grupo compatible: Ana Rossi, Luca Rossi" in informe
+    assert "❌ No se encontraron coincidencias para viajes de vuelta." in informe
+    assert "📋 INFORMACIÓN ESPECÍFICA PARA 100002" in informe
+    assert "👤 Estudiante: Luca Rossi" in informe
+
+
+def test_cohorte_en_memoria_coincide_con_el_indice(tmp_path):
+    from core.horario_bits import CohorteHorarios, codificar_horario, miembros
+    indice = _indice(tmp_path)
+    matriculas = [str(100000 + i) for i in range(40)]
+    estudiantes = {m: _estudiante(i) for i, m in enumerate(matriculas)}
+    # 100010 y 100011: martes en el bloque I; 100012: sin clase
+    estudiantes["100010"]["horario"] += [{"dia": "Martedì", "bloque": "I"}]
+    estudiantes["100011"]["horario"] = [{"dia": "Martedì", "bloque": "I"}]
+    estudiantes["100012"]["horario"] = []
+    for matricola, data in estudiantes.items():
+        indice.actualizar(matricola, data)
+    cohorte = CohorteHorarios([codificar_horario(estudiantes[m]["horario"]) for m in matriculas])
+
+    for sentido in ("ida", "vuelta"):
+        assert {(dia, bloque): [matriculas[i] for i in miembros(bitset)]
+                for dia, bloque, bitset in cohorte.grupos(sentido)} == indice.grupos(sentido)
+        for dia, desde, hasta, bitset in cohorte.grupos_ventana(sentido, 1, en_bloques=True):
+            esperado = sorted(m for b in range(desde, hasta + 1)
+                              for m in indice.grupos(sentido, minimo=1).get((dia, b), ()))
+            assert sorted(matriculas[i] for i in miembros(bitset)) == esperado
+
+    # Quien comparte la entrada del lunes con 100010, sin contarlo a él
+    assert [matriculas[i] for i in miembros(cohorte.compatibles(10, "ida", 0))] == (
+        [m for m in indice.grupos("ida")[(0, 0)] if m != "100010"])
+    assert [matriculas[i] for i in miembros(cohorte.compatibles(10, "ida", 1))] == ["100011"]
+    assert cohorte.compatibles(12, "ida", 0) == 0
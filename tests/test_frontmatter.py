@@ -0,0 +1,99 @@
+"""Lectura del frontmatter: cabecera por bloques (_read_header) y parseo parcial de select() (_parse_parcial)."""
+
+import pytest
+
+import core.obsidian_manager as om
+from core.obsidian_manager import MarkdownDB, _BLOQUE_LECTURA, _parse_frontmatter, _parse_parcial, _read_header
+
+
+def _nota(tmp_path, contenido, nombre: str = "n1.md"):
+    path = tmp_path / nombre
+    path.write_bytes(contenido.encode("utf-8") if isinstance(contenido, str) else contenido)
+    return path
+
+
+def test_frontmatter_mayor_que_un_bloque(tmp_path):
+    lineas = "".join(f"campo{i:03d}: {'x' * 40}\n" for i in range(60))
+    path = _nota(tmp_path, f"---\n{lineas}---\ncuerpo\n")
+    texto, leidos = _read_header(path)
+    assert len(texto) > 4 * _BLOQUE_LECTURA
+    assert _parse_frontmatter(texto) == {f"campo{i:03d}": "x" * 40 for i in range(60)}
+    assert leidos < path.stat().st_size + _BLOQUE_LECTURA
+
+
+@pytest.mark.parametrize("relleno", range(_BLOQUE_LECTURA - 12, _BLOQUE_LECTURA + 4))
+def test_delimitador_partido_entre_bloques(tmp_path, relleno):
+    # "\n---" cae en todas las posiciones alrededor del final del primer bloque
+    valor = "y" * (relleno - len("---\nv: "))
+    path = _nota(tmp_path, f"---\nv: {valor}\n---\n" + "z" * 2000)
+    texto, _ = _read_header(path)
+    assert _parse_frontmatter(texto) == {"v": valor}
+
+
+def test_guiones_dentro_de_valores(tmp_path):
+    # Escritos por la base: comillas con continuación sangrada
+    db = MarkdownDB(tmp_path / "datos")
+    ref = db.collection("viajes").document("v1")
+    data = {"nota": "uno\n---\ndos", "marca": "---", "fin": "x\n---", "estado": "ok"}
+    ref.set(data)
+    assert ref.get().to_dict() == data
+    assert [s.to_dict() for s in db.collection("viajes").select(["estado", "fin"]).stream()] == [
+        {"estado": "ok", "fin": "x\n---"}]
+
+    # Escritos a mano: escalar de bloque y comillas de varias líneas
+    path = _nota(tmp_path, "---\nbloque: |\n  uno\n  ---\n  dos\nestado: ok\n"
+                           "cita: \"uno\n  --- dos\"\n---\ncuerpo\n")
+    texto, _ = _read_header(path)
+    assert _parse_frontmatter(texto) == {"bloque": "uno\n---\ndos\n", "estado": "ok", "cita": "uno --- dos"}
+    assert _parse_parcial(texto, frozenset({"bloque"})) == {"bloque": "uno\n---\ndos\n"}
+    assert om._cuerpo_en_disco(path) == "cuerpo"
+    # Un escalar de bloque como última clave conserva su salto de línea final
+    texto, _ = _read_header(_nota(tmp_path, "---\nestado: ok\nbloque: |\n  uno\n  ---\n---\n", "n2.md"))
+    assert _parse_frontmatter(texto)["bloque"] == "uno\n---\n"
+    assert _parse_parcial(texto, frozenset({"bloque"})) == {"bloque": "uno\n---\n"}
+
+
+def test_fin_de_linea_crlf(tmp_path):
+    path = _nota(tmp_path, "---\r\nestado: ok\r\nhorario:\r\n- dia: Lunedì\r\n  bloque: I\r\n---\r\ncuerpo\r\n")
+    texto, _ = _read_header(path)
+    completo = {"estado": "ok", "horario": [{"dia": "Lunedì", "bloque": "I"}]}
+    assert _parse_frontmatter(texto) == completo
+    assert _parse_parcial(texto, frozenset({"horario"})) == {"horario": completo["horario"]}
+    assert om._cuerpo_en_disco(path) == "cuerpo"
+
+
+def test_sin_delimitador_de_cierre(tmp_path):
+    # Se lee el archivo entero y la nota queda sin frontmatter
+    path = _nota(tmp_path, "---\nestado: ok\n" + "z: 1\n" * 400)
+    assert _read_header(path) == ("", path.stat().st_size)
+    assert _read_header(_nota(tmp_path, "", "vacia.md")) == ("", 0)
+    assert _read_header(_nota(tmp_path, "estado: ok\n", "sin_apertura.md")) == ("", 11)
+
+
+def test_select_de_valores_anidados_y_de_varias_lineas(tmp_path):
+    db = MarkdownDB(tmp_path / "datos")
+    viajes = db.collection("viajes")
+    data = {
+        "estado": "planificado",
+        "horario": [{"dia": "Lunedì", "bloque": "I"}, {"dia": "Martedì", "bloque": "III"}],
+        "extra": {"nivel": 1, "paradas": ["Termini", "Ostiense"], "notas": {"a": None}},
+        "descripcion": "primera línea\nsegunda línea\n",
+        "n": 2,
+    }
+    viajes.document("v1").set(data)
+    for campos in (["horario"], ["extra", "n"], ["descripcion"], ["estado", "extra"]):
+        om._document_cache.clear()
+        assert [s.to_dict() for s in viajes.select(campos).stream()] == [{c: data[c] for c in campos}]
+    assert viajes.document("v1").get().to_dict() == data
+
+
+def test_formas_que_no_se_recortan_por_lineas():
+    # Clave compleja o en flujo en la columna 0: se parsea el documento completo
+    assert _parse_parcial("? [a, b]\n: 1\nestado: ok\n", frozenset({"estado"})) is None
+    assert _parse_parcial("{estado: ok}\n", frozenset({"estado"})) is None
+    # Comentarios, líneas vacías y listas sin sangría siguen a su clave
+    texto = "horario:\n- I\n\n# comentario\n- II\nestado: ok\n"
+    assert _parse_parcial(texto, frozenset({"horario"})) == {"horario": ["I", "II"]}
+    assert _parse_parcial(texto, frozenset({"estado"})) == {"estado": "ok"}
+    # Un alias cuyo ancla quedó fuera
+    assert _parse_parcial("base: &b 1\ncopia: *b\n", frozenset({"copia"})) is None
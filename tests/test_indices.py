@@ -0,0 +1,64 @@
+"""Índices _indices.jsonl compartidos entre procesos."""
+
+import multiprocessing
+from pathlib import Path
+
+from core.markdown_index import ARCHIVO_BLOQUEO_INDICES, CollectionIndex
+from core.obsidian_manager import _bloquear_carpetas
+
+CAMPOS = ("fecha",)
+POR_PROCESO = 300
+
+
+def _indice(path: Path) -> CollectionIndex:
+    # Sin notas: si el registro se perdiera o corrompiera, reconstruirlo lo dejaría vacío
+    return CollectionIndex(path, CAMPOS, lambda f: None, lambda: [],
+                           lambda: _bloquear_carpetas([path], ARCHIVO_BLOQUEO_INDICES))
+
+
+def _anexar(path: str, prefijo: str):
+    indice = _indice(Path(path))
+    for i in range(POR_PROCESO):
+        indice.update(f"{prefijo}_{i}", {"fecha": f"2026-03-{i % 28 + 1:02d}"})
+        if i % 3 == 0:
+            indice.remove(f"{prefijo}_{i}")
+
+
+def _compactar(path: str, veces: int):
+    indice = _indice(Path(path))
+    for _ in range(veces):
+        indice._compactar()
+
+
+def test_compactar_mientras_otros_procesos_anexan(tmp_path):
+    procesos = [
+        multiprocessing.Process(target=_anexar, args=(str(tmp_path), "a")),
+        multiprocessing.Process(target=_anexar, args=(str(tmp_path), "b")),
+        multiprocessing.Process(target=_compactar, args=(str(tmp_path), 200)),
+    ]
+    for p in procesos:
+        p.start()
+    for p in procesos:
+        p.join(60)
+        assert p.exitcode == 0
+
+    esperado = {
+        f"{prefijo}_{i}": f"2026-03-{i % 28 + 1:02d}"
+        for prefijo in ("a", "b") for i in range(POR_PROCESO) if i % 3 != 0
+    }
+    indice = _indice(tmp_path)
+    obtenido = {doc_id: fecha for fecha, ids in indice.grupos("fecha") for doc_id in ids}
+    assert obtenido == esperado
+
+
+def test_lookup_tras_compactar(tmp_path):
+    indice = _indice(tmp_path)
+    indice.update("v1", {"fecha": "2026-03-10"})
+    indice.update("v2", {"fecha": "2026-03-11"})
+    indice.update("v1", {"fecha": "2026-03-11"})
+    indice._compactar()
+
+    otro = _indice(tmp_path)
+    assert otro.lookup("fecha", "==", "2026-03-11") == {"v1", "v2"}
+    assert otro.lookup("fecha", "==", "2026-03-10") == set()
+    assert otro.lookup("otro", "==", "x") is None
@@ -0,0 +1,102 @@
+"""Instantánea _instantanea.pickle: versiones de las notas, clases permitidas y lecturas parciales."""
+
+import logging
+import pickle
+
+import pytest
+
+import core.obsidian_manager as om
+from core.markdown_snapshot import ARCHIVO_INSTANTANEA, CollectionSnapshot, _cargar
+from core.obsidian_manager import MarkdownDB, _stamp
+
+ejecutados = []
+
+
+def _marcar():
+    ejecutados.append(True)
+
+
+class _Malicioso:
+    """Al deserializarse con pickle normal llamaría a _marcar."""
+
+    def __reduce__(self):
+        return _marcar, ()
+
+
+def _nota(carpeta, doc_id: str, texto: str):
+    path = carpeta / f"{doc_id}.md"
+    path.write_text(texto, encoding="utf-8")
+    return path
+
+
+def test_entrada_ignorada_si_cambia_la_nota(tmp_path):
+    path = _nota(tmp_path, "v1", "---\nestado: planificado\n---\n")
+    antes = _stamp(path.stat())
+    instantanea = CollectionSnapshot(tmp_path)
+    instantanea.put("v1", antes, {"estado": "planificado"})
+    assert instantanea.get("v1", antes) == ({"estado": "planificado"}, True)
+    assert instantanea.guardar()
+
+    # Otra sesión: la misma versión se sirve; editada (otro tamaño e inodo), no
+    _nota(tmp_path, "v1.tmp", "---\nestado: completado\n---\n").replace(path)
+    despues = _stamp(path.stat())
+    assert despues != antes
+    releida = CollectionSnapshot(tmp_path)
+    assert releida.get("v1", antes) == ({"estado": "planificado"}, True)
+    assert releida.get("v1", despues) is None
+    # Solo cambia el mtime: tampoco se sirve
+    assert releida.get("v1", (antes[0], antes[1] + 1, antes[2])) is None
+
+
+def test_clase_no_permitida_no_se_ejecuta(tmp_path, caplog):
+    with pytest.raises(pickle.UnpicklingError):
+        _cargar(pickle.dumps(_Malicioso()))
+    stamp = (1, 2, 3)
+    (tmp_path / ARCHIVO_INSTANTANEA).write_bytes(pickle.dumps(
+        {"version": 2, "docs": {"v1": (stamp, None, pickle.dumps({"estado": "ok"}))}, "x": _Malicioso()}
+    ))
+
+    instantanea = CollectionSnapshot(tmp_path)
+    with caplog.at_level(logging.WARNING):
+        assert instantanea.get("v1", stamp) is None
+    assert ejecutados == []
+    assert "inválida" in caplog.text and len(instantanea) == 0
+
+    # Al guardar, lo nuevo sustituye al archivo descartado
+    (tmp_path / "v2.md").touch()
+    instantanea.put("v2", stamp, {"estado": "ok"})
+    assert instantanea.guardar()
+    assert CollectionSnapshot(tmp_path).get("v2", stamp) == ({"estado": "ok"}, True)
+
+    # Una entrada con la clase dentro de un archivo válido se descarta al leerla
+    instantanea._docs["v3"] = (stamp, None, pickle.dumps(_Malicioso()))
+    assert instantanea.get("v3", stamp) is None
+    assert ejecutados == [] and "v3" not in instantanea._docs
+
+
+def test_entrada_parcial_no_sirve_a_una_lectura_completa(tmp_path):
+    instantanea = CollectionSnapshot(tmp_path)
+    stamp = (1, 2, 3)
+    instantanea.put("v1", stamp, {"estado": "planificado"}, frozenset({"estado"}))
+    assert instantanea.get("v1", stamp) is None
+    assert instantanea.get("v1", stamp, frozenset({"estado", "n"})) is None
+    assert instantanea.get("v1", stamp, frozenset({"estado"})) == ({"estado": "planificado"}, False)
+    # Dos lecturas parciales de la misma versión se acumulan
+    instantanea.put("v1", stamp, {"n": 2}, frozenset({"n"}))
+    assert instantanea.get("v1", stamp, frozenset({"estado", "n"})) == ({"estado": "planificado", "n": 2}, False)
+    # La completa sustituye a la parcial
+    instantanea.put("v1", stamp, {"estado": "planificado", "n": 2, "extra": [1]})
+    assert instantanea.get("v1", stamp) == ({"estado": "planificado", "n": 2, "extra": [1]}, True)
+
+
+def test_select_y_lectura_completa_de_la_base(tmp_path, monkeypatch):
+    monkeypatch.setattr(om, "_instantaneas_activas", True)
+    db = MarkdownDB(tmp_path / "datos")
+    viajes = db.collection("viajes")
+    viajes.document("v1").set({"estado": "planificado", "n": 2, "extra": {"nivel": 1}})
+    om._document_cache.clear()
+    om._instantaneas.clear()
+
+    assert [s.to_dict() for s in viajes.select(["estado"]).stream()] == [{"estado": "planificado"}]
+    assert om._instantanea_de(viajes.path / "v1.md").get("v1", _stamp((viajes.path / "v1.md").stat())) is None
+    assert viajes.document("v1").get().to_dict() == {"estado": "planificado", "n": 2, "extra": {"nivel": 1}}
@@ -0,0 +1,289 @@
+"""
+Paridad entre los backends de almacenamiento (Markdown y SQLite)
+Los mismos escenarios —CRUD, consultas con filtros/orden/cursores/select,
+agregaciones, estadísticas, batches, transacciones y subcolecciones— se
+ejecutan contra MarkdownDB y SqliteDB y se comparan con los resultados
+esperados escritos a mano para estos documentos.
+"""
+
+import threading
+
+import pytest
+
+from core.obsidian_manager import (
+    DOCUMENT_ID, SERVER_TIMESTAMP, ConflictoTransaccion, FieldFilter, MarkdownDB, transactional,
+)
+from core.sqlite_db import SqliteDB
+
+# Tipos mezclados, campos ausentes, nulos y listas
+DOCS = {
+    "v01": {"fecha": "2026-03-10", "estado": "planificado", "hora_salida": "07:30", "n": 2,
+            "etiquetas": ["ida"], "extra": {"nivel": 1}},
+    "v02": {"fecha": "2026-03-11", "estado": "completado", "hora_salida": "18:00", "n": 1.5,
+            "etiquetas": ["vuelta", "extra"], "extra": {"nivel": 2}},
+    "v03": {"fecha": "2026-03-09", "estado": None, "hora_salida": 7, "n": -2,
+            "etiquetas": [], "extra": {"nivel": 0}},
+    "v04": {"fecha": None, "estado": "en_curso", "n": "x",
+            "etiquetas": ["ida", "vuelta"], "extra": {"nivel": 2}},
+    "v05": {"fecha": 3, "estado": "completado", "hora_salida": "09:00", "n": False,
+            "etiquetas": ["extra"]},
+    "v06": {"fecha": True, "estado": ["a", "b"], "hora_salida": None, "n": 4,
+            "etiquetas": ["ida"], "extra": {"nivel": 1}},
+    "v07": {"estado": "planificado", "hora_salida": "07:30", "n": 0, "extra": {"nivel": 2}},
+    "v08": {"fecha": ["x"], "estado": "completado", "hora_salida": "18:00", "n": 3,
+            "etiquetas": ["vuelta"]},
+    "v09": {"fecha": "2026-03-10", "estado": "planificado", "hora_salida": "09:00", "n": 1,
+            "etiquetas": ["ida"], "extra": {"nivel": 0}},
+}
+
+# (filtro, ids que lo cumplen)
+FILTROS = [
+    (None, ["v01", "v02", "v03", "v04", "v05", "v06", "v07", "v08", "v09"]),
+    (("estado", "==", "completado"), ["v02", "v05", "v08"]),
+    (("estado", "in", ["planificado", None]), ["v01", "v03", "v07", "v09"]),
+    (("estado", "!=", "completado"), ["v01", "v03", "v04", "v06", "v07", "v09"]),
+    (("fecha", "==", "2026-03-10"), ["v01", "v09"]),
+    (("fecha", "in", ["2026-03-09", 3, True]), ["v03", "v05", "v06"]),
+    (("fecha", ">=", "2026-03-10"), ["v01", "v02", "v09"]),
+    (("n", ">", 2), ["v06", "v08"]),
+    (("n", "<=", 1.5), ["v02", "v03", "v05", "v07", "v09"]),
+    (("hora_salida", ">=", "09:00"), ["v02", "v05", "v08", "v09"]),
+    (("etiquetas", "array_contains", "ida"), ["v01", "v04", "v06", "v09"]),
+    (("etiquetas", "array_contains_any", ["vuelta", "extra"]), ["v02", "v04", "v05", "v08"]),
+    (("extra.nivel", "==", 2), ["v02", "v04", "v07"]),
+    ((DOCUMENT_ID, "in", ["v01", "v02"]), ["v01", "v02"]),
+    ((DOCUMENT_ID, ">", "v05"), ["v06", "v07", "v08", "v09"]),
+]
+
+# (orden, ids en ese orden): null y ausentes primero, luego bool < número < texto < lista
+ORDENES = [
+    ([("fecha", "ASCENDING")], ["v04", "v07", "v06", "v05", "v03", "v01", "v09", "v02", "v08"]),
+    ([("fecha", "DESCENDING")], ["v08", "v02", "v09", "v01", "v03", "v05", "v06", "v07", "v04"]),
+    ([("estado", "DESCENDING"), ("n", "ASCENDING")],
+     ["v06", "v07", "v09", "v01", "v04", "v05", "v02", "v08", "v03"]),
+    ([("hora_salida", "ASCENDING"), ("fecha", "DESCENDING")],
+     ["v06", "v04", "v03", "v01", "v07", "v09", "v05", "v08", "v02"]),
+]
+
+# viajes tiene índices y columnas generadas; otros no
+COLECCIONES = ["viajes", "otros"]
+
+
+@pytest.fixture(params=["markdown", "sqlite"])
+def db(request, tmp_path):
+    if request.param == "markdown":
+        return MarkdownDB(tmp_path / "boveda")
+    return SqliteDB(tmp_path / "pug.sqlite3")
+
+
+def _cargar(db, nombre: str):
+    batch = db.batch(fsync=False)
+    for doc_id, data in DOCS.items():
+        batch.set(db.collection(nombre).document(doc_id), data)
+    assert batch.commit()["escritos"] == len(DOCS)
+    return db.collection(nombre)
+
+
+def _consulta(coleccion, filtro, orden=()):
+    consulta = coleccion.where(filter=FieldFilter(*filtro)) if filtro else coleccion
+    for campo, direccion in orden:
+        consulta = consulta.order_by(campo, direccion)
+    return consulta
+
+
+def _ids(consulta) -> list:
+    return [s.id for s in consulta.stream()]
+
+
+# ── CRUD ────────────────────────────────────
+
+def test_crud(db):
+    col = db.collection("crud")
+    ref = col.document("d1")
+    ref.set({"a": 1, "b": {"c": [1, 2, {"d": "é"}]}, "ts": SERVER_TIMESTAMP, "nulo": None})
+    data = ref.get().to_dict()
+    assert isinstance(data.pop("ts"), str)
+    assert data == {"a": 1, "b": {"c": [1, 2, {"d": "é"}]}, "nulo": None}
+
+    ref.set({"a": 2, "nuevo": True}, merge=True)
+    assert {k: v for k, v in ref.get().to_dict().items() if k != "ts"} == {
+        "a": 2, "b": {"c": [1, 2, {"d": "é"}]}, "nulo": None, "nuevo": True}
+    ref.update({"b": "plano"})
+    assert ref.get().get("b") == "plano"
+    ref.set({"solo": "esto"})
+    assert ref.get().to_dict() == {"solo": "esto"}
+
+    col.document("d2").update({"creado": "por update"})
+    assert col.document("d2").get().to_dict() == {"creado": "por update"}
+
+    ref.delete()
+    snap = ref.get()
+    assert (snap.exists, snap.to_dict(), snap.get("solo")) == (False, {}, None)
+
+    refs = [col.document("d2"), col.document("nada"), db.collection("otra").document("d2"), col.document("d2")]
+    assert [(s.id, s.exists, s.to_dict()) for s in db.get_all(refs)] == [
+        ("d2", True, {"creado": "por update"}), ("nada", False, {}),
+        ("d2", False, {}), ("d2", True, {"creado": "por update"}),
+    ]
+    assert [s.to_dict() for s in db.get_all(refs[:1], field_paths=["otro"])] == [{}]
+
+
+# ── Consultas ───────────────────────────────
+
+@pytest.mark.parametrize("nombre", COLECCIONES)
+@pytest.mark.parametrize("filtro, esperado", FILTROS)
+def test_filtros(db, nombre, filtro, esperado):
+    consulta = _consulta(_cargar(db, nombre), filtro)
+    assert _ids(consulta) == esperado
+    assert consulta.count() == len(esperado)
+    assert _ids(consulta.offset(1).limit(2)) == esperado[1:3]
+    assert consulta.limit(2).count() == len(esperado[:2])
+    proyectados = [(s.id, s.to_dict()) for s in consulta.select(["estado", "extra.nivel"]).stream()]
+    assert proyectados == [(doc_id, _proyeccion(DOCS[doc_id])) for doc_id in esperado]
+
+
+def _proyeccion(data: dict) -> dict:
+    resultado = {k: data[k] for k in ("estado",) if k in data}
+    if "extra" in data:
+        resultado["extra"] = {"nivel": data["extra"]["nivel"]}
+    return resultado
+
+
+@pytest.mark.parametrize("nombre", COLECCIONES)
+@pytest.mark.parametrize("orden, esperado", ORDENES)
+def test_orden_limite_y_cursor(db, nombre, orden, esperado):
+    col = _cargar(db, nombre)
+    consulta = _consulta(col, None, orden)
+    assert _ids(consulta) == esperado
+    assert _ids(consulta.limit(3)) == esperado[:3]
+    assert _ids(consulta.offset(2).limit(3)) == esperado[2:5]
+    cursor = consulta.limit(4).get()[-1]
+    assert _ids(consulta.start_after(cursor).limit(3)) == esperado[4:7]
+    # Con filtro: solo los completados, en el mismo orden relativo
+    completados = [i for i in esperado if DOCS[i].get("estado") == "completado"]
+    assert _ids(_consulta(col, ("estado", "==", "completado"), orden)) == completados
+    assert _ids(_consulta(col, ("estado", "==", "completado"), orden).limit(2)) == completados[:2]
+
+
+@pytest.mark.parametrize("nombre", COLECCIONES)
+def test_cursor_sin_orden(db, nombre):
+    col = _cargar(db, nombre)
+    assert _ids(col.start_after(col.document("v03").get()).limit(3)) == ["v04", "v05", "v06"]
+    assert _ids(col.start_after({DOCUMENT_ID: "v07"})) == ["v08", "v09"]
+
+
+# ── Agregaciones ────────────────────────────
+
+@pytest.mark.parametrize("nombre", COLECCIONES)
+def test_agregaciones(db, nombre):
+    col = _cargar(db, nombre)
+    # n: los booleanos y el texto no cuentan como números
+    assert col.sum("n") == 9.5
+    assert col.avg("n") == pytest.approx(9.5 / 7)
+    assert col.group_count("estado") == {
+        "planificado": 3, "completado": 3, "en_curso": 1, None: 1, "a": 1, "b": 1}
+    assert col.group_count("etiquetas") == {"ida": 4, "vuelta": 3, "extra": 2}
+    assert col.group_count("fecha") == {
+        "2026-03-10": 2, "2026-03-11": 1, "2026-03-09": 1, None: 1, 3: 1, True: 1, "x": 1}
+
+    completados = col.where("estado", "==", "completado")
+    assert completados.sum("n") == 4.5
+    assert completados.avg("n") == 2.25
+    assert completados.group_count("hora_salida") == {"18:00": 2, "09:00": 1}
+    assert completados.limit(2).group_count("n") == {1.5: 1, False: 1}
+    assert col.where("estado", "==", "ninguno").avg("n") is None
+
+
+def test_estadisticas(db):
+    col = _cargar(db, "viajes")
+    stats = col.estadisticas()
+    assert stats["total"] == 9
+    assert stats["por_valor"] == {
+        "fecha": {"2026-03-10": 2, "2026-03-11": 1, "2026-03-09": 1, None: 1, 3: 1, True: 1},
+        "estado": {"planificado": 3, "completado": 3, "en_curso": 1, None: 1},
+    }
+    assert db.collection("otros").estadisticas() is None
+
+
+# ── Escrituras agrupadas ────────────────────
+
+def test_batch(db):
+    col = _cargar(db, "viajes")
+    batch = db.batch()
+    batch.update(col.document("v01"), {"estado": "completado"})
+    batch.delete(col.document("v02"))
+    batch.set(col.document("v02"), {"estado": "recreado"}, merge=True)
+    batch.delete(col.document("v03"))
+    batch.set(col.document("nuevo"), {"fecha": "2026-03-10", "estado": "planificado"})
+    batch.set(col.document("nuevo"), {"n": 9}, merge=True)
+    batch.set(db.collection("otros").document("nuevo"), {"x": 1})
+    # v04 queda igual: se omite
+    batch.set(col.document("v04"), dict(DOCS["v04"]))
+    assert batch.commit() == {"escritos": 4, "omitidos": 1, "eliminados": 1, "carpetas": 2}
+
+    assert col.document("v01").get().to_dict() == dict(DOCS["v01"], estado="completado")
+    assert col.document("v02").get().to_dict() == {"estado": "recreado"}
+    assert not col.document("v03").get().exists
+    assert col.document("nuevo").get().to_dict() == {"fecha": "2026-03-10", "estado": "planificado", "n": 9}
+    assert _ids(col.where("estado", "==", "recreado")) == ["v02"]
+    assert _ids(col.where("fecha", "==", "2026-03-10")) == ["nuevo", "v01", "v09"]
+    stats = col.estadisticas()
+    assert stats["total"] == 9
+    assert stats["por_valor"]["estado"] == {"planificado": 3, "completado": 3, "en_curso": 1, "recreado": 1}
+
+
+# ── Transacciones ───────────────────────────
+
+def test_transacciones(db):
+    ref = db.collection("viajes").document("contador")
+    ref.set({"plazas": 0, "pasajeros": []})
+
+    @transactional
+    def reservar(transaction, matricola):
+        snap = transaction.get(ref)
+        transaction.update(ref, {"plazas": snap.get("plazas") + 1,
+                                 "pasajeros": snap.get("pasajeros") + [matricola]})
+
+    hilos = [threading.Thread(target=reservar, args=(db.transaction(max_attempts=50), f"m{i}"))
+             for i in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    data = ref.get().to_dict()
+    assert (data["plazas"], sorted(data["pasajeros"])) == (8, [f"m{i}" for i in range(8)])
+
+    transaccion = db.transaction()
+    transaccion.get(ref)
+    ref.update({"plazas": 100})
+    transaccion.update(ref, {"plazas": -1})
+    with pytest.raises(ConflictoTransaccion):
+        transaccion.commit()
+    assert ref.get().get("plazas") == 100
+
+    transaccion = db.transaction()
+    transaccion.set(ref, {"plazas": 0})
+    with pytest.raises(ValueError):
+        transaccion.get(ref)
+
+
+# ── Subcolecciones ──────────────────────────
+
+def test_subcolecciones(db):
+    padre = db.collection("estudiantes").document("e1")
+    padre.set({"nome": "Ana"})
+    for i in range(3):
+        padre.collection("viajes").document(f"s{i}").set({"fecha": f"2026-03-1{i}", "estado": "planificado"})
+    padre.collection("notas").document("n").set({"x": 1})
+    padre.collection("viajes").document("s0").collection("paradas").document("p").set({"k": 1})
+    assert sorted(c.id for c in padre.collections()) == ["notas", "viajes"]
+
+    sub = padre.collection("viajes")
+    consulta = sub.where("estado", "==", "planificado").order_by("fecha", "DESCENDING")
+    assert _ids(consulta) == ["s2", "s1", "s0"]
+    assert sorted(c.id for c in db.collections()) == ["estudiantes"]
+
+    padre.delete()
+    assert _ids(sub) == []
+    assert padre.collections() == []
+    assert not sub.document("s0").collection("paradas").document("p").get().exists
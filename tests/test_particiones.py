@@ -0,0 +1,95 @@
+"""Colecciones particionadas por fecha: poda de carpetas y notas fuera del mes de su id."""
+
+import json
+
+import pytest
+
+from core.markdown_particiones import ARCHIVO_PARTICIONES, Particionado
+from core.obsidian_manager import MarkdownDB, configurar_diario
+
+VIAJES = {
+    "ida_2026-03-10_c1": {"fecha": "2026-03-10", "estado": "planificado"},
+    "ida_2026-03-11_c1": {"fecha": "2026-03-11", "estado": "completado"},
+    "vuelta_2026-04-02_c2": {"fecha": "2026-04-02", "estado": "planificado"},
+    "especial": {"fecha": "2026-04-02", "estado": "planificado"},
+}
+
+
+def _ids(consulta) -> list:
+    return sorted(s.id for s in consulta.stream())
+
+
+def _poda(col_path) -> bool:
+    return json.loads((col_path / ARCHIVO_PARTICIONES).read_text(encoding="utf-8"))["poda"]
+
+
+@pytest.fixture(params=[False, True], ids=["notas", "diario"])
+def viajes(request, tmp_path):
+    db = MarkdownDB(tmp_path / "datos")
+    batch = db.batch()
+    for doc_id, data in VIAJES.items():
+        batch.set(db.collection("viajes").document(doc_id), data)
+    batch.commit()
+    assert db.particionar("viajes", "fecha", "fecha")["poda"] is True
+    configurar_diario(request.param)
+    yield db.collection("viajes")
+    configurar_diario(False)
+
+
+def test_notas_en_la_carpeta_del_mes_de_su_id(viajes):
+    assert (viajes.path / "2026/03/ida_2026-03-10_c1.md").exists()
+    assert (viajes.path / "2026/04/vuelta_2026-04-02_c2.md").exists()
+    assert (viajes.path / "sin_fecha/especial.md").exists()
+    particionado = Particionado.leer(viajes.path)
+    assert particionado.podar(viajes.path, [("fecha", "==", "2026-03-10")]) == [
+        viajes.path / "2026/03", viajes.path / "sin_fecha"]
+    assert particionado.podar(viajes.path, [("estado", "==", "planificado")]) is None
+
+
+def test_consultas_por_fecha_con_poda(viajes):
+    assert _ids(viajes.where("fecha", "==", "2026-03-10")) == ["ida_2026-03-10_c1"]
+    assert _ids(viajes.where("fecha", ">=", "2026-04-01")) == ["especial", "vuelta_2026-04-02_c2"]
+    assert _ids(viajes.where("fecha", "in", ["2026-03-11", "2026-04-02"])) == [
+        "especial", "ida_2026-03-11_c1", "vuelta_2026-04-02_c2"]
+
+
+def test_fecha_fuera_del_mes_del_id_desactiva_la_poda(viajes):
+    # La nota queda en 2026/03 aunque su fecha sea de abril
+    viajes.document("ida_2026-03-10_c1").update({"fecha": "2026-04-05"})
+    assert _poda(viajes.path) is False
+    assert _ids(viajes.where("fecha", "==", "2026-04-05")) == ["ida_2026-03-10_c1"]
+    assert _ids(viajes.where("fecha", ">=", "2026-04-01")) == [
+        "especial", "ida_2026-03-10_c1", "vuelta_2026-04-02_c2"]
+    assert _ids(viajes.where("fecha", "<", "2026-04-01")) == ["ida_2026-03-11_c1"]
+
+
+def test_batch_con_fecha_fuera_del_mes_desactiva_la_poda(viajes, tmp_path):
+    db = MarkdownDB(tmp_path / "datos")
+    batch = db.batch()
+    batch.set(viajes.document("vuelta_2026-04-09_c3"), {"fecha": "2026-03-30", "estado": "planificado"})
+    batch.commit()
+    assert _poda(viajes.path) is False
+    assert _ids(viajes.where("fecha", "<=", "2026-03-31")) == [
+        "ida_2026-03-10_c1", "ida_2026-03-11_c1", "vuelta_2026-04-09_c3"]
+
+
+def test_volver_a_particionar_revisa_la_poda(viajes, tmp_path):
+    viajes.document("ida_2026-03-10_c1").update({"fecha": "2026-04-05"})
+    db = MarkdownDB(tmp_path / "datos")
+    # La nota sigue fuera de su mes: la poda no se reactiva
+    assert db.particionar("viajes", "fecha", "fecha")["poda"] is False
+    viajes.document("ida_2026-03-10_c1").update({"fecha": "2026-03-10"})
+    assert db.particionar("viajes", "fecha", "fecha")["poda"] is True
+    assert _ids(viajes.where("fecha", "==", "2026-03-10")) == ["ida_2026-03-10_c1"]
+
+
+@pytest.mark.parametrize("doc_id, data, esperado", [
+    ("ida_2026-03-10_c1", {"fecha": "2026-03-31"}, True),
+    ("ida_2026-03-10_c1", {"fecha": "2026-04-01"}, False),
+    ("ida_20260310_c1", {"fecha": "2026-03-01T08:00"}, True),
+    ("especial", {"fecha": "2030-01-01"}, True),
+    ("ida_2026-03-10_c1", {"fecha": 20260401}, True),
+    ("ida_2026-03-10_c1", {"estado": "planificado"}, True),
+])
+def test_coherente(doc_id, data, esperado):
+    assert Particionado("fecha", "fecha").coherente(doc_id, data) is esperado
@@ -0,0 +1,82 @@
+"""Filtros de SqliteCollection traducidos a SQL sobre las columnas generadas."""
+
+import pytest
+
+from core.obsidian_manager import DOCUMENT_ID, FieldFilter
+from core.sqlite_db import SqliteDB
+
+# Tipos mezclados: solo los valores del mismo tipo cumplen una comparación
+VIAJES = {
+    "a": {"fecha": "2026-03-01", "estado": "planificado", "n": 1},
+    "b": {"fecha": "2026-03-10", "estado": "completado", "n": 2.5},
+    "c": {"fecha": "2026-03-15", "estado": None},
+    "d": {"fecha": 20260312, "estado": ["x"]},
+    "e": {"fecha": True, "estado": "planificado"},
+    "f": {"fecha": ["2026-03-11"]},
+    "g": {"estado": "en_curso"},
+    "h": {"fecha": "2026-04-01", "estado": "completado"},
+    "i": {"fecha": 'Q"2026', "estado": "completado"},
+}
+
+CASOS = [
+    ([("fecha", ">=", "2026-03-10")], ["b", "c", "h", "i"]),
+    ([("fecha", "<", "2026-03-10")], ["a"]),
+    ([("fecha", ">", 20260311)], ["d"]),
+    ([("fecha", "<=", 1)], ["e"]),
+    ([("fecha", "==", "2026-03-10")], ["b"]),
+    ([("estado", "!=", "completado")], ["a", "c", "d", "e", "g"]),
+    ([("estado", "in", ["planificado", None])], ["a", "c", "e"]),
+    ([("fecha", ">=", "2026-03-01"), ("estado", "==", "completado")], ["b", "h", "i"]),
+    ([("fecha", ">", "2026-03-01"), ("n", ">", 2)], ["b"]),
+    ([(DOCUMENT_ID, ">=", "f")], ["f", "g", "h", "i"]),
+    ([(DOCUMENT_ID, "in", ["b", "z"])], ["b"]),
+    ([(DOCUMENT_ID, "==", "c"), ("estado", "==", None)], ["c"]),
+]
+
+
+@pytest.fixture
+def viajes(tmp_path):
+    db = SqliteDB(tmp_path / "pug.sqlite3")
+    batch = db.batch(fsync=False)
+    for doc_id, data in VIAJES.items():
+        batch.set(db.collection("viajes").document(doc_id), data)
+    batch.commit()
+    return db.collection("viajes")
+
+
+@pytest.mark.parametrize("filtros, esperado", CASOS)
+def test_filtros(viajes, filtros, esperado):
+    consulta = viajes
+    for filtro in filtros:
+        consulta = consulta.where(filter=FieldFilter(*filtro))
+    assert [s.id for s in consulta.stream()] == esperado
+    assert consulta.count() == len(esperado)
+
+
+@pytest.mark.parametrize("filtro, esperado", [
+    (("fecha", ">=", "2026-03-10"), ["b", "c", "h", "i"]),
+    (("fecha", ">", 20260311), ["d"]),
+    (("estado", "in", ["planificado", None]), ["a", "c", "e"]),
+    ((DOCUMENT_ID, "<", "c"), ["a", "b"]),
+])
+def test_filtros_resueltos_en_sql(viajes, filtro, esperado):
+    # Las filas salen ya filtradas de la consulta, sin leer ningún documento
+    assert sorted(viajes._ids((FieldFilter(*filtro),))) == esperado
+
+
+def test_filtros_sin_columna_se_evaluan_en_python(viajes):
+    # n no tiene columna: SQL entrega todas las filas y Python filtra
+    filtro = FieldFilter("n", ">", 2)
+    assert sorted(viajes._ids((filtro,))) == sorted(VIAJES)
+    assert [s.id for s in viajes.where(filter=filtro).stream()] == ["b"]
+
+
+def test_cursor_y_limite_por_id(viajes):
+    assert viajes._iter_ids(desde_id="c", limite=2) == ["d", "e"]
+    assert [s.id for s in viajes.start_after({DOCUMENT_ID: "c"}).limit(2).stream()] == ["d", "e"]
+    assert [s.id for s in viajes.offset(7).limit(5).stream()] == ["h", "i"]
+
+
+def test_coleccion_sin_tabla(tmp_path):
+    vacia = SqliteDB(tmp_path / "pug.sqlite3").collection("viajes")
+    assert list(vacia.where("fecha", ">=", "2026-03-01").stream()) == []
@@ -0,0 +1,113 @@
+"""Transacciones optimistas: conflicto, reintento con @transactional y reserva de plazas."""
+
+import threading
+
+import pytest
+
+from core.obsidian_manager import ConflictoTransaccion, MarkdownDB, transactional
+from core.sqlite_db import SqliteDB
+
+
+@pytest.fixture(params=["markdown", "sqlite"])
+def db(request, tmp_path):
+    if request.param == "markdown":
+        return MarkdownDB(tmp_path / "datos")
+    return SqliteDB(tmp_path / "pug.sqlite3")
+
+
+def test_conflicto_y_reintento(db):
+    ref = db.collection("viajes").document("v1")
+    ref.set({"plazas": 0, "pasajeros": []})
+    lecturas = []
+
+    @transactional
+    def reservar(transaction, matricola):
+        snap = transaction.get(ref)
+        lecturas.append(snap.get("plazas"))
+        if len(lecturas) == 1:
+            # Otra sesión reserva entre la lectura y el commit
+            ref.update({"plazas": 1, "pasajeros": ["otra"]})
+        transaction.update(ref, {"plazas": snap.get("plazas") + 1,
+                                 "pasajeros": snap.get("pasajeros") + [matricola]})
+        return snap.get("plazas") + 1
+
+    assert reservar(db.transaction(), "m1") == 2
+    # El primer intento vio 0 y chocó; el segundo releyó la reserva ajena
+    assert lecturas == [0, 1]
+    assert ref.get().to_dict() == {"plazas": 2, "pasajeros": ["otra", "m1"]}
+
+
+def test_reintentos_agotados(db):
+    ref = db.collection("viajes").document("v1")
+    ref.set({"plazas": 0})
+    intentos = []
+
+    @transactional
+    def reservar(transaction):
+        snap = transaction.get(ref)
+        intentos.append(snap.get("plazas"))
+        ref.update({"plazas": snap.get("plazas") + 10})
+        transaction.update(ref, {"plazas": -1})
+
+    with pytest.raises(ConflictoTransaccion):
+        reservar(db.transaction(max_attempts=3))
+    assert intentos == [0, 10, 20]
+    assert ref.get().get("plazas") == 30
+
+
+def test_escrituras_ajenas_a_lo_leido_no_chocan(db):
+    viajes = db.collection("viajes")
+    ref, otro = viajes.document("v1"), viajes.document("v2")
+    ref.set({"plazas": 0})
+    otro.set({"plazas": 0})
+    transaccion = db.transaction()
+    snap = transaccion.get(ref)
+    otro.update({"plazas": 5})
+    transaccion.update(ref, {"plazas": snap.get("plazas") + 1})
+    transaccion.commit()
+    assert (ref.get().get("plazas"), otro.get().get("plazas")) == (1, 5)
+
+    # Un documento leído que no existía y que otra sesión crea también choca
+    nuevo = viajes.document("v3")
+    transaccion = db.transaction()
+    assert not transaccion.get(nuevo).exists
+    nuevo.set({"plazas": 1})
+    transaccion.set(nuevo, {"plazas": 0})
+    with pytest.raises(ConflictoTransaccion):
+        transaccion.commit()
+    assert nuevo.get().get("plazas") == 1
+
+
+def test_agregar_pasajero_no_sobrevende(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATOS_PATH", str(tmp_path / "datos"))
+    from core.viaje_manager import ViajeManager
+    vm = ViajeManager()
+    batch = vm.db.batch(fsync=False)
+    for i in range(8):
+        batch.set(vm.db.collection("estudiantes").document(f"20000{i}"), {"matricola": f"20000{i}"})
+    batch.set(vm.db.collection("viajes").document("ida_2026-03-10_c1"), {
+        "id_viaje": "ida_2026-03-10_c1", "fecha": "2026-03-10", "matricola_conductor": "100000",
+        "pasajeros": [], "ocupacion_actual": 1, "capacidad_maxima": 5, "estado": "planificado",
+    })
+    batch.commit()
+
+    resultados = {}
+    barrera = threading.Barrier(8)
+
+    def reservar(matricola):
+        barrera.wait()
+        resultados[matricola] = vm.agregar_pasajero("ida_2026-03-10_c1", matricola)
+
+    hilos = [threading.Thread(target=reservar, args=(f"20000{i}",)) for i in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    viaje = vm.db.collection("viajes").document("ida_2026-03-10_c1").get().to_dict()
+    confirmados = sorted(m for m, r in resultados.items() if r["success"])
+    assert sorted(viaje["pasajeros"]) == confirmados
+    assert viaje["ocupacion_actual"] == 1 + len(confirmados) <= 5
+    rechazados = [r["message"] for r in resultados.values() if not r["success"]]
+    assert all(m in ("Viaje lleno", "El viaje se está modificando en otra sesión, intente de nuevo")
+               for m in rechazados)
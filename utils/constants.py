@@ -90,6 +90,34 @@ DATOS_COLLECTIONS = {
     'listas_diarias': 'listas_diarias',
 }
 
+# --- ÍNDICES SECUNDARIOS (datos/<coleccion>/_indices.jsonl) ---
+DATOS_INDICES = {
+    'viajes': ('fecha', 'estado'),
+    'carros': ('placa', 'estado'),
+    'estudiantes': ('tiene_licencia', 'viaja_hoy'),
+}
+
+# --- ESTADÍSTICAS MATERIALIZADAS (datos/<coleccion>/_stats.md) ---
+# por_valor: documentos por valor del campo; no_vacios: documentos con el campo no vacío
+DATOS_ESTADISTICAS = {
+    'viajes': {'por_valor': ('fecha', 'estado')},
+    'carros': {'por_valor': ('estado',)},
+    'estudiantes': {'por_valor': ('tiene_licencia',), 'no_vacios': ('horario',)},
+}
+
+# --- CAMPOS DE MARCA ---
+# Solo registran cuándo se escribió el documento: guardar_estudiante y
+# actualizar_estudiantes_lote no reescriben un estudiante si solo cambiarían
+# estos campos. La base de datos los compara como cualquier otro campo.
+DATOS_CAMPOS_MARCA = ('ultima_actualizacion', 'fecha_actualizacion', 'fecha_extraccion')
+
+# --- PARTICIONADO (datos/<coleccion>/_particiones.json, scripts/particionar.py) ---
+# Esquema que aplica scripts/particionar.py por defecto; el resto de colecciones usa 'hash'
+DATOS_PARTICIONES = {
+    'viajes': {'esquema': 'fecha', 'campo': 'fecha'},
+    'listas_diarias': {'esquema': 'fecha', 'campo': 'fecha'},
+}
+
 # --- MENSAJES DEL SISTEMA ---
 MESSAGES = {
     'success': {